@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the ingestion and query hot paths.
+
+Runs against the bundled data/documents corpus with the offline embedding,
+LLM and vector backends from utils.fake_backends, so results reflect this
+repo's code rather than network latency. Each case reports throughput and
+per-call latency; results are written as JSON and compared against a stored
+baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --save-baseline
+    python benchmarks/run_benchmarks.py --only chunk embed --repeat 5 --fail-on-regression
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+# Add the parent directory to the Python path to import utils
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCHMARK_DIR))
+
+# Benchmarks must never reach a real API, and the fakes have no quota to respect
+for key, value in {
+    "OPENAI_API_KEY": "benchmark",
+    "PINECONE_API_KEY": "benchmark",
+    "PINECONE_INDEX_NAME": "benchmark",
+    "EMBEDDING_BACKEND": "fake",
+    "LLM_BACKEND": "fake",
+    "VECTOR_BACKEND": "fake",
+    "FAKE_LLM_LATENCY": "0",
+    "FAKE_LLM_TOKENS_PER_SECOND": "0",
+    "EMBEDDING_REQUESTS_PER_MINUTE": "1e9",
+    "EMBEDDING_TOKENS_PER_MINUTE": ""
+}.items():
+    os.environ.setdefault(key, value)
+
+from utils.chunker import chunk_text
+from utils.config import load_config
+from utils.embeddings import get_batch_embeddings, get_embedding_client
+from utils.file_parser import parse_file, is_supported_file
+from utils.rag_service import RAGService
+from utils.rag_tracer import RAGTracer
+from utils.session_manager import SessionManager
+
+CASES = ["parse", "chunk", "embed", "upsert", "query", "session_append", "metrics_write"]
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "results", "latest.json")
+BATCH_SIZE = 100
+
+def measure(name: str, unit: str, calls: List[Callable[[], int]], repeat: int) -> Dict[str, Any]:
+    """
+    Time every call ``repeat`` times
+
+    Args:
+        name (str): Case name
+        unit (str): What the calls process (files, chunks, queries...)
+        calls (List[Callable]): Each returns the number of units it processed
+        repeat (int): Passes over the calls
+
+    Returns:
+        Dict[str, Any]: Throughput and latency summary
+    """
+    latencies = []
+    items = 0
+    for _ in range(repeat):
+        for call in calls:
+            start = time.perf_counter()
+            items += call()
+            latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    return {
+        "name": name,
+        "unit": unit,
+        "calls": len(latencies),
+        "items": items,
+        "total_seconds": total,
+        "throughput": items / total if total else 0.0,
+        "latency_mean_ms": total / len(latencies) * 1000 if latencies else 0.0,
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000) if latencies else 0.0,
+        "latency_p95_ms": float(np.percentile(latencies, 95) * 1000) if latencies else 0.0
+    }
+
+def load_corpus(directory: str) -> List[str]:
+    """Supported files under the corpus directory, in a stable order."""
+    files = []
+    for root, _, names in os.walk(directory):
+        files.extend(os.path.join(root, name) for name in names if is_supported_file(name))
+    return sorted(files)
+
+def paragraph_chunks(text: str, max_chars: int = 4000) -> List[str]:
+    """
+    Paragraphs packed into chunks of at most ``max_chars`` characters
+
+    Stands in for the token chunkers when the tiktoken encoding files cannot
+    be loaded (offline); overlong paragraphs are cut at the limit.
+    """
+    chunks, current = [], ""
+    for paragraph in (p.strip() for p in text.split('\n\n')):
+        for start in range(0, len(paragraph), max_chars):
+            piece = paragraph[start:start + max_chars]
+            if current and len(current) + 2 + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def batches(items: List[Any], size: int = BATCH_SIZE) -> List[List[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+class BenchmarkSuite:
+    """Runs the cases in order, handing parsed text and chunks down the pipeline."""
+
+    def __init__(self, corpus_dir: str, repeat: int, dimension: int):
+        self.files = load_corpus(corpus_dir)
+        self.repeat = repeat
+        self.dimension = dimension
+        self.workdir = tempfile.mkdtemp(prefix="bench-")
+        self.texts: List[str] = []
+        self.chunks: List[str] = []
+        self.chunker = "chunk_text"
+
+        # Read by the fake embedding and vector clients when they are built
+        os.environ["PINECONE_DIMENSION"] = str(dimension)
+        config = load_config()
+        config.data_dir = self.workdir
+        self.service = RAGService(config)
+        self.vector_client = self.service.pinecone_client
+        self.embedder = get_embedding_client()
+
+    def prepare(self):
+        """Parse and chunk once up front so every case has input even when run alone."""
+        self.texts = [text for text in (parse_file(path) for path in self.files) if text]
+        try:
+            self.chunks = [chunk for text in self.texts for chunk in chunk_text(text, 1000, 200)]
+        except Exception as e:
+            # Token chunking needs the tiktoken encoding files; keep the suite usable without them
+            print(f"⚠️ chunk_text unavailable ({str(e)[:80]}), using character-based paragraph chunks for later cases")
+            self.chunks = [chunk for text in self.texts for chunk in paragraph_chunks(text)]
+            self.chunker = "paragraph_chunks"
+
+    def case_parse(self) -> Dict[str, Any]:
+        return measure("parse", "files", [lambda path=path: 1 if parse_file(path) is not None else 0
+                                          for path in self.files], self.repeat)
+
+    def case_chunk(self) -> Dict[str, Any]:
+        return measure("chunk", "chunks", [lambda text=text: len(chunk_text(text, 1000, 200))
+                                           for text in self.texts], self.repeat)
+
+    def case_embed(self) -> Dict[str, Any]:
+        return measure("embed", "texts", [lambda batch=batch: len(get_batch_embeddings(batch))
+                                          for batch in batches(self.chunks)], self.repeat)
+
+    def case_upsert(self) -> Dict[str, Any]:
+        vectors = [
+            {"id": f"chunk-{i}", "values": self.embedder.embed(chunk), "metadata": {"text": chunk, "chunk_index": i}}
+            for i, chunk in enumerate(self.chunks)
+        ]
+        passes = iter(range(self.repeat * len(batches(vectors))))
+
+        def upsert(batch):
+            # A fresh namespace per pass, so later passes are inserts rather than overwrites
+            namespace = f"bench-{next(passes) // len(batches(vectors))}"
+            self.vector_client.upsert_batch(batch, namespace=namespace)
+            return len(batch)
+
+        result = measure("upsert", "vectors", [lambda batch=batch: upsert(batch) for batch in batches(vectors)], self.repeat)
+        # Leave one copy of the corpus in the shared namespace for the query case
+        for batch in batches(vectors):
+            self.vector_client.upsert_batch(batch, namespace="knowledge_base")
+        return result
+
+    def case_query(self) -> Dict[str, Any]:
+        if not self.vector_client.get_index_stats("knowledge_base")["total_vector_count"]:
+            self.case_upsert()
+        counter = iter(range(10 ** 9))
+
+        def query(chunk):
+            # A unique question each time so the embedding cache does not hide the work
+            question = f"{chunk[:120]} #{next(counter)}"
+            for namespace in self.service.search_namespaces("bench-session"):
+                self.service.retrieve(question, namespace)
+            return 1
+
+        return measure("query", "queries", [lambda chunk=chunk: query(chunk) for chunk in self.chunks[:50]], self.repeat)
+
+    def case_session_append(self) -> Dict[str, Any]:
+        manager = SessionManager(os.path.join(self.workdir, "sessions"))
+        session_id = manager.create_new_session("benchmark")
+        message = {"role": "user", "content": "How do I reset the BIOS password on my laptop?"}
+
+        def append():
+            manager.add_message_to_session(session_id, dict(message, timestamp=time.time()))
+            return 1
+
+        return measure("session_append", "messages", [append] * 50, self.repeat)
+
+    def case_metrics_write(self) -> Dict[str, Any]:
+        tracer = RAGTracer(os.path.join(self.workdir, "metrics"))
+
+        def record():
+            trace_id = tracer.start_operation("benchmark query", "bench-session", "fake-llm", "fake-embedding")
+            tracer.start_retrieval(trace_id)
+            tracer.end_retrieval(trace_id, chunks=["a", "b", "c"], scores=[0.9, 0.8, 0.7])
+            tracer.start_generation(trace_id)
+            tracer.end_generation(trace_id, response="benchmark answer")
+            tracer.complete_operation(trace_id)
+            return 1
+
+        return measure("metrics_write", "operations", [record] * 50, self.repeat)
+
+    def run(self, cases: List[str]) -> Dict[str, Any]:
+        self.prepare()
+        results = []
+        for name in cases:
+            print(f"⏱️ {name}...")
+            try:
+                results.append(getattr(self, f"case_{name}")())
+            except Exception as e:
+                print(f"   ❌ {name} failed: {str(e)}")
+                results.append({"name": name, "error": str(e)})
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": self.repeat,
+            "corpus": {
+                "files": len(self.files),
+                "characters": sum(len(text) for text in self.texts),
+                "chunks": len(self.chunks),
+                "chunker": self.chunker
+            },
+            "results": results
+        }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Compare each case with the baseline
+
+    A case regresses when its throughput drops, or its p50 latency rises,
+    by more than ``tolerance`` (a fraction, e.g. 0.2 for 20%).
+
+    Returns:
+        List[Dict]: Per-case changes with a 'regressed' flag
+    """
+    previous = {case["name"]: case for case in baseline.get("results", []) if "error" not in case}
+    changes = []
+    for case in results["results"]:
+        old = previous.get(case["name"])
+        if old is None or "error" in case:
+            continue
+        throughput_change = (case["throughput"] - old["throughput"]) / old["throughput"] if old["throughput"] else 0.0
+        latency_change = (case["latency_p50_ms"] - old["latency_p50_ms"]) / old["latency_p50_ms"] if old["latency_p50_ms"] else 0.0
+        changes.append({
+            "name": case["name"],
+            "throughput_change": throughput_change,
+            "latency_p50_change": latency_change,
+            "regressed": throughput_change < -tolerance or latency_change > tolerance
+        })
+    return changes
+
+def print_report(results: Dict[str, Any], changes: List[Dict[str, Any]]):
+    by_name = {change["name"]: change for change in changes}
+    print(f"\n{'case':<16}{'throughput':>12} {'':<13}{'p50 ms':>10}{'p95 ms':>10}{'vs baseline':>14}")
+    for case in results["results"]:
+        if "error" in case:
+            print(f"{case['name']:<16}{'error':>12}")
+            continue
+        change = by_name.get(case["name"])
+        delta = f"{change['throughput_change']:+.1%}" if change else "-"
+        flag = " ⚠️" if change and change["regressed"] else ""
+        print(f"{case['name']:<16}{case['throughput']:>12.1f} {case['unit'] + '/s':<13}"
+              f"{case['latency_p50_ms']:>10.2f}{case['latency_p95_ms']:>10.2f}{delta:>14}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for ingestion and query hot paths")
+    parser.add_argument("--corpus", default="data/documents", help="Directory of documents to benchmark with")
+    parser.add_argument("--only", nargs="+", choices=CASES, help="Run only these cases")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over each case")
+    parser.add_argument("--dimension", type=int, default=1536, help="Fake embedding dimension")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging (fraction)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    suite = BenchmarkSuite(args.corpus, args.repeat, args.dimension)
+    print(f"📚 Corpus: {len(suite.files)} files from {args.corpus}")
+    results = suite.run(args.only or CASES)
+
+    changes = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r') as f:
+            changes = compare(results, json.load(f), args.tolerance)
+        results["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "changes": changes}
+
+    print_report(results, changes)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📌 Baseline saved to {args.baseline}")
+
+    regressions = [change["name"] for change in changes if change["regressed"]]
+    if regressions:
+        print(f"⚠️ Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
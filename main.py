@@ -1,36 +1,45 @@
+import time
+_script_start = time.perf_counter()
+
 import streamlit as st
 import os
 import json
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-from utils.file_parser import parse_file
-from utils.chunker import chunk_text
-from utils.embeddings import get_embeddings, get_batch_embeddings
-from utils.pinecone_client import PineconeClient
-from utils.commands import CommandRouter
 from utils.session_manager import SessionManager
 from utils.rag_tracer import RAGTracer
-from utils.langchain_agents import DocumentRAGAgent
+from utils.services import ServiceContainer, StartupTimeline
 from utils.config import load_config, validate_config
+from utils.rate_limiter import PRIORITY_INTERACTIVE
+from utils.cache import get_all_cache_stats
+from utils.rag_service import RAGService
+from utils.ingest_jobs import IngestionJobQueue
 from utils.decorators import (
     handle_errors, log_execution_time, streamlit_spinner,
     log_user_action, validate_inputs, is_non_empty_string,
-    is_valid_file_size, is_valid_file_extension
+    is_valid_file_size, is_valid_file_extension, with_priority
 )
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, AIMessage
 from dotenv import load_dotenv
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
+
+_imports_done = time.perf_counter()
+
+@st.cache_resource
+def get_startup_timeline() -> StartupTimeline:
+    """Timeline of the first script run, shared by all sessions of this process."""
+    timeline = StartupTimeline(origin=_script_start)
+    timeline.record("import", _script_start, _imports_done)
+    return timeline
+
+startup_timeline = get_startup_timeline()
 
 # Load environment variables
 load_dotenv()
 
 # Load and validate configuration
 try:
-    config = load_config()
-    config_issues = validate_config(config)
+    with startup_timeline.phase("config"):
+        config = load_config()
+        config_issues = validate_config(config)
     if config_issues:
         st.error("Configuration Issues:")
         for issue in config_issues:
@@ -51,46 +60,51 @@ if config.langsmith.tracing and config.langsmith.api_key:
 else:
     print("ℹ️ LangSmith tracing disabled")
 
-# Initialize session state components
-@st.cache_resource
-def get_pinecone_client():
-    return PineconeClient()
-
 @st.cache_resource
 def get_session_manager():
     return SessionManager(config.data_dir)
 
 @st.cache_resource
 def get_rag_tracer():
-    return RAGTracer(config.data_dir)
+    return RAGTracer(config.data_dir, record_traces=config.rag.record_traces)
+
+# Retrieval and generation live in RAGService; the app is a thin client.
+# Heavy network clients are built on first use and warmed up in the background.
+@st.cache_resource
+def get_rag_service() -> RAGService:
+    service = RAGService(
+        config,
+        services=ServiceContainer(startup_timeline),
+        session_manager=get_session_manager(),
+        tracer=get_rag_tracer()
+    )
+    service.services.warm_up()
+    return service
 
+# Uploads are ingested by background workers so a refresh does not lose them
 @st.cache_resource
+def get_ingestion_queue() -> IngestionJobQueue:
+    return IngestionJobQueue(get_rag_service()).start()
+
+def get_services() -> ServiceContainer:
+    return get_rag_service().services
+
+def get_pinecone_client():
+    return get_rag_service().pinecone_client
+
 def get_command_router():
-    return CommandRouter()
+    return get_rag_service().command_router
 
-# Initialize core components
-if 'pinecone_client' not in st.session_state:
-    st.session_state.pinecone_client = get_pinecone_client()
+# Initialize core components (local only, no network access)
+get_services()
 if 'session_manager' not in st.session_state:
     st.session_state.session_manager = get_session_manager()
 if 'rag_tracer' not in st.session_state:
     st.session_state.rag_tracer = get_rag_tracer()
-if 'command_router' not in st.session_state:
-    st.session_state.command_router = get_command_router()
 
 # Initialize session-specific components
 if 'current_session_id' not in st.session_state:
     st.session_state.current_session_id = None
-if 'rag_agent' not in st.session_state:
-    st.session_state.rag_agent = None
-if 'llm' not in st.session_state:
-    st.session_state.llm = ChatOpenAI(
-        model=config.openai.model,
-        temperature=config.openai.temperature,
-        api_key=config.openai.api_key,
-        base_url=config.openai.base_url,
-        max_tokens=config.openai.max_tokens
-    )
 
 @handle_errors()
 @log_execution_time
@@ -103,20 +117,11 @@ def initialize_session(session_id: Optional[str] = None) -> str:
         session_data = session_manager.get_session(session_id)
         if session_data:
             st.session_state.current_session_id = session_id
-            # Initialize RAG agent for this session
-            st.session_state.rag_agent = DocumentRAGAgent(
-                session_id=session_id,
-                pinecone_client=st.session_state.pinecone_client
-            )
             return session_id
     
     # Create new session
     new_session_id = session_manager.create_new_session()
     st.session_state.current_session_id = new_session_id
-    st.session_state.rag_agent = DocumentRAGAgent(
-        session_id=new_session_id,
-        pinecone_client=st.session_state.pinecone_client
-    )
     return new_session_id
 
 @handle_errors()
@@ -133,7 +138,7 @@ def save_current_chat_history(history: List[Dict[str, Any]]):
 
 @handle_errors()
 @log_execution_time
-@streamlit_spinner("Processing uploaded file...")
+@streamlit_spinner("Queuing uploaded file...")
 @log_user_action()
 @validate_inputs([
     (lambda f: f is not None, "File must be provided"),
@@ -143,114 +148,65 @@ def save_current_chat_history(history: List[Dict[str, Any]]):
      f"File type must be one of: {', '.join(config.file_upload.allowed_extensions)}")
 ])
 def process_uploaded_file(uploaded_file) -> bool:
-    """Process uploaded file and store in Pinecone with session management"""
+    """Queue uploaded file for background ingestion into the current session"""
     if not st.session_state.current_session_id:
         st.error("No active session. Please start a new session first.")
         return False
     
-    # Parse the file
-    content = parse_file(uploaded_file)
-    if not content:
-        st.error("Could not extract content from the file.")
-        return False
-    
-    # Chunk the content
-    chunks = chunk_text(
-        content,
-        chunk_size=config.chunking.chunk_size,
-        chunk_overlap=config.chunking.chunk_overlap
+    get_ingestion_queue().submit(
+        st.session_state.current_session_id,
+        uploaded_file.getvalue(),
+        uploaded_file.name
     )
-    if not chunks:
-        st.error("Could not create chunks from the content.")
-        return False
-    
-    # Create embeddings and store in Pinecone with session context
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    st.success(f"Queued {uploaded_file.name} for processing.")
+    return True
+
+def _render_job_list(session_id: str):
+    """Progress of the session's recent ingestion jobs"""
+    queue = get_ingestion_queue()
+    jobs = queue.list_jobs(session_id, limit=10)
+    if not jobs:
+        st.caption("No uploads yet.")
+        return
     
-    try:
-        # Batch process embeddings for better performance
-        batch_size = 10
-        vectors = []
-        
-        for batch_start in range(0, len(chunks), batch_size):
-            batch_end = min(batch_start + batch_size, len(chunks))
-            batch_chunks = chunks[batch_start:batch_end]
-            
-            # Update progress
-            progress = batch_end / len(chunks)
-            progress_bar.progress(progress)
-            status_text.text(f"Processing chunks {batch_start + 1}-{batch_end} of {len(chunks)}...")
-            
-            # Get batch embeddings
-            batch_embeddings = get_batch_embeddings(batch_chunks)
-            
-            for i, (chunk, embedding) in enumerate(zip(batch_chunks, batch_embeddings)):
-                if embedding:
-                    chunk_index = batch_start + i
-                    vectors.append({
-                        'id': f"{st.session_state.current_session_id}_{uploaded_file.name}_{chunk_index}",
-                        'values': embedding,
-                        'metadata': {
-                            'text': chunk,
-                            'source': uploaded_file.name,
-                            'chunk_index': chunk_index,
-                            'session_id': st.session_state.current_session_id,
-                            'timestamp': datetime.now().isoformat(),
-                            'file_size': len(content),
-                            'chunk_size': len(chunk)
-                        }
-                    })
-        
-        progress_bar.progress(1.0)
-        status_text.text("Storing vectors in Pinecone...")
-        
-        if vectors:
-            # Extract texts and embeddings from vectors
-            texts = [v['metadata']['text'] for v in vectors]
-            embeddings = [v['values'] for v in vectors]
-            
-            success = st.session_state.pinecone_client.create_session_vectors(
-                texts=texts,
-                embeddings=embeddings,
-                session_id=st.session_state.current_session_id,
-                document_name=uploaded_file.name
-            )
-            if success:
-                # Update session metadata
-                session_data = st.session_state.session_manager.get_session(
-                    st.session_state.current_session_id
-                )
-                if session_data:
-                    documents = session_data.get('documents', [])
-                    documents.append({
-                        'filename': uploaded_file.name,
-                        'chunks_count': len(vectors),
-                        'file_size': len(content),
-                        'upload_time': datetime.now().isoformat()
-                    })
-                    st.session_state.session_manager.update_session(
-                        st.session_state.current_session_id,
-                        documents=documents
-                    )
-                
-                progress_bar.empty()
-                status_text.empty()
-                st.success(f"Successfully processed {uploaded_file.name} with {len(vectors)} chunks.")
-                return True
-            else:
-                st.error("Failed to store vectors in Pinecone.")
-                return False
+    status_icons = {"queued": "⏳", "running": "⚙️", "completed": "✅", "failed": "❌", "cancelled": "🚫"}
+    for job in jobs:
+        label = f"{status_icons.get(job['status'], '')} {job['filename']}"
+        if job["status"] in ("queued", "running"):
+            detail = (f"{job['completed_batches']}/{job['total_batches']} batches"
+                      if job["total_batches"] else "waiting to start")
+            st.progress(job["progress"], text=f"{label} · {detail}")
+            if job["error"]:
+                st.caption(f"Retrying after error: {job['error'][:120]}")
+            if st.button("Cancel", key=f"cancel_job_{job['id']}"):
+                queue.cancel(job["id"])
+                st.rerun()
+        elif job["status"] == "completed" and job["duplicate_of"]:
+            st.caption(f"{label} · duplicate of {job['duplicate_of']}, not stored again")
+        elif job["status"] == "completed":
+            st.caption(f"{label} · {job['chunks_stored']} chunks")
         else:
-            st.error("No valid embeddings were created.")
-            return False
-            
-    finally:
-        progress_bar.empty()
-        status_text.empty()
+            st.caption(f"{label} · {job['error'] or job['status']}")
+
+@handle_errors()
+def render_ingestion_jobs():
+    """Render upload progress, refreshed while jobs are active"""
+    session_id = st.session_state.current_session_id
+    if not session_id:
+        return
+    
+    st.markdown("### 📥 Processing")
+    fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    if fragment:
+        fragment(run_every=2)(_render_job_list)(session_id)
+    else:
+        _render_job_list(session_id)
+        if st.button("🔄 Refresh", key="refresh_jobs_btn"):
+            st.rerun()
 
 @handle_errors()
 @log_execution_time
+@with_priority(PRIORITY_INTERACTIVE)
 @validate_inputs([
     (lambda q: is_non_empty_string(q), "Query must be a non-empty string")
 ])
@@ -259,127 +215,9 @@ def get_response(query: str) -> str:
     if not st.session_state.current_session_id:
         return "No active session. Please start a new session first."
     
-    if not st.session_state.rag_agent:
-        return "RAG agent not initialized. Please start a new session."
-    
-    # Start RAG tracing
-    trace_id = st.session_state.rag_tracer.start_operation(
-        query=query,
-        session_id=st.session_state.current_session_id,
-        model="gpt-4",
-        embedding_model="text-embedding-ada-002"
-    )
-    
-    try:
-        # Check if it's a command
-        if query.startswith('/'):
-            return st.session_state.command_router.handle_command(
-                query, st.session_state.pinecone_client
-            )
-        
-        # Check if query looks like it needs agent tools
-        agent_keywords = [
-            'summarize', 'summary', 'compare', 'comparison', 'statistics', 
-            'stats', 'key concepts', 'main points', 'overview', 'analyze'
-        ]
-        
-        use_agent = any(keyword in query.lower() for keyword in agent_keywords)
-        
-        if use_agent:
-            # Use LangChain agent for complex queries
-            st.session_state.rag_tracer.start_retrieval(trace_id)
-            
-            try:
-                response = st.session_state.rag_agent.query(query)
-                
-                st.session_state.rag_tracer.end_retrieval(
-                    trace_id, 
-                    chunks=[],  # Agent handles this internally
-                    scores=[]
-                )
-                
-                st.session_state.rag_tracer.start_generation(trace_id)
-                st.session_state.rag_tracer.end_generation(
-                    trace_id,
-                    response=response
-                )
-                
-                return response
-                
-            except Exception as e:
-                st.warning(f"Agent failed, falling back to standard RAG: {e}")
-                use_agent = False
-        
-        if not use_agent:
-            # Standard RAG pipeline with tracing
-            st.session_state.rag_tracer.start_retrieval(trace_id)
-            
-            # Get relevant chunks from Pinecone
-            query_embedding = get_embeddings(query)
-            relevant_chunks = st.session_state.pinecone_client.query_vectors(
-                query_embedding, 
-                top_k=config.rag.top_k,
-                namespace=st.session_state.current_session_id
-            )
-            
-            if not relevant_chunks or 'matches' not in relevant_chunks:
-                st.session_state.rag_tracer.complete_operation(trace_id)
-                return "I couldn't find relevant information in the uploaded documents. Please make sure you've uploaded some documents first."
-            
-            # Extract context and scores
-            context_chunks = []
-            scores = []
-            
-            for match in relevant_chunks['matches']:
-                if 'metadata' in match and 'text' in match['metadata']:
-                    context_chunks.append(match['metadata']['text'])
-                    scores.append(match.get('score', 0.0))
-            
-            if not context_chunks:
-                st.session_state.rag_tracer.complete_operation(trace_id)
-                return "I couldn't find relevant information in the uploaded documents."
-            
-            st.session_state.rag_tracer.end_retrieval(
-                trace_id, 
-                chunks=context_chunks,
-                scores=scores
-            )
-            
-            # Combine context
-            context = "\n\n".join(context_chunks[:config.rag.max_context_chunks])
-            
-            # Create prompt
-            prompt = f"""Based on the following context from uploaded documents, please answer the question.
-            
-Context:
-{context}
-            
-Question: {query}
-            
-Please provide a comprehensive answer based on the context. If the context doesn't contain enough information to fully answer the question, please mention what information is missing.
-            
-Answer:"""
-            
-            # Get response from LLM
-            st.session_state.rag_tracer.start_generation(trace_id)
-            
-            response = st.session_state.llm.invoke([HumanMessage(content=prompt)])
-            
-            response_text = response.content
-            
-            st.session_state.rag_tracer.end_generation(
-                trace_id,
-                response=response_text
-            )
-            
-            return response_text
-    
-    except Exception as e:
-        st.session_state.rag_tracer.complete_operation(trace_id)
-        return f"Error generating response: {str(e)}"
-    
-    finally:
-        st.session_state.rag_tracer.complete_operation(trace_id)
+    # Async path: per-stage timeouts degrade gracefully instead of hanging the UI.
+    # Runs on the services' long-lived loop so cached async clients stay bound to one loop.
+    return get_services().run(get_rag_service().aquery(query, st.session_state.current_session_id))
 
 @handle_errors()
 def render_session_sidebar():
@@ -414,14 +252,14 @@ def render_session_sidebar():
         if st.button("🗑️ Clear Session", key="clear_session_btn", use_container_width=True):
             if st.session_state.current_session_id:
                 # Clear session data including Pinecone vectors
-                st.session_state.pinecone_client.clear_session_data(
+                get_pinecone_client().clear_session_data(
                     st.session_state.current_session_id
                 )
                 st.session_state.session_manager.delete_session(
                     st.session_state.current_session_id
                 )
+                get_rag_service().drop_session(st.session_state.current_session_id)
                 st.session_state.current_session_id = None
-                st.session_state.rag_agent = None
                 st.sidebar.success("Session cleared!")
                 st.rerun()
     
@@ -469,14 +307,39 @@ def render_rag_metrics():
             st.metric("Avg Generation Time", f"{stats['avg_generation_time']:.2f}s")
         with col4:
             st.metric("Avg Total Time", f"{stats['avg_total_time']:.2f}s")
-        
+
+        # Token usage and cost
+        rollups = st.session_state.rag_tracer.get_usage_rollups(st.session_state.current_session_id)
+        session_usage = rollups['by_session'].get(st.session_state.current_session_id, {})
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Session Tokens", f"{stats.get('total_tokens', 0):,}")
+        with col2:
+            st.metric("Session Cost (incl. uploads)", f"${session_usage.get('cost', 0.0):.4f}")
+        with col3:
+            st.metric("Avg Cost per Query", f"${stats.get('avg_cost', 0.0):.4f}")
+
+        usage_col1, usage_col2 = st.columns(2)
+        with usage_col1:
+            st.caption("Cost by operation (this session)")
+            st.table([{"operation": name, **totals} for name, totals in rollups['by_operation'].items()])
+        with usage_col2:
+            st.caption("Cost by day (this session)")
+            st.table([{"day": day, **totals} for day, totals in sorted(rollups['by_day'].items(), reverse=True)])
+
+        with st.expander("💰 Cost by session (all sessions)", expanded=False):
+            st.table([{"session": session[:8], **totals} for session, totals in list(rollups['by_session'].items())[:20]])
+
         # Get raw metrics for chart
         raw_metrics = st.session_state.rag_tracer.get_session_metrics(
             st.session_state.current_session_id
         )
         
-        # Performance chart
+        # Performance chart (plotting libraries are imported on first use)
         if len(raw_metrics) > 1:
+            import pandas as pd
+            import plotly.express as px
+            
             df = pd.DataFrame(raw_metrics)
             df['timestamp'] = pd.to_datetime(df['timestamp'])
             
@@ -751,9 +614,8 @@ def main():
         if uploaded_file is not None:
             st.info(f"📄 Selected: {uploaded_file.name} ({uploaded_file.size:,} bytes)")
             if st.button("📤 Process File", key="process_file_btn", use_container_width=True, type="primary"):
-                success = process_uploaded_file(uploaded_file)
-                if success:
-                    st.rerun()
+                process_uploaded_file(uploaded_file)
+        render_ingestion_jobs()
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Quick Actions Section
@@ -795,6 +657,28 @@ def main():
             - "overview", "analyze"
             """)
         st.markdown('</div>', unsafe_allow_html=True)
+        
+        # Startup diagnostics
+        if config.debug_mode:
+            with st.expander("⏱️ Startup Timeline", expanded=False):
+                for name, status in get_services().status().items():
+                    st.caption(f"{name}: {status}")
+                st.code(startup_timeline.summary() or "No phases recorded")
+            
+            with st.expander("🗄️ Cache Stats", expanded=False):
+                for name, stats in get_all_cache_stats().items():
+                    st.caption(
+                        f"{name}: {stats['entries']} entries, hit rate {stats['hit_rate']:.0%} "
+                        f"({stats['hits']} hits / {stats['misses']} misses, {stats['evictions']} evicted)"
+                    )
+                flight_groups = [get_rag_service().flights]
+                if get_services().is_ready("command_router"):
+                    flight_groups.append(get_command_router().flights)
+                for flight_stats in (group.get_stats() for group in flight_groups):
+                    st.caption(
+                        f"{flight_stats['name']} single-flight: {flight_stats['executions']} executed, "
+                        f"{flight_stats['coalesced']} coalesced"
+                    )
     
     # Main content area with enhanced layout
     col1, col2 = st.columns([3, 1])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Measure recall@k and latency of the IVF index across nprobe settings.
+
+Ground truth is exact cosine search over the same vectors. The sweep shows
+how many clusters must be scanned to reach a target recall, which is the
+value to put in LOCAL_INDEX_NPROBE.
+
+Usage:
+    python scripts/benchmark_ann_index.py --vectors 100000 --dimension 384
+    python scripts/benchmark_ann_index.py --embeddings data/embeddings.npy --nprobe 1 4 16 64
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import List
+
+import numpy as np
+
+# Add the parent directory to the Python path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ann_index import IVFIndex
+from utils.vector_store import normalize_rows, top_k_indices
+from benchmark_vector_store import make_synthetic_embeddings, recall_at_k
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[List[int]]:
+    """Exact top-k by cosine with one matrix product per query."""
+    normalized = normalize_rows(vectors)
+    return [list(top_k_indices(normalized @ query, k)) for query in normalize_rows(queries)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k and latency of the IVF index per nprobe")
+    parser.add_argument("--embeddings", help="Optional .npy matrix of real embeddings (rows are vectors)")
+    parser.add_argument("--vectors", type=int, default=50000, help="Synthetic vector count")
+    parser.add_argument("--dimension", type=int, default=384, help="Synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=100, help="Number of queries")
+    parser.add_argument("--k", type=int, default=10, help="Neighbors per query (recall@k)")
+    parser.add_argument("--nlist", type=int, help="Number of clusters (default about 4 * sqrt(n))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64], help="nprobe values to sweep")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        data = np.load(args.embeddings).astype(np.float32)
+    else:
+        data = make_synthetic_embeddings(args.vectors + args.queries, args.dimension, clusters=200)
+    vectors, queries = data[:-args.queries], data[-args.queries:]
+
+    print(f"📐 {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}")
+    truth_start = time.perf_counter()
+    truth = exact_neighbors(vectors, queries, args.k)
+    exact_latency = (time.perf_counter() - truth_start) / len(queries)
+
+    build_start = time.perf_counter()
+    index = IVFIndex(vectors.shape[1], nlist=args.nlist, train_threshold=len(vectors) + 1)
+    index.upsert([str(i) for i in range(len(vectors))], vectors)
+    index.train()
+    build_time = time.perf_counter() - build_start
+    stats = index.stats()
+    print(f"🏗️ Built {stats['nlist']} lists in {build_time:.1f}s (largest list {stats['largest_list']})")
+
+    results = []
+    for nprobe in args.nprobe:
+        latencies = []
+        found = []
+        for query in queries:
+            start = time.perf_counter()
+            matches = index.search(query, top_k=args.k, nprobe=nprobe)
+            latencies.append(time.perf_counter() - start)
+            found.append([int(vector_id) for vector_id, _, _ in matches])
+        results.append({
+            "nprobe": nprobe,
+            "recall_at_k": recall_at_k(found, truth),
+            "latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "latency_p95_ms": float(np.percentile(latencies, 95) * 1000)
+        })
+
+    print(f"\n{'nprobe':<10}{'recall@k':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    print(f"{'exact':<10}{1.0:>10.3f}{exact_latency * 1000:>9.2f}{'':>9}")
+    for result in results:
+        print(f"{result['nprobe']:<10}{result['recall_at_k']:>10.3f}"
+              f"{result['latency_p50_ms']:>9.2f}{result['latency_p95_ms']:>9.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                "vectors": len(vectors),
+                "dimension": int(vectors.shape[1]),
+                "queries": len(queries),
+                "k": args.k,
+                "nlist": stats["nlist"],
+                "build_seconds": build_time,
+                "exact_latency_ms": exact_latency * 1000,
+                "results": results
+            }, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
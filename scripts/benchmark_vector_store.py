@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark the quantized in-process vector store against exact cosine search.
+
+Ground truth comes from utils.embeddings.find_most_similar, the exact O(n)
+search the app uses today. Each store configuration reports memory per
+vector, recall@k against that ground truth and query latency.
+
+Usage:
+    python scripts/benchmark_vector_store.py --vectors 10000 --queries 20
+    python scripts/benchmark_vector_store.py --embeddings data/embeddings.npy --json results.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Add the parent directory to the Python path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embeddings import find_most_similar
+from utils.vector_store import VectorStore
+
+def make_synthetic_embeddings(count: int, dimension: int, clusters: int = 50, seed: int = 0) -> np.ndarray:
+    """
+    Clustered Gaussian vectors, a rough stand-in for real text embeddings
+
+    Real embeddings are anisotropic and topic-clustered; uniform random
+    vectors would make every index look either perfect or useless.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    labels = rng.integers(clusters, size=count)
+    noise = rng.normal(scale=0.6, size=(count, dimension)).astype(np.float32)
+    return centers[labels] + noise
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[List[int]]:
+    """Exact top-k via utils.embeddings.find_most_similar."""
+    candidates = vectors.tolist()
+    return [
+        [index for index, _ in find_most_similar(query.tolist(), candidates, top_k=k)]
+        for query in queries
+    ]
+
+def recall_at_k(found: List[List[int]], truth: List[List[int]]) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / sum(len(t) for t in truth)
+
+def run_configuration(name: str, vectors: np.ndarray, queries: np.ndarray, truth: List[List[int]],
+                      k: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Build one store, search every query and summarize the run."""
+    options = dict(options)
+    rescore = options.pop("rescore", None)
+
+    build_start = time.perf_counter()
+    store = VectorStore(vectors.shape[1], **options)
+    ids = [str(i) for i in range(len(vectors))]
+    if options.get("full_precision", "float32") is None:
+        # Code-only stores must be trained before vectors are added
+        store.train(sample=vectors)
+        store.add(ids, vectors)
+    else:
+        store.add(ids, vectors)
+        store.train()
+    store.flush()
+    build_time = time.perf_counter() - build_start
+
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        results = store.search(query, top_k=k, rescore=rescore)
+        latencies.append(time.perf_counter() - start)
+        found.append([int(vector_id) for vector_id, _, _ in results])
+
+    memory = store.memory_usage()
+    resident = memory["codes"] + memory["full_precision"] + memory["quantizer"]
+    return {
+        "name": name,
+        "bytes_per_vector": resident / len(vectors),
+        "code_bytes_per_vector": memory["codes"] / len(vectors),
+        "recall_at_k": recall_at_k(found, truth),
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "latency_p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "build_seconds": build_time
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quantized vector search against exact cosine")
+    parser.add_argument("--embeddings", help="Optional .npy matrix of real embeddings (rows are vectors)")
+    parser.add_argument("--vectors", type=int, default=10000, help="Synthetic vector count")
+    parser.add_argument("--dimension", type=int, default=1536, help="Synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=20, help="Number of queries")
+    parser.add_argument("--k", type=int, default=10, help="Neighbors per query (recall@k)")
+    parser.add_argument("--pq-subvectors", type=int, default=96, help="PQ subvectors (must divide the dimension)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        data = np.load(args.embeddings).astype(np.float32)
+    else:
+        data = make_synthetic_embeddings(args.vectors + args.queries, args.dimension)
+    vectors, queries = data[:-args.queries], data[-args.queries:]
+
+    print(f"📐 {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}")
+    print("⏳ Computing exact neighbors with utils.embeddings.find_most_similar...")
+    truth_start = time.perf_counter()
+    truth = exact_neighbors(vectors, queries, args.k)
+    exact_latency = (time.perf_counter() - truth_start) / len(queries)
+
+    configurations = [
+        ("float32 exact", dict(quantization="none")),
+        ("int8 ADC", dict(quantization="int8", full_precision=None, rescore=False)),
+        ("int8 ADC + rescore", dict(quantization="int8")),
+        ("PQ ADC", dict(quantization="pq", full_precision=None, pq_subvectors=args.pq_subvectors, rescore=False)),
+        ("PQ ADC + rescore", dict(quantization="pq", pq_subvectors=args.pq_subvectors)),
+        ("PQ ADC + float16 rescore", dict(quantization="pq", full_precision="float16", pq_subvectors=args.pq_subvectors)),
+    ]
+
+    results = [
+        run_configuration(name, vectors, queries, truth, args.k, options)
+        for name, options in configurations
+    ]
+
+    print(f"\n{'configuration':<26}{'bytes/vec':>10}{'recall@k':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    # Python list of floats: an 8-byte pointer plus a 24-byte float object per dimension
+    print(f"{'find_most_similar':<26}{vectors.shape[1] * 32 + 56:>10.0f}{1.0:>10.3f}{exact_latency * 1000:>9.1f}{'':>9}")
+    for result in results:
+        print(f"{result['name']:<26}{result['bytes_per_vector']:>10.0f}{result['recall_at_k']:>10.3f}"
+              f"{result['latency_p50_ms']:>9.2f}{result['latency_p95_ms']:>9.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                "vectors": len(vectors),
+                "dimension": int(vectors.shape[1]),
+                "queries": len(queries),
+                "k": args.k,
+                "exact_latency_ms": exact_latency * 1000,
+                "results": results
+            }, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Replay recorded query traces at increasing speed-ups to find a host's capacity.
+
+Traces come from RAGTracer with RAG_RECORD_TRACES=true (data/query_traces.jsonl).
+Each level replays the log open-loop with its inter-arrival gaps divided by
+the speed-up, so the traffic keeps its real burstiness. For every level the
+report shows offered and achieved throughput, mean concurrency (Little's
+law), end-to-end and first-token percentiles, and retrieval and generation
+percentiles. From those it finds where throughput stops keeping up, where
+each stage saturates, and how many chat users the host can serve.
+
+Usage:
+    python scripts/capacity_plan.py --speedups 1 2 4 8 16 32
+    python scripts/capacity_plan.py --traces prod_traces.jsonl --slo-ms 3000 --think-time 45 --output capacity.json
+    python scripts/capacity_plan.py --backend real --session <namespace> --speedups 1 2 4
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from dataclasses import asdict
+from typing import Any, Dict, List, Tuple
+
+# Add the parent directory to the Python path to import utils
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+sys.path.append(SCRIPT_DIR)
+
+from utils.config import load_config
+from utils.query_trace import load_query_traces
+from utils.rag_service import RAGService
+from utils.rag_tracer import RAGTracer, RAGMetrics
+from load_test import LoadGenerator, ingest_corpus, percentile_summary, use_fake_backends
+
+STAGES = ("retrieval", "generation")
+
+class CollectingTracer(RAGTracer):
+    """RAGTracer that keeps completed metrics in memory instead of on disk."""
+
+    def __init__(self, data_dir: str):
+        super().__init__(data_dir)
+        self.collected: List[Tuple[float, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+
+    def save_metrics(self, metrics: RAGMetrics):
+        with self._lock:
+            self.collected.append((time.perf_counter(), asdict(metrics)))
+
+    def take(self, since: float) -> List[Dict[str, Any]]:
+        """Metrics of operations finished after ``since``, clearing the buffer."""
+        with self._lock:
+            collected, self.collected = self.collected, []
+        return [metrics for finished, metrics in collected if finished >= since]
+
+def build_schedule(traces: List[Dict[str, Any]], speedup: float, duration: float,
+                   warmup: float, max_gap: float) -> List[Tuple[float, str, bool]]:
+    """
+    Send offsets for one level
+
+    Recorded gaps longer than ``max_gap`` (idle nights, lunch breaks) are
+    shortened to it, the rest divided by ``speedup``. The log is looped until
+    ``warmup + duration`` seconds are filled.
+
+    Returns:
+        List[Tuple]: (seconds from start, query, measured)
+    """
+    gaps = [0.0] + [
+        min(current["started_at"] - previous["started_at"], max_gap) / speedup
+        for previous, current in zip(traces, traces[1:])
+    ]
+    # Gap between the end of one pass over the log and the start of the next
+    gaps[0] = (sum(gaps) / max(len(gaps) - 1, 1)) if len(gaps) > 1 else 1.0 / speedup
+
+    schedule = []
+    offset = 0.0
+    index = 0
+    while offset < warmup + duration:
+        schedule.append((offset, traces[index]["query"], offset >= warmup))
+        index = (index + 1) % len(traces)
+        offset += gaps[index]
+    return schedule
+
+def run_level(service: RAGService, tracer: CollectingTracer, session_id: str, traces: List[Dict[str, Any]],
+              speedup: float, args) -> Dict[str, Any]:
+    """Replay one speed-up level and summarize it."""
+    schedule = build_schedule(traces, speedup, args.duration, args.warmup, args.max_gap)
+    generator = LoadGenerator(service, session_id, [(query, 1.0) for _, query, _ in schedule], args.concurrency)
+    tracer.take(float("inf"))
+    started = time.perf_counter()
+    generator.replay(schedule)
+    # Until the last measured request finished, which is later than planned once the host falls behind
+    elapsed = max(time.perf_counter() - started - args.warmup, args.duration)
+    stage_metrics = tracer.take(started + args.warmup)
+
+    offered = sum(1 for _, _, measured in schedule if measured) / args.duration
+    report = generator.report(offered, elapsed)
+    latency = report["latency_ms"]
+    level = {
+        "speedup": speedup,
+        "offered_qps": offered,
+        "achieved_qps": report["achieved_qps"],
+        "errors": report["errors"],
+        "error_rate": report["errors"] / report["sent"] if report["sent"] else 0.0,
+        "max_in_flight": report["max_in_flight"],
+        # Little's law: requests in the system = arrival rate x time in the system
+        "mean_concurrency": report["achieved_qps"] * latency.get("mean", 0.0) / 1000,
+        "latency_ms": latency,
+        "first_token_ms": report["first_token_ms"],
+        "stages_ms": {
+            stage: percentile_summary([metrics[f"{stage}_time"] for metrics in stage_metrics])
+            for stage in STAGES
+        }
+    }
+    return level
+
+def find_saturation(levels: List[Dict[str, Any]], factor: float, slo_ms: float) -> Dict[str, Any]:
+    """
+    Where the host stops keeping up
+
+    Throughput saturates at the first level achieving under 90% of the
+    offered rate; a stage saturates at the first level whose p95 exceeds
+    ``factor`` times its p95 at the lowest level. The sustainable rate is
+    the highest level that keeps up, fails under 1% of requests and meets
+    the p95 SLO.
+    """
+    saturation = {"throughput": None, "stages": {}, "sustainable_qps": 0.0}
+    for level in levels:
+        if saturation["throughput"] is None and level["achieved_qps"] < 0.9 * level["offered_qps"]:
+            saturation["throughput"] = level["speedup"]
+        if (level["achieved_qps"] >= 0.9 * level["offered_qps"] and level["error_rate"] <= 0.01
+                and level["latency_ms"].get("p95", float("inf")) <= slo_ms):
+            saturation["sustainable_qps"] = max(saturation["sustainable_qps"], level["achieved_qps"])
+
+    for stage in STAGES + ("first_token", "total"):
+        def p95(level):
+            if stage == "total":
+                return level["latency_ms"].get("p95")
+            if stage == "first_token":
+                return level["first_token_ms"].get("p95")
+            return level["stages_ms"][stage].get("p95")
+
+        base = next((p95(level) for level in levels if p95(level)), None)
+        saturation["stages"][stage] = next(
+            (level["speedup"] for level in levels if base and p95(level) and p95(level) > factor * base), None
+        )
+    return saturation
+
+def print_report(levels: List[Dict[str, Any]], saturation: Dict[str, Any], think_time: float):
+    print(f"\n{'speedup':>8}{'offered':>9}{'achieved':>10}{'conc':>8}{'p50':>9}{'p95':>9}{'p99':>9}"
+          f"{'ttft95':>9}{'retr95':>9}{'gen95':>9}{'err':>5}")
+    for level in levels:
+        latency = level["latency_ms"]
+        print(f"{level['speedup']:>7g}x{level['offered_qps']:>9.1f}{level['achieved_qps']:>10.1f}"
+              f"{level['mean_concurrency']:>8.1f}{latency.get('p50', 0):>9.0f}{latency.get('p95', 0):>9.0f}"
+              f"{latency.get('p99', 0):>9.0f}{level['first_token_ms'].get('p95', 0):>9.0f}"
+              f"{level['stages_ms']['retrieval'].get('p95', 0):>9.0f}"
+              f"{level['stages_ms']['generation'].get('p95', 0):>9.0f}{level['errors']:>5}")
+    print("(throughput in queries/s, latencies in ms)")
+
+    if saturation["throughput"] is not None:
+        print(f"\n⚠️ Throughput saturates at {saturation['throughput']:g}x")
+    for stage, speedup in saturation["stages"].items():
+        if speedup is not None:
+            print(f"⚠️ {stage} p95 degrades at {speedup:g}x")
+
+    sustainable = saturation["sustainable_qps"]
+    if sustainable:
+        print(f"\n✅ Sustainable: {sustainable:.1f} queries/s within the SLO, "
+              f"about {saturation['concurrent_users']:.0f} concurrent chat users "
+              f"at one question every {think_time:.0f}s")
+    else:
+        print("\n❌ No level met the SLO")
+
+def main():
+    parser = argparse.ArgumentParser(description="Capacity planning by replaying recorded query traces")
+    parser.add_argument("--traces", default="data/query_traces.jsonl", help="Trace log written by RAGTracer")
+    parser.add_argument("--speedups", type=float, nargs="+", default=[1, 2, 4, 8, 16], help="Replay speed-ups, ascending")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds at the start of each level")
+    parser.add_argument("--max-gap", type=float, default=30.0, help="Longest recorded gap kept, in seconds")
+    parser.add_argument("--concurrency", type=int, default=256, help="Worker threads serving requests")
+    parser.add_argument("--backend", choices=["fake", "real"], default="fake", help="Offline fakes or the configured APIs")
+    parser.add_argument("--session", help="Namespace to query (real backend); fake runs ingest --corpus instead")
+    parser.add_argument("--corpus", default="data/documents", help="Documents ingested for fake runs")
+    parser.add_argument("--max-files", type=int, default=50, help="Maximum documents to ingest")
+    parser.add_argument("--slo-ms", type=float, default=5000.0, help="p95 end-to-end latency target")
+    parser.add_argument("--saturation-factor", type=float, default=2.0, help="p95 growth that marks a stage saturated")
+    parser.add_argument("--think-time", type=float, default=30.0, help="Seconds a user waits between questions")
+    parser.add_argument("--output", help="Optional JSON file for the curves")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.traces):
+        print(f"❌ Trace log not found: {args.traces} (record one with RAG_RECORD_TRACES=true)")
+        sys.exit(1)
+    traces = load_query_traces(args.traces)
+    if not traces:
+        print(f"❌ No traces in {args.traces}")
+        sys.exit(1)
+    span = traces[-1]["started_at"] - traces[0]["started_at"]
+    print(f"📜 {len(traces)} traces spanning {span / 60:.1f} minutes")
+
+    if args.backend == "fake":
+        use_fake_backends()
+    config = load_config()
+    config.data_dir = tempfile.mkdtemp(prefix="capacity-")
+    tracer = CollectingTracer(config.data_dir)
+    service = RAGService(config, tracer=tracer)
+
+    if args.backend == "fake":
+        session_id = service.session_manager.create_new_session("capacity plan")
+        print(f"📚 Ingesting up to {args.max_files} documents from {args.corpus}...")
+        print(f"✅ {ingest_corpus(service, session_id, args.corpus, args.max_files)} chunks indexed")
+    elif args.session:
+        session_id = args.session
+    else:
+        print("❌ --session is required with --backend real")
+        sys.exit(1)
+
+    levels = []
+    for speedup in sorted(args.speedups):
+        print(f"🚀 {speedup:g}x for {args.warmup:.0f}s warm-up + {args.duration:.0f}s measured...")
+        levels.append(run_level(service, tracer, session_id, traces, speedup, args))
+
+    saturation = find_saturation(levels, args.saturation_factor, args.slo_ms)
+    # Each user sends one question per think time plus the time spent waiting for the answer
+    sustainable_levels = [level for level in levels if level["achieved_qps"] == saturation["sustainable_qps"]]
+    cycle = args.think_time + (sustainable_levels[0]["latency_ms"].get("mean", 0.0) / 1000 if sustainable_levels else 0.0)
+    saturation["concurrent_users"] = saturation["sustainable_qps"] * cycle
+    print_report(levels, saturation, args.think_time)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"traces": len(traces), "levels": levels, "saturation": saturation,
+                       "settings": vars(args)}, f, indent=2)
+        print(f"\n💾 Curves written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,14 @@ Integrates PDF downloading with the existing RAG system
 
 import os
 import sys
+import json
+import time
+import shutil
 import asyncio
+import hashlib
+from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 import logging
 
 # Add project root to path
@@ -16,26 +21,129 @@ sys.path.append(str(project_root))
 
 from scripts.pdf_downloader import PDFDownloader
 from scripts.download_configs import DOWNLOAD_CONFIGS
-from utils.file_parser import parse_file
-from utils.chunker import chunk_text
-from utils.pinecone_client import PineconeClient
+from utils.file_parser import get_parser, parse_file_with_pages
+from utils.chunker import chunk_text_with_offsets, assign_pages_to_chunks
+from utils.config import load_config
+from utils.rag_service import DEDUP_DIR, VOCABULARY_FILE, create_pinecone_client
+from utils.dedup import DuplicateRegistry
+from utils.federated_search import KNOWLEDGE_BASE_NAMESPACE
+from utils.query_router import MetadataVocabulary, document_metadata
 from utils.embeddings import get_embeddings, get_batch_embeddings
 from utils.session_manager import SessionManager
+from utils.rate_limiter import request_priority, PRIORITY_BULK
 import streamlit as st
 
+# Stage checkpoints, in pipeline order
+STAGE_DOWNLOADED = "downloaded"
+STAGE_PROCESSED = "processed"
+STAGE_VECTORIZED = "vectorized"
+
+# Chunks embedded and upserted per vectorize step; progress is checkpointed after each
+VECTORIZE_BATCH_SIZE = 50
+
+# Documents buffered between stages before the earlier stage waits
+STAGE_QUEUE_SIZE = 8
+
+class PipelineCheckpoints:
+    """
+    On-disk record of the stages each document has finished.
+
+    Every document gets a directory under ``<checkpoint_dir>/<session_id>``
+    holding one JSON file per finished stage. Checkpoints remember the size
+    and modification time of the source file and are ignored once it
+    changes, so an updated download is processed again.
+    """
+    
+    def __init__(self, session_id: str, checkpoint_dir: str = "data/pipeline_checkpoints"):
+        self.root = Path(checkpoint_dir) / session_id
+        self.root.mkdir(parents=True, exist_ok=True)
+    
+    def _document_dir(self, file_path: str) -> Path:
+        path = Path(file_path)
+        digest = hashlib.blake2b(str(path.resolve()).encode('utf-8'), digest_size=6).hexdigest()
+        return self.root / f"{path.stem[:40]}-{digest}"
+    
+    @staticmethod
+    def _fingerprint(file_path: str) -> Dict:
+        stat = Path(file_path).stat()
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+    
+    def load(self, file_path: str, stage: str) -> Optional[Dict]:
+        """Checkpoint data of a stage, or None if missing or the file changed since."""
+        checkpoint = self._document_dir(file_path) / f"{stage}.json"
+        try:
+            with open(checkpoint, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('fingerprint') != self._fingerprint(file_path):
+                return None
+            return data
+        except (OSError, json.JSONDecodeError):
+            return None
+    
+    def save(self, file_path: str, stage: str, data: Dict):
+        """Write a stage checkpoint atomically, so a crash never leaves half a file."""
+        document_dir = self._document_dir(file_path)
+        document_dir.mkdir(parents=True, exist_ok=True)
+        data = {**data, 'file_path': str(file_path), 'fingerprint': self._fingerprint(file_path),
+                'updated_at': datetime.now().isoformat()}
+        temp_path = document_dir / f".{stage}.json.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, document_dir / f"{stage}.json")
+    
+    def unfinished(self) -> List[str]:
+        """Downloaded documents that have not been fully vectorized, oldest first."""
+        pending = []
+        for checkpoint in sorted(self.root.glob(f"*/{STAGE_DOWNLOADED}.json"), key=lambda p: p.stat().st_mtime):
+            try:
+                with open(checkpoint, 'r', encoding='utf-8') as f:
+                    file_path = json.load(f)['file_path']
+            except (OSError, json.JSONDecodeError, KeyError):
+                continue
+            if not Path(file_path).exists():
+                continue
+            vectorized = self.load(file_path, STAGE_VECTORIZED)
+            if not vectorized or not vectorized.get('complete'):
+                pending.append(file_path)
+        return pending
+    
+    def clear(self):
+        """Forget every checkpoint of the session."""
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.root.mkdir(parents=True, exist_ok=True)
+
 class AutoDocumentPipeline:
-    """Automated document download and processing pipeline."""
+    """
+    Automated document download and processing pipeline.
     
-    def __init__(self, session_id: str = "auto_knowledge_base"):
+    Download, processing and vectorization run as concurrent stages joined
+    by bounded queues: each file is parsed as soon as it is downloaded and
+    embedded while other downloads continue. Every stage checkpoints each document to disk
+    (vectorization after every batch), and a restarted run skips what is
+    already done and resumes unfinished documents first.
+    """
+    
+    def __init__(self, session_id: str = KNOWLEDGE_BASE_NAMESPACE, checkpoint_dir: str = "data/pipeline_checkpoints",
+                 deduplicate: Optional[bool] = None):
+        config = load_config()
         self.session_id = session_id
         self.downloader = PDFDownloader()
         self.base_dir = Path("data/documents")
+        self.checkpoints = PipelineCheckpoints(session_id, checkpoint_dir)
+        # The app's query router reads the metadata values of stored documents from here
+        self.vocabulary_path = os.path.join(config.data_dir, VOCABULARY_FILE)
+        # Shared with the app's RAGService, so both skip documents already in the namespace
+        if deduplicate is None:
+            deduplicate = config.rag.deduplicate
+        self.duplicates = (DuplicateRegistry(os.path.join(config.data_dir, DEDUP_DIR), config.rag.dedup_threshold).get(session_id)
+                           if deduplicate else None)
         self.processed_files = []
         self.failed_files = []
+        self.duplicate_files = {}
         
-        # Initialize Pinecone client
+        # Initialize the vector client (Pinecone, or VECTOR_BACKEND=local / fake)
         try:
-            self.pinecone_client = PineconeClient()
+            self.pinecone_client = create_pinecone_client(config.data_dir)
         except Exception as e:
             logging.error(f"Failed to initialize Pinecone client: {e}")
             self.pinecone_client = None
@@ -45,36 +153,86 @@ class AutoDocumentPipeline:
         
         print("🚀 Starting Full Document Pipeline...")
         
-        # Step 1: Download documents
-        download_results = await self.download_documents(categories, manufacturers)
+        if not self.pinecone_client:
+            print("❌ Pinecone client not available")
+            return {'error': 'Pinecone client not initialized'}
         
-        # Step 2: Process downloaded documents
-        if download_results['downloaded']:
-            processing_results = await self.process_documents(download_results['downloaded'])
-            
-            # Step 3: Add to vector database
-            if self.pinecone_client and processing_results:
-                vector_results = await self.add_to_vector_database(processing_results)
-                
-                print(f"\n✅ Pipeline Complete!")
-                print(f"   📥 Downloaded: {len(download_results['downloaded'])} files")
-                print(f"   🔄 Processed: {len(processing_results)} files")
-                print(f"   📊 Added to Vector DB: {vector_results.get('success_count', 0)} files")
+        to_process: asyncio.Queue = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+        to_vectorize: asyncio.Queue = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+        download_results = {'downloaded': [], 'failed': [], 'skipped': []}
+        processed_results = []
+        vector_results = {'success_count': 0, 'failed_count': 0, 'skipped_count': 0, 'total_vectors': 0}
+        # Seconds each stage spent working; with the stages overlapping, wall time approaches the largest
+        timings = {'download': 0.0, 'process': 0.0, 'vectorize': 0.0}
+        started = time.perf_counter()
+        
+        async def download_stage():
+            queued = set()
+            try:
+                # Documents a previous run did not finish go first
+                resumed = self.checkpoints.unfinished()
+                if resumed:
+                    print(f"♻️  Resuming {len(resumed)} unfinished documents from checkpoints")
+                for file_path in resumed:
+                    queued.add(file_path)
+                    await to_process.put(file_path)
                 
-                return {
-                    'downloaded': download_results,
-                    'processed': processing_results,
-                    'vectorized': vector_results
-                }
+                async for file_path in self.iter_downloads(categories, manufacturers, download_results):
+                    if file_path not in queued:
+                        queued.add(file_path)
+                        await to_process.put(file_path)
+            finally:
+                timings['download'] = time.perf_counter() - started
+                # Let the later stages drain what they have even if downloading failed
+                await to_process.put(None)
         
-        return {'error': 'No documents were successfully downloaded'}
-    
-    async def download_documents(self, categories: List[str] = None, manufacturers: List[str] = None):
-        """Download documents based on configuration."""
+        async def process_stage():
+            try:
+                while (file_path := await to_process.get()) is not None:
+                    stage_start = time.perf_counter()
+                    document = await asyncio.to_thread(self.process_document, file_path)
+                    timings['process'] += time.perf_counter() - stage_start
+                    if document:
+                        processed_results.append({'file_path': file_path, 'chunks_count': len(document['chunks'])})
+                        await to_vectorize.put(document)
+            finally:
+                await to_vectorize.put(None)
+        
+        async def vectorize_stage():
+            # Ingestion yields to interactive chat traffic under the shared rate limits
+            with request_priority(PRIORITY_BULK):
+                while (document := await to_vectorize.get()) is not None:
+                    stage_start = time.perf_counter()
+                    outcome = await asyncio.to_thread(self.vectorize_document, document)
+                    timings['vectorize'] += time.perf_counter() - stage_start
+                    vector_results[f"{outcome}_count"] += 1
+                    if outcome != 'failed':
+                        vector_results['total_vectors'] += len(document['chunks'])
         
-        print("📥 Starting document downloads...")
+        await asyncio.gather(download_stage(), process_stage(), vectorize_stage())
+        timings['total'] = time.perf_counter() - started
         
-        # Filter configurations
+        if not processed_results:
+            return {'error': 'No documents were successfully downloaded'}
+        
+        print(f"\n✅ Pipeline Complete!")
+        print(f"   📥 Downloaded: {len(download_results['downloaded'])} files")
+        print(f"   🔄 Processed: {len(processed_results)} files")
+        if self.duplicate_files:
+            print(f"   🔁 Duplicates skipped: {len(self.duplicate_files)} files")
+        print(f"   📊 Added to Vector DB: {vector_results['success_count']} files "
+              f"({vector_results['skipped_count']} already up to date)")
+        print(f"   ⏱️  {timings['total']:.1f}s total: download {timings['download']:.1f}s, "
+              f"processing {timings['process']:.1f}s, embedding {timings['vectorize']:.1f}s")
+        
+        return {
+            'downloaded': download_results,
+            'processed': processed_results,
+            'vectorized': vector_results,
+            'timings': timings
+        }
+    
+    def _filter_configs(self, categories: List[str] = None, manufacturers: List[str] = None) -> List[Dict]:
         filtered_configs = []
         for config in DOWNLOAD_CONFIGS:
             include_config = True
@@ -87,25 +245,161 @@ class AutoDocumentPipeline:
             
             if include_config:
                 filtered_configs.append(config)
+        return filtered_configs
+    
+    def validate_download(self, file_path: str) -> Optional[str]:
+        """
+        Check a downloaded file before it enters processing
+        
+        Returns:
+            Optional[str]: Why the file was rejected, None if it can be parsed
+        """
+        path = Path(file_path)
+        if not path.exists() or path.stat().st_size == 0:
+            return "empty file"
+        if get_parser(path) is None:
+            return "no parser for its content"
+        return None
+    
+    async def iter_downloads(self, categories: List[str] = None, manufacturers: List[str] = None,
+                             results: Optional[Dict[str, List[str]]] = None) -> AsyncIterator[str]:
+        """
+        Download documents, yielding each file as soon as it is downloaded and validated
         
-        print(f"   Processing {len(filtered_configs)} configurations...")
+        Files of all selected configurations share the downloader's pool, so
+        while later files are still downloading the earlier ones are already
+        being processed and embedded by the caller.
+        
+        Args:
+            categories (List[str]): Categories to include, all if None
+            manufacturers (List[str]): Manufacturers to include, all if None
+            results (Optional[Dict]): Collects downloaded, failed and skipped entries
+        """
+        filtered_configs = self._filter_configs(categories, manufacturers)
+        print(f"📥 Downloading from {len(filtered_configs)} configurations...")
+        
+        jobs = []
+        for config in filtered_configs:
+            print(f"   📁 {config['category']}/{config.get('manufacturer', 'general')}")
+            jobs.extend(await asyncio.to_thread(self.downloader.plan_config, config))
+        
+        # The downloader's threads hand finished files over one at a time; the bounded queue applies backpressure
+        loop = asyncio.get_running_loop()
+        handoff: asyncio.Queue = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+        
+        def produce():
+            try:
+                for result in self.downloader.download_many(jobs):
+                    asyncio.run_coroutine_threadsafe(handoff.put(result), loop).result()
+            finally:
+                asyncio.run_coroutine_threadsafe(handoff.put(None), loop).result()
+        
+        producer = loop.run_in_executor(None, produce)
+        while (result := await handoff.get()) is not None:
+            url, status, file_path = result
+            rejected = self.validate_download(file_path) if file_path else status
+            if rejected:
+                print(f"   ⚠️  Skipping {file_path or url}: {rejected}")
+                if results is not None:
+                    results['failed'].append(url)
+                continue
+            
+            # Unchanged files are "skipped" by the downloader but may still need processing here
+            if results is not None:
+                results['skipped' if status == "unchanged" else 'downloaded'].append(file_path)
+            self.checkpoints.save(file_path, STAGE_DOWNLOADED, {'url': url})
+            yield file_path
+        await producer
+    
+    async def download_documents(self, categories: List[str] = None, manufacturers: List[str] = None):
+        """Download documents based on configuration."""
         
         total_results = {
             'downloaded': [],
             'failed': [],
             'skipped': []
         }
+        async for _ in self.iter_downloads(categories, manufacturers, total_results):
+            pass
+        return total_results
+    
+    def process_document(self, file_path: str) -> Optional[Dict]:
+        """
+        Parse and chunk one document, or load it from its checkpoint
         
-        for config in filtered_configs:
-            print(f"   📁 {config['category']}/{config.get('manufacturer', 'general')}")
+        Returns:
+            Optional[Dict]: file_path, chunks and metadata; None if nothing could be extracted
+        """
+        checkpoint = self.checkpoints.load(file_path, STAGE_PROCESSED)
+        if checkpoint and checkpoint.get('duplicate_of'):
+            self.duplicate_files[file_path] = checkpoint['duplicate_of']
+            return None
+        if checkpoint:
+            self.processed_files.append(file_path)
+            return {'file_path': file_path, 'chunks': checkpoint['chunks'], 'metadata': checkpoint['metadata']}
+        
+        try:
+            print(f"   📄 Processing: {Path(file_path).name}")
             
-            results = self.downloader.download_from_config(config)
+            # Parse the file
+            parsed = parse_file_with_pages(file_path)
+            parsed_content = parsed['text']
             
-            # Merge results
-            for key in total_results:
-                total_results[key].extend(results[key])
-        
-        return total_results
+            if not parsed_content:
+                print(f"   ⚠️  No content extracted from: {Path(file_path).name}")
+                self.failed_files.append(file_path)
+                return None
+            
+            # Chunk the content
+            chunks = assign_pages_to_chunks(
+                chunk_text_with_offsets(
+                    text=parsed_content,
+                    chunk_size=1000,
+                    chunk_overlap=200
+                ),
+                parsed['pages']
+            )
+            
+            # Create metadata
+            file_info = self._extract_file_metadata(file_path)
+            
+            # Copies of a document already in the namespace are aliased instead of embedded again
+            if self.duplicates:
+                # Registered now rather than after embedding, so a copy later in the run
+                # (or in another pipeline process) is caught
+                duplicate = self.duplicates.register(file_path, parsed_content)
+                # Matching its own earlier registration means a re-run, e.g. with --fresh
+                if duplicate and duplicate['duplicate_of'] != file_path:
+                    self.checkpoints.save(file_path, STAGE_PROCESSED, {'chunks': [], 'metadata': file_info, **duplicate})
+                    self.checkpoints.save(file_path, STAGE_VECTORIZED, {'complete': True, **duplicate})
+                    self.duplicate_files[file_path] = duplicate['duplicate_of']
+                    print(f"   🔁 Duplicate of {Path(duplicate['duplicate_of']).name} "
+                          f"(similarity {duplicate['similarity']:.2f}), not stored again")
+                    return None
+            
+            # Add metadata to chunks
+            chunk_documents = []
+            for i, chunk in enumerate(chunks):
+                chunk_metadata = {
+                    **file_info,
+                    'chunk_index': i,
+                    'chunk_count': len(chunks),
+                    'text': chunk['text'],
+                    # Documents without pages have no page_start/page_end; Pinecone rejects nulls
+                    **{key: chunk[key] for key in ('page_start', 'page_end', 'char_start', 'char_end') if key in chunk},
+                    'session_id': self.session_id
+                }
+                chunk_documents.append(chunk_metadata)
+            
+            self.checkpoints.save(file_path, STAGE_PROCESSED, {'chunks': chunk_documents, 'metadata': file_info})
+            self.processed_files.append(file_path)
+            print(f"   ✅ Processed: {len(chunks)} chunks")
+            return {'file_path': file_path, 'chunks': chunk_documents, 'metadata': file_info}
+            
+        except Exception as e:
+            print(f"   ❌ Error processing {Path(file_path).name}: {e}")
+            self.failed_files.append(file_path)
+            return None
     
     async def process_documents(self, file_paths: List[str]):
         """Process downloaded documents into chunks."""
@@ -113,55 +407,59 @@ class AutoDocumentPipeline:
         print(f"🔄 Processing {len(file_paths)} documents...")
         
         processed_results = []
-        
         for file_path in file_paths:
-            try:
-                print(f"   📄 Processing: {Path(file_path).name}")
-                
-                # Parse the file
-                parsed_content = parse_file(file_path)
-                
-                if not parsed_content:
-                    print(f"   ⚠️  No content extracted from: {Path(file_path).name}")
-                    self.failed_files.append(file_path)
-                    continue
-                
-                # Chunk the content
-                chunks = chunk_text(
-                    text=parsed_content,
-                    chunk_size=1000,
-                    chunk_overlap=200
-                )
-                
-                # Create metadata
-                file_info = self._extract_file_metadata(file_path)
+            document = await asyncio.to_thread(self.process_document, file_path)
+            if document:
+                processed_results.append(document)
+        return processed_results
+    
+    def vectorize_document(self, doc_info: Dict) -> str:
+        """
+        Embed and upsert one processed document, resuming after its last checkpointed batch
+        
+        Vector IDs are derived from the chunk index, so a batch repeated after
+        a crash overwrites its earlier upsert.
+        
+        Returns:
+            str: "success", "skipped" (already vectorized) or "failed"
+        """
+        file_path = doc_info['file_path']
+        chunks = doc_info['chunks']
+        checkpoint = self.checkpoints.load(file_path, STAGE_VECTORIZED) or {}
+        if checkpoint.get('complete'):
+            return 'skipped'
+        
+        upserted = checkpoint.get('upserted', 0)
+        try:
+            for batch_start in range(upserted, len(chunks), VECTORIZE_BATCH_SIZE):
+                batch = chunks[batch_start:batch_start + VECTORIZE_BATCH_SIZE]
+                embeddings = get_batch_embeddings([chunk['text'] for chunk in batch])
                 
-                # Add metadata to chunks
-                chunk_documents = []
-                for i, chunk in enumerate(chunks):
-                    chunk_metadata = {
-                        **file_info,
-                        'chunk_index': i,
-                        'chunk_count': len(chunks),
-                        'text': chunk,
-                        'session_id': self.session_id
-                    }
-                    chunk_documents.append(chunk_metadata)
+                # Prepare vectors for Pinecone
+                vectors = []
+                for i, (chunk, embedding) in enumerate(zip(batch, embeddings), start=batch_start):
+                    if embedding:
+                        vectors.append({
+                            'id': f"{self.session_id}_{Path(file_path).stem}_{i}",
+                            'values': embedding,
+                            'metadata': chunk
+                        })
+                self.pinecone_client.upsert_batch(vectors=vectors, namespace=self.session_id)
                 
-                processed_results.append({
-                    'file_path': file_path,
-                    'chunks': chunk_documents,
-                    'metadata': file_info
+                upserted = batch_start + len(batch)
+                self.checkpoints.save(file_path, STAGE_VECTORIZED, {
+                    'upserted': upserted,
+                    'total': len(chunks),
+                    'complete': upserted >= len(chunks)
                 })
-                
-                self.processed_files.append(file_path)
-                print(f"   ✅ Processed: {len(chunks)} chunks")
-                
-            except Exception as e:
-                print(f"   ❌ Error processing {Path(file_path).name}: {e}")
-                self.failed_files.append(file_path)
+            
+            self.record_vocabulary(doc_info['metadata'])
+            print(f"   ✅ Added: {Path(file_path).name} ({len(chunks)} vectors)")
+            return 'success'
         
-        return processed_results
+        except Exception as e:
+            print(f"   ❌ Failed to add: {Path(file_path).name} after {upserted}/{len(chunks)} chunks - {e}")
+            return 'failed'
     
     async def add_to_vector_database(self, processed_documents: List[Dict]):
         """Add processed documents to vector database."""
@@ -172,55 +470,36 @@ class AutoDocumentPipeline:
         
         print(f"📊 Adding {len(processed_documents)} documents to vector database...")
         
-        success_count = 0
-        failed_count = 0
-        
-        for doc_info in processed_documents:
-            try:
-                chunks = doc_info['chunks']
-                
-                # Generate embeddings for all chunks
-                chunk_texts = [chunk['text'] for chunk in chunks]
-                embeddings = get_batch_embeddings(chunk_texts)
-                
-                # Prepare vectors for Pinecone
-                vectors = []
-                for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                    vector_id = f"{self.session_id}_{Path(doc_info['file_path']).stem}_{i}"
-                    vectors.append({
-                        'id': vector_id,
-                        'values': embedding,
-                        'metadata': chunk
-                    })
-                
-                # Upsert to Pinecone
-                self.pinecone_client.upsert_vectors(
-                    vectors=vectors,
-                    namespace=self.session_id
-                )
-                
-                success_count += 1
-                print(f"   ✅ Added: {Path(doc_info['file_path']).name} ({len(vectors)} vectors)")
-                
-            except Exception as e:
-                failed_count += 1
-                print(f"   ❌ Failed to add: {Path(doc_info['file_path']).name} - {e}")
+        outcomes = []
+        # Ingestion yields to interactive chat traffic under the shared rate limits
+        with request_priority(PRIORITY_BULK):
+            for doc_info in processed_documents:
+                outcomes.append(await asyncio.to_thread(self.vectorize_document, doc_info))
         
         return {
-            'success_count': success_count,
-            'failed_count': failed_count,
+            'success_count': outcomes.count('success'),
+            'failed_count': outcomes.count('failed'),
+            'skipped_count': outcomes.count('skipped'),
             'total_vectors': sum(len(doc['chunks']) for doc in processed_documents)
         }
     
+    def record_vocabulary(self, metadata: Dict):
+        """Let the query router filter this namespace on a stored document's routing values."""
+        vocabulary = MetadataVocabulary()
+        vocabulary.add(metadata, self.session_id)
+        if vocabulary.values:
+            vocabulary.save(self.vocabulary_path)
+    
     def _extract_file_metadata(self, file_path: str) -> Dict:
         """Extract metadata from file path and name."""
         
         path = Path(file_path)
+        inferred = document_metadata(path)
         
         # Extract category and manufacturer from path
         parts = path.parts
         category = 'general'
-        manufacturer = 'general'
+        manufacturer = inferred['manufacturer']
         
         if 'documents' in parts:
             doc_index = parts.index('documents')
@@ -230,6 +509,7 @@ class AutoDocumentPipeline:
                 manufacturer = parts[doc_index + 2]
         
         return {
+            'doc_type': inferred['doc_type'],
             'document_name': path.name,
             'file_path': str(path),
             'category': category,
@@ -245,8 +525,10 @@ class AutoDocumentPipeline:
             'session_id': self.session_id,
             'processed_files': len(self.processed_files),
             'failed_files': len(self.failed_files),
+            'duplicate_files': len(self.duplicate_files),
             'processed_file_list': self.processed_files,
-            'failed_file_list': self.failed_files
+            'failed_file_list': self.failed_files,
+            'duplicates': self.duplicate_files
         }
 
 
@@ -383,10 +665,17 @@ if __name__ == "__main__":
     parser.add_argument("--categories", nargs="+", help="Categories to process")
     parser.add_argument("--manufacturers", nargs="+", help="Manufacturers to include")
     parser.add_argument("--download-only", action="store_true", help="Download only, don't process")
+    parser.add_argument("--session", default=KNOWLEDGE_BASE_NAMESPACE, help="Namespace to store the vectors in")
+    parser.add_argument("--checkpoint-dir", default="data/pipeline_checkpoints", help="Where stage checkpoints are kept")
+    parser.add_argument("--fresh", action="store_true", help="Ignore checkpoints from earlier runs")
+    parser.add_argument("--no-dedup", action="store_true", help="Embed documents even if they duplicate stored ones")
     
     args = parser.parse_args()
     
-    pipeline = AutoDocumentPipeline()
+    pipeline = AutoDocumentPipeline(session_id=args.session, checkpoint_dir=args.checkpoint_dir,
+                                    deduplicate=False if args.no_dedup else None)
+    if args.fresh:
+        pipeline.checkpoints.clear()
     
     if args.download_only:
         results = asyncio.run(pipeline.download_documents(args.categories, args.manufacturers))
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Replay a query mix against the full RAG pipeline at a target rate.
+
+Runs RAGService end to end (routing, embedding, vector search, prompt
+building, streamed generation, tracing) with the offline backends from
+utils.fake_backends, so capacity can be measured without API keys or
+network. Arrivals are open-loop: requests are sent on schedule whether or
+not earlier ones finished, and latency is measured from the scheduled send
+time, so queueing shows up in the percentiles instead of slowing the load.
+
+Usage:
+    python scripts/load_test.py --qps 20 --duration 60
+    python scripts/load_test.py --qps 50 --poisson --queries data/query_mix.json --output load.json
+    FAKE_LLM_LATENCY=0.8 FAKE_VECTOR_LATENCY=0.05 python scripts/load_test.py --qps 10
+
+A query mix file is either plain text (one query per line) or JSON:
+    [{"query": "How do I reset my password?", "weight": 3}, {"query": "/help", "weight": 1}]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Add the parent directory to the Python path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config import load_config
+from utils.file_parser import is_supported_file
+from utils.rag_service import RAGService
+
+PERCENTILES = (50, 90, 95, 99)
+
+def use_fake_backends():
+    """
+    Switch every client to its offline fake, overriding .env
+
+    Client-side rate limits are lifted too, and kept out of the buckets
+    other processes share, so the run measures the pipeline rather than
+    the throttle. Must run before the service is built.
+    """
+    for key in ("OPENAI_API_KEY", "PINECONE_API_KEY", "PINECONE_INDEX_NAME"):
+        os.environ.setdefault(key, "load-test")
+    os.environ.update({
+        "EMBEDDING_BACKEND": "fake",
+        "LLM_BACKEND": "fake",
+        "VECTOR_BACKEND": "fake",
+        "EMBEDDING_REQUESTS_PER_MINUTE": "1e9",
+        "EMBEDDING_TOKENS_PER_MINUTE": "",
+        "OPENAI_REQUESTS_PER_MINUTE": "1e9",
+        "OPENAI_TOKENS_PER_MINUTE": "",
+        "RATE_LIMIT_SHARED": "false"
+    })
+
+def load_query_mix(path: Optional[str], service: RAGService, session_id: str) -> List[Tuple[str, float]]:
+    """
+    Weighted queries to replay
+
+    Without a file, questions are made from the ingested chunks' opening
+    sentences, plus a share of /help commands.
+
+    Returns:
+        List[Tuple[str, float]]: (query, weight) pairs
+    """
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith(".json"):
+                return [(item["query"], float(item.get("weight", 1))) for item in json.load(f)]
+            return [(line.strip(), 1.0) for line in f if line.strip()]
+
+    mix = []
+    for match in service.pinecone_client.search_by_metadata({"session_id": session_id}, top_k=200,
+                                                            namespace=session_id)["matches"]:
+        sentence = match["metadata"]["text"].strip().split(".")[0][:160]
+        if sentence:
+            mix.append((f"What does the documentation say about {sentence.lower()}?", 1.0))
+    mix.append(("/help", max(len(mix) / 9, 1.0)))
+    return mix
+
+def ingest_corpus(service: RAGService, session_id: str, corpus_dir: str, max_files: int) -> int:
+    """Ingest up to max_files supported documents into the session namespace."""
+    paths = []
+    for root, _, names in os.walk(corpus_dir):
+        paths.extend(os.path.join(root, name) for name in names if is_supported_file(name))
+    chunks = 0
+    for path in sorted(paths)[:max_files]:
+        try:
+            chunks += service.ingest(path, session_id)["chunks_count"]
+        except Exception as e:
+            print(f"⚠️ Skipping {path}: {str(e)}")
+    return chunks
+
+def percentile_summary(values: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds."""
+    if not values:
+        return {}
+    summary = {f"p{p}": float(np.percentile(values, p) * 1000) for p in PERCENTILES}
+    summary["mean"] = float(np.mean(values) * 1000)
+    summary["max"] = float(np.max(values) * 1000)
+    return summary
+
+class LoadGenerator:
+    """Open-loop request scheduler with a bounded worker pool."""
+
+    def __init__(self, service: RAGService, session_id: str, mix: List[Tuple[str, float]],
+                 concurrency: int, seed: int = 0):
+        self.service = service
+        self.session_id = session_id
+        self.queries = [query for query, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.concurrency = concurrency
+        self.random = random.Random(seed)
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.max_in_flight = 0
+
+    def _execute(self, query: str, scheduled: float, measured: bool):
+        with self._lock:
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        first_token = None
+        error = None
+        try:
+            for fragment in self.service.stream_query(query, self.session_id):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                if fragment.startswith("Error generating response:"):
+                    error = fragment
+        except Exception as e:
+            error = str(e)
+        finished = time.perf_counter()
+        with self._lock:
+            self._in_flight -= 1
+            if measured:
+                self.records.append({
+                    "kind": "command" if query.startswith('/') else "question",
+                    "latency": finished - scheduled,
+                    "first_token": (first_token - scheduled) if first_token else None,
+                    "error": error
+                })
+
+    def replay(self, schedule: List[Tuple[float, str, bool]]):
+        """
+        Send each query at its offset, whether or not earlier ones finished
+
+        Args:
+            schedule (List[Tuple]): (seconds from start, query, measured) in send order
+        """
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for offset, query, measured in schedule:
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._execute, query, start + offset, measured)
+
+    def run(self, qps: float, duration: float, warmup: float, poisson: bool) -> float:
+        """
+        Send requests from the mix at ``qps`` for ``warmup + duration`` seconds
+
+        Returns:
+            float: Seconds spent sending the measured requests
+        """
+        schedule = []
+        offset = 0.0
+        while offset < warmup + duration:
+            schedule.append((offset, self.random.choices(self.queries, weights=self.weights)[0], offset >= warmup))
+            offset += self.random.expovariate(qps) if poisson else 1.0 / qps
+        self.replay(schedule)
+        return duration
+
+    def report(self, qps: float, elapsed: float) -> Dict[str, Any]:
+        """Percentiles overall and per request kind."""
+        completed = [record for record in self.records if not record["error"]]
+        report = {
+            "target_qps": qps,
+            "sent": len(self.records),
+            "completed": len(completed),
+            "errors": len(self.records) - len(completed),
+            "achieved_qps": len(completed) / elapsed if elapsed else 0.0,
+            "max_in_flight": self.max_in_flight,
+            "latency_ms": percentile_summary([record["latency"] for record in completed]),
+            "first_token_ms": percentile_summary([record["first_token"] for record in completed
+                                                  if record["first_token"] is not None]),
+            "by_kind": {}
+        }
+        for kind in sorted({record["kind"] for record in completed}):
+            report["by_kind"][kind] = percentile_summary(
+                [record["latency"] for record in completed if record["kind"] == kind]
+            )
+        errors = [record["error"] for record in self.records if record["error"]]
+        if errors:
+            report["sample_errors"] = sorted(set(errors))[:5]
+        return report
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n📈 Target {report['target_qps']:.1f} QPS, achieved {report['achieved_qps']:.1f} QPS "
+          f"({report['completed']}/{report['sent']} ok, {report['errors']} errors, "
+          f"max {report['max_in_flight']} in flight)")
+    print(f"{'':<14}" + "".join(f"{label:>10}" for label in [f"p{p}" for p in PERCENTILES] + ["max"]))
+    rows = [("total", report["latency_ms"]), ("first token", report["first_token_ms"])]
+    rows += [(f"  {kind}", summary) for kind, summary in report["by_kind"].items()]
+    for label, summary in rows:
+        if summary:
+            print(f"{label:<14}" + "".join(f"{summary[key]:>10.1f}" for key in [f"p{p}" for p in PERCENTILES] + ["max"]))
+    for error in report.get("sample_errors", []):
+        print(f"❌ {error[:160]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test of the RAG pipeline with offline backends")
+    parser.add_argument("--qps", type=float, default=10.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds of load")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds of load before that")
+    parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times instead of a fixed rate")
+    parser.add_argument("--concurrency", type=int, default=64, help="Worker threads serving requests")
+    parser.add_argument("--corpus", default="data/documents", help="Documents to ingest before the run")
+    parser.add_argument("--max-files", type=int, default=50, help="Maximum documents to ingest")
+    parser.add_argument("--queries", help="Query mix file (.json with weights, or one query per line)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for query choice and arrival times")
+    parser.add_argument("--output", help="Optional JSON file for the report")
+    args = parser.parse_args()
+
+    use_fake_backends()
+    config = load_config()
+    config.data_dir = tempfile.mkdtemp(prefix="load-test-")
+    service = RAGService(config)
+    session_id = service.session_manager.create_new_session("load test")
+
+    print(f"📚 Ingesting up to {args.max_files} documents from {args.corpus}...")
+    chunks = ingest_corpus(service, session_id, args.corpus, args.max_files)
+    mix = load_query_mix(args.queries, service, session_id)
+    if not mix:
+        print("❌ No queries to replay")
+        sys.exit(1)
+    print(f"✅ {chunks} chunks indexed, {len(mix)} distinct queries in the mix")
+
+    generator = LoadGenerator(service, session_id, mix, args.concurrency, args.seed)
+    print(f"🚀 {args.qps} QPS for {args.warmup:.0f}s warm-up + {args.duration:.0f}s measured...")
+    elapsed = generator.run(args.qps, args.duration, args.warmup, args.poisson)
+    report = generator.report(args.qps, elapsed)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,17 @@ Downloads manuals, troubleshooting guides, and other documents from manufacturer
 import requests
 import os
 import time
+import random
 import logging
+import threading
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
 from urllib.parse import urljoin, urlparse, quote
-from typing import List, Dict, Optional, Tuple
+from urllib.robotparser import RobotFileParser
+from typing import Iterator, List, Dict, Optional, Tuple
 import json
 from pathlib import Path
 import re
@@ -27,11 +34,111 @@ logging.basicConfig(
     ]
 )
 
+# Name matched against robots.txt User-agent groups
+ROBOTS_USER_AGENT = "DocumentChatbot"
+
+class HostThrottle:
+    """Concurrency limit and request spacing for one host."""
+    
+    def __init__(self, max_concurrent: int, delay: float):
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.delay = delay
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def slot(self):
+        """Hold one of the host's connections, starting no sooner than ``delay`` after the previous request."""
+        with self.semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start)
+                self._next_start = start + self.delay
+            if start > now:
+                time.sleep(start - now)
+            yield
+    
+    def back_off(self, seconds: float):
+        """Send nothing to the host for ``seconds`` (Retry-After, failures)."""
+        with self._lock:
+            self._next_start = max(self._next_start, time.monotonic() + seconds)
+
+class DownloadState:
+    """
+    Validators of downloaded files, for conditional requests and Range resumes.
+    
+    Stored as JSON next to the documents (``.download_state.json``), keyed by URL.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._entries = {}
+    
+    def get(self, url: str) -> Dict:
+        with self._lock:
+            return dict(self._entries.get(url, {}))
+    
+    def update(self, url: str, **fields):
+        with self._lock:
+            self._entries.setdefault(url, {}).update(fields)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(temp_path, self.path)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
 class PDFDownloader:
-    """Enhanced PDF downloader with retry logic and better error handling."""
+    """
+    Concurrent PDF downloader that is polite per host.
     
-    def __init__(self, base_dir: str = "data/documents/"):
+    Files are fetched by a thread pool. Each host has its own concurrency
+    limit and minimum spacing between requests (raised to the robots.txt
+    Crawl-delay), so different hosts download in parallel while no single
+    host gets hammered. robots.txt rules and Retry-After are honored;
+    known files are revalidated with If-None-Match / If-Modified-Since
+    and partial downloads resume with Range.
+    """
+    
+    def __init__(self, base_dir: str = "data/documents/", max_workers: int = 8, max_per_host: int = 2,
+                 host_delay: float = 1.0, max_retries: int = 3, respect_robots: bool = True,
+                 max_retry_after: float = 300.0, timeout: float = 30.0):
+        """
+        Args:
+            base_dir (str): Root of the category/manufacturer folders
+            max_workers (int): Downloads in flight across all hosts
+            max_per_host (int): Downloads in flight per host
+            host_delay (float): Minimum seconds between request starts to one host
+            max_retries (int): Attempts per file
+            respect_robots (bool): Skip URLs disallowed by the host's robots.txt
+            max_retry_after (float): Longest Retry-After waited for before giving up, in seconds
+            timeout (float): Connect and read timeout per request, in seconds
+        """
         self.base_dir = Path(base_dir)
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.host_delay = host_delay
+        self.max_retries = max_retries
+        self.respect_robots = respect_robots
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+        
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -41,20 +148,86 @@ class PDFDownloader:
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1'
         })
+        # One pooled connection per worker
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        self.state = DownloadState(self.base_dir / ".download_state.json")
+        self._throttles: Dict[str, HostThrottle] = {}
+        self._robots: Dict[str, Optional[RobotFileParser]] = {}
+        self._hosts_lock = threading.Lock()
+        self._results_lock = threading.Lock()
         self.downloaded_files = []
         self.failed_downloads = []
         
         # Create logs directory
         os.makedirs('logs', exist_ok=True)
+    
+    def _host(self, url: str) -> str:
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+    
+    def _throttle(self, url: str) -> HostThrottle:
+        host = self._host(url)
+        robots = self._robots_for(host)
+        with self._hosts_lock:
+            if host not in self._throttles:
+                crawl_delay = robots.crawl_delay(ROBOTS_USER_AGENT) if robots else None
+                self._throttles[host] = HostThrottle(self.max_per_host, max(self.host_delay, float(crawl_delay or 0)))
+            return self._throttles[host]
+    
+    def _robots_for(self, host: str) -> Optional[RobotFileParser]:
+        """Parsed robots.txt of a host, fetched once; None when the host has none."""
+        if not self.respect_robots:
+            return None
+        with self._hosts_lock:
+            if host in self._robots:
+                return self._robots[host]
         
-    def download_from_config(self, config: Dict) -> Dict[str, List[str]]:
-        """Download PDFs based on configuration."""
-        results = {
-            'downloaded': [],
-            'failed': [],
-            'skipped': []
-        }
+        robots = None
+        try:
+            response = self.session.get(f"{host}/robots.txt", timeout=self.timeout)
+            if response.status_code in (401, 403):
+                # Access to robots.txt itself is denied: treat the whole host as disallowed
+                robots = RobotFileParser()
+                robots.disallow_all = True
+            elif response.ok:
+                robots = RobotFileParser()
+                robots.parse(response.text.splitlines())
+        except requests.RequestException as e:
+            logging.warning(f"Could not fetch robots.txt from {host}: {e}")
+        with self._hosts_lock:
+            return self._robots.setdefault(host, robots)
+    
+    def allowed(self, url: str) -> bool:
+        """Whether robots.txt lets us fetch the URL."""
+        robots = self._robots_for(self._host(url))
+        return robots is None or robots.can_fetch(ROBOTS_USER_AGENT, url)
+    
+    @contextmanager
+    def _get(self, url: str, **kwargs) -> Iterator[requests.Response]:
+        """
+        GET through the host's throttle, pausing the host on 429/503 Retry-After
+        
+        The host slot is held until the block exits, so a streamed body
+        counts against max_per_host for as long as it is being read.
+        """
+        throttle = self._throttle(url)
+        with throttle.slot():
+            with self.session.get(url, timeout=self.timeout, **kwargs) as response:
+                if response.status_code in (429, 503):
+                    wait = parse_retry_after(response.headers.get('Retry-After'))
+                    if wait is not None:
+                        throttle.back_off(min(wait, self.max_retry_after))
+                yield response
+    
+    def plan_config(self, config: Dict) -> List[Tuple[str, Path]]:
+        """
+        (url, target path) of every file a configuration lists or links to
         
+        Search pages are fetched here, through the same host limits.
+        """
         category = config['category']
         manufacturer = config.get('manufacturer', 'general')
         
@@ -62,101 +235,162 @@ class PDFDownloader:
         target_dir = self.base_dir / category / manufacturer
         target_dir.mkdir(parents=True, exist_ok=True)
         
-        logging.info(f"Starting downloads for {category}/{manufacturer}")
-        
-        # Process direct PDF URLs
-        if 'direct_pdfs' in config:
-            for pdf_info in config['direct_pdfs']:
-                try:
-                    result = self._download_direct_pdf(pdf_info, target_dir)
-                    if result:
-                        results['downloaded'].append(result)
-                    else:
-                        results['failed'].append(pdf_info['url'])
-                except Exception as e:
-                    logging.error(f"Error downloading {pdf_info['url']}: {e}")
-                    results['failed'].append(pdf_info['url'])
-                
-                # Be respectful to servers
-                time.sleep(2)
+        jobs = []
+        for pdf_info in config.get('direct_pdfs', []):
+            url = pdf_info['url']
+            filename = pdf_info.get('filename')
+            if not filename:
+                # Extract filename from URL
+                filename = os.path.basename(urlparse(url).path)
+                if not filename.endswith('.pdf'):
+                    filename += '.pdf'
+            jobs.append((url, target_dir / self._clean_filename(filename)))
         
         # Process search URLs (for future enhancement)
-        if 'search_urls' in config:
-            for search_config in config['search_urls']:
+        for search_config in config.get('search_urls', []):
+            for pdf_url, filename in self._search_for_pdfs(search_config):
+                jobs.append((pdf_url, target_dir / self._clean_filename(filename)))
+        return jobs
+    
+    def download_many(self, jobs: List[Tuple[str, Path]]) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """
+        Download files concurrently, yielding each result as it finishes
+        
+        Args:
+            jobs (List[Tuple[str, Path]]): (url, target path) pairs
+        
+        Yields:
+            Tuple[str, str, Optional[str]]: (url, status, file path) with status
+            "downloaded", "unchanged", "disallowed" or "failed"
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pdf-download") as executor:
+            futures = {executor.submit(self.fetch, url, path): url for url, path in jobs}
+            for future in as_completed(futures):
+                url = futures[future]
                 try:
-                    found_pdfs = self._search_for_pdfs(search_config)
-                    for pdf_url, filename in found_pdfs:
-                        result = self._download_pdf(pdf_url, target_dir / filename)
-                        if result:
-                            results['downloaded'].append(result)
-                        else:
-                            results['failed'].append(pdf_url)
-                        time.sleep(2)
+                    status, file_path = future.result()
                 except Exception as e:
-                    logging.error(f"Error in search download: {e}")
-        
+                    logging.error(f"Error downloading {url}: {e}")
+                    status, file_path = "failed", None
+                with self._results_lock:
+                    if status == "downloaded":
+                        self.downloaded_files.append(file_path)
+                    elif status in ("failed", "disallowed"):
+                        self.failed_downloads.append(url)
+                yield url, status, file_path
+    
+    def download_from_config(self, config: Dict) -> Dict[str, List[str]]:
+        """Download PDFs based on configuration."""
+        logging.info(f"Starting downloads for {config['category']}/{config.get('manufacturer', 'general')}")
+        results = {
+            'downloaded': [],
+            'failed': [],
+            'skipped': []
+        }
+        for url, status, file_path in self.download_many(self.plan_config(config)):
+            if status == "downloaded":
+                results['downloaded'].append(file_path)
+            elif status == "unchanged":
+                results['skipped'].append(file_path)
+            else:
+                results['failed'].append(url)
         return results
     
-    def _download_direct_pdf(self, pdf_info: Dict, target_dir: Path) -> Optional[str]:
-        """Download a PDF from direct URL."""
-        url = pdf_info['url']
-        filename = pdf_info.get('filename')
-        
-        if not filename:
-            # Extract filename from URL
-            parsed_url = urlparse(url)
-            filename = os.path.basename(parsed_url.path)
-            if not filename.endswith('.pdf'):
-                filename += '.pdf'
+    def fetch(self, url: str, filepath: Path) -> Tuple[str, Optional[str]]:
+        """
+        Download one file, revalidating or resuming what is already on disk
         
-        # Clean filename
-        filename = self._clean_filename(filename)
-        filepath = target_dir / filename
+        A complete file is requested conditionally and kept on 304. A
+        ``.part`` file left by an interrupted download is continued with a
+        Range request (If-Range guards against the file having changed).
         
-        # Check if already exists
-        if filepath.exists():
-            logging.info(f"File already exists: {filename}")
-            return str(filepath)
+        Returns:
+            Tuple[str, Optional[str]]: (status, file path), status being
+            "downloaded", "unchanged", "disallowed" or "failed"
+        """
+        if not self.allowed(url):
+            logging.warning(f"Disallowed by robots.txt: {url}")
+            return "disallowed", None
         
-        return self._download_pdf(url, filepath)
-    
-    def _download_pdf(self, url: str, filepath: Path, max_retries: int = 3) -> Optional[str]:
-        """Download a single PDF with retry logic."""
-        for attempt in range(max_retries):
+        part_path = filepath.with_name(filepath.name + '.part')
+        for attempt in range(self.max_retries):
+            known = self.state.get(url)
+            headers = {}
+            if filepath.exists():
+                if known.get('etag'):
+                    headers['If-None-Match'] = known['etag']
+                headers['If-Modified-Since'] = known.get('last_modified') or formatdate(filepath.stat().st_mtime, usegmt=True)
+            # Validators of the response the partial file came from
+            part_validator = known.get('part_etag') or known.get('part_last_modified')
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            if offset and part_validator:
+                headers['Range'] = f"bytes={offset}-"
+                headers['If-Range'] = part_validator
+            
+            retry_after = None
             try:
-                logging.info(f"Downloading: {url} -> {filepath.name}")
-                
-                response = self.session.get(url, stream=True, timeout=30)
-                response.raise_for_status()
-                
-                # Check if it's actually a PDF
-                content_type = response.headers.get('content-type', '').lower()
-                if 'pdf' not in content_type and not url.lower().endswith('.pdf'):
-                    logging.warning(f"URL may not be a PDF: {url} (Content-Type: {content_type})")
-                
-                # Download the file
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
+                logging.info(f"Downloading: {url} -> {filepath.name}" + (f" (resuming at {offset} bytes)" if 'Range' in headers else ""))
+                with self._get(url, headers=headers, stream=True) as response:
+                    if response.status_code == 304:
+                        logging.info(f"Unchanged: {filepath.name}")
+                        return "unchanged", str(filepath)
+                    if response.status_code == 416:
+                        # The partial file does not fit the current resource; start over
+                        part_path.unlink(missing_ok=True)
+                        continue
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    response.raise_for_status()
+                    
+                    # Check if it's actually a PDF
+                    content_type = response.headers.get('content-type', '').lower()
+                    if 'pdf' not in content_type and not url.lower().endswith('.pdf'):
+                        logging.warning(f"URL may not be a PDF: {url} (Content-Type: {content_type})")
+                    
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+                    # 206 continues the partial file; anything else replaces it
+                    if response.status_code == 206:
+                        mode = 'ab'
+                    else:
+                        mode = 'wb'
+                        self.state.update(url, part_etag=etag, part_last_modified=last_modified)
+                    filepath.parent.mkdir(parents=True, exist_ok=True)
+                    with open(part_path, mode) as f:
+                        for chunk in response.iter_content(chunk_size=65536):
+                            if chunk:
+                                f.write(chunk)
                 
                 # Verify the file was downloaded
-                if filepath.exists() and filepath.stat().st_size > 0:
-                    logging.info(f"Successfully downloaded: {filepath.name} ({filepath.stat().st_size} bytes)")
-                    return str(filepath)
-                else:
-                    logging.error(f"Downloaded file is empty or doesn't exist: {filepath}")
-                    
+                if part_path.stat().st_size == 0:
+                    logging.error(f"Downloaded file is empty: {filepath}")
+                    part_path.unlink(missing_ok=True)
+                    return "failed", None
+                os.replace(part_path, filepath)
+                self.state.update(url, etag=etag or known.get('part_etag'),
+                                  last_modified=last_modified or known.get('part_last_modified'),
+                                  part_etag=None, part_last_modified=None,
+                                  path=str(filepath), size=filepath.stat().st_size)
+                logging.info(f"Successfully downloaded: {filepath.name} ({filepath.stat().st_size} bytes)")
+                return "downloaded", str(filepath)
+            
             except requests.RequestException as e:
                 logging.error(f"Attempt {attempt + 1} failed for {url}: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(5 * (attempt + 1))  # Exponential backoff
-                
+                status_code = getattr(getattr(e, 'response', None), 'status_code', None)
+                if attempt == self.max_retries - 1 or (status_code and 400 <= status_code < 500
+                                                       and status_code not in (408, 429)):
+                    break
+                if retry_after is not None and retry_after > self.max_retry_after:
+                    logging.error(f"Giving up on {url}: server asked to wait {retry_after:.0f}s")
+                    break
+                if retry_after is None:
+                    # Exponential backoff with jitter; only this host is paused, other hosts keep downloading
+                    self._throttle(url).back_off(5 * 2 ** attempt * random.uniform(0.5, 1.5))
+            
             except Exception as e:
                 logging.error(f"Unexpected error downloading {url}: {e}")
                 break
         
-        return None
+        return "failed", None
     
     def _search_for_pdfs(self, search_config: Dict) -> List[Tuple[str, str]]:
         """Search for PDFs on a webpage (basic implementation)."""
@@ -164,10 +398,12 @@ class PDFDownloader:
         search_terms = search_config.get('search_terms', [])
         
         try:
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
+            if not self.allowed(url):
+                logging.warning(f"Disallowed by robots.txt: {url}")
+                return []
+            with self._get(url) as response:
+                response.raise_for_status()
+                soup = BeautifulSoup(response.content, 'html.parser')
             
             pdf_links = []
             for link in soup.find_all('a', href=True):
@@ -231,16 +467,22 @@ def main():
         'skipped': []
     }
     
+    # One pool for every configuration, so files from different hosts download side by side
+    jobs = []
     for config in configs:
-        print(f"\n📁 Processing: {config['category']}/{config.get('manufacturer', 'general')}")
-        results = downloader.download_from_config(config)
-        
-        # Merge results
-        for key in total_results:
-            total_results[key].extend(results[key])
-        
-        print(f"   ✅ Downloaded: {len(results['downloaded'])}")
-        print(f"   ❌ Failed: {len(results['failed'])}")
+        print(f"\n📁 Planning: {config['category']}/{config.get('manufacturer', 'general')}")
+        jobs.extend(downloader.plan_config(config))
+    
+    print(f"\n🚀 Downloading {len(jobs)} files...")
+    for url, status, file_path in downloader.download_many(jobs):
+        if status == "downloaded":
+            total_results['downloaded'].append(file_path)
+            print(f"   ✅ {Path(file_path).name}")
+        elif status == "unchanged":
+            total_results['skipped'].append(file_path)
+        else:
+            total_results['failed'].append(url)
+            print(f"   ❌ {url} ({status})")
     
     print(f"\n📊 Final Summary:")
     print(f"   Total Downloaded: {len(total_results['downloaded'])}")
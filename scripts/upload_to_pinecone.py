@@ -9,18 +9,21 @@ import sys
 import time
 import logging
 from pathlib import Path
-from typing import List, Dict, Any
-import uuid
+from typing import Dict, Any
 
 # Add the parent directory to the Python path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.pinecone_client import PineconeClient
-from utils.embeddings import EmbeddingClient
-from utils.chunker import ChunkingStrategy
-from utils.config import Config
+from utils.config import load_config
+from utils.federated_search import KNOWLEDGE_BASE_NAMESPACE
+from utils.file_parser import is_supported_file
+from utils.query_router import document_metadata
+from utils.rag_service import RAGService
+from utils.decorators import with_priority
+from utils.rate_limiter import PRIORITY_BULK
 
 # Setup logging
+os.makedirs('logs', exist_ok=True)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
@@ -36,76 +39,25 @@ class DocumentProcessor:
     
     def __init__(self):
         """Initialize the document processor."""
-        self.config = Config()
-        self.pinecone_client = PineconeClient()
-        self.embedding_client = EmbeddingClient()
-        self.chunking_strategy = ChunkingStrategy()
+        self.config = load_config()
+        # Same ingest path as uploads in the app: chunking, embedding, duplicate
+        # checks and the query routing vocabulary under DATA_DIR
+        self.service = RAGService(self.config)
+        self.service.pinecone_client
         
         # Document processing statistics
         self.stats = {
             'total_files': 0,
             'processed_files': 0,
             'failed_files': 0,
+            'duplicate_files': 0,
             'total_chunks': 0,
-            'uploaded_chunks': 0,
-            'failed_chunks': 0
+            'uploaded_chunks': 0
         }
         
         # Create logs directory
         os.makedirs('logs', exist_ok=True)
     
-    def parse_local_file(self, file_path: str) -> str:
-        """
-        Parse a local file and extract text content.
-        
-        Args:
-            file_path: Path to the file
-            
-        Returns:
-            str: Extracted text content
-        """
-        try:
-            file_extension = file_path.lower().split('.')[-1]
-            
-            if file_extension == 'txt':
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return f.read()
-            elif file_extension == 'md':
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return f.read()
-            elif file_extension == 'pdf':
-                return self._parse_pdf_file(file_path)
-            else:
-                logger.warning(f"Unsupported file type: {file_extension} for {file_path}")
-                return ""
-                
-        except Exception as e:
-            logger.error(f"Error parsing file {file_path}: {str(e)}")
-            raise
-    
-    def _parse_pdf_file(self, file_path: str) -> str:
-        """Parse PDF file using PyMuPDF."""
-        try:
-            import fitz  # PyMuPDF
-            
-            pdf_document = fitz.open(file_path)
-            text_content = ""
-            
-            for page_num in range(pdf_document.page_count):
-                page = pdf_document[page_num]
-                text_content += page.get_text()
-                text_content += "\n\n"
-            
-            pdf_document.close()
-            return text_content.strip()
-            
-        except ImportError:
-            logger.error("PyMuPDF not installed. Install with: pip install PyMuPDF")
-            return ""
-        except Exception as e:
-            logger.error(f"Error parsing PDF {file_path}: {str(e)}")
-            return ""
-    
     def get_document_metadata(self, file_path: str) -> Dict[str, Any]:
         """
         Extract metadata from file path and content.
@@ -117,58 +69,14 @@ class DocumentProcessor:
             Dict containing metadata
         """
         path_obj = Path(file_path)
-        
-        # Extract category from directory structure
-        parts = path_obj.parts
-        if 'documents' in parts:
-            doc_index = parts.index('documents')
-            if doc_index + 1 < len(parts):
-                category = parts[doc_index + 1]
-            else:
-                category = 'general'
-        else:
-            category = 'general'
-        
-        # Extract subcategory if exists
-        subcategory = 'general'
-        if len(parts) > 2:
-            subcategory = parts[-2] if parts[-2] != category else 'general'
-        
-        # Determine document type based on filename patterns
-        filename = path_obj.stem.lower()
-        doc_type = 'general'
-        
-        if 'manual' in filename or 'guide' in filename:
-            doc_type = 'manual'
-        elif 'troubleshoot' in filename:
-            doc_type = 'troubleshooting'
-        elif 'scenario' in filename or 'training' in filename:
-            doc_type = 'training'
-        elif 'compatibility' in filename or 'technical' in filename:
-            doc_type = 'technical'
-        elif 'faq' in filename:
-            doc_type = 'faq'
-        elif 'policy' in filename:
-            doc_type = 'policy'
-        
-        # Extract manufacturer if present in filename
-        manufacturer = 'general'
-        for brand in ['hp', 'dell', 'lenovo', 'asus', 'amd', 'nvidia', 'intel']:
-            if brand in filename:
-                manufacturer = brand
-                break
-        
         return {
+            **document_metadata(path_obj),
             'filename': path_obj.name,
-            'category': category,
-            'subcategory': subcategory,
-            'doc_type': doc_type,
-            'manufacturer': manufacturer,
             'file_path': str(file_path),
             'file_size': path_obj.stat().st_size if path_obj.exists() else 0
         }
     
-    def process_document(self, file_path: str, session_id: str = "bulk_upload") -> bool:
+    def process_document(self, file_path: str, session_id: str = KNOWLEDGE_BASE_NAMESPACE) -> bool:
         """
         Process a single document and upload to Pinecone.
         
@@ -182,103 +90,24 @@ class DocumentProcessor:
         try:
             logger.info(f"Processing document: {file_path}")
             
-            # Parse document content
-            content = self.parse_local_file(file_path)
-            if not content:
-                logger.warning(f"No content extracted from {file_path}")
-                return False
-            
-            # Get document metadata
-            metadata = self.get_document_metadata(file_path)
-            
-            # Chunk the document
-            chunks = self.chunking_strategy.chunk_text(
-                content, 
-                chunk_size=self.config.chunk_size,
-                chunk_overlap=self.config.chunk_overlap
-            )
+            document = self.service.ingest(file_path, session_id, metadata=self.get_document_metadata(file_path))
             
-            if not chunks:
-                logger.warning(f"No chunks created from {file_path}")
-                return False
-            
-            logger.info(f"Created {len(chunks)} chunks from {file_path}")
-            self.stats['total_chunks'] += len(chunks)
-            
-            # Process chunks in batches
-            batch_size = 100
-            for i in range(0, len(chunks), batch_size):
-                batch_chunks = chunks[i:i + batch_size]
-                success = self._upload_chunk_batch(batch_chunks, metadata, session_id)
-                if success:
-                    self.stats['uploaded_chunks'] += len(batch_chunks)
-                else:
-                    self.stats['failed_chunks'] += len(batch_chunks)
-                
-                # Small delay to avoid rate limits
-                time.sleep(0.1)
+            if document.get('duplicate_of'):
+                logger.info(f"Skipped {file_path}: duplicate of {document['duplicate_of']} "
+                            f"(similarity {document['similarity']:.2f})")
+                self.stats['duplicate_files'] += 1
+                return True
             
+            logger.info(f"Uploaded {document['chunks_count']} chunks from {file_path}")
+            self.stats['total_chunks'] += document['chunks_count']
+            self.stats['uploaded_chunks'] += document['chunks_count']
             return True
             
         except Exception as e:
             logger.error(f"Error processing document {file_path}: {str(e)}")
             return False
     
-    def _upload_chunk_batch(self, chunks: List[str], base_metadata: Dict[str, Any], session_id: str) -> bool:
-        """
-        Upload a batch of chunks to Pinecone.
-        
-        Args:
-            chunks: List of text chunks
-            base_metadata: Base metadata for all chunks
-            session_id: Session ID for namespacing
-            
-        Returns:
-            bool: True if successful, False otherwise
-        """
-        try:
-            # Prepare vectors for batch upload
-            vectors = []
-            
-            for chunk_idx, chunk_text in enumerate(chunks):
-                # Generate embedding
-                embedding = self.embedding_client.get_embedding(chunk_text)
-                
-                # Create unique ID for this chunk
-                chunk_id = f"{base_metadata['filename']}_{uuid.uuid4().hex[:8]}_{chunk_idx}"
-                
-                # Prepare metadata for this chunk
-                chunk_metadata = base_metadata.copy()
-                chunk_metadata.update({
-                    'chunk_id': chunk_id,
-                    'chunk_index': chunk_idx,
-                    'chunk_text': chunk_text[:500],  # Store first 500 chars in metadata
-                    'text_length': len(chunk_text),
-                    'session_id': session_id,
-                    'upload_timestamp': time.time()
-                })
-                
-                vectors.append({
-                    'id': chunk_id,
-                    'values': embedding,
-                    'metadata': chunk_metadata
-                })
-            
-            # Upload to Pinecone
-            success = self.pinecone_client.upsert_vectors(vectors, namespace=session_id)
-            
-            if success:
-                logger.debug(f"Successfully uploaded batch of {len(vectors)} vectors")
-                return True
-            else:
-                logger.error(f"Failed to upload batch of {len(vectors)} vectors")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error uploading chunk batch: {str(e)}")
-            return False
-    
-    def process_directory(self, directory_path: str, session_id: str = "knowledge_base") -> Dict[str, Any]:
+    def process_directory(self, directory_path: str, session_id: str = KNOWLEDGE_BASE_NAMESPACE) -> Dict[str, Any]:
         """
         Process all documents in a directory and subdirectories.
         
@@ -292,12 +121,11 @@ class DocumentProcessor:
         logger.info(f"Starting bulk document processing from: {directory_path}")
         
         # Find all supported files
-        supported_extensions = ['.txt', '.pdf', '.md']
         all_files = []
         
         for root, dirs, files in os.walk(directory_path):
             for file in files:
-                if any(file.lower().endswith(ext) for ext in supported_extensions):
+                if is_supported_file(file):
                     all_files.append(os.path.join(root, file))
         
         self.stats['total_files'] = len(all_files)
@@ -334,7 +162,7 @@ class DocumentProcessor:
         print(f"❌ Failed to Process: {self.stats['failed_files']}")
         print(f"📄 Total Chunks Created: {self.stats['total_chunks']}")
         print(f"☁️ Chunks Uploaded to Pinecone: {self.stats['uploaded_chunks']}")
-        print(f"💥 Failed Chunk Uploads: {self.stats['failed_chunks']}")
+        print(f"🔁 Duplicates Skipped: {self.stats['duplicate_files']}")
         
         success_rate = (self.stats['processed_files'] / self.stats['total_files'] * 100) if self.stats['total_files'] > 0 else 0
         print(f"📈 Success Rate: {success_rate:.1f}%")
@@ -342,9 +170,12 @@ class DocumentProcessor:
         if self.stats['uploaded_chunks'] > 0:
             print(f"\n🎉 Your knowledge base is now available in Pinecone!")
             print(f"🚀 Ready to start your chatbot: streamlit run main.py")
+        elif self.stats['duplicate_files'] > 0:
+            print(f"\n✅ All processed documents were already in Pinecone.")
         else:
             print(f"\n⚠️ No chunks were uploaded. Check the logs for errors.")
 
+@with_priority(PRIORITY_BULK)
 def main():
     """Main function to run the document processing."""
     
@@ -368,7 +199,8 @@ def main():
         return
     
     # Process all documents
-    session_id = f"knowledge_base_{int(time.time())}"
+    # The shared namespace the chatbot searches next to each session (RAG_SEARCH_NAMESPACES)
+    session_id = KNOWLEDGE_BASE_NAMESPACE
     print(f"📁 Processing documents from: {doc_directory}")
     print(f"🏷️ Using session ID: {session_id}")
     
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the app's modules the same way the scripts do
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
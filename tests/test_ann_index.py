@@ -0,0 +1,61 @@
+import numpy as np
+
+from utils.ann_index import IVFIndex
+
+def vectors(count, dimension=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dimension)).astype(np.float32)
+
+def test_deleted_and_overwritten_vectors_are_never_returned():
+    index = IVFIndex(16, train_threshold=10_000)
+    data = vectors(50)
+    index.upsert([str(i) for i in range(50)], data, [{"i": i} for i in range(50)])
+    index.delete(["3"])
+    index.upsert(["4"], vectors(1, seed=1), [{"i": 400}])
+
+    assert len(index) == 49
+    assert [hit[0] for hit in index.search(data[3], top_k=5)].count("3") == 0
+    hits = [hit[0] for hit in index.search(data[4], top_k=100)]
+    assert len(hits) == len(set(hits)) == 49
+    assert index.get("4")[1] == {"i": 400}
+    assert index.stats()["tombstones"] == 2
+
+def test_tombstones_are_compacted_away():
+    index = IVFIndex(16, train_threshold=10_000, compact_ratio=0.25)
+    index.upsert([str(i) for i in range(20)], vectors(20))
+    index.delete([str(i) for i in range(6)])
+    assert index.stats()["tombstones"] == 0
+    assert sorted(vector_id for vector_id, _ in index.items()) == sorted(str(i) for i in range(6, 20))
+
+def test_an_id_repeated_in_one_batch_keeps_its_last_copy():
+    index = IVFIndex(16, train_threshold=10_000)
+    data = vectors(3)
+    index.upsert(["a", "b", "a"], data, [{"n": 1}, {"n": 2}, {"n": 3}])
+
+    assert len(index) == 2
+    assert index.get("a")[1] == {"n": 3}
+    assert np.allclose(index.get("a")[0], data[2] / np.linalg.norm(data[2]), atol=1e-6)
+    hits = index.search(data[0], top_k=10)
+    assert sorted(hit[0] for hit in hits) == ["a", "b"]
+    index.delete(["a"])
+    assert [hit[0] for hit in index.search(data[2], top_k=10)] == ["b"]
+
+def test_trained_index_finds_its_own_vectors_and_counts_trainings():
+    index = IVFIndex(16, train_threshold=200, nprobe=4)
+    data = vectors(400)
+    index.upsert([str(i) for i in range(400)], data)
+    assert index.trained and index.version == 1
+    found = sum(index.search(data[i], top_k=1)[0][0] == str(i) for i in range(0, 400, 10))
+    assert found >= 36
+
+def test_from_arrays_rebuilds_lists_and_recomputes_missing_assignments():
+    index = IVFIndex(16, train_threshold=200, nprobe=4)
+    data = vectors(300)
+    index.upsert([str(i) for i in range(300)], data, [{"i": i} for i in range(300)])
+    ids, unit, metadata, assignment = index.export()
+
+    for given in (assignment, None):
+        rebuilt = IVFIndex.from_arrays(16, ids, unit, metadata, centroids=index.centroids, assignment=given,
+                                       version=index.version, nprobe=4)
+        assert rebuilt.trained and len(rebuilt) == 300
+        assert rebuilt.search(data[7], top_k=1)[0][:1] == index.search(data[7], top_k=1)[0][:1]
+        assert rebuilt.search(data[7], top_k=3, filter_dict={"i": {"$gte": 290}})[0][2]["i"] >= 290
@@ -0,0 +1,66 @@
+import threading
+import time
+
+from utils.cache import TTLCache, make_cache_key
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = TTLCache("test-lru", max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.get_stats()["evictions"] == 1
+
+def test_entries_expire_after_their_ttl():
+    cache = TTLCache("test-ttl", ttl_seconds=0.05)
+    cache.set("short", 1)
+    cache.set("forever", 2, ttl_seconds=None)
+    time.sleep(0.06)
+    assert cache.get("short") is None
+    assert cache.get("forever") == 2
+    assert cache.get_stats()["expirations"] == 1
+
+def test_byte_limit_evicts_and_skips_oversized_values():
+    cache = TTLCache("test-bytes", max_bytes=100, sizeof=len)
+    cache.set("a", "x" * 60)
+    cache.set("b", "y" * 60)
+    assert cache.get("a") is None and cache.get("b") == "y" * 60
+    cache.set("huge", "z" * 101)
+    assert cache.get("huge") is None and len(cache) == 1
+    assert cache.get_stats()["bytes"] == 60
+
+def test_concurrent_misses_load_once():
+    cache = TTLCache("test-flight")
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", loader))) for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["value"] * 4 and len(calls) == 1
+    assert cache.get_or_compute("k", loader) == "value" and len(calls) == 1
+
+def test_cache_keys_compare_by_value():
+    assert make_cache_key(([1, 2], {"b": 1, "a": [3]}), {}) == make_cache_key(((1, 2), {"a": (3,), "b": 1}), {})
+    assert make_cache_key(("ab",), {}) != make_cache_key(("a", "b"), {})
+
+def test_cache_keys_distinguish_types_and_keyword_arguments():
+    assert len({make_cache_key((1,), {}), make_cache_key((1.0,), {}), make_cache_key((True,), {})}) == 3
+    assert make_cache_key((((1,), (("k", 2),)),), {}) != make_cache_key((1,), {"k": 2})
+    assert make_cache_key(((("k", 2),),), {}) != make_cache_key(({"k": 2},), {})
+    assert make_cache_key((1,), {"k": 2}) == make_cache_key((1,), {"k": 2})
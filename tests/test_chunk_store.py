@@ -0,0 +1,86 @@
+import pytest
+
+from utils.chunk_store import ChunkStore, open_chunk_store
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkStore(tmp_path / "chunks.db")
+
+def test_texts_round_trip_per_namespace(store):
+    store.put_many("a", [("1", "first chunk"), ("2", "second chunk ü")])
+    store.put_many("b", [("1", "other namespace")])
+    assert store.get_many("a", ["1", "2", "missing"]) == {"1": "first chunk", "2": "second chunk ü"}
+    assert store.get_many("b", ["1"]) == {"1": "other namespace"}
+    assert store.count() == 3 and store.count("a") == 2
+
+def test_lookups_larger_than_one_sql_batch(store):
+    store.put_many(None, [(str(i), f"text {i}") for i in range(1200)])
+    texts = store.get_many(None, [str(i) for i in range(1200)])
+    assert len(texts) == 1200 and texts["1199"] == "text 1199"
+
+def test_delete_namespace_and_clear(store):
+    store.put_many("a", [("1", "x"), ("2", "y")])
+    store.put_many("b", [("1", "z")])
+    store.delete("a", ["1"])
+    assert store.get_many("a", ["1", "2"]) == {"2": "y"}
+    store.delete_namespace("a")
+    assert store.count("a") == 0 and store.count("b") == 1
+    store.clear()
+    assert store.count() == 0
+
+def test_detach_moves_texts_out_of_the_upserted_metadata(store):
+    vectors = [{"id": "1", "values": [0.1], "metadata": {"text": "chunk", "filename": "a.pdf"}},
+               {"id": "2", "values": [0.2], "metadata": {"filename": "b.pdf"}}]
+    stripped = store.detach_texts(vectors, "ns")
+    assert stripped[0]["metadata"] == {"filename": "a.pdf"}
+    assert vectors[0]["metadata"]["text"] == "chunk"
+    assert store.get_many("ns", ["1"]) == {"1": "chunk"}
+
+def test_hydrate_fills_texts_without_touching_the_stored_metadata(store):
+    store.put_many("ns", [("1", "stored text")])
+    stored = {"filename": "a.pdf"}
+    results = {"matches": [{"id": "1", "metadata": stored},
+                           {"id": "2", "metadata": {"chunk_text": "legacy preview"}},
+                           {"id": "3", "metadata": {"text": "inline"}}]}
+    store.hydrate(results, "ns")
+    assert [match["metadata"]["text"] for match in results["matches"]] == ["stored text", "legacy preview", "inline"]
+    assert "text" not in stored
+
+def test_open_chunk_store_follows_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHUNK_STORE", "false")
+    assert open_chunk_store(tmp_path / "a.db") is None
+    monkeypatch.setenv("CHUNK_STORE", "true")
+    monkeypatch.setenv("CHUNK_STORE_PATH", str(tmp_path / "b.db"))
+    assert open_chunk_store(tmp_path / "a.db").path == tmp_path / "b.db"
+    monkeypatch.delenv("CHUNK_STORE_PATH")
+    assert open_chunk_store(tmp_path / "a.db").path == tmp_path / "a.db"
+
+class _FilteredIndex:
+    """Pinecone index stand-in answering metadata queries at most top_k IDs at a time."""
+
+    def __init__(self, ids):
+        self.ids = list(ids)
+        self.delete_calls = []
+
+    def query(self, top_k, **kwargs):
+        return {"matches": [{"id": vector_id, "metadata": None} for vector_id in self.ids[:top_k]]}
+
+    def delete(self, ids=None, namespace=None, **kwargs):
+        self.delete_calls.append(len(ids))
+        self.ids = [vector_id for vector_id in self.ids if vector_id not in set(ids)]
+
+def test_delete_by_filter_pages_through_every_match(tmp_path, monkeypatch):
+    pytest.importorskip("pinecone")
+    from utils import pinecone_client
+    from utils.cache import TTLCache
+
+    monkeypatch.setattr(pinecone_client, "DELETE_PAGE_SIZE", 100)
+    client = object.__new__(pinecone_client.PineconeClient)
+    client._index = _FilteredIndex(str(i) for i in range(250))
+    client._stats_cache = TTLCache("index_stats")
+    client.chunk_store = ChunkStore(tmp_path / "chunks.db")
+    client.chunk_store.put_many("ns", [(str(i), "text") for i in range(250)])
+
+    client.delete_by_filter({"filename": "a.pdf"}, namespace="ns")
+    assert client._index.ids == []
+    assert client.chunk_store.count("ns") == 0
@@ -0,0 +1,38 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from utils.commands import CommandRouter
+
+def test_concurrent_commands_share_work_only_for_the_same_session_and_arguments(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    router = CommandRouter()
+    release = threading.Event()
+    calls = []
+
+    def dispatch(command_input, pinecone_client):
+        calls.append(command_input)
+        release.wait(5)
+        return command_input
+
+    router._dispatch = dispatch
+    requests = [("/translate French", "a"), ("/TRANSLATE  French", "a"), ("/translate french", "a"), ("/translate French", "b")]
+    results = {}
+    threads = [threading.Thread(target=lambda r=request: results.__setitem__(r, router.handle_command(r[0], None, r[1])))
+               for request in requests]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while sum(router.flights.get_stats()[count] for count in ("executions", "coalesced")) < len(requests):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 3
+    assert results[("/translate french", "a")] == "/translate french"
+    assert results[("/TRANSLATE  French", "a")] == results[("/translate French", "a")]
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from utils.dedup import DuplicateIndex, DuplicateRegistry, MinHasher, estimate_similarity, lsh_bands
+
+MANUAL = " ".join(f"Step {i}: press the reset button and hold it for {i} seconds until the light blinks."
+                  for i in range(120))
+
+@pytest.mark.parametrize("num_perm,threshold", [(128, 0.85), (128, 0.5), (64, 0.9), (100, 0.7)])
+def test_lsh_bands_split_the_signature_around_the_threshold(num_perm, threshold):
+    bands, rows = lsh_bands(num_perm, threshold)
+    assert bands * rows == num_perm
+    midpoint = (1 / bands) ** (1 / rows)
+    assert midpoint <= threshold
+    # No other exact split has its midpoint closer to the threshold from below
+    for other_rows in range(1, num_perm + 1):
+        if num_perm % other_rows == 0:
+            other = (other_rows / num_perm) ** (1 / other_rows)
+            assert not midpoint < other <= threshold
+
+def test_lsh_bands_fall_back_to_single_row_bands_for_tiny_thresholds():
+    assert lsh_bands(128, 0.001) == (128, 1)
+
+def test_minhash_estimates_similarity():
+    hasher = MinHasher()
+    edited = MANUAL.replace("Step 7:", "Step seven:")
+    assert estimate_similarity(hasher.signature(MANUAL), hasher.signature(MANUAL)) == 1.0
+    assert estimate_similarity(hasher.signature(MANUAL), hasher.signature(edited)) > 0.85
+    assert estimate_similarity(hasher.signature(MANUAL), hasher.signature("An unrelated text about fridges. " * 50)) < 0.2
+
+def test_exact_and_near_duplicates_are_found():
+    index = DuplicateIndex(threshold=0.8)
+    index.add("manual.pdf", MANUAL)
+    assert index.find("copy.pdf", MANUAL) == {"duplicate_of": "manual.pdf", "similarity": 1.0, "exact": True}
+    near = index.find("edited.pdf", MANUAL.replace("Step 7:", "Step seven:"))
+    assert near["duplicate_of"] == "manual.pdf" and not near["exact"]
+    assert index.find("other.pdf", "An unrelated text about fridges. " * 50) is None
+
+def test_changed_version_under_the_same_name_is_not_a_duplicate():
+    index = DuplicateIndex(threshold=0.8)
+    index.add("manual.pdf", MANUAL)
+    assert index.find("manual.pdf", MANUAL.replace("Step 7:", "Step seven:")) is None
+
+def test_removed_documents_are_no_longer_matched():
+    index = DuplicateIndex()
+    index.add("manual.pdf", MANUAL)
+    index.remove("manual.pdf")
+    assert index.find("copy.pdf", MANUAL) is None
+
+def test_index_persists_aliases_and_sees_other_writers(tmp_path):
+    path = tmp_path / "kb.json"
+    first, second = DuplicateIndex(path), DuplicateIndex(path)
+    first.add("manual.pdf", MANUAL)
+    first.alias("copy.pdf", "manual.pdf", 1.0)
+    # Saved by another instance (e.g. an upload script) after this one loaded
+    assert second.find("third.pdf", MANUAL)["duplicate_of"] == "manual.pdf"
+    second.add("fridge.pdf", "An unrelated text about fridges. " * 50)
+    assert set(DuplicateIndex(path).documents) == {"manual.pdf", "copy.pdf", "fridge.pdf"}
+    assert first.aliases() == {"copy.pdf": "manual.pdf"}
+
+def test_registry_keeps_one_index_per_namespace(tmp_path):
+    registry = DuplicateRegistry(tmp_path)
+    registry.get("knowledge_base").add("manual.pdf", MANUAL)
+    assert registry.get("session-1").find("copy.pdf", MANUAL) is None
+    assert registry.get("knowledge_base") is registry.get("knowledge_base")
+
+def run_together(*targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_concurrent_writers_keep_every_document(tmp_path):
+    path = tmp_path / "kb.json"
+    writers = [DuplicateIndex(path) for _ in range(8)]
+    run_together(*(lambda i=i: writers[i].add(f"doc{i}.pdf", f"Document number {i} about topic {i}. " * 40)
+                   for i in range(8)))
+    assert set(DuplicateIndex(path).documents) == {f"doc{i}.pdf" for i in range(8)}
+
+def test_only_one_of_two_concurrent_copies_is_new(tmp_path):
+    path = tmp_path / "kb.json"
+    results = {}
+    run_together(*(lambda name=name: results.setdefault(name, DuplicateIndex(path).register(name, MANUAL))
+                   for name in ("a.pdf", "b.pdf")))
+    assert sorted(result is None for result in results.values()) == [False, True]
+    assert len(DuplicateIndex(path).aliases()) == 1
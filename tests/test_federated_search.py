@@ -0,0 +1,33 @@
+from utils.federated_search import KNOWLEDGE_BASE_NAMESPACE, merge_namespace_results, resolve_namespaces
+
+def response(*scores, prefix="m"):
+    return {"matches": [{"id": f"{prefix}{i}", "score": score} for i, score in enumerate(scores)]}
+
+def test_session_placeholder_is_resolved_and_duplicates_dropped():
+    configured = ["session", KNOWLEDGE_BASE_NAMESPACE, "session"]
+    assert resolve_namespaces(configured, "abc") == ["abc", KNOWLEDGE_BASE_NAMESPACE]
+    assert resolve_namespaces(configured, None) == [KNOWLEDGE_BASE_NAMESPACE]
+
+def test_matches_are_ranked_by_raw_score_across_namespaces():
+    merged = merge_namespace_results({
+        "abc": response(0.80, 0.60, prefix="s"),
+        KNOWLEDGE_BASE_NAMESPACE: response(0.90, 0.70, prefix="k"),
+    }, limit=3)
+    assert [(match["id"], match["namespace"]) for match in merged] == [
+        ("k0", KNOWLEDGE_BASE_NAMESPACE), ("s0", "abc"), ("k1", KNOWLEDGE_BASE_NAMESPACE)
+    ]
+
+def test_quotas_keep_a_large_corpus_from_crowding_out_the_session():
+    merged = merge_namespace_results({
+        "abc": response(0.50, prefix="s"),
+        KNOWLEDGE_BASE_NAMESPACE: response(0.90, 0.89, 0.88, 0.87, prefix="k"),
+    }, limit=3, quotas={KNOWLEDGE_BASE_NAMESPACE: 2})
+    assert [match["id"] for match in merged] == ["k0", "k1", "s0"]
+
+def test_min_scores_apply_per_namespace_and_empty_responses_are_skipped():
+    merged = merge_namespace_results({
+        "abc": response(0.40, prefix="s"),
+        KNOWLEDGE_BASE_NAMESPACE: response(0.70, 0.55, prefix="k"),
+        "empty": None,
+    }, limit=5, min_scores={KNOWLEDGE_BASE_NAMESPACE: 0.6})
+    assert [match["id"] for match in merged] == ["k0", "s0"]
@@ -0,0 +1,90 @@
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from utils.ingest_jobs import CANCELLED, IngestionJobQueue
+
+class _VectorClient:
+    def __init__(self):
+        self.deleted_filters = []
+        self.stored = []
+
+    def create_session_vectors(self, texts, embeddings, session_id, **kwargs):
+        self.stored.append((session_id, len(texts)))
+
+    def delete_by_filter(self, filter_dict, namespace=None):
+        self.deleted_filters.append((filter_dict, namespace))
+
+class _Service:
+    """The parts of RAGService a cancelled job touches."""
+
+    def __init__(self, data_dir):
+        self.config = SimpleNamespace(data_dir=str(data_dir))
+        self.pinecone_client = _VectorClient()
+        self.forgotten = []
+
+    def forget_document(self, session_id, filename):
+        self.forgotten.append((session_id, filename))
+
+    def prepare_document(self, path, name=None):
+        return None, 9, [{"text": "some text", "page": 1}]
+
+    def claim_document(self, session_id, filename, spans):
+        return None
+
+    def document_metadata(self, filename):
+        return {"filename": filename}
+
+    def embed_chunks(self, spans):
+        return [span["text"] for span in spans], [[0.0]] * len(spans), [{"page": span["page"]} for span in spans]
+
+@pytest.fixture
+def queue(tmp_path):
+    return IngestionJobQueue(_Service(tmp_path), workers=1)
+
+def _stored_some_batches(queue, **lease):
+    job_id = queue.submit("session-1", b"some text", "manual.txt")
+    queue._update(job_id, total_batches=3, completed_batches=1, **lease)
+    return job_id
+
+def test_cancel_during_backoff_removes_stored_vectors(queue):
+    job_id = _stored_some_batches(queue, attempts=1, lease_owner=None, lease_expires=time.time() + 60)
+    assert queue.cancel(job_id)
+    assert queue.get_job(job_id)["status"] == CANCELLED
+    assert queue.service.pinecone_client.deleted_filters == [({"job_id": job_id}, "session-1")]
+    assert queue.service.forgotten == [("session-1", "manual.txt")]
+    assert not Path(queue.get_job(job_id)["file_path"]).exists()
+
+def test_cancel_leaves_cleanup_of_a_leased_job_to_its_worker(queue):
+    job_id = _stored_some_batches(queue, lease_owner="other-worker", lease_expires=time.time() + 60)
+    assert queue.cancel(job_id)
+    assert queue.service.pinecone_client.deleted_filters == []
+    assert Path(queue.get_job(job_id)["file_path"]).exists()
+
+def test_cancel_takes_over_an_expired_lease(queue):
+    job_id = _stored_some_batches(queue, lease_owner="crashed-worker", lease_expires=time.time() - 1)
+    assert queue.cancel(job_id)
+    assert queue.service.pinecone_client.deleted_filters == [({"job_id": job_id}, "session-1")]
+
+def test_finished_jobs_cannot_be_cancelled(queue):
+    job_id = _stored_some_batches(queue)
+    queue._update(job_id, status="completed")
+    assert not queue.cancel(job_id)
+
+def test_cancel_while_the_first_batch_is_stored_removes_it(queue):
+    job_id = queue.submit("session-1", b"some text", "manual.txt")
+    embed = queue.service.embed_chunks
+
+    def cancel_then_embed(spans):
+        # The user cancels while the worker is embedding and storing this batch
+        assert queue.cancel(job_id)
+        return embed(spans)
+
+    queue.service.embed_chunks = cancel_then_embed
+    queue._step(queue._claim())
+
+    assert queue.service.pinecone_client.stored == [("session-1", 1)]
+    assert queue.service.pinecone_client.deleted_filters == [({"job_id": job_id}, "session-1")]
+    assert queue.get_job(job_id)["status"] == CANCELLED
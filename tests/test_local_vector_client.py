@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils.ann_index import IVFIndex
+from utils.local_vector_client import LocalVectorClient
+
+DIMENSION = 16
+
+@pytest.fixture(autouse=True)
+def small_training_threshold(monkeypatch):
+    monkeypatch.setenv("LOCAL_INDEX_TRAIN_THRESHOLD", "200")
+
+def records(count, start=0, seed=0):
+    data = np.random.default_rng(seed).normal(size=(count, DIMENSION))
+    return [
+        {"id": f"v{start + i}", "values": data[i].tolist(), "metadata": {"text": f"chunk {start + i}", "page": i}}
+        for i in range(count)
+    ]
+
+def client(path, **kwargs):
+    return LocalVectorClient(index_dir=str(path), dimension=DIMENSION, nprobe=4, **kwargs)
+
+def test_writes_append_segments_and_survive_a_restart(tmp_path):
+    local = client(tmp_path)
+    batch = records(50)
+    local.upsert_batch(batch, namespace="docs")
+    local.upsert_batch(records(10, start=50, seed=1), namespace="docs")
+    local.delete_vector("v3", namespace="docs")
+    # Each write added a segment instead of rewriting the namespace
+    assert len(list((tmp_path / "docs").glob("seg-*"))) == 2
+
+    reopened = client(tmp_path)
+    assert reopened.get_index_stats()["namespaces"] == {"docs": {"vector_count": 59}}
+    hit = reopened.query_vectors(batch[5]["values"], top_k=1, namespace="docs")["matches"][0]
+    assert hit["id"] == "v5" and hit["metadata"]["text"] == "chunk 5"
+    assert "v3" not in [match["id"] for match in reopened.query_vectors(batch[3]["values"], top_k=60, namespace="docs")["matches"]]
+
+def test_a_trained_namespace_reloads_its_quantizer_from_memory_maps(tmp_path):
+    local = client(tmp_path)
+    batch = records(300)
+    local.upsert_batch(batch, namespace="docs")
+    state = json.loads((tmp_path / "docs" / "ivf.json").read_text())
+    assert state["version"] == 1 and (tmp_path / "docs" / state["centroids"]).exists()
+    # Training rewrote the namespace as one snapshot segment, mapped as is on load
+    assert isinstance(client(tmp_path)._get_index("docs")._vectors, np.memmap)
+
+    local.upsert_batch(records(5, start=300, seed=2), namespace="docs")
+    reopened = client(tmp_path)
+    index = reopened._get_index("docs")
+    assert index.trained and index.version == 1 and len(index) == 305
+    assert reopened.query_vectors(batch[42]["values"], top_k=1, namespace="docs")["matches"][0]["id"] == "v42"
+
+def test_without_autosave_nothing_is_written_until_save(tmp_path):
+    local = client(tmp_path, autosave=False)
+    local.upsert_batch(records(20), namespace="docs")
+    local.delete_vector("v1", namespace="docs")
+    assert client(tmp_path).get_index_stats()["total_vector_count"] == 0
+
+    local.save()
+    assert client(tmp_path).get_index_stats()["namespaces"] == {"docs": {"vector_count": 19}}
+
+def test_namespaces_in_the_previous_format_are_migrated(tmp_path):
+    batch = records(30)
+    index = IVFIndex(DIMENSION, train_threshold=10_000)
+    index.upsert([r["id"] for r in batch], [r["values"] for r in batch], [r["metadata"] for r in batch])
+    index.save(tmp_path / "old")
+
+    local = client(tmp_path)
+    assert local.get_index_stats()["namespaces"] == {"old": {"vector_count": 30}}
+    assert not (tmp_path / "old" / "index.json").exists()
+    assert client(tmp_path).query_vectors(batch[9]["values"], top_k=1, namespace="old")["matches"][0]["id"] == "v9"
+
+def test_queries_do_not_wait_for_a_namespace_writer(tmp_path):
+    local = client(tmp_path)
+    batch = records(20)
+    local.upsert_batch(batch, namespace="docs")
+    holder = local._namespace("docs")
+    results = []
+    with holder.lock:
+        # As if a write were persisting this namespace right now
+        reader = threading.Thread(target=lambda: results.append(
+            local.query_vectors(batch[0]["values"], top_k=1, namespace="docs")))
+        reader.start()
+        reader.join(timeout=5)
+        assert not reader.is_alive()
+    assert results[0]["matches"][0]["id"] == "v0"
+
+def test_delete_by_filter_and_namespace(tmp_path):
+    local = client(tmp_path)
+    local.upsert_batch(records(10), namespace="docs")
+    local.upsert_batch(records(5, seed=1), namespace="other")
+    local.delete_by_filter({"page": {"$lt": 4}}, namespace="docs")
+    local.delete_namespace("other")
+
+    reopened = client(tmp_path)
+    assert reopened.get_index_stats()["namespaces"] == {"docs": {"vector_count": 6}}
+    assert sorted(reopened.list_vectors()) == sorted(f"v{i}" for i in range(4, 10))
+
+def test_two_clients_see_and_keep_each_others_writes(tmp_path):
+    first, second = client(tmp_path), client(tmp_path)
+    batch = records(50)
+    first.upsert_batch(batch, namespace="docs")
+    assert second.query_vectors(batch[7]["values"], top_k=1, namespace="docs")["matches"][0]["id"] == "v7"
+
+    extra = records(30, start=50, seed=1)
+    second.upsert_batch(extra, namespace="docs")
+    second.delete_vector("v1", namespace="docs")
+    assert first.query_vectors(extra[3]["values"], top_k=1, namespace="docs")["matches"][0]["id"] == "v53"
+    assert first.get_index_stats()["namespaces"] == {"docs": {"vector_count": 79}}
+
+    # Crossing the training threshold rewrites the namespace from the first client's index
+    first.upsert_batch(records(150, start=80, seed=2), namespace="docs")
+    assert json.loads((tmp_path / "docs" / "ivf.json").read_text())["version"] == 1
+    second.upsert_batch(records(5, start=230, seed=3), namespace="docs")
+
+    for reader in (first, second, client(tmp_path)):
+        ids = set(reader.list_vectors(limit=1000))
+        assert len(ids) == 234 and "v1" not in ids and {"v53", "v100", "v232"} <= ids
+
+def test_a_compaction_elsewhere_is_caught_up_without_a_reload(tmp_path):
+    first, second = client(tmp_path), client(tmp_path)
+    first.upsert_batch(records(20), namespace="docs")
+    index = first._get_index("docs")
+    second.delete_by_filter({"page": {"$lt": 10}}, namespace="docs")
+    second._namespace("docs").store.compact(full=True)
+
+    assert first._get_index("docs") is index
+    assert sorted(first.list_vectors()) == sorted(f"v{i}" for i in range(10, 20))
+
+def test_segments_are_merged_in_the_background_not_on_write(tmp_path, monkeypatch):
+    writer = client(tmp_path)
+    for i in range(4):
+        writer.upsert_batch(records(5, start=5 * i, seed=i), namespace="docs")
+    assert len(list((tmp_path / "docs").glob("seg-*"))) == 4
+
+    monkeypatch.setenv("VECTOR_SEGMENT_COMPACT_INTERVAL", "0.05")
+    compacting = client(tmp_path)
+    store = compacting._namespace("docs").store
+    for _ in range(100):
+        if not store.needs_compaction():
+            break
+        time.sleep(0.05)
+    assert len(store.segments) < 4
+    assert len(writer.list_vectors()) == 20
+
+    compacting.close()
+    assert store._compactor is None
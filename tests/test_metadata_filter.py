@@ -0,0 +1,64 @@
+import pytest
+
+from utils.metadata_filter import MetadataIndex, matches_filter, page_range_filter
+
+RECORDS = [
+    {"filename": "a.pdf", "page_start": 1, "page_end": 2, "brand": "bosch", "tags": ["oven", "manual"]},
+    {"filename": "a.pdf", "page_start": 3, "page_end": 3, "brand": "bosch", "tags": ["oven"]},
+    {"filename": "b.pdf", "page_start": 1, "page_end": 5, "brand": "miele"},
+    {"filename": "c.txt", "brand": None},
+    None,
+]
+
+FILTERS = [
+    {"filename": "a.pdf"},
+    {"filename": {"$ne": "a.pdf"}},
+    {"brand": {"$in": ["bosch", "miele"]}},
+    {"brand": {"$nin": ["bosch"]}},
+    {"page_start": {"$gt": 1}},
+    {"page_end": {"$lte": 3}},
+    {"brand": {"$exists": True}},
+    {"page_start": {"$exists": False}},
+    {"tags": "manual"},
+    {"tags": {"$ne": "manual"}},
+    {"$or": [{"brand": "miele"}, {"page_start": 3}]},
+    {"$and": [{"brand": "bosch"}, {"page_end": {"$gte": 2}}]},
+    page_range_filter(2, 3),
+    page_range_filter(4),
+    {},
+]
+
+@pytest.mark.parametrize("filter_dict", FILTERS)
+def test_index_agrees_with_the_record_by_record_filter(filter_dict):
+    index = MetadataIndex()
+    index.extend(RECORDS)
+    assert index.can_evaluate(filter_dict)
+    expected = [row for row, record in enumerate(RECORDS) if matches_filter(record, filter_dict)]
+    assert index.candidates(filter_dict) == expected
+
+def test_page_range_filter_matches_overlapping_chunks():
+    assert [matches_filter(record, page_range_filter(2, 3)) for record in RECORDS[:3]] == [True, True, True]
+    assert [matches_filter(record, page_range_filter(4)) for record in RECORDS[:3]] == [False, False, True]
+
+def test_removed_rows_never_match():
+    index = MetadataIndex()
+    index.extend(RECORDS)
+    index.remove(0)
+    assert index.candidates({"filename": "a.pdf"}) == [1]
+    assert 0 not in index.candidates({})
+
+def test_unindexed_fields_are_reported():
+    index = MetadataIndex(fields=["filename"])
+    index.extend(RECORDS)
+    assert index.can_evaluate({"filename": "a.pdf"})
+    assert not index.can_evaluate({"$or": [{"filename": "a.pdf"}, {"brand": "bosch"}]})
+    with pytest.raises(ValueError):
+        index.evaluate({"brand": "bosch"})
+
+    unhashable = MetadataIndex()
+    unhashable.add({"extra": {"nested": 1}})
+    assert not unhashable.can_evaluate({"extra": {"$exists": True}})
+
+def test_unknown_operators_are_rejected():
+    with pytest.raises(ValueError):
+        matches_filter({"page_start": 1}, {"page_start": {"$near": 1}})
@@ -0,0 +1,22 @@
+from utils.chunker import assign_pages_to_chunks, format_page_reference
+from utils.file_parser import parse_file_with_pages
+
+def test_text_files_have_no_pages(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("First paragraph.\n\nSecond paragraph.", encoding="utf-8")
+    parsed = parse_file_with_pages(str(path))
+    assert parsed["text"].startswith("First paragraph.")
+    assert parsed["pages"] == []
+
+def test_chunks_of_unpaginated_documents_are_referenced_by_index():
+    chunks = assign_pages_to_chunks([{"text": "a", "char_start": 0, "char_end": 1}], [])
+    assert "page_start" not in chunks[0]
+    assert format_page_reference({"chunk_index": 3}) == "Chunk 3"
+
+def test_chunks_are_mapped_onto_the_pages_they_span():
+    pages = [{"page_number": 1, "char_start": 0, "char_end": 10},
+             {"page_number": 2, "char_start": 12, "char_end": 22}]
+    chunks = assign_pages_to_chunks([{"char_start": 0, "char_end": 8}, {"char_start": 5, "char_end": 20},
+                                     {"char_start": 14, "char_end": 22}], pages)
+    assert [(chunk["page_start"], chunk["page_end"]) for chunk in chunks] == [(1, 1), (1, 2), (2, 2)]
+    assert [format_page_reference(chunk) for chunk in chunks] == ["Page 1", "Pages 1-2", "Page 2"]
@@ -0,0 +1,123 @@
+import importlib.util
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "pdf_downloader.py"
+
+class Resource:
+    """One PDF served with an ETag, honoring If-None-Match and Range/If-Range."""
+
+    def __init__(self, content: bytes, etag: str):
+        self.content = content
+        self.etag = etag
+        self.requests = []
+        # Seconds between body chunks, to keep transfers open
+        self.chunk_delay = 0.0
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+
+class Handler(BaseHTTPRequestHandler):
+    resource: Resource
+
+    def do_GET(self):
+        resource = self.server.resource
+        resource.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == resource.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body, status = resource.content, 200
+        byte_range = self.headers.get("Range")
+        if byte_range and self.headers.get("If-Range") in (None, resource.etag):
+            start = int(byte_range.split("=")[1].rstrip("-"))
+            body, status = resource.content[start:], 206
+        # A transfer counts as open from before its headers until before its last chunk,
+        # so one the client has finished can never overlap the next
+        with resource.lock:
+            resource.active += 1
+            resource.peak = max(resource.peak, resource.active)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("ETag", resource.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        chunks = [body[start:start + 4096] for start in range(0, len(body), 4096)] or [b""]
+        try:
+            for chunk in chunks[:-1]:
+                self.wfile.write(chunk)
+                self.wfile.flush()
+                time.sleep(resource.chunk_delay)
+        finally:
+            with resource.lock:
+                resource.active -= 1
+        self.wfile.write(chunks[-1])
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.resource = Resource(b"%PDF-1.4 " + bytes(range(256)) * 40, '"v1"')
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch):
+    pytest.importorskip("bs4")
+    # The script sets up logs/ in the working directory on import
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location("pdf_downloader", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.PDFDownloader(base_dir=str(tmp_path / "documents"), host_delay=0, respect_robots=False, timeout=5)
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_port}/manual.pdf"
+
+def test_known_files_are_revalidated_with_304(downloader, server, tmp_path):
+    target = tmp_path / "documents" / "manual.pdf"
+    assert downloader.fetch(url(server), target) == ("downloaded", str(target))
+    assert target.read_bytes() == server.resource.content
+
+    assert downloader.fetch(url(server), target) == ("unchanged", str(target))
+    assert server.resource.requests[-1]["If-None-Match"] == '"v1"'
+    assert target.read_bytes() == server.resource.content
+
+def test_partial_downloads_resume_with_range(downloader, server, tmp_path):
+    target = tmp_path / "documents" / "manual.pdf"
+    target.parent.mkdir(parents=True)
+    target.with_name("manual.pdf.part").write_bytes(server.resource.content[:1000])
+    downloader.state.update(url(server), part_etag='"v1"')
+
+    assert downloader.fetch(url(server), target)[0] == "downloaded"
+    request = server.resource.requests[-1]
+    assert request["Range"] == "bytes=1000-" and request["If-Range"] == '"v1"'
+    assert target.read_bytes() == server.resource.content
+    assert not target.with_name("manual.pdf.part").exists()
+    assert downloader.state.get(url(server))["etag"] == '"v1"'
+
+def test_a_changed_resource_replaces_the_partial_file(downloader, server, tmp_path):
+    target = tmp_path / "documents" / "manual.pdf"
+    target.parent.mkdir(parents=True)
+    target.with_name("manual.pdf.part").write_bytes(b"stale bytes from the old version")
+    downloader.state.update(url(server), part_etag='"v0"')
+
+    assert downloader.fetch(url(server), target)[0] == "downloaded"
+    assert target.read_bytes() == server.resource.content
+
+def test_max_per_host_bounds_transfers_not_just_requests(downloader, server, tmp_path):
+    server.resource.chunk_delay = 0.02
+    downloader.max_workers, downloader.max_per_host = 8, 2
+    jobs = [(f"{url(server)}?copy={i}", tmp_path / "documents" / f"manual-{i}.pdf") for i in range(6)]
+
+    results = list(downloader.download_many(jobs))
+    assert [status for _, status, _ in results] == ["downloaded"] * 6
+    assert server.resource.peak == 2
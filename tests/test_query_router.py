@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+
+from utils.query_router import AhoCorasick, MetadataVocabulary, QueryRouter, document_metadata
+
+def test_document_metadata_reads_folders_and_file_name():
+    metadata = document_metadata("data/documents/laptops/gaming/HP_Omen_Troubleshooting_Guide.pdf")
+    assert metadata == {"manufacturer": "hp", "doc_type": "manual", "category": "laptops", "subcategory": "gaming"}
+    assert document_metadata("upload.txt") == {
+        "manufacturer": "general", "doc_type": "general", "category": "general", "subcategory": "general"
+    }
+
+def test_aho_corasick_matches_whole_words_only():
+    automaton = AhoCorasick({"hp": "brand", "not working": "problem"})
+    matches = automaton.find("My HP laptop is not working; the hpx is fine")
+    assert [(payload, start) for start, _, payload in matches] == [("brand", 3), ("problem", 16)]
+
+def write_vocabulary(path, namespace, **fields):
+    vocabulary = MetadataVocabulary()
+    for field, values in fields.items():
+        for value in values:
+            vocabulary.add({field: value}, namespace)
+    vocabulary.save(path)
+
+def test_router_builds_filters_from_known_values(tmp_path):
+    path = tmp_path / "vocabulary.json"
+    write_vocabulary(path, "kb", manufacturer=["hp", "dell"], doc_type=["troubleshooting", "manual"])
+    router = QueryRouter(path)
+
+    assert router.route("HP Pavilion won't boot", "kb") == {
+        "$and": [{"manufacturer": "hp"}, {"doc_type": "troubleshooting"}]
+    }
+    assert router.route("Compare HP and Dell", "kb") == {"manufacturer": {"$in": ["hp", "dell"]}}
+    assert router.route("What is the warranty?", "kb") is None
+    # Values only route in namespaces whose documents carry them
+    assert router.route("HP Pavilion won't boot", "other") is None
+
+def test_vocabulary_merges_on_save_and_router_picks_up_changes(tmp_path):
+    path = tmp_path / "vocabulary.json"
+    write_vocabulary(path, "kb", manufacturer=["hp"])
+    router = QueryRouter(path)
+    assert router.route("dell drivers", "kb") is None
+
+    time.sleep(0.01)
+    write_vocabulary(path, "kb", manufacturer=["dell"], category=["general"])
+    assert MetadataVocabulary.load(path).values["kb"] == {"manufacturer": {"hp", "dell"}}
+    assert router.route("dell drivers", "kb") == {"manufacturer": "dell"}
+    assert os.path.exists(path) and not path.with_suffix(".tmp").exists()
+
+def test_concurrent_saves_keep_every_value(tmp_path):
+    path = tmp_path / "vocabulary.json"
+
+    def save(i):
+        vocabulary = MetadataVocabulary()
+        vocabulary.add({"manufacturer": f"brand{i}"}, "docs")
+        vocabulary.save(path)
+
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert MetadataVocabulary.load(path).values["docs"]["manufacturer"] == {f"brand{i}" for i in range(16)}
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,40 @@
+import asyncio
+import json
+
+import pytest
+
+rag_api = pytest.importorskip("utils.rag_api")
+
+class FailingStreamService:
+    async def astream_query(self, query, session_id):
+        yield "partial "
+        raise RuntimeError("model went away")
+
+def call(app, path, body):
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app({'type': 'http', 'method': 'POST', 'path': path, 'query_string': b''}, receive, send))
+    return sent
+
+def test_stream_errors_end_the_body_instead_of_starting_a_new_response():
+    app = rag_api.RAGApp(FailingStreamService)
+    sent = call(app, '/query/stream', json.dumps({'query': 'q', 'session_id': 's'}).encode())
+
+    assert [message['type'] for message in sent].count('http.response.start') == 1
+    assert sent[0]['status'] == 200
+    assert sent[1]['body'] == b"partial " and sent[1]['more_body']
+    assert sent[-1]['more_body'] is False
+    assert b"model went away" in sent[-1]['body']
+
+def test_request_body_must_be_a_json_object():
+    app = rag_api.RAGApp(FailingStreamService)
+    sent = call(app, '/query/stream', b'[1]')
+
+    assert sent[0]['status'] == 400
+    assert json.loads(sent[1]['body']) == {'error': "Request body must be a JSON object"}
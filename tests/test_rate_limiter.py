@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from utils.rate_limiter import PRIORITY_BULK, PRIORITY_INTERACTIVE, RateLimitScheduler, request_priority
+
+class RateLimitError(Exception):
+    pass
+
+def drain(scheduler):
+    scheduler.requests.level = 0.0
+    scheduler.requests.updated = scheduler._clock()
+
+def test_interactive_callers_overtake_queued_bulk_work():
+    scheduler = RateLimitScheduler("test", 600)
+    drain(scheduler)
+    order = []
+
+    def call(priority):
+        scheduler.acquire(priority=priority)
+        order.append(priority)
+
+    bulk = [threading.Thread(target=call, args=(PRIORITY_BULK,)) for _ in range(2)]
+    for thread in bulk:
+        thread.start()
+    time.sleep(0.02)
+    interactive = threading.Thread(target=call, args=(PRIORITY_INTERACTIVE,))
+    interactive.start()
+    for thread in bulk + [interactive]:
+        thread.join(timeout=5)
+    assert order == [PRIORITY_INTERACTIVE, PRIORITY_BULK, PRIORITY_BULK]
+
+def test_a_timed_out_caller_leaves_the_queue():
+    scheduler = RateLimitScheduler("test", 1)
+    drain(scheduler)
+    with pytest.raises(TimeoutError):
+        scheduler.acquire(timeout=0.05)
+    assert scheduler.get_stats()["queued"] == 0
+
+def test_rate_limit_errors_pause_and_retry():
+    scheduler = RateLimitScheduler("test", 6000)
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RateLimitError("429")
+        return "ok"
+
+    assert scheduler.call(flaky) == "ok"
+    assert attempts[1] - attempts[0] >= 0.009
+    assert scheduler.get_stats()["rate_limited"] == 1
+    assert 0.5 < scheduler.rate_factor < 1.0
+
+def test_schedulers_sharing_a_state_file_share_one_limit(tmp_path):
+    path = str(tmp_path / "api.json")
+    app, script = RateLimitScheduler("test", 3, state_path=path), RateLimitScheduler("test", 3, state_path=path)
+    for _ in range(3):
+        script.acquire(priority=PRIORITY_INTERACTIVE, timeout=1)
+    # The other process's calls used the whole minute
+    with pytest.raises(TimeoutError):
+        app.acquire(priority=PRIORITY_INTERACTIVE, timeout=0.05)
+
+def test_bulk_callers_leave_the_reserve_to_interactive_ones(tmp_path):
+    path = str(tmp_path / "api.json")
+    app = RateLimitScheduler("test", 10, state_path=path, bulk_reserve=0.2)
+    script = RateLimitScheduler("test", 10, state_path=path, bulk_reserve=0.2)
+    with request_priority(PRIORITY_BULK):
+        for _ in range(8):
+            script.acquire(timeout=1)
+        with pytest.raises(TimeoutError):
+            script.acquire(timeout=0.05)
+    app.acquire(priority=PRIORITY_INTERACTIVE, timeout=1)
+    app.acquire(priority=PRIORITY_INTERACTIVE, timeout=1)
+
+def test_a_pause_reaches_every_process(tmp_path):
+    path = str(tmp_path / "api.json")
+    app, script = RateLimitScheduler("test", 600, state_path=path), RateLimitScheduler("test", 600, state_path=path)
+    script.report_rate_limited(retry_after=30)
+    with pytest.raises(TimeoutError):
+        app.acquire(timeout=0.05)
+    assert app.rate_factor == 0.5
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.singleflight import SingleFlight, query_key
+
+def run_concurrently(flight, key, func, callers=3):
+    """Start the leader, then the other callers while it is still running."""
+    outcomes = []
+
+    def call():
+        try:
+            outcomes.append(("ok", flight.do(key, func)))
+        except Exception as e:
+            outcomes.append(("error", e))
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    threads[0].start()
+    time.sleep(0.02)
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.1)
+        return 42
+
+    assert run_concurrently(flight, "k", work) == [("ok", 42)] * 3
+    assert len(calls) == 1
+    assert flight.get_stats()["coalesced"] == 2 and flight.in_flight() == 0
+
+def test_an_error_reaches_every_waiter_and_is_not_remembered():
+    flight = SingleFlight()
+    error = ValueError("backend down")
+
+    def failing():
+        time.sleep(0.1)
+        raise error
+
+    outcomes = run_concurrently(flight, "k", failing)
+    assert outcomes == [("error", error)] * 3
+    assert flight.do("k", lambda: "recovered") == "recovered"
+
+def test_async_callers_share_results_and_errors():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("boom")
+
+    async def main():
+        results = await asyncio.gather(*(flight.ado("q", work) for _ in range(3)))
+        errors = await asyncio.gather(*(flight.ado("e", failing) for _ in range(3)), return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(main())
+    assert results == ["answer"] * 3 and len(calls) == 1
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert flight.in_flight() == 0
+
+def test_waiters_take_over_when_the_leader_is_cancelled():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def main():
+        leader = asyncio.ensure_future(flight.ado("q", work))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(flight.ado("q", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(main()) == 2
+
+def test_query_keys_ignore_case_and_spacing():
+    assert query_key("docs", "  How do I   reset it?") == query_key("docs", "how do i reset it?")
+    assert query_key(None, "x") == ("", "x")
@@ -0,0 +1,40 @@
+import os
+
+from utils.usage import UsageLedger
+
+def usage(cost, prompt_tokens=10):
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": 0, "embedding_tokens": 0, "cost": cost}
+
+def test_rollups_only_read_appended_lines(tmp_path):
+    ledger = UsageLedger(tmp_path / "usage.jsonl")
+    ledger.append("s1", "rag", "gpt-4o", usage(0.5), timestamp="2026-01-02T10:00:00")
+    ledger.append("s2", "ingest", "text-embedding-3-small", usage(0.25), timestamp="2026-01-03T10:00:00")
+    assert ledger.rollup("session") == {
+        "s1": {"count": 1, "prompt_tokens": 10, "completion_tokens": 0, "embedding_tokens": 0, "cost": 0.5},
+        "s2": {"count": 1, "prompt_tokens": 10, "completion_tokens": 0, "embedding_tokens": 0, "cost": 0.25}
+    }
+
+    # Another process appends, the last line still half written
+    other = UsageLedger(tmp_path / "usage.jsonl")
+    other.append("s1", "/summarize", "gpt-4o", usage(1.0), timestamp="2026-01-03T11:00:00")
+    with open(tmp_path / "usage.jsonl", 'a', encoding='utf-8') as f:
+        f.write('{"session_id": "s1", "operation": "rag"')
+    assert list(ledger.rollup("operation", "s1")) == ["/summarize", "rag"]
+    assert ledger.rollup("day", "s1")["2026-01-03"]["cost"] == 1.0
+    assert ledger.rollup("session")["s1"]["count"] == 2
+
+    with open(tmp_path / "usage.jsonl", 'a', encoding='utf-8') as f:
+        f.write(', "cost": 2.0, "timestamp": "2026-01-04T09:00:00"}\n')
+    assert ledger.rollup("operation", "s1")["rag"] == {
+        "count": 2, "prompt_tokens": 10, "completion_tokens": 0, "embedding_tokens": 0, "cost": 2.5
+    }
+
+def test_a_replaced_ledger_is_read_again(tmp_path):
+    ledger = UsageLedger(tmp_path / "usage.jsonl")
+    ledger.append("s1", "rag", "gpt-4o", usage(0.5))
+    assert ledger.rollup("session")["s1"]["count"] == 1
+
+    os.remove(tmp_path / "usage.jsonl")
+    assert ledger.rollup("session") == {}
+    ledger.append("s2", "rag", "gpt-4o", usage(0.5))
+    assert list(ledger.rollup("session")) == ["s2"]
@@ -0,0 +1,129 @@
+import numpy as np
+
+from utils.vector_segments import SegmentedVectorStore
+
+def vectors(count, dimension=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dimension)).astype(np.float32)
+
+def test_overwrites_and_deletes_survive_reopening(tmp_path):
+    store = SegmentedVectorStore(tmp_path, flush_size=1000)
+    store.add(["a", "b", "c"], vectors(3), [{"n": 1}, {"n": 2}, {"n": 3}])
+    store.flush()
+    store.add(["b"], vectors(1, seed=1), [{"n": 20}])
+    store.flush()
+    store.delete(["c"])
+
+    reopened = SegmentedVectorStore(tmp_path)
+    assert len(reopened) == 2
+    assert reopened.get("b")[1] == {"n": 20}
+    assert reopened.get("c") is None
+    assert [hit[0] for hit in reopened.search(vectors(1, seed=1)[0], top_k=1)] == ["b"]
+
+def test_live_rows_return_the_memory_map_of_a_compacted_store(tmp_path):
+    store = SegmentedVectorStore(tmp_path, flush_size=1000)
+    store.add(["a", "b"], vectors(2), extras={"cluster": [3, 4]})
+    store.flush()
+
+    ids, matrix, metadata, extras = store.live_rows(["cluster", "missing"])
+    assert ids == ["a", "b"] and metadata == [None, None]
+    assert isinstance(matrix, np.memmap)
+    assert extras["cluster"].tolist() == [3, 4] and "missing" not in extras
+
+def test_live_rows_skip_dead_rows_and_include_buffered_ones(tmp_path):
+    store = SegmentedVectorStore(tmp_path, flush_size=1000)
+    store.add(["a", "b", "c"], vectors(3), extras={"cluster": [0, 1, 2]})
+    store.flush()
+    store.delete(["a"])
+    store.add(["b", "d"], vectors(2, seed=1), extras={"cluster": [5, 6]})
+
+    ids, matrix, _, extras = store.live_rows(["cluster"])
+    assert ids == ["c", "b", "d"]
+    assert matrix.shape == (3, 8)
+    assert extras["cluster"].tolist() == [2, 5, 6]
+
+def test_merges_are_size_tiered(tmp_path):
+    store = SegmentedVectorStore(tmp_path, flush_size=1000, max_segments=100)
+    store.add([f"big{i}" for i in range(8)], vectors(8))
+    store.flush()
+    store.add(["small0"], vectors(1, seed=1))
+    store.flush()
+    # One small segment after a big one is not worth merging yet
+    assert not store.needs_compaction()
+
+    store.add(["small1"], vectors(1, seed=2))
+    store.flush()
+    store.compact()
+    assert [len(segment) for segment in store.segments] == [8, 2]
+    assert len(store) == 10
+
+def test_max_segments_caps_the_segment_count(tmp_path):
+    store = SegmentedVectorStore(tmp_path, flush_size=1000, max_segments=2)
+    for count in (16, 8, 4):
+        store.add([f"{count}-{i}" for i in range(count)], vectors(count, seed=count))
+        store.flush()
+    assert store.needs_compaction()
+    store.compact()
+    assert [len(segment) for segment in store.segments] == [16, 12]
+
+def test_partial_merge_keeps_tombstones_for_older_segments(tmp_path):
+    store = SegmentedVectorStore(tmp_path, flush_size=1000, max_segments=100)
+    store.add([f"old{i}" for i in range(20)], vectors(20))
+    store.flush()
+    store.add(["old0", "x"], vectors(2, seed=1), [{"v": 2}, None])
+    store.flush()
+    store.add(["y", "z"], vectors(2, seed=2))
+    store.flush()
+    store.compact()
+
+    assert [len(segment) for segment in store.segments] == [20, 4]
+    reopened = SegmentedVectorStore(tmp_path)
+    assert len(reopened) == 23
+    assert reopened.get("old0")[1] == {"v": 2}
+    assert reopened.live_rows()[0].count("old0") == 1
+
+def test_heavy_deletes_trigger_a_full_merge(tmp_path):
+    store = SegmentedVectorStore(tmp_path, flush_size=1000)
+    store.add([str(i) for i in range(10)], vectors(10), extras={"cluster": list(range(10))})
+    store.flush()
+    store.delete(["0", "1", "2"])
+    assert store.needs_compaction()
+    store.compact()
+
+    assert len(store.segments) == 1 and not store.tombstones
+    ids, _, _, extras = store.live_rows(["cluster"])
+    assert ids == [str(i) for i in range(3, 10)]
+    assert extras["cluster"].tolist() == list(range(3, 10))
+
+def test_rewrite_replaces_everything(tmp_path):
+    store = SegmentedVectorStore(tmp_path, flush_size=1000)
+    store.add(["a", "b"], vectors(2))
+    store.flush()
+    store.delete(["a"])
+    store.rewrite(["c"], vectors(1, seed=3), [{"n": 1}], extras={"cluster": [7]})
+
+    reopened = SegmentedVectorStore(tmp_path)
+    assert len(reopened) == 1 and not reopened.tombstones
+    assert reopened.live_rows(["cluster"])[3]["cluster"].tolist() == [7]
+    assert len(list(tmp_path.glob("seg-*"))) == 1
+
+def test_changes_since_follows_flushes_and_merges_but_not_rewrites(tmp_path):
+    store = SegmentedVectorStore(tmp_path, flush_size=1000)
+    store.add(["a", "b", "c"], vectors(3))
+    store.flush()
+    state = store.state()
+
+    other = SegmentedVectorStore(tmp_path, flush_size=1000)
+    other.add(["b", "d"], vectors(2, seed=1), [{"n": 1}, {"n": 2}])
+    other.flush()
+    ids, matrix, metadata, deleted = store.changes_since(state)
+    assert ids == ["b", "d"] and matrix.shape == (2, 8) and metadata == [{"n": 1}, {"n": 2}] and deleted == []
+
+    # A merge of known segments only reports the dead rows it dropped
+    state = store.state()
+    other.delete(["c"])
+    other.compact(full=True)
+    assert store.changes_since(state)[0] == [] and store.changes_since(state)[3] == ["c"]
+
+    state = store.state()
+    other.rewrite(["z"], vectors(1, seed=2))
+    assert store.changes_since(state) is None
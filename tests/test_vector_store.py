@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from utils.vector_store import VectorStore, assign_to_centroids, kmeans, normalize_rows, top_k_indices
+
+DIMENSION = 32
+
+def vectors(count, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, DIMENSION)).astype(np.float32)
+
+def test_normalize_rows_leaves_zero_vectors_alone():
+    matrix = normalize_rows([[3.0, 4.0], [0.0, 0.0]])
+    assert np.allclose(matrix, [[0.6, 0.8], [0.0, 0.0]])
+
+def test_top_k_indices_are_sorted_best_first():
+    scores = np.array([0.1, 0.9, 0.5, 0.7])
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 2]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 2, 0]
+    assert top_k_indices(scores, 0).tolist() == []
+
+def test_kmeans_separates_clear_clusters():
+    rng = np.random.default_rng(0)
+    centers = np.eye(DIMENSION)[:3] * 10
+    data = np.vstack([center + rng.normal(scale=0.1, size=(50, DIMENSION)) for center in centers]).astype(np.float32)
+    assignment = assign_to_centroids(data, kmeans(data, 3))
+    assert all(len(set(assignment[i * 50:(i + 1) * 50])) == 1 for i in range(3))
+    assert len(set(assignment)) == 3
+
+@pytest.mark.parametrize("quantization,full_precision", [
+    ("none", "float32"), ("int8", "float32"), ("int8", "float16"), ("int8", None), ("pq", "float32")
+])
+def test_every_layout_finds_stored_vectors(quantization, full_precision):
+    data = vectors(500)
+    store = VectorStore(DIMENSION, quantization=quantization, full_precision=full_precision, pq_subvectors=8)
+    if full_precision is None:
+        store.train(data)
+    store.add([str(i) for i in range(500)], data, [{"i": i} for i in range(500)])
+
+    found = sum(store.search(data[i], top_k=1)[0][0] == str(i) for i in range(0, 500, 25))
+    assert found >= 19
+    best = store.search(data[7], top_k=3)
+    assert [score for _, score, _ in best] == sorted((score for _, score, _ in best), reverse=True)
+
+def test_overwrites_replace_vectors_and_metadata():
+    data = vectors(20)
+    store = VectorStore(DIMENSION)
+    store.add([str(i) for i in range(20)], data)
+    store.search(data[0], top_k=1)
+    store.add(["3", "3"], vectors(2, seed=1), [{"v": 1}, {"v": 2}])
+
+    assert len(store) == 20
+    hit = store.search(vectors(2, seed=1)[1], top_k=1)[0]
+    assert hit[0] == "3" and hit[2] == {"v": 2}
+
+def test_int8_codes_are_a_quarter_of_float32():
+    store = VectorStore(DIMENSION, quantization="int8", full_precision=None)
+    store.train(vectors(100))
+    store.add([str(i) for i in range(100)], vectors(100))
+    usage = store.memory_usage()
+    assert usage["codes"] == 100 * DIMENSION and usage["full_precision"] == 0
+
+def test_rejects_wrong_dimensions_and_untrained_code_only_stores():
+    store = VectorStore(DIMENSION, full_precision=None)
+    with pytest.raises(ValueError):
+        store.add(["a"], vectors(1))
+    with pytest.raises(ValueError):
+        VectorStore(DIMENSION).add(["a"], np.ones((1, DIMENSION + 1)))
@@ -0,0 +1,423 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils.metadata_filter import MetadataIndex, matches_filter
+from utils.vector_store import normalize_rows, kmeans, assign_to_centroids, top_k_indices
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbor index for cosine similarity.
+
+    A k-means coarse quantizer splits the vectors into ``nlist`` clusters and
+    a query only scans the ``nprobe`` clusters whose centroids are closest,
+    so search cost grows with n / nlist * nprobe instead of n. Small indexes
+    (below ``train_threshold``) are searched exactly until there is enough
+    data to train on.
+
+    Inserts are incremental: new vectors join the list of their nearest
+    centroid. Deletes and overwrites leave tombstones that searches skip;
+    the arrays are compacted once too many rows are dead. The quantizer is
+    retrained when the index has grown well past its training size.
+
+    Tuning: raise ``nprobe`` for recall, lower it for latency.
+
+    ``version`` counts trainings, so whoever persists the index can tell
+    when every assignment changed at once.
+    """
+
+    def __init__(self, dimension: int, nlist: Optional[int] = None, nprobe: int = 8,
+                 train_threshold: int = 4096, compact_ratio: float = 0.25):
+        self.dimension = dimension
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.compact_ratio = compact_ratio
+
+        self.centroids: Optional[np.ndarray] = None
+        self.ids: List[Optional[str]] = []
+        self.metadata: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors = np.empty((0, dimension), dtype=np.float32)
+        self._deleted = np.empty(0, dtype=bool)
+        self._assignment = np.empty(0, dtype=np.int32)
+        self._size = 0
+        self._lists: List[List[int]] = []
+        self._list_arrays: Dict[int, np.ndarray] = {}
+        self._trained_size = 0
+        self.version = 0
+        self._metadata_index = MetadataIndex()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def upsert(self, ids: Sequence[str], vectors: Any, metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None):
+        """
+        Insert vectors, replacing any existing vectors with the same ids
+
+        Args:
+            ids (Sequence[str]): Vector ids
+            vectors: Matrix or list of vectors
+            metadata (Optional[Sequence[Dict]]): Metadata per vector
+        """
+        matrix = normalize_rows(vectors)
+        if matrix.shape[1] != self.dimension:
+            raise ValueError(f"Expected dimension {self.dimension}, got {matrix.shape[1]}")
+        metadata = list(metadata) if metadata is not None else [None] * len(ids)
+        last = {vector_id: offset for offset, vector_id in enumerate(ids)}
+        if len(last) < len(ids):
+            # The last copy of an id repeated within the batch wins
+            keep = sorted(last.values())
+            ids, matrix, metadata = [ids[i] for i in keep], matrix[keep], [metadata[i] for i in keep]
+
+        with self._lock:
+            # Overwrites become tombstones plus a fresh row
+            self._tombstone(ids)
+            start = self._size
+            self._reserve(start + len(ids))
+            self._vectors[start:start + len(ids)] = matrix
+            self._deleted[start:start + len(ids)] = False
+            self._size += len(ids)
+            for offset, (vector_id, item) in enumerate(zip(ids, metadata)):
+                self._rows[vector_id] = start + offset
+                self.ids.append(vector_id)
+                self.metadata.append(item)
+                self._metadata_index.add(item)
+
+            if self.trained:
+                self._add_to_lists(np.arange(start, self._size))
+                if len(self) > 4 * max(self._trained_size, 1):
+                    self.train()
+            elif len(self) >= self.train_threshold:
+                self.train()
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """
+        Delete vectors by id
+
+        Returns:
+            int: Number of vectors deleted
+        """
+        with self._lock:
+            deleted = self._tombstone(ids)
+            self._maybe_compact()
+            return deleted
+
+    def delete_where(self, filter_dict: Dict[str, Any]) -> int:
+        """Delete every vector whose metadata matches a filter."""
+        with self._lock:
+            return self.delete([vector_id for vector_id, _ in self.filter_rows(filter_dict)])
+
+    def get(self, vector_id: str) -> Optional[Tuple[np.ndarray, Optional[Dict[str, Any]]]]:
+        """Get the stored (normalized) vector and metadata for an id."""
+        with self._lock:
+            row = self._rows.get(vector_id)
+            if row is None:
+                return None
+            return self._vectors[row].copy(), self.metadata[row]
+
+    def items(self) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        """All live (id, metadata) pairs."""
+        with self._lock:
+            return [(vector_id, self.metadata[row]) for vector_id, row in self._rows.items()]
+
+    def train(self, nlist: Optional[int] = None, iterations: int = 10):
+        """
+        Fit the coarse quantizer on the live vectors and rebuild the lists
+
+        Args:
+            nlist (Optional[int]): Number of clusters, default about 4 * sqrt(n)
+            iterations (int): k-means iterations
+        """
+        with self._lock:
+            self._compact()
+            if not self._size:
+                return
+            data = self._vectors[:self._size]
+            nlist = nlist or self.nlist or max(1, int(4 * np.sqrt(self._size)))
+            # Train on a sample; 256 points per cluster is plenty for k-means
+            rng = np.random.default_rng(0)
+            sample_size = min(self._size, nlist * 256)
+            sample = data[rng.choice(self._size, size=sample_size, replace=False)] if sample_size < self._size else data
+
+            self.centroids = normalize_rows(kmeans(sample, nlist, iterations=iterations))
+            self._lists = [[] for _ in range(len(self.centroids))]
+            self._list_arrays = {}
+            self._add_to_lists(np.arange(self._size))
+            self._trained_size = self._size
+            self.version += 1
+
+    def search(self, query: Any, top_k: int = 10, nprobe: Optional[int] = None,
+               filter_dict: Optional[Dict[str, Any]] = None,
+               filter_fn: Optional[Callable[[Optional[Dict[str, Any]]], bool]] = None
+               ) -> List[Tuple[str, float, Optional[Dict[str, Any]]]]:
+        """
+        Approximate top-k search by cosine similarity
+
+        A metadata filter is first turned into a candidate bitmap by the
+        metadata index. Selective filters (fewer candidates than the probed
+        lists would hold) are answered by scoring just those rows exactly;
+        otherwise the bitmap masks the probed lists, and more clusters are
+        probed until top_k matches are found.
+
+        Args:
+            query: Query vector
+            top_k (int): Number of results
+            nprobe (Optional[int]): Clusters to scan, defaults to self.nprobe
+            filter_dict (Optional[Dict]): Pinecone-style metadata filter
+            filter_fn (Optional[Callable]): Predicate on metadata, checked per row
+
+        Returns:
+            List[Tuple]: (id, score, metadata), best first
+        """
+        q = normalize_rows(query)[0]
+        with self._lock:
+            if not self._rows:
+                return []
+            mask = ~self._deleted[:self._size]
+            if filter_dict:
+                mask &= self._filter_mask(filter_dict)
+
+            nprobe = min(nprobe or self.nprobe, len(self.centroids)) if self.trained else 0
+            expected_scan = self._size * nprobe / max(len(self._lists), 1)
+            if not self.trained or (filter_dict and mask.sum() <= expected_scan):
+                return self._score(np.flatnonzero(mask), q, top_k, filter_fn)
+
+            filtered = bool(filter_dict) or filter_fn is not None
+            order = np.argsort(-(self.centroids @ q))
+            probed = 0
+            rows = np.empty(0, dtype=np.int64)
+            results = []
+            while probed < len(order):
+                lists = order[probed:nprobe]
+                probed = nprobe
+                rows = np.concatenate([rows] + [self._list_array(int(i)) for i in lists])
+                results = self._score(rows[mask[rows]], q, top_k, filter_fn)
+                if len(results) >= top_k or not filtered:
+                    break
+                nprobe = min(nprobe * 2, len(order))
+            return results
+
+    def filter_rows(self, filter_dict: Optional[Dict[str, Any]]) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        """Live (id, metadata) pairs matching a metadata filter."""
+        with self._lock:
+            mask = ~self._deleted[:self._size] & self._filter_mask(filter_dict)
+            return [(self.ids[row], self.metadata[row]) for row in np.flatnonzero(mask)]
+
+    def stats(self) -> Dict[str, Any]:
+        """Size, tombstones and list balance."""
+        with self._lock:
+            sizes = [len(rows) for rows in self._lists]
+            return {
+                "vector_count": len(self),
+                "tombstones": int(self._deleted[:self._size].sum()),
+                "trained": self.trained,
+                "nlist": len(self._lists),
+                "nprobe": self.nprobe,
+                "trained_size": self._trained_size,
+                "largest_list": max(sizes) if sizes else 0,
+                "dimension": self.dimension
+            }
+
+    def export(self, ids: Optional[Iterable[str]] = None) -> Tuple[List[str], np.ndarray, List[Optional[Dict[str, Any]]], Optional[np.ndarray]]:
+        """
+        Live rows for persisting elsewhere
+
+        Args:
+            ids (Optional[Iterable[str]]): Rows to export, every live row if None; unknown ids are skipped
+
+        Returns:
+            Tuple: (ids, unit vectors, metadata, cluster assignment or None if untrained)
+        """
+        with self._lock:
+            if ids is None:
+                self._compact()
+                rows = np.arange(self._size)
+            else:
+                rows = np.array([self._rows[vector_id] for vector_id in ids if vector_id in self._rows], dtype=np.int64)
+            assignment = self._assignment[rows].astype(np.int32) if self.trained else None
+            return ([self.ids[row] for row in rows], np.asarray(self._vectors[rows], dtype=np.float32),
+                    [self.metadata[row] for row in rows], assignment)
+
+    def save(self, directory: Union[str, Path]):
+        """
+        Persist the index to a directory (compacted first)
+
+        Every file is written under a temporary name and renamed into place.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._compact()
+            arrays = {
+                "vectors.npy": self._vectors[:self._size],
+                "assignment.npy": self._assignment[:self._size],
+            }
+            if self.trained:
+                arrays["centroids.npy"] = self.centroids
+            for name, array in arrays.items():
+                temp = directory / f".{name}.tmp"
+                with open(temp, 'wb') as f:
+                    np.save(f, array)
+                os.replace(temp, directory / name)
+            if not self.trained and (directory / "centroids.npy").exists():
+                (directory / "centroids.npy").unlink()
+
+            state = {
+                "dimension": self.dimension,
+                "nlist": self.nlist,
+                "nprobe": self.nprobe,
+                "train_threshold": self.train_threshold,
+                "compact_ratio": self.compact_ratio,
+                "trained_size": self._trained_size,
+                "ids": self.ids,
+                "metadata": self.metadata
+            }
+            temp = directory / ".index.json.tmp"
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(temp, directory / "index.json")
+
+    @classmethod
+    def load(cls, directory: Union[str, Path]) -> "IVFIndex":
+        """Load an index written by save()."""
+        directory = Path(directory)
+        with open(directory / "index.json", 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        centroids = np.load(directory / "centroids.npy") if (directory / "centroids.npy").exists() else None
+        return cls.from_arrays(state["dimension"], state["ids"], np.load(directory / "vectors.npy"), state["metadata"],
+                               centroids=centroids, assignment=np.load(directory / "assignment.npy"),
+                               trained_size=state["trained_size"], nlist=state["nlist"], nprobe=state["nprobe"],
+                               train_threshold=state["train_threshold"], compact_ratio=state["compact_ratio"])
+
+    @classmethod
+    def from_arrays(cls, dimension: int, ids: Sequence[str], vectors: np.ndarray,
+                    metadata: Sequence[Optional[Dict[str, Any]]], centroids: Optional[np.ndarray] = None,
+                    assignment: Optional[np.ndarray] = None, trained_size: int = 0, version: int = 0,
+                    **params) -> "IVFIndex":
+        """
+        Build an index over existing unit vectors without copying them
+
+        A memory-mapped matrix stays mapped until the first insert grows
+        the index. Missing assignments are recomputed from the centroids.
+
+        Args:
+            dimension (int): Vector dimension
+            ids (Sequence[str]): Unique vector ids
+            vectors (np.ndarray): Unit vectors, one row per id
+            metadata (Sequence[Dict]): Metadata per vector
+            centroids (Optional[np.ndarray]): Trained centroids, None for an untrained index
+            assignment (Optional[np.ndarray]): Centroid of every row
+            trained_size (int): Vector count at the last training
+            version (int): Trainings so far (see the class docstring)
+            **params: IVFIndex constructor arguments
+        """
+        index = cls(dimension, **params)
+        index._size = len(ids)
+        if index._size:
+            index._vectors = vectors
+        index._deleted = np.zeros(index._size, dtype=bool)
+        index.ids = list(ids)
+        index.metadata = list(metadata)
+        index._rows = {vector_id: row for row, vector_id in enumerate(index.ids)}
+        index._trained_size = trained_size
+        index.version = version
+        index._metadata_index.extend(index.metadata)
+
+        index._assignment = np.full(index._size, -1, dtype=np.int32)
+        if centroids is not None:
+            index.centroids = centroids
+            if assignment is None and index._size:
+                assignment = assign_to_centroids(vectors, centroids)
+            if assignment is not None:
+                index._assignment[:] = assignment
+            index._lists = [[] for _ in range(len(centroids))]
+            for row, cluster in enumerate(index._assignment):
+                index._lists[int(cluster)].append(row)
+        return index
+
+    def _score(self, rows: np.ndarray, q: np.ndarray, top_k: int,
+               filter_fn: Optional[Callable[[Optional[Dict[str, Any]]], bool]]) -> List[Tuple[str, float, Optional[Dict[str, Any]]]]:
+        rows = rows[~self._deleted[rows]]
+        if filter_fn is not None:
+            rows = np.array([row for row in rows if filter_fn(self.metadata[row])], dtype=np.int64)
+        if not len(rows):
+            return []
+        scores = self._vectors[rows] @ q
+        best = top_k_indices(scores, top_k)
+        return [(self.ids[rows[i]], float(scores[i]), self.metadata[rows[i]]) for i in best]
+
+    def _filter_mask(self, filter_dict: Optional[Dict[str, Any]]) -> np.ndarray:
+        if self._metadata_index.can_evaluate(filter_dict):
+            return self._metadata_index.evaluate(filter_dict)
+        return np.array([matches_filter(item, filter_dict) for item in self.metadata[:self._size]], dtype=bool)
+
+    def _list_array(self, cluster: int) -> np.ndarray:
+        array = self._list_arrays.get(cluster)
+        if array is None:
+            array = self._list_arrays[cluster] = np.array(self._lists[cluster], dtype=np.int64)
+        return array
+
+    def _add_to_lists(self, rows: np.ndarray):
+        clusters = assign_to_centroids(self._vectors[rows], self.centroids)
+        self._assignment[rows] = clusters
+        for row, cluster in zip(rows, clusters):
+            self._lists[cluster].append(int(row))
+            self._list_arrays.pop(int(cluster), None)
+
+    def _tombstone(self, ids: Iterable[str]) -> int:
+        deleted = 0
+        for vector_id in ids:
+            row = self._rows.pop(vector_id, None)
+            if row is not None:
+                self._deleted[row] = True
+                self.metadata[row] = None
+                self._metadata_index.remove(row)
+                deleted += 1
+        return deleted
+
+    def _reserve(self, capacity: int):
+        """Grow the row arrays geometrically so appends are amortized O(1)."""
+        if capacity <= len(self._vectors):
+            return
+        new_capacity = max(capacity, 2 * len(self._vectors), 1024)
+        for name, fill in (("_vectors", 0.0), ("_deleted", True), ("_assignment", -1)):
+            old = getattr(self, name)
+            grown = np.full((new_capacity,) + old.shape[1:], fill, dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def _maybe_compact(self):
+        dead = self._size - len(self._rows)
+        if self._size and dead / self._size > self.compact_ratio:
+            self._compact()
+
+    def _compact(self):
+        """Drop tombstoned rows and renumber the lists."""
+        if len(self._rows) == self._size:
+            return
+        live = np.flatnonzero(~self._deleted[:self._size])
+        self._vectors = self._vectors[live].copy()
+        self._assignment = self._assignment[live].copy()
+        self._deleted = np.zeros(len(live), dtype=bool)
+        self.ids = [self.ids[row] for row in live]
+        self.metadata = [self.metadata[row] for row in live]
+        self._rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self._size = len(live)
+        self._metadata_index = MetadataIndex()
+        self._metadata_index.extend(self.metadata)
+        if self.trained:
+            self._lists = [[] for _ in range(len(self.centroids))]
+            for row, cluster in enumerate(self._assignment):
+                self._lists[int(cluster)].append(row)
+            self._list_arrays = {}
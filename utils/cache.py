@@ -0,0 +1,216 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from utils.singleflight import SingleFlight
+
+_MISSING = object()
+
+def make_cache_key(args: tuple, kwargs: dict) -> Hashable:
+    """
+    Build an exact, hashable cache key from call arguments
+
+    Unhashable containers (lists, dicts, sets) are converted to tagged
+    tuples, so keys compare by value and never collide the way
+    hash(str(args)) can. Every value carries its type, so 1, 1.0 and True
+    are different keys, and positional and keyword arguments are tagged
+    separately so no argument can pass for a keyword.
+
+    Args:
+        args (tuple): Positional arguments
+        kwargs (dict): Keyword arguments
+
+    Returns:
+        Hashable: Cache key
+    """
+    return ("args", _freeze(args), "kwargs", _freeze(kwargs))
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, (str, bytes, int, float, bool, type(None))):
+        return (type(value), value)
+    if isinstance(value, dict):
+        return ("dict", frozenset((_freeze(key), _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        # Lists and tuples of equal items are the same argument
+        return ("seq", tuple(_freeze(item) for item in value))
+    if isinstance(value, (set, frozenset)):
+        return ("set", frozenset(_freeze(item) for item in value))
+    hash(value)  # raise TypeError early for unsupported objects
+    return (type(value), value)
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """
+    Approximate memory footprint of a cached value in bytes
+
+    Args:
+        value: Value to measure
+
+    Returns:
+        int: Estimated size in bytes
+    """
+    size = sys.getsizeof(value)
+    if _depth > 3:
+        return size
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+        if items and all(isinstance(item, float) for item in items[:8]):
+            # Homogeneous float vectors (embeddings): avoid walking every element
+            size += len(items) * sys.getsizeof(0.0)
+        else:
+            size += sum(estimate_size(item, _depth + 1) for item in items)
+    return size
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with time-to-live and size limits.
+
+    Entries are kept in access order in an OrderedDict so lookups, inserts
+    and evictions are O(1). Expired entries are dropped lazily when they are
+    touched or reach the LRU end. Concurrent misses for the same key run the
+    loader once and share its result (single-flight).
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, max_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[float] = 300, sizeof: Callable[[Any], int] = estimate_size):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizeof = sizeof
+
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._flights = SingleFlight(name)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+        register_cache(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a cached value, or default if missing or expired."""
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+            if value is _MISSING:
+                self._stats["misses"] += 1
+                return default
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = _MISSING):
+        """Store a value, evicting least recently used entries over the limits."""
+        ttl = self.ttl_seconds if ttl_seconds is _MISSING else ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # Never cache a value larger than the whole cache
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            self._evict()
+
+    def get_or_compute(self, key: Hashable, loader: Callable[[], Any], ttl_seconds: Optional[float] = _MISSING) -> Any:
+        """
+        Get a cached value or compute it, coalescing concurrent misses
+
+        Args:
+            key (Hashable): Cache key
+            loader (Callable): Zero-argument function producing the value
+            ttl_seconds (Optional[float]): Override the cache TTL for this entry
+
+        Returns:
+            Any: Cached or freshly computed value
+        """
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+            if value is not _MISSING:
+                self._stats["hits"] += 1
+                return value
+            self._stats["misses"] += 1
+
+        def load():
+            # A previous flight may have filled the entry since the miss above
+            with self._lock:
+                value = self._lookup(key, time.monotonic())
+            if value is _MISSING:
+                value = loader()
+                self.set(key, value, ttl_seconds)
+            return value
+
+        return self._flights.do(key, load)
+
+    def invalidate(self, key: Hashable):
+        """Remove a single entry."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters and current size."""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "name": self.name,
+                **self._stats,
+                "coalesced": self._flights.get_stats()["coalesced"],
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: Hashable, now: float) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at, _ = entry
+        if expires_at is not None and now >= expires_at:
+            self._remove(key)
+            self._stats["expirations"] += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _remove(self, key: Hashable):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key, (_, expires_at, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            if expires_at is not None and time.monotonic() >= expires_at:
+                self._stats["expirations"] += 1
+            else:
+                self._stats["evictions"] += 1
+
+# All caches created in this process, for stats reporting
+_caches: Dict[str, TTLCache] = {}
+_caches_lock = threading.Lock()
+
+def register_cache(cache: TTLCache):
+    """Make a cache visible to get_all_cache_stats()."""
+    with _caches_lock:
+        _caches[cache.name] = cache
+
+def get_all_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Get stats for every cache in the process, keyed by cache name."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.get_stats() for cache in caches}
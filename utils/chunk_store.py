@@ -0,0 +1,183 @@
+import os
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# SQLite's default limit on bound parameters is 999 in older builds
+_GET_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    namespace TEXT NOT NULL,
+    id TEXT NOT NULL,
+    text BLOB NOT NULL,
+    PRIMARY KEY (namespace, id)
+) WITHOUT ROWID;
+"""
+
+class ChunkStore:
+    """
+    Chunk texts kept on local disk, keyed by namespace and vector ID.
+
+    Vector records then only carry IDs and the small fields used for
+    filtering; the text of the top-k matches is looked up here in one
+    batched read after a query. Texts are zlib-compressed in a SQLite file
+    that is memory-mapped for reads.
+    """
+
+    def __init__(self, path: Union[str, Path], compression_level: int = 6):
+        """
+        Args:
+            path (Union[str, Path]): SQLite file, created if missing
+            compression_level (int): zlib level for stored texts
+        """
+        self.path = Path(path)
+        self.compression_level = compression_level
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(os.getenv('CHUNK_STORE_MMAP_BYTES', str(256 * 1024 * 1024)))}")
+            self._local.conn = conn
+        yield conn
+
+    def put_many(self, namespace: Optional[str], items: Iterable[Tuple[str, str]]):
+        """
+        Store or replace the texts of several vectors
+
+        Args:
+            namespace (Optional[str]): Vector namespace
+            items (Iterable[Tuple[str, str]]): (vector_id, text) pairs
+        """
+        rows = [(namespace or "", vector_id, zlib.compress(text.encode('utf-8'), self.compression_level))
+                for vector_id, text in items]
+        if not rows:
+            return
+        with self._connection() as conn:
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany("INSERT OR REPLACE INTO chunks (namespace, id, text) VALUES (?, ?, ?)", rows)
+
+    def get_many(self, namespace: Optional[str], ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Texts of the given vectors; IDs without a stored text are left out
+
+        Args:
+            namespace (Optional[str]): Vector namespace
+            ids (Iterable[str]): Vector IDs
+
+        Returns:
+            Dict[str, str]: vector_id -> text
+        """
+        ids = list(dict.fromkeys(ids))
+        texts = {}
+        with self._connection() as conn:
+            for start in range(0, len(ids), _GET_BATCH):
+                batch = ids[start:start + _GET_BATCH]
+                placeholders = ", ".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT id, text FROM chunks WHERE namespace = ? AND id IN ({placeholders})",
+                    (namespace or "", *batch)
+                )
+                texts.update((vector_id, zlib.decompress(blob).decode('utf-8')) for vector_id, blob in rows)
+        return texts
+
+    def delete(self, namespace: Optional[str], ids: Iterable[str]):
+        """Forget the texts of the given vectors."""
+        rows = [(namespace or "", vector_id) for vector_id in ids]
+        with self._connection() as conn:
+            conn.executemany("DELETE FROM chunks WHERE namespace = ? AND id = ?", rows)
+
+    def delete_namespace(self, namespace: Optional[str]):
+        """Forget every text of a namespace."""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM chunks WHERE namespace = ?", (namespace or "",))
+
+    def clear(self):
+        """Forget every stored text."""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM chunks")
+
+    def count(self, namespace: Optional[str] = None) -> int:
+        """Number of stored texts, in one namespace or overall."""
+        with self._connection() as conn:
+            if namespace is None:
+                return conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM chunks WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+    def detach_texts(self, vectors: List[Dict[str, Any]], namespace: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Move the 'text' metadata of vectors about to be upserted into the store
+
+        Args:
+            vectors (List[Dict]): Vectors with 'id', 'values' and 'metadata' keys
+            namespace (Optional[str]): Namespace they are upserted into
+
+        Returns:
+            List[Dict]: The vectors with 'text' removed from their metadata (copies; the input is left as is)
+        """
+        texts, stripped = [], []
+        for vector in vectors:
+            metadata = vector.get("metadata") or {}
+            if "text" in metadata:
+                texts.append((vector["id"], metadata["text"]))
+                vector = dict(vector, metadata={k: v for k, v in metadata.items() if k != "text"})
+            stripped.append(vector)
+        # Texts go in first, so a query never sees a vector whose text is missing
+        self.put_many(namespace, texts)
+        return stripped
+
+    def hydrate(self, results: Any, namespace: Optional[str]) -> Any:
+        """
+        Fill in metadata['text'] of query matches from the store
+
+        Matches whose metadata already holds the text (vectors written
+        before the store was enabled) are left alone; those with only the
+        bulk scripts' old 'chunk_text' preview fall back to it.
+
+        Args:
+            results: Query response with a 'matches' list, as returned by Pinecone
+            namespace (Optional[str]): Namespace that was queried
+
+        Returns:
+            The same response, with texts filled in
+        """
+        matches = results["matches"] if results else []
+        missing = [match["id"] for match in matches if "text" not in (match["metadata"] or {})]
+        if not missing:
+            return results
+        texts = self.get_many(namespace, missing)
+        for match in matches:
+            metadata = match["metadata"] or {}
+            if "text" in metadata:
+                continue
+            text = texts.get(match["id"], metadata.get("chunk_text"))
+            if text is not None:
+                # A copy, so a client returning its stored metadata keeps it text-free
+                match["metadata"] = dict(metadata, text=text)
+        return results
+
+def open_chunk_store(default_path: Union[str, Path]) -> Optional[ChunkStore]:
+    """
+    The chunk store configured by CHUNK_STORE and CHUNK_STORE_PATH
+
+    Args:
+        default_path (Union[str, Path]): File used when CHUNK_STORE_PATH is not set
+
+    Returns:
+        Optional[ChunkStore]: None if CHUNK_STORE=false, so texts stay in vector metadata
+    """
+    if os.getenv("CHUNK_STORE", "true").lower() != "true":
+        return None
+    return ChunkStore(os.getenv("CHUNK_STORE_PATH") or default_path)
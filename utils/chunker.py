@@ -1,5 +1,6 @@
+import bisect
 import tiktoken
-from typing import List
+from typing import Any, Dict, List
 
 def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
     """
@@ -13,11 +14,27 @@ def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> L
     Returns:
         List[str]: List of text chunks
     """
+    return [chunk['text'] for chunk in chunk_text_with_offsets(text, chunk_size, chunk_overlap)]
+
+def chunk_text_with_offsets(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+    """
+    Split text into token chunks and record where each chunk sits in the text
+    
+    Args:
+        text (str): Input text to chunk
+        chunk_size (int): Maximum tokens per chunk
+        chunk_overlap (int): Number of overlapping tokens between chunks
+        
+    Returns:
+        List[Dict[str, Any]]: Chunks as ``{'text', 'char_start', 'char_end'}``
+        where ``text == source[char_start:char_end]``
+    """
     # Initialize tokenizer
     encoding = tiktoken.get_encoding("cl100k_base")  # GPT-4 tokenizer
     
-    # Tokenize the text
+    # Tokenize the text and map every token back to its character offset
     tokens = encoding.encode(text)
+    decoded_text, token_offsets = encoding.decode_with_offsets(tokens)
     
     chunks = []
     start = 0
@@ -26,17 +43,20 @@ def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> L
         # Calculate end position
         end = start + chunk_size
         
-        # Get chunk tokens
-        chunk_tokens = tokens[start:end]
-        
-        # Decode back to text
-        chunk_text = encoding.decode(chunk_tokens)
+        # Slice the source text between the first and the next token offsets
+        char_start = token_offsets[start]
+        char_end = token_offsets[end] if end < len(tokens) else len(decoded_text)
+        chunk = decoded_text[char_start:char_end]
         
-        # Clean up the chunk
-        chunk_text = chunk_text.strip()
-        
-        if chunk_text:
-            chunks.append(chunk_text)
+        # Clean up the chunk while keeping offsets aligned
+        stripped = chunk.strip()
+        if stripped:
+            char_start += len(chunk) - len(chunk.lstrip())
+            chunks.append({
+                'text': stripped,
+                'char_start': char_start,
+                'char_end': char_start + len(stripped)
+            })
         
         # Move start position with overlap
         start = end - chunk_overlap
@@ -47,6 +67,58 @@ def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> L
     
     return chunks
 
+def assign_pages_to_chunks(chunks: List[Dict[str, Any]], pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Annotate offset chunks with the pages they span
+    
+    Args:
+        chunks (List[Dict[str, Any]]): Chunks from ``chunk_text_with_offsets``
+        pages (List[Dict[str, Any]]): Page spans from ``parse_file_with_pages``
+        
+    Returns:
+        List[Dict[str, Any]]: The same chunks with ``page_start`` and ``page_end`` set,
+        unchanged if the document has no pages
+    """
+    if not pages:
+        return chunks
+    
+    page_starts = [page['char_start'] for page in pages]
+    
+    def page_at(offset: int) -> int:
+        index = max(bisect.bisect_right(page_starts, offset) - 1, 0)
+        return pages[index]['page_number']
+    
+    for chunk in chunks:
+        chunk['page_start'] = page_at(chunk['char_start'])
+        chunk['page_end'] = page_at(max(chunk['char_end'] - 1, chunk['char_start']))
+    
+    return chunks
+
+def format_page_reference(metadata: Dict[str, Any]) -> str:
+    """
+    Render a human readable location for a chunk's metadata
+    
+    Args:
+        metadata (Dict[str, Any]): Vector metadata
+        
+    Returns:
+        str: "Page N", "Pages N-M", "Chunk N" or "Unknown location"
+    """
+    page_start = metadata.get('page_start')
+    page_end = metadata.get('page_end', page_start)
+    
+    if page_start is not None:
+        page_start, page_end = int(page_start), int(page_end)
+        if page_start == page_end:
+            return f"Page {page_start}"
+        return f"Pages {page_start}-{page_end}"
+    
+    chunk_index = metadata.get('chunk_index')
+    if chunk_index is not None:
+        return f"Chunk {chunk_index}"
+    
+    return "Unknown location"
+
 def chunk_text_by_sentences(text: str, max_chunk_size: int = 1000) -> List[str]:
     """
     Split text into chunks by sentences, respecting token limits
@@ -1,9 +1,14 @@
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage
 from utils.embeddings import get_embeddings
 from utils.file_parser import extract_sections
+from utils.cache import TTLCache
+from utils.singleflight import SingleFlight, normalize_query
+from utils.rate_limiter import get_scheduler, estimate_tokens
+from utils.fake_backends import fake_backend_enabled, FakeChatModel
+from utils.usage import record_usage, response_token_usage
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -28,8 +33,9 @@ class CommandRouter:
         """
         Initialize command router
         """
-        self.llm = ChatOpenAI(
-            model=os.getenv("OPENAI_MODEL", "gpt-4"),
+        self.model_name = os.getenv("OPENAI_MODEL", "gpt-4")
+        self.llm = FakeChatModel() if fake_backend_enabled("llm") else ChatOpenAI(
+            model=self.model_name,
             temperature=0.7,
             openai_api_key=os.getenv("OPENAI_API_KEY"),
             openai_api_base=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
@@ -43,33 +49,102 @@ class CommandRouter:
             '/clear': self.clear_chat,
             '/help': self.show_help
         }
+        
+        # Commands whose answers only depend on the indexed documents
+        self.cacheable_commands = {'/summarize', '/list-sections', '/translate'}
+        self.result_cache = TTLCache("command_results", max_entries=256,
+                                     ttl_seconds=float(os.getenv("COMMAND_CACHE_TTL", "600")))
+        
+        # Identical commands issued at the same time share one execution
+        self.flights = SingleFlight("commands")
     
-    def handle_command(self, command_input: str, pinecone_client) -> str:
+    def _invoke_llm(self, prompt: str):
+        """
+        Call the LLM under the shared OpenAI rate limit and count its tokens
+        
+        Args:
+            prompt (str): Prompt text
+            
+        Returns:
+            AIMessage: LLM response
+        """
+        response = get_scheduler("openai").call(
+            lambda: self.llm.invoke([HumanMessage(content=prompt)]),
+            tokens=estimate_tokens(prompt)
+        )
+        usage = response_token_usage(response) or (estimate_tokens(prompt), estimate_tokens(response.content))
+        record_usage("llm", self.model_name, *usage)
+        return response
+    
+    def handle_command(self, command_input: str, pinecone_client, session_id: Optional[str] = None) -> str:
         """
         Handle command input and route to appropriate handler
         
         Args:
             command_input (str): Command string from user
             pinecone_client: Pinecone client instance
+            session_id (Optional[str]): Session the command was issued in
             
         Returns:
             str: Command response
         """
         try:
-            # Parse command and arguments
-            parts = command_input.strip().split()
-            command = parts[0].lower()
-            args = parts[1:] if len(parts) > 1 else []
-            
-            # Check if command exists
-            if command in self.commands:
-                return self.commands[command](args, pinecone_client)
-            else:
-                return f"Unknown command: {command}. Type /help for available commands."
-                
+            # Only the command name is case-insensitive; arguments (e.g. a translation
+            # target or section title) are passed through as typed
+            parts = command_input.split()
+            key = ("command", session_id or "", normalize_query(parts[0]) if parts else "", tuple(parts[1:]))
+            return self.flights.do(key, lambda: self._dispatch(command_input, pinecone_client))
         except Exception as e:
             return f"Error executing command: {str(e)}"
     
+    def _dispatch(self, command_input: str, pinecone_client) -> str:
+        """
+        Parse a command and run its handler
+        
+        Args:
+            command_input (str): Command string from user
+            pinecone_client: Pinecone client instance
+            
+        Returns:
+            str: Command response
+        """
+        # Parse command and arguments
+        parts = command_input.strip().split()
+        command = parts[0].lower()
+        args = parts[1:] if len(parts) > 1 else []
+        
+        # Check if command exists
+        if command in self.commands:
+            if command in self.cacheable_commands:
+                return self._run_cached(command, args, pinecone_client)
+            return self.commands[command](args, pinecone_client)
+        else:
+            return f"Unknown command: {command}. Type /help for available commands."
+    
+    def _run_cached(self, command: str, args: List[str], pinecone_client) -> str:
+        """
+        Run a document command, reusing the answer while the index is unchanged
+        
+        Args:
+            command (str): Command name
+            args (List[str]): Command arguments
+            pinecone_client: Pinecone client instance
+            
+        Returns:
+            str: Command response
+        """
+        # The vector count changes whenever documents are added or removed
+        stats = pinecone_client.get_index_stats()
+        cache_key = (command, tuple(args), stats.get('total_vector_count', 0))
+        result = self.result_cache.get_or_compute(
+            cache_key, lambda: self.commands[command](args, pinecone_client)
+        )
+        
+        # Handlers report failures as text; don't keep those around
+        if result.startswith("Error"):
+            self.result_cache.invalidate(cache_key)
+        return result
+    
     def summarize_documents(self, args: List[str], pinecone_client) -> str:
         """
         Summarize all uploaded documents
@@ -126,7 +201,7 @@ Content:
 Summary:"""
             
             # Get summary from LLM
-            response = self.llm.invoke([HumanMessage(content=prompt)])
+            response = self._invoke_llm(prompt)
             
             return f"📄 **Document Summary**\n\n{response.content}\n\n*Based on {len(filenames)} document(s): {', '.join(filenames)}*"
             
@@ -270,7 +345,7 @@ Summary:"""
 Translation:"""
             
             # Get translation from LLM
-            response = self.llm.invoke([HumanMessage(content=prompt)])
+            response = self._invoke_llm(prompt)
             
             return f"🌐 **Translation to {full_language}**\n\n{response.content}\n\n*Note: This is a sample translation of the document content.*"
             
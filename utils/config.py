@@ -1,8 +1,10 @@
 import os
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pathlib import Path
 from pydantic import BaseModel, Field, validator
 
+from utils.federated_search import KNOWLEDGE_BASE_NAMESPACE, SESSION_NAMESPACE
+
 class OpenAIConfig(BaseModel):
     """Configuration for OpenAI API settings."""
     api_key: str = Field(..., description="OpenAI API key")
@@ -61,7 +63,7 @@ class FileUploadConfig(BaseModel):
     """Configuration for file upload settings."""
     max_size_mb: int = Field(default=100, gt=0, description="Maximum file size in MB")
     allowed_extensions: List[str] = Field(
-        default=['.pdf', '.txt', '.docx', '.md'],
+        default=['.pdf', '.txt', '.docx', '.md', '.html', '.htm', '.csv'],
         description="Allowed file extensions"
     )
     max_files_per_session: int = Field(default=100, gt=0, description="Maximum files per session")
@@ -100,6 +102,53 @@ class RAGConfig(BaseModel):
         description="Maximum number of context chunks for generation"
     )
     enable_reranking: bool = Field(default=False, description="Enable result reranking")
+    retrieval_timeout: float = Field(
+        default=10.0, gt=0,
+        description="Seconds allowed for query embedding and vector search"
+    )
+    generation_timeout: float = Field(
+        default=60.0, gt=0,
+        description="Seconds allowed for LLM generation before falling back to excerpts"
+    )
+    agent_timeout: float = Field(
+        default=45.0, gt=0,
+        description="Seconds allowed for the LangChain agent before falling back to standard RAG"
+    )
+    search_namespaces: List[str] = Field(
+        default=[SESSION_NAMESPACE, KNOWLEDGE_BASE_NAMESPACE],
+        description="Namespaces searched for every query; 'session' is the current session"
+    )
+    namespace_quotas: Dict[str, int] = Field(
+        default={KNOWLEDGE_BASE_NAMESPACE: 3},
+        description="Maximum context chunks taken from each namespace"
+    )
+    query_routing: bool = Field(
+        default=True,
+        description="Filter searches on metadata values (brand, doc type) recognized in the query"
+    )
+    routing_min_matches: int = Field(
+        default=2, ge=0,
+        description="Routed searches with fewer matches are retried without the filter"
+    )
+    record_traces: bool = Field(
+        default=False,
+        description="Append anonymized query traces to data/query_traces.jsonl for replay"
+    )
+    deduplicate: bool = Field(
+        default=True,
+        description="Store documents that duplicate one already in the namespace as aliases instead of embedding them"
+    )
+    dedup_threshold: float = Field(
+        default=0.85, ge=0.0, le=1.0,
+        description="Estimated shingle similarity above which a document counts as a near duplicate"
+    )
+    
+    @validator('search_namespaces')
+    def validate_search_namespaces(cls, v):
+        namespaces = [namespace.strip() for namespace in v if namespace.strip()]
+        if not namespaces:
+            raise ValueError('At least one search namespace is required')
+        return namespaces
 
 class AppConfig(BaseModel):
     """Main application configuration."""
@@ -164,7 +213,7 @@ def load_config() -> AppConfig:
     # File upload configuration
     file_upload_config = FileUploadConfig(
         max_size_mb=int(os.getenv("MAX_FILE_SIZE_MB", "100")),
-        allowed_extensions=os.getenv("ALLOWED_EXTENSIONS", ".pdf,.txt,.docx,.md").split(","),
+        allowed_extensions=os.getenv("ALLOWED_EXTENSIONS", ".pdf,.txt,.docx,.md,.html,.htm,.csv").split(","),
         max_files_per_session=int(os.getenv("MAX_FILES_PER_SESSION", "100"))
     )
     
@@ -180,7 +229,22 @@ def load_config() -> AppConfig:
         top_k=int(os.getenv("RAG_TOP_K", "5")),
         similarity_threshold=float(os.getenv("RAG_SIMILARITY_THRESHOLD", "0.7")),
         max_context_chunks=int(os.getenv("RAG_MAX_CONTEXT_CHUNKS", "5")),
-        enable_reranking=os.getenv("RAG_ENABLE_RERANKING", "false").lower() == "true"
+        enable_reranking=os.getenv("RAG_ENABLE_RERANKING", "false").lower() == "true",
+        retrieval_timeout=float(os.getenv("RAG_RETRIEVAL_TIMEOUT", "10")),
+        generation_timeout=float(os.getenv("RAG_GENERATION_TIMEOUT", "60")),
+        agent_timeout=float(os.getenv("RAG_AGENT_TIMEOUT", "45")),
+        search_namespaces=os.getenv("RAG_SEARCH_NAMESPACES", f"{SESSION_NAMESPACE},{KNOWLEDGE_BASE_NAMESPACE}").split(","),
+        namespace_quotas={
+            namespace.strip(): int(quota)
+            for namespace, quota in (
+                item.split(":") for item in os.getenv("RAG_NAMESPACE_QUOTAS", f"{KNOWLEDGE_BASE_NAMESPACE}:3").split(",") if item.strip()
+            )
+        },
+        query_routing=os.getenv("RAG_QUERY_ROUTING", "true").lower() == "true",
+        routing_min_matches=int(os.getenv("RAG_ROUTING_MIN_MATCHES", "2")),
+        record_traces=os.getenv("RAG_RECORD_TRACES", "false").lower() == "true",
+        deduplicate=os.getenv("RAG_DEDUPLICATE", "true").lower() == "true",
+        dedup_threshold=float(os.getenv("RAG_DEDUP_THRESHOLD", "0.85"))
     )
     
     # Main app configuration
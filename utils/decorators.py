@@ -4,6 +4,8 @@ import logging
 import streamlit as st
 from typing import Callable, Any, Optional
 from datetime import datetime
+from utils.cache import TTLCache, make_cache_key
+from utils.rate_limiter import RateLimitScheduler, get_retry_after, request_priority
 
 # Configure logging
 logging.basicConfig(
@@ -46,38 +48,28 @@ def log_execution_time(func: Callable) -> Callable:
             raise
     return wrapper
 
-def cache_with_ttl(ttl_seconds: int = 300):
-    """Decorator to cache function results with time-to-live."""
+def cache_with_ttl(ttl_seconds: int = 300, max_entries: int = 1024, max_bytes: Optional[int] = None):
+    """
+    Decorator to cache function results with time-to-live.
+    
+    Backed by a bounded, thread-safe LRU cache; concurrent calls with the same
+    arguments run the function once. The cache is exposed as ``wrapper.cache``
+    for stats and invalidation.
+    """
     def decorator(func: Callable) -> Callable:
-        cache = {}
+        cache = TTLCache(f"{func.__module__}.{func.__qualname__}", max_entries=max_entries,
+                         max_bytes=max_bytes, ttl_seconds=ttl_seconds)
         
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            # Create cache key from function name, args, and kwargs
-            cache_key = f"{func.__name__}_{hash(str(args) + str(sorted(kwargs.items())))}"
-            current_time = time.time()
-            
-            # Check if cached result exists and is still valid
-            if cache_key in cache:
-                cached_result, cached_time = cache[cache_key]
-                if current_time - cached_time < ttl_seconds:
-                    logger.debug(f"Cache hit for {func.__name__}")
-                    return cached_result
-            
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            cache[cache_key] = (result, current_time)
-            logger.debug(f"Cache miss for {func.__name__}, result cached")
-            
-            # Clean up old cache entries
-            expired_keys = [
-                key for key, (_, cached_time) in cache.items()
-                if current_time - cached_time >= ttl_seconds
-            ]
-            for key in expired_keys:
-                del cache[key]
-            
-            return result
+            try:
+                cache_key = make_cache_key(args, kwargs)
+            except TypeError:
+                # Arguments that cannot be compared by value are never cached
+                return func(*args, **kwargs)
+            return cache.get_or_compute(cache_key, lambda: func(*args, **kwargs))
+        
+        wrapper.cache = cache
         return wrapper
     return decorator
 
@@ -96,11 +88,13 @@ def retry_on_failure(max_retries: int = 3, delay: float = 1.0, backoff: float =
                     last_exception = e
                     
                     if attempt < max_retries:
+                        # Honor a server-provided Retry-After if it asks for longer
+                        wait = max(current_delay, get_retry_after(e) or 0.0)
                         logger.warning(
                             f"Attempt {attempt + 1} failed for {func.__name__}: {str(e)}. "
-                            f"Retrying in {current_delay:.1f} seconds..."
+                            f"Retrying in {wait:.1f} seconds..."
                         )
-                        time.sleep(current_delay)
+                        time.sleep(wait)
                         current_delay *= backoff
                     else:
                         logger.error(
@@ -203,28 +197,39 @@ def log_user_action(action_type: Optional[str] = None, session_id: Optional[str]
         return wrapper
     return decorator
 
-def rate_limit(calls_per_minute: int = 60):
-    """Decorator to rate limit function calls."""
+def rate_limit(calls_per_minute: int = 60, scheduler: Optional[RateLimitScheduler] = None,
+               timeout: Optional[float] = None):
+    """Decorator to rate limit function calls.
+    
+    Calls over the limit wait for capacity instead of failing. Pass a shared
+    scheduler (see utils.rate_limiter.get_scheduler) to share the limit
+    across functions; otherwise each decorated function gets its own.
+    """
     def decorator(func: Callable) -> Callable:
-        call_times = []
+        limiter = scheduler or RateLimitScheduler(func.__name__, calls_per_minute)
         
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            current_time = time.time()
-            
-            # Remove calls older than 1 minute
-            call_times[:] = [t for t in call_times if current_time - t < 60]
-            
-            # Check if rate limit exceeded
-            if len(call_times) >= calls_per_minute:
-                raise Exception(
-                    f"Rate limit exceeded: {calls_per_minute} calls per minute for {func.__name__}"
-                )
-            
-            # Record this call
-            call_times.append(current_time)
-            
+            waited = limiter.acquire(timeout=timeout)
+            if waited > 0.01:
+                logger.debug(f"{func.__name__} waited {waited:.2f} seconds for rate limit")
             return func(*args, **kwargs)
+        
+        wrapper.rate_limiter = limiter
+        return wrapper
+    return decorator
+
+def with_priority(priority: int):
+    """Decorator to schedule all rate-limited API calls made by a function at a priority.
+    
+    Use PRIORITY_INTERACTIVE from utils.rate_limiter for user-facing calls and
+    PRIORITY_BULK for ingestion jobs.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with request_priority(priority):
+                return func(*args, **kwargs)
         return wrapper
     return decorator
 
@@ -252,7 +257,7 @@ def is_valid_file_size(value: Any, max_size_mb: int = 10) -> bool:
 def is_valid_file_extension(value: Any, allowed_extensions: list = None) -> bool:
     """Validate file extension is allowed."""
     if allowed_extensions is None:
-        allowed_extensions = ['.pdf', '.txt', '.docx', '.md']
+        allowed_extensions = ['.pdf', '.txt', '.docx', '.md', '.html', '.htm', '.csv']
     
     try:
         filename = getattr(value, 'name', str(value))
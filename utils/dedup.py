@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single writer process only
+    fcntl = None
+
+# Words per shingle; five keeps boilerplate sentences from making unrelated manuals look alike
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+DEFAULT_THRESHOLD = 0.85
+
+# Universal hashing h(x) = (a*x + b) mod p over 32-bit shingle hashes; products stay below 2^63
+_PRIME = (1 << 31) - 1
+_MAX_HASH = np.uint64(_PRIME)
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace, so re-wrapped copies compare equal."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def content_hash(text: str) -> str:
+    """SHA-256 of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """Distinct 32-bit hashes of the text's word ``size``-grams."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64)
+
+class MinHasher:
+    """MinHash signatures whose agreement estimates the Jaccard similarity of shingle sets."""
+
+    def __init__(self, num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, _PRIME, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, _PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingle_hashes(text, self.shingle_size) % _MAX_HASH
+        if not len(hashes):
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        signature = np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        # Blocks bound the (num_perm x shingles) intermediate for long documents
+        for start in range(0, len(hashes), 4096):
+            block = hashes[start:start + 4096]
+            permuted = (np.outer(self.a, block) + self.b[:, None]) % _MAX_HASH
+            signature = np.minimum(signature, permuted.min(axis=1))
+        return signature
+
+def estimate_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return float(np.mean(first == second))
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    (bands, rows) splitting a signature so pairs near ``threshold`` collide
+
+    Two documents share a bucket in at least one band with probability
+    1 - (1 - s^rows)^bands, an S-curve rising around (1/bands)^(1/rows).
+    The steepest split whose midpoint is still at or below the threshold
+    is used, favouring recall; candidates are verified on the full
+    signature anyway.
+    """
+    splits = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [split for split in splits if (1 / split[0]) ** (1 / split[1]) <= threshold]
+    if not below:
+        return splits[0]
+    return max(below, key=lambda split: (1 / split[0]) ** (1 / split[1]))
+
+class DuplicateIndex:
+    """
+    Exact and near-duplicate lookup over the documents of one namespace.
+
+    Documents are keyed by name. Exact copies are found by content hash
+    and near copies (re-exported manuals, generated variants) by MinHash
+    with LSH banding. A duplicate is stored as an alias of the document it
+    copies instead of being embedded again. Persisted as JSON when a path
+    is given; every change reloads, edits and saves the file under a file
+    lock, so processes sharing it cannot lose each other's documents.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, threshold: Optional[float] = None,
+                 hasher: Optional[MinHasher] = None):
+        """
+        Args:
+            path (Optional[Union[str, Path]]): JSON file to load from and save to, in memory only if None
+            threshold (Optional[float]): Estimated Jaccard similarity counted as a duplicate, defaults to RAG_DEDUP_THRESHOLD
+            hasher (Optional[MinHasher]): Signature function, shared between indexes
+        """
+        self.path = Path(path) if path else None
+        self.threshold = threshold if threshold is not None else float(os.getenv("RAG_DEDUP_THRESHOLD", str(DEFAULT_THRESHOLD)))
+        self.hasher = hasher or MinHasher()
+        self.bands, self.rows = lsh_bands(self.hasher.num_perm, self.threshold)
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self._hashes: Dict[str, str] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._version: Optional[Tuple[int, int]] = None
+        self._refresh()
+
+    def _band_keys(self, signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def _index(self, name: str, digest: str, signature: np.ndarray):
+        self._hashes.setdefault(digest, name)
+        self._signatures[name] = signature
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(name)
+
+    def find(self, name: str, text: str) -> Optional[Dict[str, Any]]:
+        """
+        The stored document ``text`` duplicates, if any
+
+        An unchanged copy of a stored document under the same name is a
+        duplicate; a changed version of it is not, so updates go through.
+
+        Returns:
+            Optional[Dict[str, Any]]: {"duplicate_of", "similarity", "exact"}, or None
+        """
+        digest = content_hash(text)
+        with self._lock:
+            self._refresh()
+            original = self._hashes.get(digest)
+            if original:
+                return {"duplicate_of": original, "similarity": 1.0, "exact": True}
+
+            signature = self.hasher.signature(text)
+            candidates = {candidate for key in self._band_keys(signature)
+                          for candidate in self._buckets.get(key, ()) if candidate != name}
+            best, best_similarity = None, 0.0
+            for candidate in candidates:
+                similarity = estimate_similarity(signature, self._signatures[candidate])
+                if similarity > best_similarity:
+                    best, best_similarity = candidate, similarity
+            if best and best_similarity >= self.threshold:
+                return {"duplicate_of": best, "similarity": round(best_similarity, 3), "exact": False}
+        return None
+
+    def register(self, name: str, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Check a document and record it in one locked step
+
+        A duplicate is recorded as an alias of the document it copies,
+        anything else as a new document, so of two copies registered at
+        the same time (from any process) only one comes out as new.
+
+        Returns:
+            Optional[Dict[str, Any]]: As find(); None when the document was added
+        """
+        with self._locked():
+            duplicate = self.find(name, text)
+            if duplicate:
+                self.alias(name, duplicate["duplicate_of"], duplicate["similarity"])
+            else:
+                self.add(name, text)
+            return duplicate
+
+    def add(self, name: str, text: str):
+        """Register a stored document so later copies of it are found."""
+        digest = content_hash(text)
+        signature = self.hasher.signature(text)
+        with self._locked():
+            self.remove(name, save=False)
+            self.documents[name] = {"hash": digest, "signature": signature.tolist()}
+            self._index(name, digest, signature)
+            self.save()
+
+    def alias(self, name: str, duplicate_of: str, similarity: float):
+        """Record that ``name`` was not stored because it duplicates ``duplicate_of``."""
+        with self._locked():
+            if name != duplicate_of:
+                self.remove(name, save=False)
+                self.documents[name] = {"duplicate_of": duplicate_of, "similarity": similarity}
+            self.save()
+
+    def remove(self, name: str, save: bool = True):
+        """Forget a document, e.g. after its vectors were deleted."""
+        with self._locked():
+            entry = self.documents.pop(name, None)
+            if entry and "hash" in entry:
+                if self._hashes.get(entry["hash"]) == name:
+                    del self._hashes[entry["hash"]]
+                signature = self._signatures.pop(name)
+                for key in self._band_keys(signature):
+                    bucket = self._buckets.get(key, [])
+                    if name in bucket:
+                        bucket.remove(name)
+            if save:
+                self.save()
+
+    def aliases(self) -> Dict[str, str]:
+        """Skipped duplicate -> stored document."""
+        with self._lock:
+            self._refresh()
+            return {name: entry["duplicate_of"] for name, entry in self.documents.items() if "duplicate_of" in entry}
+
+    def save(self):
+        if not self.path:
+            return
+        with self._locked():
+            temp = self.path.with_name(f".{self.path.name}.tmp")
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump({"num_perm": self.hasher.num_perm, "documents": self.documents}, f)
+            os.replace(temp, self.path)
+            self._version = self._file_version()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the thread lock and the file lock (re-entrant), with the file reloaded."""
+        with self._lock:
+            if self._lock_depth or not self.path:
+                self._lock_depth += 1
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path.with_name(f".{self.path.name}.lock"), 'a') as handle:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                self._lock_depth = 1
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    self._lock_depth = 0
+                    if fcntl is not None:
+                        fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _file_version(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _refresh(self):
+        """Reload the file if another process (an upload script, the pipeline) saved it since."""
+        if not self.path:
+            return
+        version = self._file_version()
+        if version is None or version == self._version:
+            return
+        self.documents.clear()
+        self._hashes.clear()
+        self._signatures.clear()
+        self._buckets.clear()
+        self._load()
+        self._version = version
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored.get("num_perm") != self.hasher.num_perm:
+            return
+        for name, entry in stored.get("documents", {}).items():
+            self.documents[name] = entry
+            if "hash" in entry:
+                self._index(name, entry["hash"], np.array(entry["signature"], dtype=np.uint64))
+
+class DuplicateRegistry:
+    """One persistent DuplicateIndex per namespace under a directory."""
+
+    def __init__(self, directory: Union[str, Path], threshold: Optional[float] = None):
+        self.directory = Path(directory)
+        self.threshold = threshold
+        self.hasher = MinHasher()
+        self._indexes: Dict[str, DuplicateIndex] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, namespace: str) -> Path:
+        return self.directory / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', namespace)}.json"
+
+    def get(self, namespace: str) -> DuplicateIndex:
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None:
+                index = DuplicateIndex(self._path(namespace), self.threshold, self.hasher)
+                self._indexes[namespace] = index
+            return index
+
+    def drop(self, namespace: str):
+        """Forget a namespace whose vectors were deleted."""
+        with self._lock:
+            self._indexes.pop(namespace, None)
+            self._path(namespace).unlink(missing_ok=True)
@@ -0,0 +1,134 @@
+import io
+import mmap
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, Optional, Union
+
+class DocumentSource:
+    """
+    A document to parse, independent of where its bytes live.
+
+    Wraps a local path, an in-memory buffer (bytes, bytearray, memoryview) or
+    a file-like upload (e.g. a Streamlit ``UploadedFile``) behind one interface
+    so parsers never copy the payload just to look at it: local files are
+    memory-mapped and uploads expose their internal buffer directly.
+    """
+
+    def __init__(self, name: str, path: Optional[Union[str, Path]] = None,
+                 data: Optional[Union[bytes, bytearray, memoryview]] = None,
+                 fileobj: Optional[BinaryIO] = None):
+        if sum(x is not None for x in (path, data, fileobj)) != 1:
+            raise ValueError("DocumentSource needs exactly one of path, data or fileobj")
+
+        self.name = name
+        self.path = Path(path) if path is not None else None
+        self.data = data
+        self.fileobj = fileobj
+
+    @classmethod
+    def from_path(cls, path: Union[str, Path]) -> "DocumentSource":
+        """Create a source backed by a local file."""
+        return cls(name=Path(path).name, path=path)
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview], name: str) -> "DocumentSource":
+        """Create a source backed by an in-memory buffer."""
+        return cls(name=name, data=data)
+
+    @classmethod
+    def from_upload(cls, uploaded_file: Any) -> "DocumentSource":
+        """Create a source backed by a file-like upload object with a ``name``."""
+        return cls(name=getattr(uploaded_file, 'name', 'upload'), fileobj=uploaded_file)
+
+    @classmethod
+    def coerce(cls, source: Any, name: Optional[str] = None) -> "DocumentSource":
+        """
+        Turn any supported input into a DocumentSource
+
+        Args:
+            source: DocumentSource, path (str or Path), bytes-like object or
+                file-like object with ``read()``
+            name (Optional[str]): File name, required for raw buffers
+
+        Returns:
+            DocumentSource: Wrapped source
+        """
+        if isinstance(source, DocumentSource):
+            return source
+        if isinstance(source, (str, os.PathLike)):
+            return cls.from_path(source)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            if not name:
+                raise ValueError("A file name is required to parse a raw buffer")
+            return cls.from_bytes(source, name)
+        if hasattr(source, 'read'):
+            if name:
+                return cls(name=name, fileobj=source)
+            return cls.from_upload(source)
+        raise TypeError(f"Unsupported document source: {type(source).__name__}")
+
+    @property
+    def extension(self) -> str:
+        """Lower-case file extension without the leading dot."""
+        return self.name.lower().split('.')[-1] if '.' in self.name else ''
+
+    @property
+    def size(self) -> int:
+        """Size of the document in bytes."""
+        if self.path is not None:
+            return self.path.stat().st_size
+        if self.data is not None:
+            return memoryview(self.data).nbytes
+        if hasattr(self.fileobj, 'getbuffer'):
+            return self.fileobj.getbuffer().nbytes
+        return getattr(self.fileobj, 'size', 0)
+
+    @contextmanager
+    def buffer(self) -> Iterator[memoryview]:
+        """
+        Expose the document bytes as a read-only memoryview
+
+        Local files are memory-mapped and pages are loaded on demand;
+        ``io.BytesIO`` uploads share their internal buffer. The view is only
+        valid inside the ``with`` block.
+        """
+        if self.path is not None:
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    yield memoryview(b'')
+                    return
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                view = memoryview(mapped)
+                try:
+                    yield view
+                finally:
+                    view.release()
+                    mapped.close()
+        elif self.data is not None:
+            yield memoryview(self.data).cast('B')
+        elif hasattr(self.fileobj, 'getbuffer'):
+            view = self.fileobj.getbuffer()
+            try:
+                yield view
+            finally:
+                view.release()
+        else:
+            self.fileobj.seek(0)
+            yield memoryview(self.fileobj.read())
+
+    @contextmanager
+    def open(self) -> Iterator[BinaryIO]:
+        """Open the document as a binary file object positioned at the start."""
+        if self.path is not None:
+            with open(self.path, 'rb') as f:
+                yield f
+        elif self.data is not None:
+            yield io.BytesIO(self.data)
+        else:
+            self.fileobj.seek(0)
+            yield self.fileobj
+
+    def __repr__(self) -> str:
+        kind = 'path' if self.path is not None else 'data' if self.data is not None else 'fileobj'
+        return f"DocumentSource(name={self.name!r}, {kind})"
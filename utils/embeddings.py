@@ -1,21 +1,64 @@
-import openai
 import os
-from typing import List
+import threading
+from typing import Iterable, List, Optional
 import numpy as np
 from dotenv import load_dotenv
+from utils.cache import TTLCache
+from utils.rate_limiter import get_scheduler, estimate_tokens
+from utils.usage import record_usage, response_token_usage
 
 # Load environment variables
 load_dotenv()
 
-# Configure OpenAI client for embeddings
-embedding_client = openai.OpenAI(
-    api_key=os.getenv("EMBEDDING_API_KEY"),
-    base_url=os.getenv("EMBEDDING_BASE_URL", "https://api.openai.com/v1")
-)
+# OpenAI client for embeddings, created on first use
+_embedding_client = None
+_embedding_client_lock = threading.Lock()
 
 # Get default embedding model from environment
 DEFAULT_EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
 
+# Cache of single-text embeddings keyed by (model, text)
+_embedding_cache = TTLCache(
+    "embeddings",
+    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+    max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+)
+
+def get_embedding_client():
+    """
+    Get the shared OpenAI embedding client, creating it on first call
+
+    With EMBEDDING_BACKEND=fake this is an offline FakeEmbeddingClient.
+    
+    Returns:
+        openai.OpenAI: Embedding API client
+    """
+    global _embedding_client
+    if _embedding_client is None:
+        with _embedding_client_lock:
+            if _embedding_client is None:
+                from utils.fake_backends import fake_backend_enabled, FakeEmbeddingClient
+                if fake_backend_enabled("embedding"):
+                    _embedding_client = FakeEmbeddingClient()
+                    return _embedding_client
+                import openai
+                _embedding_client = openai.OpenAI(
+                    api_key=os.getenv("EMBEDDING_API_KEY"),
+                    base_url=os.getenv("EMBEDDING_BASE_URL", "https://api.openai.com/v1")
+                )
+    return _embedding_client
+
+def _create_embedding(text: str, model: str) -> List[float]:
+    """Call the OpenAI embeddings API under the shared rate limit."""
+    tokens = estimate_tokens(text)
+    response = get_scheduler("embedding").call(
+        lambda: get_embedding_client().embeddings.create(input=text, model=model),
+        tokens=tokens
+    )
+    record_usage("embedding", model, (response_token_usage(response) or (tokens,))[0])
+    return response.data[0].embedding
+
 def get_embeddings(text: str, model: str = None) -> List[float]:
     """
     Generate embeddings for given text using OpenAI API
@@ -38,16 +81,8 @@ def get_embeddings(text: str, model: str = None) -> List[float]:
         if model is None:
             model = DEFAULT_EMBEDDING_MODEL
             
-        # Create embedding using OpenAI API
-        response = embedding_client.embeddings.create(
-            input=text,
-            model=model
-        )
-        
-        # Extract embedding vector
-        embedding = response.data[0].embedding
-        
-        return embedding
+        # Embeddings are deterministic, so repeated queries are served from cache
+        return _embedding_cache.get_or_compute((model, text), lambda: _create_embedding(text, model))
         
     except Exception as e:
         raise Exception(f"Error generating embedding: {str(e)}")
@@ -78,11 +113,13 @@ def get_batch_embeddings(texts: List[str], model: str = None) -> List[List[float
         if model is None:
             model = DEFAULT_EMBEDDING_MODEL
             
-        # Create embeddings using OpenAI API
-        response = embedding_client.embeddings.create(
-            input=cleaned_texts,
-            model=model
+        # Create embeddings using OpenAI API under the shared rate limit
+        tokens = estimate_tokens(cleaned_texts)
+        response = get_scheduler("embedding").call(
+            lambda: get_embedding_client().embeddings.create(input=cleaned_texts, model=model),
+            tokens=tokens
         )
+        record_usage("embedding", model, (response_token_usage(response) or (tokens,))[0])
         
         # Extract embedding vectors
         embeddings = [item.embedding for item in response.data]
@@ -124,7 +161,8 @@ def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
 
 def find_most_similar(query_embedding: List[float], 
                      candidate_embeddings: List[List[float]], 
-                     top_k: int = 5) -> List[tuple]:
+                     top_k: int = 5,
+                     candidate_indices: Optional[Iterable[int]] = None) -> List[tuple]:
     """
     Find most similar embeddings to query
     
@@ -132,6 +170,8 @@ def find_most_similar(query_embedding: List[float],
         query_embedding (List[float]): Query vector
         candidate_embeddings (List[List[float]]): List of candidate vectors
         top_k (int): Number of top results to return
+        candidate_indices (Optional[Iterable[int]]): Only score these positions,
+            e.g. MetadataIndex.candidates(filter_dict) for a filtered search
         
     Returns:
         List[tuple]: List of (index, similarity_score) tuples
@@ -139,8 +179,11 @@ def find_most_similar(query_embedding: List[float],
     try:
         similarities = []
         
-        for i, candidate in enumerate(candidate_embeddings):
-            similarity = cosine_similarity(query_embedding, candidate)
+        if candidate_indices is None:
+            candidate_indices = range(len(candidate_embeddings))
+        
+        for i in candidate_indices:
+            similarity = cosine_similarity(query_embedding, candidate_embeddings[i])
             similarities.append((i, similarity))
         
         # Sort by similarity score (descending)
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+import numpy as np
+from utils.local_vector_client import LocalVectorClient
+
+# Words the fake LLM builds its answers from
+FAKE_ANSWER_WORDS = (
+    "based on the provided context the document explains that the device should be restarted "
+    "after the update and the settings checked again before contacting support"
+).split()
+
+def fake_backend_enabled(kind: str) -> bool:
+    """
+    Check whether a backend is switched to its offline fake
+
+    Args:
+        kind (str): "llm", "embedding" or "vector", read from {KIND}_BACKEND
+
+    Returns:
+        bool: True when {KIND}_BACKEND is "fake"
+    """
+    return os.getenv(f"{kind.upper()}_BACKEND", "").lower() == "fake"
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+class FakeEmbeddingClient:
+    """
+    Offline stand-in for ``openai.OpenAI`` that only serves embeddings.
+
+    Each vector is seeded from a hash of its text, so a text always gets the
+    same unit vector and repeated queries find the chunks they came from.
+    """
+
+    def __init__(self, dimension: Optional[int] = None, latency: Optional[float] = None):
+        """
+        Args:
+            dimension (Optional[int]): Vector dimension, defaults to PINECONE_DIMENSION
+            latency (Optional[float]): Seconds each API call takes, defaults to FAKE_EMBEDDING_LATENCY
+        """
+        self.dimension = dimension or int(os.getenv("PINECONE_DIMENSION", "1536"))
+        self.latency = float(os.getenv("FAKE_EMBEDDING_LATENCY", "0")) if latency is None else latency
+        self.embeddings = self
+
+    def embed(self, text: str) -> List[float]:
+        """Deterministic unit vector for a text."""
+        vector = np.random.default_rng(_seed(text)).standard_normal(self.dimension, dtype=np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def create(self, input: Union[str, List[str]], model: str = None):
+        """Same call and response shape as ``client.embeddings.create``."""
+        if self.latency:
+            time.sleep(self.latency)
+        texts = [input] if isinstance(input, str) else input
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=self.embed(text), index=i) for i, text in enumerate(texts)],
+            model=model
+        )
+
+class FakeChatModel:
+    """
+    Offline stand-in for ``ChatOpenAI`` with a realistic timing profile.
+
+    Answers are built from FAKE_ANSWER_WORDS, seeded by the prompt. The first
+    token arrives after ``latency`` seconds and the rest at
+    ``tokens_per_second``, for both blocking and streaming calls.
+    """
+
+    def __init__(self, latency: Optional[float] = None, tokens_per_second: Optional[float] = None,
+                 answer_tokens: Optional[int] = None):
+        """
+        Args:
+            latency (Optional[float]): Time to first token, defaults to FAKE_LLM_LATENCY
+            tokens_per_second (Optional[float]): Generation speed, defaults to FAKE_LLM_TOKENS_PER_SECOND
+                (0 for instant)
+            answer_tokens (Optional[int]): Tokens per answer, defaults to FAKE_LLM_ANSWER_TOKENS
+        """
+        self.latency = float(os.getenv("FAKE_LLM_LATENCY", "0.3")) if latency is None else latency
+        self.tokens_per_second = (float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+                                  if tokens_per_second is None else tokens_per_second)
+        self.answer_tokens = int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "120")) if answer_tokens is None else answer_tokens
+
+    def _tokens(self, messages: Any) -> List[str]:
+        prompt = "".join(getattr(message, "content", str(message)) for message in messages) \
+            if isinstance(messages, list) else str(messages)
+        start = _seed(prompt) % len(FAKE_ANSWER_WORDS)
+        return [FAKE_ANSWER_WORDS[(start + i) % len(FAKE_ANSWER_WORDS)] + " " for i in range(self.answer_tokens)]
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def invoke(self, messages: Any) -> SimpleNamespace:
+        tokens = self._tokens(messages)
+        time.sleep(self.latency + self._token_delay() * max(len(tokens) - 1, 0))
+        return SimpleNamespace(content="".join(tokens).strip())
+
+    def stream(self, messages: Any) -> Iterator[SimpleNamespace]:
+        time.sleep(self.latency)
+        for i, token in enumerate(self._tokens(messages)):
+            if i:
+                time.sleep(self._token_delay())
+            yield SimpleNamespace(content=token)
+
+    async def ainvoke(self, messages: Any) -> SimpleNamespace:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency + self._token_delay() * max(len(tokens) - 1, 0))
+        return SimpleNamespace(content="".join(tokens).strip())
+
+    async def astream(self, messages: Any) -> AsyncIterator[SimpleNamespace]:
+        await asyncio.sleep(self.latency)
+        for i, token in enumerate(self._tokens(messages)):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            yield SimpleNamespace(content=token)
+
+class InMemoryVectorClient(LocalVectorClient):
+    """
+    Offline stand-in for PineconeClient.
+
+    A LocalVectorClient that never persists (its index directory is a fresh
+    temporary one) and can add a fixed network round trip to every query.
+    """
+
+    def __init__(self, dimension: Optional[int] = None, latency: Optional[float] = None):
+        """
+        Args:
+            dimension (Optional[int]): Vector dimension, defaults to PINECONE_DIMENSION
+            latency (Optional[float]): Seconds added per query, defaults to FAKE_VECTOR_LATENCY
+        """
+        super().__init__(index_dir=tempfile.mkdtemp(prefix="memory-index-"), dimension=dimension, autosave=False)
+        self.latency = float(os.getenv("FAKE_VECTOR_LATENCY", "0")) if latency is None else latency
+
+    def query_vectors(self, *args, **kwargs) -> Dict[str, Any]:
+        if self.latency:
+            time.sleep(self.latency)
+        return super().query_vectors(*args, **kwargs)
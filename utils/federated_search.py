@@ -0,0 +1,68 @@
+from typing import Any, Dict, List, Optional
+
+# Placeholder in RAG_SEARCH_NAMESPACES for the caller's own session namespace
+SESSION_NAMESPACE = "session"
+
+# Shared corpus written by the bulk upload scripts and the document pipeline
+KNOWLEDGE_BASE_NAMESPACE = "knowledge_base"
+
+def resolve_namespaces(namespaces: List[str], session_id: Optional[str]) -> List[str]:
+    """
+    Expand the configured namespace list for one session
+
+    Args:
+        namespaces (List[str]): Configured namespaces, may contain "session"
+        session_id (Optional[str]): Current session namespace
+
+    Returns:
+        List[str]: Concrete namespaces, duplicates removed, order kept
+    """
+    resolved = []
+    for namespace in namespaces:
+        if namespace == SESSION_NAMESPACE:
+            namespace = session_id
+        if namespace and namespace not in resolved:
+            resolved.append(namespace)
+    return resolved
+
+def merge_namespace_results(results: Dict[str, Dict[str, Any]], limit: int,
+                            quotas: Optional[Dict[str, int]] = None,
+                            min_scores: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    Merge per-namespace query responses into one ranked list
+
+    Matches are ranked by raw similarity, which is comparable across
+    namespaces because all of them are embedded with the same model, and
+    taken greedily while their namespace is under its quota, so one large
+    shared corpus cannot crowd out the session's own documents.
+
+    Args:
+        results (Dict[str, Dict]): Query response per namespace
+        limit (int): Maximum number of merged matches
+        quotas (Optional[Dict[str, int]]): Maximum matches per namespace
+        min_scores (Optional[Dict[str, float]]): Similarity below which a namespace's matches are dropped
+
+    Returns:
+        List[Dict]: Matches with 'namespace' added
+    """
+    quotas = quotas or {}
+    min_scores = min_scores or {}
+    candidates = [
+        {**match, 'namespace': namespace}
+        for namespace, response in results.items()
+        for match in (response or {}).get('matches', [])
+        if match.get('score', 0.0) >= min_scores.get(namespace, 0.0)
+    ]
+    candidates.sort(key=lambda match: match.get('score', 0.0), reverse=True)
+
+    merged = []
+    taken: Dict[str, int] = {}
+    for match in candidates:
+        namespace = match['namespace']
+        if taken.get(namespace, 0) >= quotas.get(namespace, limit):
+            continue
+        merged.append(match)
+        taken[namespace] = taken.get(namespace, 0) + 1
+        if len(merged) >= limit:
+            break
+    return merged
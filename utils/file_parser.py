@@ -1,73 +1,312 @@
-import fitz  # PyMuPDF
-from docx import Document
+import csv
+import importlib
 import io
+import logging
+import time
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, List, Optional
+from utils.document_source import DocumentSource
 
-def parse_file(uploaded_file):
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ParserBackend:
+    """A registered document parser and the lazily imported modules it needs."""
+    name: str
+    extensions: List[str]
+    mime_types: List[str]
+    parse: Callable[[DocumentSource], str]
+    parse_pages: Optional[Callable[[DocumentSource], Dict[str, Any]]] = None
+    requires: List[str] = field(default_factory=list)
+    binary: bool = False
+
+# Parser registry, keyed by backend name with extension and MIME lookups
+_PARSERS: Dict[str, ParserBackend] = {}
+_EXTENSION_INDEX: Dict[str, str] = {}
+_MIME_INDEX: Dict[str, str] = {}
+
+# Lazily imported backend modules and how long each import took (seconds)
+_BACKEND_MODULES: Dict[str, Any] = {}
+_IMPORT_TIMES: Dict[str, float] = {}
+
+PDF_MIME = "application/pdf"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+def register_parser(name: str, extensions: List[str], mime_types: List[str] = None,
+                    requires: List[str] = None, parse_pages: Callable = None, binary: bool = False):
     """
-    Parse uploaded file and extract text content
+    Decorator registering a parse function for file extensions and MIME types
     
     Args:
-        uploaded_file: Streamlit uploaded file object
+        name (str): Backend name
+        extensions (List[str]): File extensions handled, with or without dot
+        mime_types (List[str]): MIME types handled, used for content sniffing
+        requires (List[str]): Modules imported lazily on first use
+        parse_pages (Callable): Optional page-aware variant of the parser
+        binary (bool): Whether the format has a reliable magic-byte signature
+    """
+    def decorator(func: Callable) -> Callable:
+        backend = ParserBackend(
+            name=name,
+            extensions=[ext.lower().lstrip('.') for ext in extensions],
+            mime_types=list(mime_types or []),
+            parse=func,
+            parse_pages=parse_pages,
+            requires=list(requires or []),
+            binary=binary
+        )
+        _PARSERS[name] = backend
+        for ext in backend.extensions:
+            _EXTENSION_INDEX[ext] = name
+        for mime in backend.mime_types:
+            _MIME_INDEX[mime] = name
+        return func
+    return decorator
+
+def load_backend(module_name: str):
+    """
+    Import a parser backend module on first use and record the import time
+    
+    Args:
+        module_name (str): Module to import, e.g. "fitz"
         
     Returns:
-        str: Extracted text content
+        module: The imported module
+    """
+    module = _BACKEND_MODULES.get(module_name)
+    if module is None:
+        start_time = time.perf_counter()
+        module = importlib.import_module(module_name)
+        _IMPORT_TIMES[module_name] = time.perf_counter() - start_time
+        _BACKEND_MODULES[module_name] = module
+        logger.info(f"Loaded parser backend {module_name} in {_IMPORT_TIMES[module_name]:.3f} seconds")
+    return module
+
+def get_backend_import_times() -> Dict[str, float]:
+    """Get import time in seconds for every parser backend loaded so far."""
+    return dict(_IMPORT_TIMES)
+
+def preload_backends() -> Dict[str, float]:
+    """
+    Import every registered backend ahead of time, e.g. from a warm-up thread
+    
+    Returns:
+        Dict[str, float]: Import time in seconds per backend module
     """
-    file_extension = uploaded_file.name.lower().split('.')[-1]
+    for backend in _PARSERS.values():
+        for module_name in backend.requires:
+            try:
+                load_backend(module_name)
+            except ImportError as e:
+                logger.warning(f"Parser backend {module_name} for {backend.name} is unavailable: {e}")
+    return get_backend_import_times()
+
+def supported_extensions() -> List[str]:
+    """Get all file extensions with a registered parser, e.g. ['.csv', '.docx', ...]."""
+    return sorted(f".{ext}" for ext in _EXTENSION_INDEX)
+
+def is_supported_file(filename: str) -> bool:
+    """Check whether a file name has a registered parser."""
+    return filename.lower().split('.')[-1] in _EXTENSION_INDEX if '.' in filename else False
+
+def sniff_mime_type(source) -> str:
+    """
+    Guess a document's MIME type from its first bytes
+    
+    Args:
+        source: Uploaded file, path, buffer or DocumentSource
+        
+    Returns:
+        str: Detected MIME type, "application/octet-stream" if unknown
+    """
+    source = DocumentSource.coerce(source)
+    with source.buffer() as buffer:
+        head = bytes(buffer[:2048])
     
-    if file_extension == 'pdf':
-        return parse_pdf(uploaded_file)
-    elif file_extension == 'docx':
-        return parse_docx(uploaded_file)
-    elif file_extension == 'txt':
-        return parse_txt(uploaded_file)
-    else:
-        raise ValueError(f"Unsupported file type: {file_extension}")
+    if b'%PDF-' in head[:1024]:
+        return PDF_MIME
+    if head.startswith(b'PK\x03\x04'):
+        if b'word/' in head or b'[Content_Types].xml' in head:
+            return DOCX_MIME
+        return "application/zip"
+    
+    lowered = head.lstrip().lower()
+    if lowered.startswith((b'<!doctype html', b'<html')) or b'<html' in lowered[:512]:
+        return "text/html"
+    if b'\x00' in head:
+        return "application/octet-stream"
+    return "text/plain"
 
-def parse_pdf(uploaded_file):
+def get_parser(source) -> Optional[ParserBackend]:
     """
-    Extract text from PDF file
+    Resolve the parser backend for a document
+    
+    The extension decides for text formats. Binary formats, and files with an
+    unknown extension, are checked against their content so that e.g. an HTML
+    error page saved as ``manual.pdf`` is still parsed as HTML.
     
     Args:
-        uploaded_file: Streamlit uploaded file object
+        source: Uploaded file, path, buffer or DocumentSource
         
     Returns:
-        str: Extracted text content
+        Optional[ParserBackend]: Matching backend or None
     """
-    try:
-        # Read the uploaded file bytes
-        pdf_bytes = uploaded_file.read()
+    source = DocumentSource.coerce(source)
+    backend = _PARSERS.get(_EXTENSION_INDEX.get(source.extension))
+    
+    if backend is not None and not backend.binary:
+        return backend
+    
+    sniffed = _PARSERS.get(_MIME_INDEX.get(sniff_mime_type(source)))
+    if backend is None:
+        return sniffed
+    if sniffed is not None and sniffed is not backend:
+        logger.warning(f"{source.name} looks like {sniffed.name}, not {backend.name}; parsing as {sniffed.name}")
+        return sniffed
+    return backend
+
+def parse_file(source, name: Optional[str] = None):
+    """
+    Parse a document and extract text content
+    
+    Args:
+        source: Streamlit uploaded file object, local path, bytes-like buffer
+            or DocumentSource
+        name (Optional[str]): File name, required when source is a raw buffer
         
-        # Open PDF document
-        pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
+    Returns:
+        str: Extracted text content
+    """
+    source = DocumentSource.coerce(source, name)
+    backend = get_parser(source)
+    
+    if backend is None:
+        raise ValueError(f"Unsupported file type: {source.extension}")
+    
+    return backend.parse(source)
+
+def parse_file_with_pages(source, name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Parse a document and keep track of page boundaries
+    
+    Args:
+        source: Streamlit uploaded file object, local path, bytes-like buffer
+            or DocumentSource
+        name (Optional[str]): File name, required when source is a raw buffer
         
-        text_content = ""
+    Returns:
+        Dict[str, Any]: ``text`` with the extracted content and ``pages``, a list
+        of ``{'page_number', 'char_start', 'char_end'}`` spans into ``text``.
+        Formats without pages (TXT, DOCX, HTML, ...) have no spans, so their
+        chunks are referenced by chunk index instead of an invented page 1.
+    """
+    source = DocumentSource.coerce(source, name)
+    backend = get_parser(source)
+    
+    if backend is None:
+        raise ValueError(f"Unsupported file type: {source.extension}")
+    
+    if backend.parse_pages is not None:
+        return backend.parse_pages(source)
+    
+    return {
+        'text': backend.parse(source),
+        'pages': []
+    }
+
+def _open_pdf_stream(buffer: memoryview):
+    """Open an in-memory PDF, sharing the buffer with MuPDF when supported."""
+    fitz = load_backend("fitz")
+    try:
+        return fitz.open(stream=buffer, filetype="pdf")
+    except (TypeError, ValueError):
+        # Older PyMuPDF releases only accept bytes streams
+        return fitz.open(stream=bytes(buffer), filetype="pdf")
+
+def _extract_pdf_pages(pdf_document) -> Dict[str, Any]:
+    """Collect page texts and their character spans, closing the document."""
+    raw_content = ""
+    raw_spans = []
+    try:
         for page_num in range(pdf_document.page_count):
             page = pdf_document[page_num]
-            text_content += page.get_text()
-            text_content += "\n\n"  # Add page separator
-        
+            page_start = len(raw_content)
+            raw_content += page.get_text()
+            raw_spans.append((page_num + 1, page_start, len(raw_content)))
+            raw_content += "\n\n"  # Add page separator
+    finally:
         pdf_document.close()
-        return text_content.strip()
+    
+    # Shift spans to account for leading whitespace removed by strip()
+    text_content = raw_content.strip()
+    leading = len(raw_content) - len(raw_content.lstrip())
+    pages = []
+    for page_number, char_start, char_end in raw_spans:
+        pages.append({
+            'page_number': page_number,
+            'char_start': min(max(char_start - leading, 0), len(text_content)),
+            'char_end': min(max(char_end - leading, 0), len(text_content))
+        })
+    
+    return {'text': text_content, 'pages': pages}
+
+def parse_pdf_pages(source) -> Dict[str, Any]:
+    """
+    Extract text from PDF file together with per-page character spans
+    
+    Args:
+        source: Uploaded file, path, buffer or DocumentSource
+        
+    Returns:
+        Dict[str, Any]: Extracted ``text`` and its ``pages`` spans
+    """
+    source = DocumentSource.coerce(source)
+    
+    try:
+        # MuPDF reads local files itself; uploads hand over their buffer
+        if source.path is not None:
+            fitz = load_backend("fitz")
+            return _extract_pdf_pages(fitz.open(str(source.path), filetype="pdf"))
+        
+        with source.buffer() as buffer:
+            return _extract_pdf_pages(_open_pdf_stream(buffer))
         
     except Exception as e:
         raise Exception(f"Error parsing PDF: {str(e)}")
 
-def parse_docx(uploaded_file):
+@register_parser("pdf", [".pdf"], [PDF_MIME], requires=["fitz"], parse_pages=parse_pdf_pages, binary=True)
+def parse_pdf(source):
+    """
+    Extract text from PDF file
+    
+    Args:
+        source: Uploaded file, path, buffer or DocumentSource
+        
+    Returns:
+        str: Extracted text content
+    """
+    return parse_pdf_pages(source)['text']
+
+@register_parser("docx", [".docx"], [DOCX_MIME], requires=["docx"], binary=True)
+def parse_docx(source):
     """
     Extract text from DOCX file
     
     Args:
-        uploaded_file: Streamlit uploaded file object
+        source: Uploaded file, path, buffer or DocumentSource
         
     Returns:
         str: Extracted text content
     """
+    source = DocumentSource.coerce(source)
+    
     try:
-        # Read the uploaded file bytes
-        docx_bytes = uploaded_file.read()
+        docx = load_backend("docx")
         
-        # Open DOCX document
-        document = Document(io.BytesIO(docx_bytes))
+        # python-docx reads from the file object directly, no intermediate copy
+        with source.open() as docx_file:
+            document = docx.Document(docx_file)
         
         text_content = ""
         for paragraph in document.paragraphs:
@@ -79,32 +318,153 @@ def parse_docx(uploaded_file):
     except Exception as e:
         raise Exception(f"Error parsing DOCX: {str(e)}")
 
-def parse_txt(uploaded_file):
+def _decode_text(source: DocumentSource) -> str:
+    """Decode a text document as UTF-8, falling back to latin-1."""
+    with source.buffer() as buffer:
+        try:
+            return str(buffer, 'utf-8')
+        except UnicodeDecodeError:
+            # Try with different encoding if UTF-8 fails
+            return str(buffer, 'latin-1')
+
+@register_parser("txt", [".txt"], ["text/plain"])
+def parse_txt(source):
     """
     Extract text from TXT file
     
     Args:
-        uploaded_file: Streamlit uploaded file object
+        source: Uploaded file, path, buffer or DocumentSource
         
     Returns:
         str: Extracted text content
     """
+    source = DocumentSource.coerce(source)
+    
     try:
-        # Read the uploaded file as text
-        text_content = uploaded_file.read().decode('utf-8')
-        return text_content.strip()
+        return _decode_text(source).strip()
         
-    except UnicodeDecodeError:
-        # Try with different encoding if UTF-8 fails
-        try:
-            uploaded_file.seek(0)
-            text_content = uploaded_file.read().decode('latin-1')
-            return text_content.strip()
-        except Exception as e:
-            raise Exception(f"Error parsing TXT file with encoding: {str(e)}")
     except Exception as e:
         raise Exception(f"Error parsing TXT: {str(e)}")
 
+@register_parser("markdown", [".md", ".markdown"], ["text/markdown"])
+def parse_markdown(source):
+    """
+    Extract text from Markdown file
+    
+    Markdown is kept as-is so that ``#`` headers stay available to
+    ``extract_sections``.
+    
+    Args:
+        source: Uploaded file, path, buffer or DocumentSource
+        
+    Returns:
+        str: Extracted text content
+    """
+    source = DocumentSource.coerce(source)
+    
+    try:
+        return _decode_text(source).strip()
+        
+    except Exception as e:
+        raise Exception(f"Error parsing Markdown: {str(e)}")
+
+class _HTMLTextExtractor(HTMLParser):
+    """Collects visible text from HTML, one line per block element."""
+    
+    SKIP_TAGS = {'script', 'style', 'noscript', 'template'}
+    BLOCK_TAGS = {'p', 'div', 'br', 'li', 'tr', 'table', 'section', 'article',
+                  'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'blockquote', 'title'}
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+    
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+    
+    def get_text(self) -> str:
+        lines = (" ".join(line.split()) for line in "".join(self.parts).splitlines())
+        return "\n".join(line for line in lines if line)
+
+@register_parser("html", [".html", ".htm"], ["text/html"])
+def parse_html(source):
+    """
+    Extract visible text from HTML file
+    
+    Args:
+        source: Uploaded file, path, buffer or DocumentSource
+        
+    Returns:
+        str: Extracted text content
+    """
+    source = DocumentSource.coerce(source)
+    
+    try:
+        extractor = _HTMLTextExtractor()
+        extractor.feed(_decode_text(source))
+        extractor.close()
+        return extractor.get_text()
+        
+    except Exception as e:
+        raise Exception(f"Error parsing HTML: {str(e)}")
+
+@register_parser("csv", [".csv"], ["text/csv"])
+def parse_csv(source):
+    """
+    Extract text from CSV file, one "column: value" line per row
+    
+    Args:
+        source: Uploaded file, path, buffer or DocumentSource
+        
+    Returns:
+        str: Extracted text content
+    """
+    source = DocumentSource.coerce(source)
+    
+    try:
+        content = _decode_text(source)
+        
+        try:
+            dialect = csv.Sniffer().sniff(content[:4096])
+        except csv.Error:
+            dialect = csv.excel
+        
+        rows = list(csv.reader(io.StringIO(content), dialect))
+        if not rows:
+            return ""
+        
+        header = [column.strip() for column in rows[0]]
+        if len(rows) == 1:
+            return ", ".join(column for column in header if column)
+        
+        lines = []
+        for row in rows[1:]:
+            cells = [
+                f"{header[i] if i < len(header) and header[i] else f'column_{i + 1}'}: {value.strip()}"
+                for i, value in enumerate(row) if value.strip()
+            ]
+            if cells:
+                lines.append(" | ".join(cells))
+        
+        return "\n".join(lines).strip()
+        
+    except Exception as e:
+        raise Exception(f"Error parsing CSV: {str(e)}")
+
 def extract_sections(text_content, file_type='txt'):
     """
     Extract section headers from document content
@@ -0,0 +1,401 @@
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from utils.usage import UsageMeter, track_usage
+
+logger = logging.getLogger(__name__)
+
+# Job states; queued and running jobs are picked up by workers
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total_chunks INTEGER,
+    total_batches INTEGER,
+    completed_batches INTEGER NOT NULL DEFAULT 0,
+    chunks_stored INTEGER NOT NULL DEFAULT 0,
+    file_size INTEGER,
+    embedding_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    duplicate_of TEXT,
+    lease_owner TEXT,
+    lease_expires REAL NOT NULL DEFAULT 0,
+    last_run_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ingest_jobs_status ON ingest_jobs (status, lease_expires);
+CREATE INDEX IF NOT EXISTS ingest_jobs_session ON ingest_jobs (session_id, created_at);
+"""
+
+class IngestionJobQueue:
+    """
+    Background document ingestion backed by a SQLite job table.
+
+    Uploads are copied to disk and queued; worker threads embed and store
+    them one batch at a time, committing progress after every batch. Vector
+    IDs are derived from the job and chunk index, so a job interrupted by a
+    crash or restart resumes from its last completed batch and re-sending a
+    batch overwrites rather than duplicates it.
+
+    Each step, a worker takes the runnable job whose session was served
+    least recently, so one large upload cannot starve other sessions.
+    Leases in the job table keep two workers (or two app processes sharing
+    the data directory) off the same job; an expired lease is taken over.
+    """
+
+    def __init__(self, service, data_dir: Optional[str] = None, workers: Optional[int] = None,
+                 lease_seconds: Optional[float] = None, max_attempts: int = 3):
+        """
+        Args:
+            service (RAGService): Pipeline whose ingestion steps are run
+            data_dir (Optional[str]): Holds ingest_jobs.db and the queued uploads, defaults to the service's
+            workers (Optional[int]): Worker threads, defaults to INGEST_WORKERS
+            lease_seconds (Optional[float]): How long a claimed job is reserved, defaults to INGEST_LEASE_SECONDS
+            max_attempts (int): Failed steps before a job is abandoned
+        """
+        from utils.rag_service import INGEST_BATCH_SIZE
+
+        self.service = service
+        self.data_dir = Path(data_dir or service.config.data_dir)
+        self.db_path = self.data_dir / "ingest_jobs.db"
+        self.upload_dir = self.data_dir / "uploads"
+        self.workers = workers or int(os.getenv("INGEST_WORKERS", "2"))
+        self.lease_seconds = lease_seconds or float(os.getenv("INGEST_LEASE_SECONDS", "120"))
+        self.max_attempts = max_attempts
+        self.batch_size = INGEST_BATCH_SIZE
+        self.owner = uuid.uuid4().hex[:12]
+
+        self._local = threading.local()
+        self._threads: List[threading.Thread] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        # Parsed chunks of the jobs this process is working on, rebuilt from the upload after a restart
+        self._chunks: Dict[str, List[Dict[str, Any]]] = {}
+        self._chunks_lock = threading.Lock()
+
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            # Columns added after the first release of the table
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(ingest_jobs)")}
+            if "duplicate_of" not in columns:
+                conn.execute("ALTER TABLE ingest_jobs ADD COLUMN duplicate_of TEXT")
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        yield conn
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connection() as conn:
+            conn.execute(f"UPDATE ingest_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def start(self) -> "IngestionJobQueue":
+        """Start the worker threads (once)."""
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the workers after their current batch; unfinished jobs resume on the next start."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stop.clear()
+
+    def submit(self, session_id: str, data: Union[bytes, str, Path], filename: str) -> str:
+        """
+        Queue a document for ingestion
+
+        Args:
+            session_id (str): Session namespace to store the vectors in
+            data (Union[bytes, str, Path]): File contents, or a path to copy them from
+            filename (str): File name shown to the user and stored with the chunks
+
+        Returns:
+            str: Job ID
+        """
+        try:
+            job_id = uuid.uuid4().hex
+            job_dir = self.upload_dir / job_id
+            job_dir.mkdir(parents=True, exist_ok=True)
+            file_path = job_dir / os.path.basename(filename)
+            if isinstance(data, (str, Path)):
+                shutil.copyfile(data, file_path)
+            else:
+                file_path.write_bytes(data)
+
+            now = time.time()
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT INTO ingest_jobs (id, session_id, filename, file_path, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, session_id, filename, str(file_path), QUEUED, now, now)
+                )
+            self._wake.set()
+            return job_id
+        except Exception as e:
+            raise Exception(f"Error queuing ingestion job: {str(e)}")
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job, with a 0-1 progress fraction."""
+        with self._connection() as conn:
+            row = conn.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_jobs(self, session_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally for one session."""
+        query = "SELECT * FROM ingest_jobs"
+        params: tuple = ()
+        if session_id:
+            query += " WHERE session_id = ?"
+            params = (session_id,)
+        with self._connection() as conn:
+            rows = conn.execute(query + " ORDER BY created_at DESC LIMIT ?", (*params, limit)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job and remove what it stored
+
+        A batch in progress finishes first; its worker then sees the
+        cancellation and cleans up.
+
+        Returns:
+            bool: True if the job was still active
+        """
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE ingest_jobs SET status = ?, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+                (CANCELLED, time.time(), job_id, *ACTIVE_STATES)
+            )
+        if not cursor.rowcount:
+            return False
+        job = self.get_job(job_id)
+        # No worker holds the job (queued, backing off after a failed step, or its lease ran out)
+        if job and (job["lease_owner"] is None or job["lease_expires"] < time.time()):
+            self._discard(job)
+        return True
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        if job["status"] == COMPLETED:
+            job["progress"] = 1.0
+        elif job["total_batches"]:
+            job["progress"] = job["completed_batches"] / job["total_batches"]
+        else:
+            job["progress"] = 0.0
+        return job
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Lease the next job to run a step of
+
+        The session served least recently goes first, then the job within
+        it that ran least recently.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    """
+                    SELECT j.*, (SELECT MAX(s.last_run_at) FROM ingest_jobs s WHERE s.session_id = j.session_id) AS session_last_run
+                    FROM ingest_jobs j
+                    WHERE j.status IN (?, ?) AND j.lease_expires < ?
+                    ORDER BY session_last_run ASC, j.last_run_at ASC, j.created_at ASC
+                    LIMIT 1
+                    """,
+                    (*ACTIVE_STATES, now)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                owner = f"{self.owner}:{threading.current_thread().name}"
+                conn.execute(
+                    "UPDATE ingest_jobs SET lease_owner = ?, lease_expires = ?, last_run_at = ?, updated_at = ? WHERE id = ?",
+                    (owner, now + self.lease_seconds, now, now, row["id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        job = dict(row)
+        job["lease_owner"] = owner
+        return job
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not claim an ingestion job: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(timeout=1.0)
+                self._wake.clear()
+                continue
+            self._step(job)
+
+    def _chunk_spans(self, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with self._chunks_lock:
+            spans = self._chunks.get(job["id"])
+        if spans is None:
+            # Parsing and chunking are deterministic, so a resumed job gets the same batches
+            _, content_length, spans = self.service.prepare_document(job["file_path"], name=job["filename"])
+            job["file_size"] = content_length
+            with self._chunks_lock:
+                self._chunks[job["id"]] = spans
+        return spans
+
+    def _plan(self, job: Dict[str, Any], spans: List[Dict[str, Any]]) -> bool:
+        """
+        First step of a job: skip it if it duplicates a stored document, else record its size
+
+        Returns:
+            bool: True if batches should be embedded
+        """
+        # Registered before embedding, so a copy queued behind this job is caught
+        duplicate = self.service.claim_document(job["session_id"], job["filename"], spans)
+        if duplicate:
+            self.service.add_document_record(job["session_id"], dict(
+                self.service.duplicate_record(job["filename"], job["file_size"], duplicate), job_id=job["id"]
+            ))
+            self._update(job["id"], status=COMPLETED, duplicate_of=duplicate["duplicate_of"],
+                         file_size=job["file_size"], lease_owner=None, lease_expires=0)
+            self._release_files(job)
+            return False
+        job["total_chunks"] = len(spans)
+        job["total_batches"] = -(-len(spans) // self.batch_size)
+        self._update(job["id"], status=RUNNING, total_chunks=len(spans),
+                     total_batches=job["total_batches"], file_size=job["file_size"])
+        return True
+
+    def _step(self, job: Dict[str, Any]):
+        """Embed and store the job's next batch, then release it."""
+        try:
+            spans = self._chunk_spans(job)
+            if job["total_batches"] is None and not self._plan(job, spans):
+                return
+            batch = job["completed_batches"]
+            start = batch * self.batch_size
+            usage = UsageMeter()
+            with track_usage(usage):
+                texts, embeddings, locations = self.service.embed_chunks(spans[start:start + self.batch_size])
+            if texts:
+                self.service.pinecone_client.create_session_vectors(
+                    texts=texts,
+                    embeddings=embeddings,
+                    session_id=job["session_id"],
+                    document_name=job["filename"],
+                    chunk_metadata=[{**self.service.document_metadata(job["filename"]), **location, "job_id": job["id"]}
+                                    for location in locations],
+                    id_prefix=f"{job['session_id']}_{job['id']}",
+                    start_index=start
+                )
+        except Exception as e:
+            self._step_failed(job, e)
+            return
+
+        job["completed_batches"] += 1
+        job["chunks_stored"] += len(texts)
+        job["embedding_tokens"] += usage.embedding_tokens
+        job["cost"] += usage.cost
+        with self._connection() as conn:
+            # Only commit progress while we still hold the lease and nobody cancelled the job
+            cursor = conn.execute(
+                "UPDATE ingest_jobs SET completed_batches = ?, chunks_stored = ?, embedding_tokens = ?, cost = ?, "
+                "attempts = 0, error = NULL, lease_owner = NULL, lease_expires = 0, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status IN (?, ?)",
+                (job["completed_batches"], job["chunks_stored"], job["embedding_tokens"], job["cost"],
+                 time.time(), job["id"], job["lease_owner"], *ACTIVE_STATES)
+            )
+        if not cursor.rowcount:
+            current = self.get_job(job["id"])
+            if current and current["status"] == CANCELLED:
+                self._discard(current)
+            return
+
+        if job["completed_batches"] >= job["total_batches"]:
+            self._finish(job)
+        else:
+            self._wake.set()
+
+    def _finish(self, job: Dict[str, Any]):
+        if not job["chunks_stored"]:
+            self._update(job["id"], status=FAILED, error="No valid embeddings were created.")
+            self._discard(job)
+            return
+        self.service.add_document_record(job["session_id"], {
+            'filename': job["filename"],
+            'chunks_count': job["chunks_stored"],
+            'file_size': job["file_size"],
+            'upload_time': datetime.now().isoformat(),
+            'usage': {"embedding_tokens": job["embedding_tokens"], "cost": round(job["cost"], 6)},
+            'job_id': job["id"]
+        })
+        self.service.record_vocabulary(job["session_id"], self.service.document_metadata(job["filename"]))
+        usage = UsageMeter()
+        usage.embedding_tokens, usage.cost = job["embedding_tokens"], job["cost"]
+        self.service.tracer.record_ingestion(job["session_id"], self.service.config.embedding.model, usage)
+        self._update(job["id"], status=COMPLETED, lease_owner=None, lease_expires=0)
+        self._release_files(job)
+
+    def _step_failed(self, job: Dict[str, Any], error: Exception):
+        attempts = job["attempts"] + 1
+        # Unreadable documents will not get better on retry
+        if isinstance(error, ValueError) or attempts >= self.max_attempts:
+            logger.warning(f"Ingestion job {job['id']} ({job['filename']}) failed: {error}")
+            self._update(job["id"], status=FAILED, error=str(error), attempts=attempts,
+                         lease_owner=None, lease_expires=0)
+            self._discard(job)
+        else:
+            # Back off, then let any worker retry from the last completed batch
+            self._update(job["id"], error=str(error), attempts=attempts, lease_owner=None,
+                         lease_expires=time.time() + 5 * 2 ** attempts)
+
+    def _discard(self, job: Dict[str, Any]):
+        """Remove the vectors and files of a failed or cancelled job."""
+        if job["total_batches"] is not None:
+            self.service.forget_document(job["session_id"], job["filename"])
+            # Not just completed batches: the step a cancel interrupted may have stored its batch too
+            try:
+                self.service.pinecone_client.delete_by_filter({"job_id": job["id"]}, namespace=job["session_id"])
+            except Exception as e:
+                logger.warning(f"Could not remove vectors of ingestion job {job['id']}: {e}")
+        self._release_files(job)
+
+    def _release_files(self, job: Dict[str, Any]):
+        with self._chunks_lock:
+            self._chunks.pop(job["id"], None)
+        shutil.rmtree(Path(job["file_path"]).parent, ignore_errors=True)
@@ -1,24 +1,75 @@
 from langchain.agents import Tool, AgentExecutor, create_react_agent
+from langchain.callbacks.base import BaseCallbackHandler
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 from typing import List, Dict, Any, Optional
 import os
 from .embeddings import get_embeddings
 from .pinecone_client import PineconeClient
-from .chunker import chunk_text
+from .chunker import chunk_text, format_page_reference
+from .rate_limiter import estimate_tokens, get_retry_after, get_scheduler, is_rate_limit_error
+from .usage import record_usage
 import json
 
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Counts the tokens of every agent LLM call (reasoning steps and tools) against the current operation."""
+
+    def __init__(self, model: str):
+        self.model = model
+        # Estimated prompt tokens per run, for responses that report no usage
+        self._prompt_tokens: Dict[Any, int] = {}
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._prompt_tokens[kwargs.get("run_id")] = sum(
+            estimate_tokens(message.content) for batch in messages for message in batch
+        )
+
+    def on_llm_end(self, response, **kwargs):
+        prompt_tokens = self._prompt_tokens.pop(kwargs.get("run_id"), 0)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage.get("prompt_tokens") is not None:
+            record_usage("llm", self.model, usage["prompt_tokens"], usage.get("completion_tokens", 0))
+        else:
+            completion = "".join(generation.text for batch in response.generations for generation in batch)
+            record_usage("llm", self.model, prompt_tokens, estimate_tokens(completion))
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """
+    Holds every agent LLM call (reasoning steps and tools) to the shared OpenAI rate limit.
+
+    The agent executor calls the model itself, so instead of wrapping each
+    call as commands._invoke_llm does, the scheduler is entered from the
+    model's start callback; rate limit errors pause the shared bucket.
+    """
+
+    # Let the call fail rather than bypass the limit if waiting goes wrong
+    raise_error = True
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        get_scheduler("openai").acquire(
+            tokens=sum(estimate_tokens(message.content) for batch in messages for message in batch)
+        )
+
+    def on_llm_end(self, response, **kwargs):
+        get_scheduler("openai").report_success()
+
+    def on_llm_error(self, error, **kwargs):
+        if is_rate_limit_error(error):
+            get_scheduler("openai").report_rate_limited(get_retry_after(error))
+
 class DocumentRAGAgent:
     """LangChain agent with RAG-specific tools for document interaction."""
     
     def __init__(self, session_id: str, pinecone_client: PineconeClient):
         self.session_id = session_id
         self.pinecone_client = pinecone_client
+        model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
         self.llm = ChatOpenAI(
-            model=os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"),
+            model=model,
             api_key=os.getenv("OPENAI_API_KEY"),
             base_url=os.getenv("OPENAI_BASE_URL"),
-            temperature=0.1
+            temperature=0.1,
+            callbacks=[RateLimitCallbackHandler(), UsageCallbackHandler(model)]
         )
         self.tools = self._create_tools()
         self.agent = self._create_agent()
@@ -49,10 +100,9 @@ class DocumentRAGAgent:
                     text = metadata.get('text', 'No text available')
                     score = match.get('score', 0)
                     doc_name = metadata.get('document_name', 'Unknown')
-                    chunk_index = metadata.get('chunk_index', 'Unknown')
                     
-                    # Calculate approximate page/section reference
-                    page_ref = f"Chunk {chunk_index}" if chunk_index != 'Unknown' else "Unknown location"
+                    # Exact page reference when the chunk carries page metadata
+                    page_ref = format_page_reference(metadata)
                     
                     formatted_results.append(
                         f"[SOURCE {i}]\n"
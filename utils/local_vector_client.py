@@ -0,0 +1,547 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Set, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from utils.ann_index import IVFIndex
+from utils.chunk_store import open_chunk_store
+from utils.metadata_filter import page_range_filter
+from utils.vector_segments import MANIFEST_FILE, SegmentedVectorStore
+
+# Load environment variables
+load_dotenv()
+
+# Directory name used for the unnamed default namespace
+DEFAULT_NAMESPACE_DIR = "__default__"
+
+# Quantizer state next to a namespace's segments: training version, size and centroids file
+IVF_STATE_FILE = "ivf.json"
+
+# Index files of the previous whole-namespace format, migrated on first load
+LEGACY_INDEX_FILES = ("index.json", "vectors.npy", "assignment.npy", "centroids.npy")
+
+class _Namespace:
+    """One namespace: its index, its on-disk segments and the lock serializing its writers."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.index: Optional[IVFIndex] = None
+        self.store: Optional[SegmentedVectorStore] = None
+        # Index training version whose centroids are on disk
+        self.version = 0
+        # Ids written or deleted since the namespace was last persisted
+        self.changed: Set[str] = set()
+        # Store state (see SegmentedVectorStore.state) the index reflects
+        self.synced: Optional[Tuple] = None
+
+class LocalVectorClient:
+    """
+    In-process replacement for PineconeClient backed by one IVF index per namespace
+
+    Exposes the same query/upsert/delete surface and result shapes as
+    PineconeClient, so RAGService and the scripts can use either. Each
+    namespace is persisted under LOCAL_INDEX_DIR as a SegmentedVectorStore:
+    a write appends a small segment instead of rewriting the namespace, and
+    loading maps the segment files instead of reading them. Namespaces are
+    loaded on first use, and each has its own lock, so writing one never
+    blocks another; searches only wait for in-memory index updates. Each
+    loaded namespace's segments are merged by a background compactor, off
+    the write path.
+
+    Other processes may write the same namespaces: every write first merges
+    what they appended into the index while holding the store's file lock,
+    and searches do the same whenever the namespace's manifest changed, so
+    neither a write nor a snapshot can drop rows this process never saw.
+    """
+
+    def __init__(self, index_dir: Optional[str] = None, dimension: Optional[int] = None,
+                 nprobe: Optional[int] = None, autosave: bool = True):
+        """
+        Initialize the local client
+
+        Args:
+            index_dir (Optional[str]): Index directory, defaults to LOCAL_INDEX_DIR
+            dimension (Optional[int]): Vector dimension, defaults to PINECONE_DIMENSION
+            nprobe (Optional[int]): Clusters scanned per query, defaults to LOCAL_INDEX_NPROBE
+            autosave (bool): Persist a namespace after every write; bulk loaders
+                can turn this off and call save() once at the end
+        """
+        self.index_dir = Path(index_dir or os.getenv("LOCAL_INDEX_DIR", "data/vector_index"))
+        self.dimension = dimension or int(os.getenv("PINECONE_DIMENSION", "1536"))
+        self.nprobe = nprobe or int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+        self.train_threshold = int(os.getenv("LOCAL_INDEX_TRAIN_THRESHOLD", "4096"))
+        self.compact_interval = float(os.getenv("VECTOR_SEGMENT_COMPACT_INTERVAL", "30"))
+        self.autosave = autosave
+        # Chunk texts live next to the indexes instead of in their metadata
+        self.chunk_store = open_chunk_store(self.index_dir / "chunks.db")
+
+        # Guards the namespace table only; each namespace has its own lock
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.RLock()
+
+    def connect(self):
+        """
+        Prepare the index directory (namespaces are loaded on first use)
+        """
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+    def close(self):
+        """
+        Persist pending changes and stop the namespaces' background compactors
+        """
+        self.save()
+        with self._lock:
+            namespaces = list(self._namespaces.values())
+        for holder in namespaces:
+            if holder.store is not None:
+                holder.store.close()
+
+    def save(self):
+        """
+        Persist every namespace changed since the last save
+        """
+        with self._lock:
+            namespaces = list(self._namespaces.values())
+        for holder in namespaces:
+            with holder.lock:
+                if holder.index is not None:
+                    with holder.store.locked():
+                        self._sync(holder)
+                        self._persist(holder)
+
+    def _namespace_dir(self, namespace: str) -> Path:
+        return self.index_dir / (namespace or DEFAULT_NAMESPACE_DIR)
+
+    def _stored_namespaces(self) -> List[str]:
+        """Namespaces with files under the index directory."""
+        if not self.index_dir.exists():
+            return []
+        return [
+            "" if path.name == DEFAULT_NAMESPACE_DIR else path.name
+            for path in self.index_dir.iterdir()
+            if (path / MANIFEST_FILE).exists() or (path / LEGACY_INDEX_FILES[0]).exists()
+        ]
+
+    def _namespace(self, namespace: Optional[str], create: bool = False) -> Optional[_Namespace]:
+        """The loaded namespace, or None if it does not exist and ``create`` is false."""
+        namespace = namespace or ""
+        path = self._namespace_dir(namespace)
+        with self._lock:
+            holder = self._namespaces.get(namespace)
+            if holder is None:
+                if not create and not ((path / MANIFEST_FILE).exists() or (path / LEGACY_INDEX_FILES[0]).exists()):
+                    return None
+                holder = self._namespaces[namespace] = _Namespace(path)
+        if holder.index is None:
+            with holder.lock:
+                if holder.index is None:
+                    if holder.store is None:
+                        holder.store = SegmentedVectorStore(holder.path)
+                        holder.store.start_compactor(self.compact_interval)
+                    with holder.store.locked():
+                        self._load(holder)
+        return holder
+
+    def _get_index(self, namespace: Optional[str], create: bool = False) -> Optional[IVFIndex]:
+        """A namespace's index, caught up with writes from other processes."""
+        holder = self._namespace(namespace, create)
+        if holder is None:
+            return None
+        version = holder.store.manifest_version()
+        if version != holder.synced[0]:
+            if version is None:
+                # Deleted by another process
+                with self._lock:
+                    if self._namespaces.get(namespace or "") is holder:
+                        del self._namespaces[namespace or ""]
+                holder.store.stop_compactor()
+                return None
+            with holder.lock, holder.store.locked():
+                self._sync(holder)
+        return holder.index
+
+    def _load(self, holder: _Namespace):
+        """Build a namespace's index over its mapped segments (store lock held)."""
+        if (holder.path / LEGACY_INDEX_FILES[0]).exists() and not (holder.path / MANIFEST_FILE).exists():
+            holder.index = IVFIndex.load(holder.path)
+            self._snapshot(holder)
+            for name in LEGACY_INDEX_FILES:
+                (holder.path / name).unlink(missing_ok=True)
+            return
+
+        state_path = holder.path / IVF_STATE_FILE
+        state = {}
+        if state_path.exists():
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        version = state.get("version", 0)
+        extra = f"ivf_{version}"
+        ids, vectors, metadata, extras = holder.store.live_rows([extra])
+        centroids = np.load(holder.path / state["centroids"]) if state.get("centroids") else None
+        # Rows written without the current assignment get theirs recomputed
+        holder.index = IVFIndex.from_arrays(self.dimension, ids, vectors, metadata, centroids=centroids,
+                                            assignment=extras.get(extra), trained_size=state.get("trained_size", 0),
+                                            version=version, nprobe=self.nprobe, train_threshold=self.train_threshold)
+        holder.version = version
+        holder.synced = holder.store.state()
+
+    def _sync(self, holder: _Namespace):
+        """
+        Merge other processes' writes into a namespace's index (store lock held)
+
+        Appended segments and deletes are applied incrementally; after a
+        rewrite elsewhere (a retrained snapshot) the index is rebuilt from
+        the segments. Either way, changes not yet persisted here win.
+        """
+        store = holder.store
+        if store.manifest_version() == holder.synced[0]:
+            return
+        changes = store.changes_since(holder.synced)
+        if changes is None:
+            ids, vectors, metadata, _ = holder.index.export(holder.changed)
+            removed = holder.changed.difference(ids)
+            pending = set(holder.changed)
+            self._load(holder)
+            if ids:
+                holder.index.upsert(ids, vectors, metadata)
+            if removed:
+                holder.index.delete(removed)
+            holder.changed = pending
+            return
+        ids, vectors, metadata, deleted = changes
+        keep = [row for row, vector_id in enumerate(ids) if vector_id not in holder.changed]
+        if keep:
+            holder.index.upsert([ids[row] for row in keep], vectors[keep], [metadata[row] for row in keep])
+        deleted = [vector_id for vector_id in deleted if vector_id not in holder.changed]
+        if deleted:
+            holder.index.delete(deleted)
+        holder.synced = store.state()
+
+    def _changed(self, holder: _Namespace, ids: List[str]):
+        holder.changed.update(ids)
+        if self.autosave:
+            self._persist(holder)
+
+    def _persist(self, holder: _Namespace):
+        """
+        Write a namespace's changes as a new segment (its lock and the store lock held, index synced)
+
+        After the index retrained, every assignment changed, so the
+        namespace is rewritten as one snapshot segment instead.
+        """
+        index, store = holder.index, holder.store
+        if index.version != holder.version:
+            self._snapshot(holder)
+            return
+        if not holder.changed:
+            return
+        ids, vectors, metadata, assignment = index.export(holder.changed)
+        deleted = holder.changed.difference(ids)
+        if deleted:
+            store.delete(list(deleted))
+        if ids:
+            extras = {f"ivf_{index.version}": assignment} if assignment is not None else None
+            store.add(ids, vectors, metadata, extras=extras)
+        store.flush()
+        holder.changed.clear()
+        holder.synced = store.state()
+
+    def _snapshot(self, holder: _Namespace):
+        """Rewrite a namespace from its index, along with the current centroids."""
+        index = holder.index
+        ids, vectors, metadata, assignment = index.export()
+        state = {"version": index.version, "trained_size": index.stats()["trained_size"], "centroids": None}
+        if index.trained:
+            state["centroids"] = f"centroids-{index.version}.npy"
+            self._write_atomic(holder.path / state["centroids"], lambda f: np.save(f, index.centroids))
+        extras = {f"ivf_{index.version}": assignment} if assignment is not None else None
+        holder.store.rewrite(ids, vectors, metadata, extras=extras)
+        self._write_atomic(holder.path / IVF_STATE_FILE, lambda f: f.write(json.dumps(state).encode("utf-8")))
+        for path in holder.path.glob("centroids-*.npy"):
+            if path.name != state["centroids"]:
+                path.unlink(missing_ok=True)
+        holder.version = index.version
+        holder.changed.clear()
+        holder.synced = holder.store.state()
+
+    @staticmethod
+    def _write_atomic(path: Path, write):
+        temp = path.with_name(f".{path.name}.tmp")
+        with open(temp, 'wb') as f:
+            write(f)
+        os.replace(temp, path)
+
+    def upsert_vector(self, vector_id: str, embedding: List[float], metadata: Dict[str, Any], namespace: Optional[str] = None):
+        """
+        Upsert a single vector
+
+        Args:
+            vector_id (str): Unique identifier for the vector
+            embedding (List[float]): Vector embedding
+            metadata (Dict[str, Any]): Metadata associated with the vector
+            namespace (Optional[str]): Optional namespace
+        """
+        self.upsert_batch([{"id": vector_id, "values": embedding, "metadata": metadata}], namespace=namespace)
+
+    def upsert_batch(self, vectors: List[Dict[str, Any]], namespace: Optional[str] = None):
+        """
+        Upsert multiple vectors
+
+        Args:
+            vectors (List[Dict]): Vectors with 'id', 'values' and 'metadata' keys
+            namespace (Optional[str]): Optional namespace
+        """
+        try:
+            if not vectors:
+                return
+            if self.chunk_store:
+                vectors = self.chunk_store.detach_texts(vectors, namespace)
+            holder = self._namespace(namespace, create=True)
+            with holder.lock, holder.store.locked():
+                self._sync(holder)
+                ids = [vector["id"] for vector in vectors]
+                holder.index.upsert(ids, [vector["values"] for vector in vectors],
+                                    [vector.get("metadata") or {} for vector in vectors])
+                self._changed(holder, ids)
+        except Exception as e:
+            raise Exception(f"Error upserting batch: {str(e)}")
+
+    def create_session_vectors(self, texts: List[str], embeddings: List[List[float]], session_id: str, document_name: str = None,
+                               chunk_metadata: Optional[List[Dict[str, Any]]] = None,
+                               id_prefix: Optional[str] = None, start_index: int = 0):
+        """
+        Create vectors with session-specific metadata and namespace
+
+        Uses the same record layout and ID scheme as PineconeClient.create_session_vectors.
+
+        Returns:
+            bool: Success status
+        """
+        try:
+            vectors = []
+            for i, (text, embedding) in enumerate(zip(texts, embeddings), start=start_index):
+                metadata = {
+                    "text": text,
+                    "session_id": session_id,
+                    "chunk_index": i,
+                    "document_name": document_name or "unknown",
+                    "created_at": str(uuid.uuid1().time)
+                }
+                if chunk_metadata and i - start_index < len(chunk_metadata):
+                    metadata.update({k: v for k, v in chunk_metadata[i - start_index].items() if v is not None})
+                vectors.append({
+                    "id": f"{id_prefix}_{i}" if id_prefix else f"{session_id}_{uuid.uuid4()}",
+                    "values": embedding,
+                    "metadata": metadata
+                })
+
+            self.upsert_batch(vectors, namespace=session_id)
+            return True
+        except Exception as e:
+            raise Exception(f"Error creating session vectors: {str(e)}")
+
+    def query_vectors(self, query_embedding: List[float], top_k: int = 5,
+                     filter_dict: Dict[str, Any] = None, namespace: Optional[str] = None,
+                     page_range: Optional[Tuple[int, int]] = None,
+                     nprobe: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Query a namespace for similar vectors
+
+        Args:
+            query_embedding (List[float]): Query vector
+            top_k (int): Number of top results to return
+            filter_dict (Dict[str, Any]): Optional metadata filter
+            namespace (Optional[str]): Optional namespace to query
+            page_range (Optional[Tuple[int, int]]): Optional (first, last) page range
+            nprobe (Optional[int]): Clusters to scan, overrides the client default
+
+        Returns:
+            Dict[str, Any]: Query results in Pinecone's shape
+        """
+        try:
+            if page_range:
+                page_filter = page_range_filter(*page_range)
+                filter_dict = {"$and": [filter_dict, page_filter]} if filter_dict else page_filter
+
+            # The index locks itself; the namespace lock would also wait for disk writes
+            index = self._get_index(namespace)
+            matches = []
+            if index is not None:
+                for vector_id, score, metadata in index.search(query_embedding, top_k, nprobe=nprobe, filter_dict=filter_dict):
+                    matches.append({"id": vector_id, "score": score, "metadata": metadata})
+            results = {"matches": matches, "namespace": namespace or ""}
+            return self.chunk_store.hydrate(results, namespace) if self.chunk_store else results
+        except Exception as e:
+            raise Exception(f"Error querying vectors: {str(e)}")
+
+    def query_session_vectors(self, query_embedding: List[float], session_id: str, top_k: int = 5,
+                             filter_dict: Dict[str, Any] = None,
+                             page_range: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        """
+        Query vectors within a specific session namespace
+        """
+        return self.query_vectors(query_embedding, top_k, filter_dict, namespace=session_id,
+                                  page_range=page_range)
+
+    def delete_vector(self, vector_id: str, namespace: Optional[str] = None):
+        """
+        Delete a vector (tombstoned until the namespace is compacted)
+        """
+        try:
+            holder = self._namespace(namespace)
+            if holder is not None:
+                with holder.lock, holder.store.locked():
+                    self._sync(holder)
+                    if holder.index.delete([vector_id]):
+                        self._changed(holder, [vector_id])
+            if self.chunk_store:
+                self.chunk_store.delete(namespace, [vector_id])
+        except Exception as e:
+            raise Exception(f"Error deleting vector: {str(e)}")
+
+    def delete_by_filter(self, filter_dict: Dict[str, Any], namespace: Optional[str] = None):
+        """
+        Delete vectors matching filter criteria
+        """
+        try:
+            holder = self._namespace(namespace)
+            if holder is None:
+                return
+            with holder.lock, holder.store.locked():
+                self._sync(holder)
+                ids = [vector_id for vector_id, _ in holder.index.filter_rows(filter_dict)]
+                if self.chunk_store:
+                    self.chunk_store.delete(namespace, ids)
+                if holder.index.delete(ids):
+                    self._changed(holder, ids)
+        except Exception as e:
+            raise Exception(f"Error deleting vectors by filter: {str(e)}")
+
+    def delete_namespace(self, namespace: str):
+        """
+        Delete all vectors in a specific namespace
+        """
+        try:
+            with self._lock:
+                holder = self._namespaces.pop(namespace or "", None)
+            if holder is not None:
+                # Let a write in progress finish before its files go
+                with holder.lock:
+                    if holder.store is not None:
+                        holder.store.close()
+                    shutil.rmtree(self._namespace_dir(namespace), ignore_errors=True)
+            else:
+                shutil.rmtree(self._namespace_dir(namespace), ignore_errors=True)
+            if self.chunk_store:
+                self.chunk_store.delete_namespace(namespace)
+        except Exception as e:
+            raise Exception(f"Error deleting namespace: {str(e)}")
+
+    def clear_session_data(self, session_id: str):
+        """
+        Clear all vectors for a specific session
+        """
+        return self.delete_namespace(session_id)
+
+    def get_index_stats(self, namespace: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get statistics in the shape of Pinecone's describe_index_stats
+
+        Args:
+            namespace (Optional[str]): Optional namespace to restrict the stats to
+
+        Returns:
+            Dict[str, Any]: Index statistics
+        """
+        with self._lock:
+            loaded = {name for name, holder in self._namespaces.items() if holder.index is not None}
+        namespaces = {}
+        for name in loaded | set(self._stored_namespaces()):
+            if namespace is not None and name != namespace:
+                continue
+            if name in loaded:
+                index = self._get_index(name)
+                if index is not None:
+                    namespaces[name] = {"vector_count": len(index)}
+                continue
+            manifest = self._namespace_dir(name) / MANIFEST_FILE
+            if not manifest.exists():
+                # Old format, counted once migrated
+                namespaces[name] = {"vector_count": len(self._get_index(name))}
+                continue
+            with open(manifest, 'r', encoding='utf-8') as f:
+                namespaces[name] = {"vector_count": json.load(f)["vector_count"]}
+        return {
+            "dimension": self.dimension,
+            "total_vector_count": sum(item["vector_count"] for item in namespaces.values()),
+            "namespaces": namespaces
+        }
+
+    def get_session_stats(self, session_id: str) -> Dict[str, Any]:
+        """
+        Get statistics for a specific session namespace
+        """
+        return self.get_index_stats(namespace=session_id)
+
+    def list_vectors(self, prefix: str = None, limit: int = 100) -> List[str]:
+        """
+        List vector IDs across all namespaces
+
+        Args:
+            prefix (str): Optional prefix filter
+            limit (int): Maximum number of IDs to return
+
+        Returns:
+            List[str]: List of vector IDs
+        """
+        ids = []
+        with self._lock:
+            names = set(self._namespaces) | set(self._stored_namespaces())
+        for name in sorted(names):
+            index = self._get_index(name)
+            for vector_id, _ in index.items() if index is not None else []:
+                if prefix and not vector_id.startswith(prefix):
+                    continue
+                ids.append(vector_id)
+                if len(ids) >= limit:
+                    return ids
+        return ids
+
+    def clear_index(self):
+        """
+        Clear all vectors from every namespace
+        """
+        with self._lock:
+            names = set(self._namespaces) | set(self._stored_namespaces())
+        for namespace in names:
+            self.delete_namespace(namespace)
+
+    def search_by_metadata(self, filter_dict: Dict[str, Any], top_k: int = 10, namespace: Optional[str] = None,
+                           include_metadata: bool = True) -> Dict[str, Any]:
+        """
+        Search vectors by metadata only (without vector similarity)
+        """
+        index = self._get_index(namespace)
+        matches = []
+        if index is not None:
+            for vector_id, metadata in index.filter_rows(filter_dict)[:top_k]:
+                matches.append({"id": vector_id, "score": 0.0, "metadata": metadata if include_metadata else None})
+        results = {"matches": matches, "namespace": namespace or ""}
+        return self.chunk_store.hydrate(results, namespace) if self.chunk_store and include_metadata else results
+
+    def get_documents_by_filename(self, filename: str) -> List[Dict[str, Any]]:
+        """
+        Get all document chunks for a specific filename
+        """
+        results = self.search_by_metadata({"filename": filename}, top_k=1000)
+        documents = [
+            {'id': match['id'], 'metadata': match['metadata'], 'score': match.get('score', 0)}
+            for match in results.get('matches', [])
+        ]
+        documents.sort(key=lambda x: x['metadata'].get('chunk_index', 0))
+        return documents
@@ -0,0 +1,228 @@
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    if isinstance(value, (list, tuple)) and operator in ("$eq", "$ne", "$in", "$nin"):
+        # List fields match when any element does, as in Pinecone
+        positive = "$eq" if operator in ("$eq", "$ne") else "$in"
+        hit = any(_compare(item, positive, operand) for item in value)
+        return hit if operator == positive else not hit
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if operator == "$exists":
+        return (value is not None) == bool(operand)
+    if value is None:
+        return False
+    try:
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        if operator == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+def matches_filter(metadata: Optional[Dict[str, Any]], filter_dict: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluate a Pinecone-style metadata filter against one record
+
+    Supports $and/$or, the comparison operators $eq, $ne, $gt, $gte, $lt,
+    $lte, $in, $nin and $exists, and the {"field": value} shorthand for $eq.
+
+    Args:
+        metadata (Optional[Dict]): Record metadata
+        filter_dict (Optional[Dict]): Filter, e.g. {"page_start": {"$lte": 3}}
+
+    Returns:
+        bool: True if the record matches (an empty filter matches everything)
+    """
+    if not filter_dict:
+        return True
+    metadata = metadata or {}
+
+    for key, condition in filter_dict.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_compare(value, operator, operand) for operator, operand in condition.items()):
+                return False
+        elif not _compare(metadata.get(key), "$eq", condition):
+            return False
+    return True
+
+def page_range_filter(page_start: int, page_end: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Build a metadata filter matching chunks that overlap a page range
+    
+    Args:
+        page_start (int): First page of the range (1-based)
+        page_end (Optional[int]): Last page of the range, defaults to page_start
+        
+    Returns:
+        Dict[str, Any]: Pinecone metadata filter
+    """
+    if page_end is None:
+        page_end = page_start
+    return {
+        "$and": [
+            {"page_start": {"$lte": page_end}},
+            {"page_end": {"$gte": page_start}}
+        ]
+    }
+
+class MetadataIndex:
+    """
+    Inverted index from metadata field values to rows, for pre-filtering.
+
+    Each (field, value) pair keeps the sorted rows holding it; evaluating a
+    Pinecone-style filter combines those row sets into one candidate bitmap
+    (a boolean mask over all rows) before any vector is scored. Row sets
+    are stored as sorted arrays rather than dense bitmaps so that
+    high-cardinality fields such as filenames cost memory proportional to
+    the rows, not rows x distinct values.
+
+    Range operators ($gt, $lt, ...) are answered from the distinct values
+    of a field, so every operator matches_filter supports is indexed.
+    List-valued fields index each element, so {"tags": "x"} matches a
+    record whose tags contain "x".
+    """
+
+    def __init__(self, fields: Optional[Sequence[str]] = None):
+        """
+        Args:
+            fields (Optional[Sequence[str]]): Fields to index; None indexes
+                every field with scalar or list values
+        """
+        self.fields = set(fields) if fields is not None else None
+        self.size = 0
+        self._postings: Dict[str, Dict[Hashable, List[int]]] = {}
+        self._arrays: Dict[tuple, np.ndarray] = {}
+        self._deleted: List[int] = []
+        self._unindexed = set()
+
+    def add(self, metadata: Optional[Dict[str, Any]]) -> int:
+        """
+        Index the metadata of the next row
+
+        Returns:
+            int: The row number assigned
+        """
+        row = self.size
+        self.size += 1
+        for field, value in (metadata or {}).items():
+            if self.fields is not None and field not in self.fields:
+                continue
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            for item in values:
+                if item is None:
+                    continue
+                if not isinstance(item, Hashable):
+                    self._unindexed.add(field)
+                    continue
+                self._postings.setdefault(field, {}).setdefault(item, []).append(row)
+                self._arrays.pop((field, item), None)
+        return row
+
+    def extend(self, metadata: Iterable[Optional[Dict[str, Any]]]):
+        for item in metadata:
+            self.add(item)
+
+    def remove(self, row: int):
+        """Exclude a row from every future result."""
+        self._deleted.append(row)
+
+    def values(self, field: str) -> List[Hashable]:
+        """Distinct indexed values of a field."""
+        return list(self._postings.get(field, {}))
+
+    def rows(self, field: str, value: Hashable) -> np.ndarray:
+        """Sorted rows holding a value (deleted rows included)."""
+        key = (field, value)
+        array = self._arrays.get(key)
+        if array is None:
+            array = self._arrays[key] = np.array(self._postings.get(field, {}).get(value, []), dtype=np.int64)
+        return array
+
+    def can_evaluate(self, filter_dict: Optional[Dict[str, Any]]) -> bool:
+        """True if every field in the filter is indexed."""
+        if not filter_dict:
+            return True
+        for key, condition in filter_dict.items():
+            if key in ("$and", "$or"):
+                if not all(self.can_evaluate(clause) for clause in condition):
+                    return False
+            elif key in self._unindexed or (self.fields is not None and key not in self.fields):
+                return False
+        return True
+
+    def evaluate(self, filter_dict: Optional[Dict[str, Any]]) -> np.ndarray:
+        """
+        Evaluate a filter into a candidate bitmap
+
+        Args:
+            filter_dict (Optional[Dict]): Pinecone-style filter
+
+        Returns:
+            np.ndarray: Boolean mask of length self.size, True for matching rows
+        """
+        if not self.can_evaluate(filter_dict):
+            raise ValueError("Filter references fields that are not indexed")
+        mask = self._evaluate(filter_dict)
+        if self._deleted:
+            mask[self._deleted] = False
+        return mask
+
+    def candidates(self, filter_dict: Optional[Dict[str, Any]]) -> List[int]:
+        """Matching rows, ascending."""
+        return np.flatnonzero(self.evaluate(filter_dict)).tolist()
+
+    def _evaluate(self, filter_dict: Optional[Dict[str, Any]]) -> np.ndarray:
+        mask = np.ones(self.size, dtype=bool)
+        for key, condition in (filter_dict or {}).items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._evaluate(clause)
+            elif key == "$or":
+                union = np.zeros(self.size, dtype=bool)
+                for clause in condition:
+                    union |= self._evaluate(clause)
+                mask &= union
+            elif isinstance(condition, dict):
+                for operator, operand in condition.items():
+                    mask &= self._field_mask(key, operator, operand)
+            else:
+                mask &= self._field_mask(key, "$eq", condition)
+        return mask
+
+    def _field_mask(self, field: str, operator: str, operand: Any) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        if operator in ("$eq", "$ne"):
+            mask[self.rows(field, operand)] = True
+        elif operator in ("$in", "$nin"):
+            for value in operand:
+                mask[self.rows(field, value)] = True
+        elif operator == "$exists":
+            for value in self.values(field):
+                mask[self.rows(field, value)] = True
+            return mask if operand else ~mask
+        else:
+            for value in self.values(field):
+                if _compare(value, operator, operand):
+                    mask[self.rows(field, value)] = True
+        return ~mask if operator in ("$ne", "$nin") else mask
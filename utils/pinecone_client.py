@@ -1,21 +1,37 @@
 from pinecone import Pinecone, ServerlessSpec
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
+import threading
 import time
 import uuid
+from utils.cache import TTLCache
+from utils.chunk_store import open_chunk_store
+from utils.metadata_filter import page_range_filter
 
 # Load environment variables
 load_dotenv()
 
+# Chunk text store, under the data directory
+CHUNK_STORE_FILE = "chunk_store.db"
+
+# IDs looked up per metadata query when deleting by filter (Pinecone's top_k limit)
+DELETE_PAGE_SIZE = 10000
+
+# IDs per delete request
+DELETE_BATCH_SIZE = 1000
+
 class PineconeClient:
     """
     Client for interacting with Pinecone vector database with session-based namespaces
     """
     
-    def __init__(self):
+    def __init__(self, data_dir: Optional[str] = None):
         """
         Initialize Pinecone client
+        
+        Args:
+            data_dir (Optional[str]): Directory of the local chunk store, defaults to DATA_DIR
         """
         self.api_key = os.getenv("PINECONE_API_KEY")
         self.index_name = os.getenv("PINECONE_INDEX_NAME", "document-chat")
@@ -26,8 +42,36 @@ class PineconeClient:
         # Initialize Pinecone
         self.pc = Pinecone(api_key=self.api_key)
         
-        # Connect to or create index
-        self.index = self._get_or_create_index()
+        # The index connection (list_indexes / create_index) is made on first use
+        self._index = None
+        self._index_lock = threading.Lock()
+        
+        # describe_index_stats is slow; cache it briefly and drop it on writes
+        self._stats_cache = TTLCache("index_stats", max_entries=128,
+                                     ttl_seconds=float(os.getenv("INDEX_STATS_CACHE_TTL", "30")))
+        
+        # Chunk texts are kept locally instead of in vector metadata (None: in metadata, as before)
+        self.chunk_store = open_chunk_store(os.path.join(data_dir or os.getenv("DATA_DIR", "data"), CHUNK_STORE_FILE))
+    
+    @property
+    def index(self):
+        """
+        Pinecone index, connected or created on first access
+        
+        Returns:
+            pinecone.Index: Pinecone index object
+        """
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = self._get_or_create_index()
+        return self._index
+    
+    def connect(self):
+        """
+        Connect to the index now instead of on first use, e.g. from a warm-up thread
+        """
+        return self.index
     
     def _get_or_create_index(self):
         """
@@ -56,13 +100,30 @@ class PineconeClient:
                     )
                 )
                 
-                # Wait for index to be ready
-                time.sleep(10)
+                # Wait for index to be ready instead of a fixed sleep
+                self._wait_until_ready()
                 return self.pc.Index(self.index_name)
                 
         except Exception as e:
             raise Exception(f"Error connecting to Pinecone index: {str(e)}")
     
+    def _wait_until_ready(self, timeout: float = 60.0, poll_interval: float = 0.5):
+        """
+        Poll a newly created index until Pinecone reports it ready
+        
+        Args:
+            timeout (float): Maximum seconds to wait
+            poll_interval (float): Seconds between status checks
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            status = self.pc.describe_index(self.index_name).status
+            ready = status.get('ready') if isinstance(status, dict) else getattr(status, 'ready', False)
+            if ready:
+                return
+            time.sleep(poll_interval)
+        raise TimeoutError(f"Index {self.index_name} was not ready after {timeout:.0f} seconds")
+    
     def upsert_vector(self, vector_id: str, embedding: List[float], metadata: Dict[str, Any], namespace: Optional[str] = None):
         """
         Insert or update a vector in the index
@@ -74,19 +135,21 @@ class PineconeClient:
             namespace (Optional[str]): Optional namespace for the vector
         """
         try:
-            upsert_params = {
-                "vectors": [
-                    {
-                        "id": vector_id,
-                        "values": embedding,
-                        "metadata": metadata
-                    }
-                ]
-            }
+            vectors = [
+                {
+                    "id": vector_id,
+                    "values": embedding,
+                    "metadata": metadata
+                }
+            ]
+            if self.chunk_store:
+                vectors = self.chunk_store.detach_texts(vectors, namespace)
+            upsert_params = {"vectors": vectors}
             if namespace:
                 upsert_params["namespace"] = namespace
             
             self.index.upsert(**upsert_params)
+            self._stats_cache.clear()
         except Exception as e:
             raise Exception(f"Error upserting vector: {str(e)}")
     
@@ -99,6 +162,9 @@ class PineconeClient:
             namespace (Optional[str]): Optional namespace for the vectors
         """
         try:
+            if self.chunk_store:
+                vectors = self.chunk_store.detach_texts(vectors, namespace)
+            
             # Pinecone recommends batches of 100 vectors
             batch_size = 100
             
@@ -108,11 +174,14 @@ class PineconeClient:
                 if namespace:
                     upsert_params["namespace"] = namespace
                 self.index.upsert(**upsert_params)
+            self._stats_cache.clear()
                 
         except Exception as e:
             raise Exception(f"Error upserting batch vectors: {str(e)}")    
     
-    def create_session_vectors(self, texts: List[str], embeddings: List[List[float]], session_id: str, document_name: str = None):
+    def create_session_vectors(self, texts: List[str], embeddings: List[List[float]], session_id: str, document_name: str = None,
+                               chunk_metadata: Optional[List[Dict[str, Any]]] = None,
+                               id_prefix: Optional[str] = None, start_index: int = 0):
         """
         Create vectors with session-specific metadata and namespace
         
@@ -121,14 +190,19 @@ class PineconeClient:
             embeddings (List[List[float]]): List of embeddings for each text
             session_id (str): Session identifier for namespace
             document_name (str): Optional document name
+            chunk_metadata (Optional[List[Dict]]): Extra per-chunk metadata such as
+                page_start, page_end, char_start and char_end
+            id_prefix (Optional[str]): Give vectors the stable IDs "{id_prefix}_{chunk_index}"
+                instead of random ones, so re-sending a batch overwrites it
+            start_index (int): chunk_index of the first text, for documents stored in batches
             
         Returns:
             bool: Success status
         """
         try:
             vectors = []
-            for i, (text, embedding) in enumerate(zip(texts, embeddings)):
-                vector_id = f"{session_id}_{uuid.uuid4()}"
+            for i, (text, embedding) in enumerate(zip(texts, embeddings), start=start_index):
+                vector_id = f"{id_prefix}_{i}" if id_prefix else f"{session_id}_{uuid.uuid4()}"
                 metadata = {
                     "text": text,
                     "session_id": session_id,
@@ -136,6 +210,9 @@ class PineconeClient:
                     "document_name": document_name or "unknown",
                     "created_at": str(uuid.uuid1().time)
                 }
+                if chunk_metadata and i - start_index < len(chunk_metadata):
+                    # Pinecone rejects null metadata values
+                    metadata.update({k: v for k, v in chunk_metadata[i - start_index].items() if v is not None})
                 vectors.append({
                     "id": vector_id,
                     "values": embedding,
@@ -148,7 +225,8 @@ class PineconeClient:
             raise Exception(f"Error creating session vectors: {str(e)}")
     
     def query_vectors(self, query_embedding: List[float], top_k: int = 5, 
-                     filter_dict: Dict[str, Any] = None, namespace: Optional[str] = None) -> Dict[str, Any]:
+                     filter_dict: Dict[str, Any] = None, namespace: Optional[str] = None,
+                     page_range: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
         """
         Query the index for similar vectors
         
@@ -157,11 +235,17 @@ class PineconeClient:
             top_k (int): Number of top results to return
             filter_dict (Dict[str, Any]): Optional metadata filter
             namespace (Optional[str]): Optional namespace to query
+            page_range (Optional[Tuple[int, int]]): Optional (first, last) page
+                range; only chunks overlapping it are searched
             
         Returns:
             Dict[str, Any]: Query results
         """
         try:
+            if page_range:
+                page_filter = page_range_filter(*page_range)
+                filter_dict = {"$and": [filter_dict, page_filter]} if filter_dict else page_filter
+            
             query_params = {
                 "vector": query_embedding,
                 "top_k": top_k,
@@ -175,13 +259,17 @@ class PineconeClient:
                 query_params["namespace"] = namespace
             
             results = self.index.query(**query_params)
+            if self.chunk_store:
+                # Only the top-k texts are read, in one batch
+                results = self.chunk_store.hydrate(results, namespace)
             return results
             
         except Exception as e:
             raise Exception(f"Error querying vectors: {str(e)}")    
     
     def query_session_vectors(self, query_embedding: List[float], session_id: str, top_k: int = 5, 
-                             filter_dict: Dict[str, Any] = None) -> Dict[str, Any]:
+                             filter_dict: Dict[str, Any] = None,
+                             page_range: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
         """
         Query vectors within a specific session namespace
         
@@ -190,11 +278,13 @@ class PineconeClient:
             session_id (str): Session identifier
             top_k (int): Number of top results to return
             filter_dict (Dict[str, Any]): Optional metadata filter
+            page_range (Optional[Tuple[int, int]]): Optional (first, last) page range
             
         Returns:
             Dict[str, Any]: Query results
         """
-        return self.query_vectors(query_embedding, top_k, filter_dict, namespace=session_id)
+        return self.query_vectors(query_embedding, top_k, filter_dict, namespace=session_id,
+                                  page_range=page_range)
     
     def delete_vector(self, vector_id: str, namespace: Optional[str] = None):
         """
@@ -209,6 +299,9 @@ class PineconeClient:
             if namespace:
                 delete_params["namespace"] = namespace
             self.index.delete(**delete_params)
+            self._stats_cache.clear()
+            if self.chunk_store:
+                self.chunk_store.delete(namespace, [vector_id])
         except Exception as e:
             raise Exception(f"Error deleting vector: {str(e)}")
     
@@ -221,10 +314,33 @@ class PineconeClient:
             namespace (Optional[str]): Optional namespace
         """
         try:
+            if self.chunk_store:
+                # Deleting by filter does not report IDs, so delete page by page by ID,
+                # dropping the stored texts along with the vectors
+                seen = set()
+                while True:
+                    matches = self.search_by_metadata(filter_dict, top_k=DELETE_PAGE_SIZE, namespace=namespace,
+                                                      include_metadata=False)
+                    # Deletes become visible to queries with a delay; stop once a page brings nothing new
+                    ids = [match["id"] for match in matches["matches"] if match["id"] not in seen]
+                    if not ids:
+                        break
+                    seen.update(ids)
+                    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+                        delete_params = {"ids": ids[start:start + DELETE_BATCH_SIZE]}
+                        if namespace:
+                            delete_params["namespace"] = namespace
+                        self.index.delete(**delete_params)
+                    self.chunk_store.delete(namespace, ids)
+                    if len(matches["matches"]) < DELETE_PAGE_SIZE:
+                        break
+                self._stats_cache.clear()
+                return
             delete_params = {"filter": filter_dict}
             if namespace:
                 delete_params["namespace"] = namespace
             self.index.delete(**delete_params)
+            self._stats_cache.clear()
         except Exception as e:
             raise Exception(f"Error deleting vectors by filter: {str(e)}")
     
@@ -237,6 +353,9 @@ class PineconeClient:
         """
         try:
             self.index.delete(delete_all=True, namespace=namespace)
+            self._stats_cache.clear()
+            if self.chunk_store:
+                self.chunk_store.delete_namespace(namespace)
         except Exception as e:
             raise Exception(f"Error deleting namespace: {str(e)}")
     
@@ -260,11 +379,12 @@ class PineconeClient:
             Dict[str, Any]: Index statistics
         """
         try:
-            if namespace:
-                stats = self.index.describe_index_stats(filter={"namespace": namespace})
-            else:
-                stats = self.index.describe_index_stats()
-            return stats
+            def load_stats():
+                if namespace:
+                    return self.index.describe_index_stats(filter={"namespace": namespace})
+                return self.index.describe_index_stats()
+            
+            return self._stats_cache.get_or_compute(namespace, load_stats)
         except Exception as e:
             raise Exception(f"Error getting index stats: {str(e)}")    
     
@@ -306,10 +426,14 @@ class PineconeClient:
         """
         try:
             self.index.delete(delete_all=True)
+            self._stats_cache.clear()
+            if self.chunk_store:
+                self.chunk_store.clear()
         except Exception as e:
             raise Exception(f"Error clearing index: {str(e)}")
     
-    def search_by_metadata(self, filter_dict: Dict[str, Any], top_k: int = 10, namespace: Optional[str] = None) -> Dict[str, Any]:
+    def search_by_metadata(self, filter_dict: Dict[str, Any], top_k: int = 10, namespace: Optional[str] = None,
+                           include_metadata: bool = True) -> Dict[str, Any]:
         """
         Search vectors by metadata only (without vector similarity)
         
@@ -317,6 +441,7 @@ class PineconeClient:
             filter_dict (Dict[str, Any]): Metadata filter
             top_k (int): Number of results to return
             namespace (Optional[str]): Optional namespace to search
+            include_metadata (bool): Return metadata (and chunk texts) with the IDs
             
         Returns:
             Dict[str, Any]: Search results
@@ -329,7 +454,7 @@ class PineconeClient:
                 "vector": dummy_vector,
                 "top_k": top_k,
                 "filter": filter_dict,
-                "include_metadata": True,
+                "include_metadata": include_metadata,
                 "include_values": False
             }
             
@@ -337,6 +462,8 @@ class PineconeClient:
                 query_params["namespace"] = namespace
             
             results = self.index.query(**query_params)
+            if self.chunk_store and include_metadata:
+                results = self.chunk_store.hydrate(results, namespace)
             
             return results
             
@@ -0,0 +1,301 @@
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: single writer process only
+    fcntl = None
+
+# Metadata fields a query can be routed on (as set by document_metadata)
+ROUTING_FIELDS = ("manufacturer", "doc_type", "category", "subcategory")
+
+# Catch-all values that say nothing about a document
+GENERIC_VALUES = {"", "general", "unknown", "other"}
+
+# Brands recognized in file names
+KNOWN_MANUFACTURERS = ("hp", "dell", "lenovo", "asus", "amd", "nvidia", "intel")
+
+# File-name keywords that imply a doc_type; the first match wins
+DOC_TYPE_KEYWORDS = (
+    ("manual", ("manual", "guide")),
+    ("troubleshooting", ("troubleshoot",)),
+    ("training", ("scenario", "training")),
+    ("technical", ("compatibility", "technical")),
+    ("faq", ("faq",)),
+    ("policy", ("policy",))
+)
+
+# Everyday phrasings for values that rarely appear verbatim in questions
+TERM_ALIASES = {
+    "doc_type": {
+        "troubleshooting": ["troubleshoot", "won't", "wont", "not working", "doesn't work", "does not work", "fails to"],
+        "manual": ["guide", "how to", "how do i"],
+        "faq": ["frequently asked"],
+        "policy": ["policies"],
+        "training": ["scenario"],
+        "technical": ["compatibility", "compatible", "specs", "specifications"]
+    }
+}
+
+def document_metadata(file_path: Union[str, Path]) -> Dict[str, str]:
+    """
+    Routing-field values implied by a document's location and file name
+
+    Files under documents/<category>/[<subcategory>/] (the layout of
+    data/documents) take category and subcategory from the folders;
+    doc_type and manufacturer come from keywords in the file name.
+    Anything that cannot be inferred is "general".
+
+    Args:
+        file_path (Union[str, Path]): Path or file name of the document
+
+    Returns:
+        Dict[str, str]: Value per ROUTING_FIELDS entry
+    """
+    path = Path(file_path)
+    folders = path.parts[:-1]
+    if "documents" in folders:
+        folders = folders[folders.index("documents") + 1:]
+    else:
+        folders = ()
+    name = path.stem.lower()
+    return {
+        "manufacturer": next((brand for brand in KNOWN_MANUFACTURERS if brand in name), "general"),
+        "doc_type": next((doc_type for doc_type, keywords in DOC_TYPE_KEYWORDS
+                          if any(keyword in name for keyword in keywords)), "general"),
+        "category": folders[0] if folders else "general",
+        "subcategory": folders[1] if len(folders) > 1 else "general"
+    }
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton for case-insensitive whole-word phrase matching.
+
+    Finds every occurrence of every pattern in one pass over the text,
+    however many patterns there are.
+    """
+
+    def __init__(self, patterns: Dict[str, Any]):
+        """
+        Args:
+            patterns (Dict[str, Any]): Phrase -> payload returned on a match
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, Any]]] = [[]]
+
+        for phrase, payload in patterns.items():
+            phrase = phrase.lower()
+            if not phrase:
+                continue
+            state = 0
+            for char in phrase:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append((len(phrase), payload))
+
+        # Breadth-first pass to set failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                # Children of the root fail back to the root
+                self._fail[child] = self._goto[fallback].get(char, 0) if state else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text: str) -> List[Tuple[int, int, Any]]:
+        """
+        All whole-word matches in the text
+
+        Returns:
+            List[Tuple]: (start, end, payload) per match
+        """
+        text = text.lower()
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, payload in self._output[state]:
+                start, end = position - length + 1, position + 1
+                before = text[start - 1] if start > 0 else " "
+                after = text[end] if end < len(text) else " "
+                if not before.isalnum() and not after.isalnum():
+                    matches.append((start, end, payload))
+        return matches
+
+class MetadataVocabulary:
+    """
+    Distinct routing-field values seen per namespace, persisted as JSON.
+
+    Filled while documents are ingested so the router only proposes
+    filters that can match something in the namespace being searched.
+    """
+
+    def __init__(self, fields: Iterable[str] = ROUTING_FIELDS):
+        self.fields = tuple(fields)
+        self.values: Dict[str, Dict[str, Set[str]]] = {}
+
+    def add(self, metadata: Optional[Dict[str, Any]], namespace: str):
+        """Record the routing-field values of one chunk."""
+        for field in self.fields:
+            value = (metadata or {}).get(field)
+            if isinstance(value, str) and value.lower() not in GENERIC_VALUES:
+                self.values.setdefault(namespace, {}).setdefault(field, set()).add(value)
+
+    def save(self, path: Union[str, Path]):
+        """
+        Write the vocabulary, merging with what is already on disk
+
+        The read-merge-replace runs under a file lock, so concurrent saves
+        (ingestion workers, upload scripts) cannot drop each other's values.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path.with_name(f".{path.name}.lock"), 'a') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                if path.exists():
+                    on_disk = MetadataVocabulary.load(path, self.fields)
+                    for namespace, fields in on_disk.values.items():
+                        for field, values in fields.items():
+                            self.values.setdefault(namespace, {}).setdefault(field, set()).update(values)
+                temp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+                with open(temp, 'w', encoding='utf-8') as f:
+                    json.dump({
+                        namespace: {field: sorted(values) for field, values in fields.items()}
+                        for namespace, fields in self.values.items()
+                    }, f, indent=2)
+                os.replace(temp, path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], fields: Iterable[str] = ROUTING_FIELDS) -> "MetadataVocabulary":
+        vocabulary = cls(fields)
+        path = Path(path)
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                for namespace, stored in json.load(f).items():
+                    vocabulary.values[namespace] = {field: set(values) for field, values in stored.items()}
+        return vocabulary
+
+class QueryRouter:
+    """
+    Turns known metadata terms in a question into a Pinecone filter.
+
+    "HP Pavilion won't boot" becomes
+    {"$and": [{"manufacturer": "hp"}, {"doc_type": "troubleshooting"}]}
+    for a namespace whose vocabulary contains both values. One automaton
+    per namespace is compiled on first use and rebuilt when the
+    vocabulary file changes.
+    """
+
+    def __init__(self, vocabulary_path: Union[str, Path]):
+        """
+        Args:
+            vocabulary_path (Union[str, Path]): JSON file written by MetadataVocabulary.save
+        """
+        self.vocabulary_path = Path(vocabulary_path)
+        self.vocabulary = MetadataVocabulary()
+        self._automata: Dict[str, AhoCorasick] = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            stat = self.vocabulary_path.stat()
+            version = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            version = None
+        if version != self._version:
+            self.vocabulary = MetadataVocabulary.load(self.vocabulary_path)
+            self._automata = {}
+            self._version = version
+
+    def _automaton(self, namespace: str) -> Optional[AhoCorasick]:
+        with self._lock:
+            self._refresh()
+            if namespace not in self._automata:
+                fields = self.vocabulary.values.get(namespace)
+                self._automata[namespace] = AhoCorasick(build_patterns(fields)) if fields else None
+            return self._automata[namespace]
+
+    def analyze(self, query: str, namespace: str) -> Dict[str, List[str]]:
+        """
+        Metadata values mentioned in a query
+
+        Returns:
+            Dict[str, List[str]]: field -> matched values, in query order
+        """
+        automaton = self._automaton(namespace)
+        if automaton is None:
+            return {}
+        found: Dict[str, List[str]] = {}
+        for _, _, targets in automaton.find(query):
+            for field, value in targets:
+                if value not in found.setdefault(field, []):
+                    found[field].append(value)
+        return found
+
+    def route(self, query: str, namespace: str) -> Optional[Dict[str, Any]]:
+        """
+        Build a metadata filter for a query
+
+        Args:
+            query (str): User question
+            namespace (str): Namespace that will be searched
+
+        Returns:
+            Optional[Dict[str, Any]]: Filter, or None when nothing was recognized
+        """
+        clauses = [
+            {field: values[0]} if len(values) == 1 else {field: {"$in": values}}
+            for field, values in self.analyze(query, namespace).items()
+        ]
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def build_patterns(fields: Dict[str, Set[str]]) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Phrases that identify each metadata value
+
+    A value matches as written, with separators turned into spaces,
+    without a plural "s", and through TERM_ALIASES.
+
+    Args:
+        fields (Dict[str, Set[str]]): field -> known values
+
+    Returns:
+        Dict[str, List[Tuple]]: phrase -> [(field, value), ...]
+    """
+    patterns: Dict[str, List[Tuple[str, str]]] = {}
+    for field, values in fields.items():
+        for value in values:
+            base = value.lower().replace("_", " ").replace("-", " ").strip()
+            phrases = {value.lower(), base}
+            if base.endswith("s") and len(base) > 3:
+                phrases.add(base[:-1])
+            phrases.update(TERM_ALIASES.get(field, {}).get(value, []))
+            for phrase in phrases:
+                target = (field, value)
+                if target not in patterns.setdefault(phrase, []):
+                    patterns[phrase].append(target)
+    return patterns
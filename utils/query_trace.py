@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+# Personal data scrubbed from recorded queries, in order
+ANONYMIZE_PATTERNS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"\+?\d[\d\s().-]{7,}\d"), "<number>"),
+    (re.compile(r"\b\d{5,}\b"), "<number>")
+]
+
+def anonymize_query(text: str) -> str:
+    """
+    Replace e-mail addresses, URLs and long numbers in a query with placeholders
+
+    Args:
+        text (str): Query as typed by the user
+
+    Returns:
+        str: Query safe to keep in a trace log
+    """
+    for pattern, placeholder in ANONYMIZE_PATTERNS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+def anonymize_namespace(namespace: str, salt: str = "") -> str:
+    """
+    Stable pseudonym for a session namespace
+
+    The same session always maps to the same pseudonym within a log, so
+    per-session query sequences survive, but the ID itself does not.
+    """
+    return "ns-" + hashlib.blake2b(f"{salt}{namespace}".encode("utf-8"), digest_size=6).hexdigest()
+
+class QueryTraceLog:
+    """
+    Append-only JSON Lines log of anonymized query traces.
+
+    One line per completed RAG operation with the scrubbed query, a
+    pseudonymous namespace, the wall-clock start time and per-stage timings.
+    scripts/capacity_plan.py replays these logs.
+    """
+
+    def __init__(self, path: Union[str, Path], salt: str = None):
+        """
+        Args:
+            path (Union[str, Path]): Log file, created on first write
+            salt (str): Salt for namespace pseudonyms, defaults to QUERY_TRACE_SALT
+        """
+        self.path = Path(path)
+        self.salt = os.getenv("QUERY_TRACE_SALT", "") if salt is None else salt
+        self._lock = threading.Lock()
+
+    def record(self, query: str, namespace: str, started_at: float, timings: Dict[str, float],
+               chunks_retrieved: int = 0):
+        """
+        Append one trace
+
+        Args:
+            query (str): Raw query, anonymized before it is written
+            namespace (str): Raw session namespace, pseudonymized before it is written
+            started_at (float): Epoch seconds when the operation started
+            timings (Dict[str, float]): Stage name -> seconds
+            chunks_retrieved (int): Context chunks used
+        """
+        line = json.dumps({
+            "started_at": round(started_at, 3),
+            "query": anonymize_query(query),
+            "namespace": anonymize_namespace(namespace, self.salt),
+            "timings": {stage: round(seconds, 4) for stage, seconds in timings.items()},
+            "chunks_retrieved": chunks_retrieved
+        }, ensure_ascii=False)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+def load_query_traces(path: Union[str, Path]) -> List[Dict[str, Any]]:
+    """
+    Read a trace log, skipping malformed lines
+
+    Returns:
+        List[Dict[str, Any]]: Traces ordered by start time
+    """
+    traces = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                trace = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(trace, dict) and trace.get("query") and "started_at" in trace:
+                traces.append(trace)
+    traces.sort(key=lambda trace: trace["started_at"])
+    return traces
@@ -0,0 +1,178 @@
+"""
+Minimal HTTP API for RAGService as a plain ASGI application.
+
+No web framework is required; serve it with any ASGI server, e.g.::
+
+    uvicorn utils.rag_api:app --workers 4
+
+Endpoints:
+    GET  /health                     service readiness
+    POST /sessions                   create a session -> {"session_id"}
+    POST /query                      {"query", "session_id"} -> {"answer"}
+    POST /query/stream               same body, answer streamed as plain text
+    POST /ingest?session_id=&filename=   raw file bytes as the request body
+"""
+import asyncio
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qs
+
+from utils.rag_service import RAGService
+
+logger = logging.getLogger(__name__)
+
+async def _read_body(receive: Callable) -> bytes:
+    body = bytearray()
+    while True:
+        message = await receive()
+        body.extend(message.get('body', b''))
+        if not message.get('more_body'):
+            return bytes(body)
+
+async def _read_json(receive: Callable) -> Dict[str, Any]:
+    request = json.loads(await _read_body(receive) or b'{}')
+    if not isinstance(request, dict):
+        raise ValueError("Request body must be a JSON object")
+    return request
+
+async def _send_json(send: Callable, status: int, payload: Dict[str, Any]):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+class RAGApp:
+    """
+    ASGI application exposing a RAGService over HTTP
+
+    Queries use the service's async path and blocking work (ingestion,
+    session creation) runs in worker threads, so one event loop can serve
+    many concurrent requests.
+    """
+
+    def __init__(self, service_factory: Callable[[], RAGService]):
+        self.service_factory = service_factory
+        self._service: Optional[RAGService] = None
+        self._lock = threading.Lock()
+
+    @property
+    def service(self) -> RAGService:
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    self._service = self.service_factory()
+        return self._service
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, asgi_send: Callable):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, asgi_send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        route = (scope['method'], scope['path'].rstrip('/') or '/')
+        params = {key: values[0] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        started = False
+
+        async def send(message: Dict[str, Any]):
+            nonlocal started
+            started = started or message['type'] == 'http.response.start'
+            await asgi_send(message)
+
+        try:
+            if route == ('GET', '/health'):
+                await _send_json(send, 200, {'status': 'ok', 'services': self.service.services.status()})
+            elif route == ('POST', '/sessions'):
+                session_id = await asyncio.to_thread(self.service.session_manager.create_new_session)
+                await _send_json(send, 201, {'session_id': session_id})
+            elif route == ('POST', '/query'):
+                request = await _read_json(receive)
+                query, session_id = self._require(request, 'query', 'session_id')
+                answer = await self.service.aquery(query, session_id)
+                await _send_json(send, 200, {'answer': answer})
+            elif route == ('POST', '/query/stream'):
+                request = await _read_json(receive)
+                query, session_id = self._require(request, 'query', 'session_id')
+                await self._stream(send, self.service.astream_query(query, session_id))
+            elif route == ('POST', '/ingest'):
+                session_id, filename = self._require(params, 'session_id', 'filename')
+                data = await _read_body(receive)
+                document = await asyncio.to_thread(self.service.ingest, data, session_id, filename)
+                await _send_json(send, 201, document)
+            else:
+                await _send_json(send, 404, {'error': f"No route for {scope['method']} {scope['path']}"})
+        except Exception as e:
+            if started:
+                # Too late for an error response, e.g. the client went away mid-stream
+                logger.warning(f"Error after responding to {scope['path']}: {e}")
+            elif isinstance(e, ValueError):
+                await _send_json(send, 400, {'error': str(e)})
+            else:
+                logger.error(f"Error handling {scope['path']}: {e}", exc_info=True)
+                await _send_json(send, 500, {'error': str(e)})
+
+    @staticmethod
+    def _require(data: Dict[str, Any], *fields: str):
+        missing = [field for field in fields if not data.get(field)]
+        if missing:
+            raise ValueError(f"Missing required field(s): {', '.join(missing)}")
+        return tuple(data[field] for field in fields)
+
+    async def _stream(self, send: Callable, fragments):
+        """Send fragments as a chunked 200 response; a failure mid-answer ends the body with an error line."""
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8')]
+        })
+        trailer = b''
+        try:
+            while True:
+                # Only generation errors become a trailer; a failed send propagates
+                try:
+                    fragment = await fragments.__anext__()
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    logger.error(f"Error streaming answer: {e}", exc_info=True)
+                    trailer = f"\n\n[error: {e}]".encode('utf-8')
+                    break
+                await send({'type': 'http.response.body', 'body': fragment.encode('utf-8'), 'more_body': True})
+        finally:
+            await fragments.aclose()
+        await send({'type': 'http.response.body', 'body': trailer, 'more_body': False})
+
+    async def _lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Connect clients in the background so the worker accepts traffic immediately
+                self.service.services.warm_up()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+def create_app(service_factory: Optional[Callable[[], RAGService]] = None) -> RAGApp:
+    """
+    Create the ASGI app
+
+    Args:
+        service_factory (Optional[Callable]): Builds the RAGService on first use;
+            defaults to one configured from environment variables
+
+    Returns:
+        RAGApp: ASGI application
+    """
+    def default_factory() -> RAGService:
+        from utils.config import load_config
+        return RAGService(load_config())
+
+    return RAGApp(service_factory or default_factory)
+
+app = create_app()
@@ -0,0 +1,814 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.chunker import chunk_text_with_offsets, assign_pages_to_chunks
+from utils.config import AppConfig
+from utils.dedup import DuplicateRegistry
+from utils.embeddings import get_embeddings, get_batch_embeddings, get_embedding_client
+from utils.federated_search import SESSION_NAMESPACE, resolve_namespaces, merge_namespace_results
+from utils.file_parser import parse_file_with_pages
+from utils.query_router import MetadataVocabulary, QueryRouter, document_metadata
+from utils.rag_tracer import RAGTracer
+from utils.rate_limiter import get_scheduler, estimate_tokens
+from utils.services import ServiceContainer
+from utils.session_manager import SessionManager
+from utils.singleflight import SingleFlight, query_key
+from utils.usage import UsageMeter, record_usage, response_token_usage, track_usage
+
+logger = logging.getLogger(__name__)
+
+# Queries containing these words are routed to the LangChain agent and its tools
+AGENT_KEYWORDS = [
+    'summarize', 'summary', 'compare', 'comparison', 'statistics',
+    'stats', 'key concepts', 'main points', 'overview', 'analyze'
+]
+
+RETRIEVAL_TIMEOUT_MESSAGE = (
+    "Searching the documents is taking longer than expected. Please try again in a moment."
+)
+
+# Knowledge-base metadata values the query router recognizes, per namespace
+VOCABULARY_FILE = "metadata_vocabulary.json"
+
+# Chunks embedded per API call during ingestion
+INGEST_BATCH_SIZE = 10
+
+# Per-namespace duplicate indexes, under the data directory
+DEDUP_DIR = "dedup"
+
+NO_RESULTS_MESSAGE = (
+    "I couldn't find relevant information in the uploaded documents. "
+    "Please make sure you've uploaded some documents first."
+)
+
+def create_pinecone_client(data_dir: Optional[str] = None):
+    """
+    Build and connect the vector client (Pinecone, or VECTOR_BACKEND=local / fake)
+
+    Args:
+        data_dir (Optional[str]): Data directory for the Pinecone client's chunk store, defaults to DATA_DIR
+    """
+    backend = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+    if backend == "fake":
+        from utils.fake_backends import InMemoryVectorClient
+        client = InMemoryVectorClient()
+    elif backend == "local":
+        from utils.local_vector_client import LocalVectorClient
+        client = LocalVectorClient()
+    else:
+        from utils.pinecone_client import PineconeClient
+        client = PineconeClient(data_dir)
+    client.connect()
+    return client
+
+def create_llm(config: AppConfig):
+    """Build the chat model from the OpenAI configuration (an offline fake with LLM_BACKEND=fake)."""
+    from utils.fake_backends import fake_backend_enabled, FakeChatModel
+    if fake_backend_enabled("llm"):
+        return FakeChatModel()
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=config.openai.model,
+        temperature=config.openai.temperature,
+        api_key=config.openai.api_key,
+        base_url=config.openai.base_url,
+        max_tokens=config.openai.max_tokens
+    )
+
+def create_command_router():
+    """Build the slash-command router."""
+    from utils.commands import CommandRouter
+    return CommandRouter()
+
+def build_prompt(query: str, context_chunks: List[str]) -> str:
+    """
+    Build the question-answering prompt from retrieved context
+
+    Args:
+        query (str): User question
+        context_chunks (List[str]): Retrieved chunk texts, most relevant first
+
+    Returns:
+        str: Prompt for the LLM
+    """
+    context = "\n\n".join(context_chunks)
+    return f"""Based on the following context from uploaded documents, please answer the question.
+
+Context:
+{context}
+
+Question: {query}
+
+Please provide a comprehensive answer based on the context. If the context doesn't contain enough information to fully answer the question, please mention what information is missing.
+
+Answer:"""
+
+def format_excerpts(context_chunks: List[str], max_chars: int = 500) -> str:
+    """
+    Fallback answer listing the retrieved excerpts when generation is unavailable
+
+    Args:
+        context_chunks (List[str]): Retrieved chunk texts, most relevant first
+        max_chars (int): Maximum characters shown per excerpt
+
+    Returns:
+        str: Markdown list of excerpts
+    """
+    excerpts = "\n\n".join(
+        f"> {chunk[:max_chars]}{'...' if len(chunk) > max_chars else ''}" for chunk in context_chunks
+    )
+    return f"The answer is taking too long to generate. Here are the most relevant excerpts from your documents:\n\n{excerpts}"
+
+def _document_text(chunk_spans: List[Dict[str, Any]]) -> str:
+    """Source text of a chunked document, with the chunk overlaps removed, for duplicate detection."""
+    parts, covered = [], 0
+    for span in chunk_spans:
+        parts.append(span['text'][max(covered - span['char_start'], 0):])
+        covered = max(covered, span['char_end'])
+    return "".join(parts)
+
+class RAGService:
+    """
+    Document ingestion and question answering without any UI dependency.
+
+    Owns the network clients (through a lazy ServiceContainer), the metrics
+    tracer, the session store and the per-session LangChain agents. The
+    Streamlit app, the HTTP endpoint in utils.rag_api and batch scripts all
+    drive the same pipeline through ``ingest``, ``query`` and
+    ``stream_query``, so any number of worker processes can serve it.
+    """
+
+    def __init__(self, config: AppConfig, services: Optional[ServiceContainer] = None,
+                 session_manager: Optional[SessionManager] = None, tracer: Optional[RAGTracer] = None):
+        self.config = config
+        self.services = services or ServiceContainer()
+        self.session_manager = session_manager or SessionManager(config.data_dir)
+        self.tracer = tracer or RAGTracer(config.data_dir, record_traces=config.rag.record_traces)
+
+        # Defaults for anything the caller did not register itself
+        defaults = {
+            "pinecone_client": lambda: create_pinecone_client(self.config.data_dir),
+            "llm": lambda: create_llm(self.config),
+            "command_router": create_command_router,
+            "embedding_client": get_embedding_client
+        }
+        for name, factory in defaults.items():
+            if name not in self.services:
+                self.services.register(name, factory)
+
+        # Identical in-flight requests for the same namespace share one execution
+        self.flights = SingleFlight("rag")
+        self.vocabulary_path = os.path.join(config.data_dir, VOCABULARY_FILE)
+        self._vocabulary_lock = threading.Lock()
+        self.query_router = QueryRouter(self.vocabulary_path) if config.rag.query_routing else None
+        self.duplicates = (DuplicateRegistry(os.path.join(config.data_dir, DEDUP_DIR), config.rag.dedup_threshold)
+                           if config.rag.deduplicate else None)
+        self._agents: Dict[str, Any] = {}
+        self._agents_lock = threading.Lock()
+        # Blocking stages of the async path. Kept apart from the event loop's default executor,
+        # which asyncio.run() joins on exit, so a stage past its deadline cannot hold up the caller.
+        self._stage_executor = ThreadPoolExecutor(max_workers=int(os.getenv("RAG_STAGE_WORKERS", "32")),
+                                                  thread_name_prefix="rag-stage")
+
+    @property
+    def pinecone_client(self):
+        return self.services.get("pinecone_client")
+
+    @property
+    def llm(self):
+        return self.services.get("llm")
+
+    @property
+    def command_router(self):
+        return self.services.get("command_router")
+
+    def get_agent(self, session_id: str):
+        """Get the LangChain agent for a session, building it on first use."""
+        agent = self._agents.get(session_id)
+        if agent is None:
+            with self._agents_lock:
+                agent = self._agents.get(session_id)
+                if agent is None:
+                    from utils.langchain_agents import DocumentRAGAgent
+                    agent = DocumentRAGAgent(session_id=session_id, pinecone_client=self.pinecone_client)
+                    self._agents[session_id] = agent
+        return agent
+
+    def drop_session(self, session_id: str):
+        """Forget per-session state such as the cached agent and the duplicate index."""
+        with self._agents_lock:
+            self._agents.pop(session_id, None)
+        if self.duplicates:
+            self.duplicates.drop(session_id)
+
+    def prepare_document(self, source: Any, name: Optional[str] = None) -> Tuple[str, int, List[Dict[str, Any]]]:
+        """
+        Parse and chunk a document
+
+        Args:
+            source: Anything accepted by DocumentSource.coerce (path, bytes, upload)
+            name (Optional[str]): File name, required for raw bytes
+
+        Returns:
+            Tuple: (filename, content length, chunk spans with text and page locations)
+        """
+        filename = name or getattr(source, 'name', None) or str(source)
+
+        # Parse the file, keeping page boundaries for citations
+        parsed = parse_file_with_pages(source, name=name)
+        content = parsed['text']
+        if not content:
+            raise ValueError("Could not extract content from the file.")
+
+        # Chunk the content and map each chunk back to its pages
+        chunk_spans = assign_pages_to_chunks(
+            chunk_text_with_offsets(
+                content,
+                chunk_size=self.config.chunking.chunk_size,
+                chunk_overlap=self.config.chunking.chunk_overlap
+            ),
+            parsed['pages']
+        )
+        if not chunk_spans:
+            raise ValueError("Could not create chunks from the content.")
+        return filename, len(content), chunk_spans
+
+    def embed_chunks(self, chunk_spans: List[Dict[str, Any]]) -> Tuple[List[str], List[List[float]], List[Dict[str, Any]]]:
+        """
+        Embed one batch of chunk spans in a single API call
+
+        Returns:
+            Tuple: (texts, embeddings, page locations) of the chunks that got an embedding
+        """
+        texts, embeddings, locations = [], [], []
+        batch_embeddings = get_batch_embeddings([span['text'] for span in chunk_spans])
+        for span, embedding in zip(chunk_spans, batch_embeddings):
+            if embedding:
+                texts.append(span['text'])
+                embeddings.append(embedding)
+                locations.append({
+                    key: span.get(key) for key in ('page_start', 'page_end', 'char_start', 'char_end')
+                })
+        return texts, embeddings, locations
+
+    def claim_document(self, session_id: str, filename: str, chunk_spans: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Register a document for duplicate checks before it is embedded
+
+        Compares the chunk texts with the namespace's documents, exactly by
+        content hash and approximately by MinHash (see utils.dedup). A copy
+        is recorded as an alias of the document it duplicates; anything
+        else is registered in the same locked step, so a copy uploaded
+        meanwhile is caught. Call forget_document if embedding then fails.
+
+        Returns:
+            Optional[Dict[str, Any]]: {"duplicate_of", "similarity", "exact"} of the
+            document this one copies, or None if it should be embedded
+        """
+        if not self.duplicates:
+            return None
+        return self.duplicates.get(session_id).register(filename, _document_text(chunk_spans))
+
+    def forget_document(self, session_id: str, filename: str):
+        """Drop a document from duplicate checks, e.g. after its ingestion failed."""
+        if self.duplicates:
+            self.duplicates.get(session_id).remove(filename)
+
+    def duplicate_record(self, filename: str, content_length: int, duplicate: Dict[str, Any]) -> Dict[str, Any]:
+        """Session document entry of a duplicate that was not embedded."""
+        return {
+            'filename': filename,
+            'chunks_count': 0,
+            'file_size': content_length,
+            'upload_time': datetime.now().isoformat(),
+            'duplicate_of': duplicate["duplicate_of"],
+            'similarity': duplicate["similarity"]
+        }
+
+    def document_metadata(self, filename: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Per-document fields stored with every chunk: routing values inferred from the name, then ``metadata``."""
+        return {**document_metadata(filename), **(metadata or {})}
+
+    def record_vocabulary(self, namespace: str, metadata: Dict[str, Any]):
+        """Let the query router filter ``namespace`` on a stored document's routing values."""
+        vocabulary = MetadataVocabulary()
+        vocabulary.add(metadata, namespace)
+        if vocabulary.values:
+            with self._vocabulary_lock:
+                vocabulary.save(self.vocabulary_path)
+
+    def add_document_record(self, session_id: str, document: Dict[str, Any]):
+        """List a stored document in its session."""
+        session_data = self.session_manager.get_session(session_id)
+        if session_data:
+            documents = session_data.get('documents', [])
+            documents.append(document)
+            self.session_manager.update_session(session_id, documents=documents)
+
+    def ingest(self, source: Any, session_id: str, name: Optional[str] = None,
+               progress: Optional[Callable[[float, str], None]] = None,
+               metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Parse, chunk, embed and store a document in a session namespace
+
+        Runs in the calling thread; utils.ingest_jobs runs the same steps in
+        the background with resumable progress.
+
+        Args:
+            source: Anything accepted by DocumentSource.coerce (path, bytes, upload)
+            session_id (str): Session namespace to store the vectors in
+            name (Optional[str]): File name, required for raw bytes
+            progress (Optional[Callable]): Called with (fraction, message) as batches finish
+            metadata (Optional[Dict[str, Any]]): Extra fields stored with every chunk, e.g. the
+                category of a knowledge-base document; routing values are inferred from the name otherwise
+
+        Returns:
+            Dict[str, Any]: filename, chunks_count and file_size of the stored document;
+            a duplicate of a document already in the namespace is not embedded and
+            carries duplicate_of and similarity instead
+        """
+        filename, content_length, chunk_spans = self.prepare_document(source, name)
+        duplicate = self.claim_document(session_id, filename, chunk_spans)
+        if duplicate:
+            document = self.duplicate_record(filename, content_length, duplicate)
+            self.add_document_record(session_id, document)
+            return document
+        try:
+            return self._store_document(session_id, filename, content_length, chunk_spans, progress, metadata)
+        except Exception:
+            self.forget_document(session_id, filename)
+            raise
+
+    def _store_document(self, session_id: str, filename: str, content_length: int,
+                        chunk_spans: List[Dict[str, Any]], progress: Optional[Callable[[float, str], None]],
+                        metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Embed and store the chunks of a claimed document (see ingest)."""
+
+        # Batch process embeddings for better performance
+        usage = UsageMeter()
+        texts, embeddings, locations = [], [], []
+        for batch_start in range(0, len(chunk_spans), INGEST_BATCH_SIZE):
+            batch_spans = chunk_spans[batch_start:batch_start + INGEST_BATCH_SIZE]
+            batch_end = batch_start + len(batch_spans)
+            if progress:
+                progress(batch_end / len(chunk_spans),
+                         f"Processing chunks {batch_start + 1}-{batch_end} of {len(chunk_spans)}...")
+
+            with track_usage(usage):
+                batch_texts, batch_embeddings, batch_locations = self.embed_chunks(batch_spans)
+            texts.extend(batch_texts)
+            embeddings.extend(batch_embeddings)
+            locations.extend(batch_locations)
+
+        if not texts:
+            raise ValueError("No valid embeddings were created.")
+
+        if progress:
+            progress(1.0, "Storing vectors in Pinecone...")
+        fields = self.document_metadata(filename, metadata)
+        self.pinecone_client.create_session_vectors(
+            texts=texts,
+            embeddings=embeddings,
+            session_id=session_id,
+            document_name=filename,
+            chunk_metadata=[{**fields, **location} for location in locations]
+        )
+        self.tracer.record_ingestion(session_id, self.config.embedding.model, usage)
+        self.record_vocabulary(session_id, fields)
+
+        document = {
+            'filename': filename,
+            'chunks_count': len(texts),
+            'file_size': content_length,
+            'upload_time': datetime.now().isoformat(),
+            'usage': usage.to_dict()
+        }
+        self.add_document_record(session_id, document)
+        return document
+
+    def retrieve(self, query: str, session_id: str) -> Dict[str, Any]:
+        """
+        Embed a query and search one namespace
+
+        Metadata values the query mentions (e.g. a brand or document type)
+        become a filter; when the filtered search comes back thin it is
+        repeated without the filter.
+
+        Args:
+            query (str): User question
+            session_id (str): Namespace to search
+
+        Returns:
+            Dict[str, Any]: Pinecone query response with matches
+        """
+        def search():
+            query_embedding = get_embeddings(query)
+            query_filter = self.query_router.route(query, session_id) if self.query_router else None
+            if query_filter:
+                response = self.pinecone_client.query_vectors(
+                    query_embedding,
+                    top_k=self.config.rag.top_k,
+                    filter_dict=query_filter,
+                    namespace=session_id
+                )
+                if len(response.get('matches', [])) >= self.config.rag.routing_min_matches:
+                    return response
+                # Too little behind the filter; the recognized terms may be incidental
+                logger.info(f"Routed search {query_filter} in {session_id} was thin, retrying unfiltered")
+            return self.pinecone_client.query_vectors(
+                query_embedding,
+                top_k=self.config.rag.top_k,
+                namespace=session_id
+            )
+
+        return self.flights.do(("retrieve",) + query_key(session_id, query), search)
+
+    def _route(self, query: str) -> str:
+        if query.startswith('/'):
+            return "command"
+        if any(keyword in query.lower() for keyword in AGENT_KEYWORDS):
+            return "agent"
+        return "rag"
+
+    def _run_agent(self, query: str, session_id: str, trace_id: str,
+                   abandoned: Optional[threading.Event] = None) -> Optional[str]:
+        """
+        Answer with the agent; None means fall back to standard RAG
+
+        Args:
+            abandoned (Optional[threading.Event]): Set by an async caller that stopped
+                waiting; the trace then belongs to its fallback and is left alone
+        """
+        if abandoned is not None and abandoned.is_set():
+            return None
+        self.tracer.start_retrieval(trace_id)
+        try:
+            response = self.flights.do(("agent",) + query_key(session_id, query),
+                                       lambda: self.get_agent(session_id).query(query))
+        except Exception as e:
+            logger.warning(f"Agent failed, falling back to standard RAG: {e}")
+            return None
+        if abandoned is not None and abandoned.is_set():
+            return None
+
+        # The agent retrieves internally
+        self.tracer.end_retrieval(trace_id, chunks=[], scores=[])
+        self.tracer.start_generation(trace_id)
+        self.tracer.end_generation(trace_id, response=response)
+        return response
+
+    def search_namespaces(self, session_id: str) -> List[str]:
+        """Namespaces searched for a session: its own plus the configured shared corpora."""
+        return resolve_namespaces(self.config.rag.search_namespaces, session_id)
+
+    def _namespace_quotas(self, session_id: str) -> Dict[str, int]:
+        return {
+            (session_id if namespace == SESSION_NAMESPACE else namespace): quota
+            for namespace, quota in self.config.rag.namespace_quotas.items()
+        }
+
+    def _retrieve_context(self, query: str, session_id: str, trace_id: str) -> Optional[List[str]]:
+        """Search every namespace in parallel threads and trace the merged context."""
+        self.tracer.start_retrieval(trace_id)
+        namespaces = self.search_namespaces(session_id)
+        with ThreadPoolExecutor(max_workers=len(namespaces)) as executor:
+            # Each search runs in a copy of this context so its embedding tokens count towards the operation
+            futures = {namespace: executor.submit(contextvars.copy_context().run, self.retrieve, query, namespace)
+                       for namespace in namespaces}
+            results = self._gather_results({namespace: future.exception() or future.result()
+                                            for namespace, future in futures.items()})
+        return self._collect_context(trace_id, results, session_id)
+
+    def _gather_results(self, outcomes: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Drop failed namespaces unless every search failed."""
+        results = {}
+        for namespace, outcome in outcomes.items():
+            if isinstance(outcome, Exception):
+                # One failing namespace should not sink the whole answer
+                logger.warning(f"Search in namespace {namespace} failed: {outcome}")
+            else:
+                results[namespace] = outcome
+        if not results and outcomes:
+            raise next(iter(outcomes.values()))
+        return results
+
+    def _collect_context(self, trace_id: str, results: Dict[str, Dict[str, Any]],
+                         session_id: str) -> Optional[List[str]]:
+        """
+        Merge namespace results under their quotas and trace the chunks that will be used
+
+        Shared namespaces only contribute matches at or above RAG_SIMILARITY_THRESHOLD;
+        the session's own documents are always eligible, as before federated search.
+        """
+        threshold = self.config.rag.similarity_threshold
+        matches = [
+            match for match in merge_namespace_results(
+                results,
+                limit=self.config.rag.max_context_chunks,
+                quotas=self._namespace_quotas(session_id),
+                min_scores={namespace: threshold for namespace in results if namespace != session_id}
+            )
+            if 'metadata' in match and 'text' in match['metadata']
+        ]
+        if not matches:
+            return None
+
+        context_chunks = [match['metadata']['text'] for match in matches]
+        scores = [match.get('score', 0.0) for match in matches]
+        self.tracer.end_retrieval(trace_id, chunks=context_chunks, scores=scores)
+        return context_chunks
+
+    def _start_trace(self, query: str, session_id: str) -> str:
+        route = self._route(query)
+        return self.tracer.start_operation(
+            query=query,
+            session_id=session_id,
+            model=self.config.openai.model,
+            embedding_model=self.config.embedding.model,
+            operation=query.split()[0].lower() if route == "command" else route
+        )
+
+    def _record_generation(self, prompt: str, answer: str, response: Any = None):
+        """Count generation tokens, as reported by the API or estimated from the text."""
+        usage = response_token_usage(response) if response is not None else None
+        record_usage("llm", self.config.openai.model, *(usage or (estimate_tokens(prompt), estimate_tokens(answer))))
+
+    def query(self, query: str, session_id: str) -> str:
+        """
+        Answer a question or slash command against a session's documents
+
+        Args:
+            query (str): User question or command
+            session_id (str): Session namespace
+
+        Returns:
+            str: Answer text (errors are reported as text)
+        """
+        trace_id = self._start_trace(query, session_id)
+        try:
+            route = self._route(query)
+            if route == "command":
+                return self.command_router.handle_command(query, self.pinecone_client, session_id)
+
+            if route == "agent":
+                response = self._run_agent(query, session_id, trace_id)
+                if response is not None:
+                    return response
+
+            context_chunks = self._retrieve_context(query, session_id, trace_id)
+            if context_chunks is None:
+                return NO_RESULTS_MESSAGE
+
+            prompt = build_prompt(query, context_chunks)
+            self.tracer.start_generation(trace_id)
+            from langchain.schema import HumanMessage
+            response = self.flights.do(("generate",) + query_key(session_id, query), lambda: get_scheduler("openai").call(
+                lambda: self.llm.invoke([HumanMessage(content=prompt)]),
+                tokens=estimate_tokens(prompt) + (self.config.openai.max_tokens or 0)
+            ))
+            self._record_generation(prompt, response.content, response)
+            self.tracer.end_generation(trace_id, response=response.content)
+            return response.content
+
+        except Exception as e:
+            return f"Error generating response: {str(e)}"
+
+        finally:
+            self.tracer.complete_operation(trace_id)
+
+    def stream_query(self, query: str, session_id: str) -> Iterator[str]:
+        """
+        Answer a question, yielding the LLM output as it is generated
+
+        Commands and agent answers are produced in one piece and yielded once.
+
+        Args:
+            query (str): User question or command
+            session_id (str): Session namespace
+
+        Yields:
+            str: Answer text fragments
+        """
+        trace_id = self._start_trace(query, session_id)
+        try:
+            route = self._route(query)
+            if route == "command":
+                yield self.command_router.handle_command(query, self.pinecone_client, session_id)
+                return
+
+            if route == "agent":
+                response = self._run_agent(query, session_id, trace_id)
+                if response is not None:
+                    yield response
+                    return
+
+            context_chunks = self._retrieve_context(query, session_id, trace_id)
+            if context_chunks is None:
+                yield NO_RESULTS_MESSAGE
+                return
+
+            prompt = build_prompt(query, context_chunks)
+            self.tracer.start_generation(trace_id)
+            from langchain.schema import HumanMessage
+            get_scheduler("openai").acquire(estimate_tokens(prompt) + (self.config.openai.max_tokens or 0))
+            parts = []
+            for chunk in self.llm.stream([HumanMessage(content=prompt)]):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+            self._record_generation(prompt, "".join(parts))
+            self.tracer.end_generation(trace_id, response="".join(parts))
+
+        except Exception as e:
+            yield f"Error generating response: {str(e)}"
+
+        finally:
+            self.tracer.complete_operation(trace_id)
+
+    async def _in_thread(self, func: Callable, *args) -> Any:
+        """Run a blocking call in the stage pool, in a copy of the current context (like asyncio.to_thread)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._stage_executor,
+                                          functools.partial(contextvars.copy_context().run, func, *args))
+
+    async def _aservice(self, name: str):
+        """Get a service without blocking the event loop while it connects."""
+        if self.services.is_ready(name):
+            return self.services.get(name)
+        return await self._in_thread(self.services.get, name)
+
+    async def _aretrieve_context(self, query: str, namespaces: List[str], session_id: str,
+                                 trace_id: str) -> Optional[List[str]]:
+        """Search every namespace concurrently and merge the matches."""
+        self.tracer.start_retrieval(trace_id)
+        outcomes = await asyncio.gather(
+            *(self._in_thread(self.retrieve, query, namespace) for namespace in namespaces),
+            return_exceptions=True
+        )
+        results = self._gather_results(dict(zip(namespaces, outcomes)))
+        return self._collect_context(trace_id, results, session_id)
+
+    async def _aprepare(self, query: str, session_id: str, trace_id: str,
+                        namespaces: Optional[List[str]]) -> Tuple[Optional[str], Optional[List[str]], Any]:
+        """
+        Shared front half of aquery and astream_query
+
+        Returns:
+            Tuple: (final answer, None, None) when the query is already answered,
+            otherwise (None, context chunks, LLM)
+        """
+        route = self._route(query)
+        if route == "command":
+            router = await self._aservice("command_router")
+            pinecone_client = await self._aservice("pinecone_client")
+            return await self._in_thread(router.handle_command, query, pinecone_client, session_id), None, None
+
+        # Connect the LLM while the agent or retrieval runs
+        llm_task = asyncio.ensure_future(self._aservice("llm"))
+        llm_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+        if route == "agent":
+            abandoned = threading.Event()
+            try:
+                response = await asyncio.wait_for(
+                    self._in_thread(self._run_agent, query, session_id, trace_id, abandoned),
+                    timeout=self.config.rag.agent_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Agent timed out after {self.config.rag.agent_timeout}s, falling back to standard RAG")
+                response = None
+            finally:
+                # The agent thread keeps running after a timeout; keep it off the trace
+                abandoned.set()
+            if response is not None:
+                return response, None, None
+
+        try:
+            context_chunks = await asyncio.wait_for(
+                self._aretrieve_context(query, namespaces or self.search_namespaces(session_id), session_id, trace_id),
+                timeout=self.config.rag.retrieval_timeout
+            )
+        except asyncio.TimeoutError:
+            return RETRIEVAL_TIMEOUT_MESSAGE, None, None
+        if context_chunks is None:
+            return NO_RESULTS_MESSAGE, None, None
+
+        return None, context_chunks, await llm_task
+
+    async def aquery(self, query: str, session_id: str, namespaces: Optional[List[str]] = None) -> str:
+        """
+        Async query path: independent stages overlap and every stage has a deadline
+
+        The LLM client connects while retrieval runs and namespaces are searched
+        concurrently. A slow agent falls back to standard RAG, a slow search
+        returns a retry message and a slow LLM returns the retrieved excerpts.
+
+        Args:
+            query (str): User question or command
+            session_id (str): Session namespace
+            namespaces (Optional[List[str]]): Namespaces to search, defaults to search_namespaces()
+
+        Returns:
+            str: Answer text (errors are reported as text)
+        """
+        trace_id = self._start_trace(query, session_id)
+        try:
+            answer, context_chunks, llm = await self._aprepare(query, session_id, trace_id, namespaces)
+            if answer is not None:
+                return answer
+
+            prompt = build_prompt(query, context_chunks)
+            self.tracer.start_generation(trace_id)
+            from langchain.schema import HumanMessage
+            try:
+                response = await asyncio.wait_for(
+                    self.flights.ado(("generate",) + query_key(session_id, query), lambda: get_scheduler("openai").acall(
+                        lambda: llm.ainvoke([HumanMessage(content=prompt)]),
+                        tokens=estimate_tokens(prompt) + (self.config.openai.max_tokens or 0)
+                    )),
+                    timeout=self.config.rag.generation_timeout
+                )
+                answer = response.content
+                self._record_generation(prompt, answer, response)
+            except asyncio.TimeoutError:
+                logger.warning(f"Generation timed out after {self.config.rag.generation_timeout}s")
+                answer = format_excerpts(context_chunks)
+            self.tracer.end_generation(trace_id, response=answer)
+            return answer
+
+        except Exception as e:
+            return f"Error generating response: {str(e)}"
+
+        finally:
+            self.tracer.complete_operation(trace_id)
+
+    async def astream_query(self, query: str, session_id: str,
+                            namespaces: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """
+        Async streaming variant of aquery
+
+        Args:
+            query (str): User question or command
+            session_id (str): Session namespace
+            namespaces (Optional[List[str]]): Namespaces to search, defaults to search_namespaces()
+
+        Yields:
+            str: Answer text fragments
+        """
+        trace_id = self._start_trace(query, session_id)
+        try:
+            answer, context_chunks, llm = await self._aprepare(query, session_id, trace_id, namespaces)
+            if answer is not None:
+                yield answer
+                return
+
+            prompt = build_prompt(query, context_chunks)
+            self.tracer.start_generation(trace_id)
+            from langchain.schema import HumanMessage
+            timeout = self.config.rag.generation_timeout
+            deadline = asyncio.get_running_loop().time() + timeout
+            try:
+                # Waiting for the rate limit counts against the generation timeout, as in aquery
+                await asyncio.wait_for(self._in_thread(
+                    get_scheduler("openai").acquire, estimate_tokens(prompt) + (self.config.openai.max_tokens or 0),
+                    None, timeout
+                ), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Generation timed out after {timeout}s waiting for the rate limit")
+                answer = format_excerpts(context_chunks)
+                self.tracer.end_generation(trace_id, response=answer)
+                yield answer
+                return
+
+            parts = []
+            stream = llm.astream([HumanMessage(content=prompt)]).__aiter__()
+            while True:
+                remaining = deadline - asyncio.get_running_loop().time()
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=max(remaining, 0.001))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    logger.warning(f"Generation timed out after {self.config.rag.generation_timeout}s")
+                    fallback = "\n\n*[Answer cut short: generation timed out]*" if parts else format_excerpts(context_chunks)
+                    parts.append(fallback)
+                    yield fallback
+                    break
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+            self._record_generation(prompt, "".join(parts))
+            self.tracer.end_generation(trace_id, response="".join(parts))
+
+        except Exception as e:
+            yield f"Error generating response: {str(e)}"
+
+        finally:
+            self.tracer.complete_operation(trace_id)
@@ -1,9 +1,12 @@
 import time
 import json
+import uuid
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, asdict
 from pathlib import Path
+from utils.query_trace import QueryTraceLog
+from utils.usage import UsageLedger, UsageMeter, start_tracking, stop_tracking
 
 @dataclass
 class RAGMetrics:
@@ -20,24 +23,45 @@ class RAGMetrics:
     response_length: int
     model_used: str
     embedding_model: str
+    operation: str = "rag"
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    embedding_tokens: int = 0
+    cost: float = 0.0
     
 class RAGTracer:
     """Traces and monitors RAG pipeline operations."""
     
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", record_traces: bool = False):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         self.metrics_file = self.data_dir / "rag_metrics.json"
         self.current_operation = {}
+        # Anonymized per-query traces for replay, see scripts/capacity_plan.py
+        self.trace_log = QueryTraceLog(self.data_dir / "query_traces.jsonl") if record_traces else None
+        # Token usage and cost of every operation and ingestion run
+        self.usage_ledger = UsageLedger(self.data_dir / "token_usage.jsonl")
         
-    def start_operation(self, query: str, session_id: str, model: str, embedding_model: str):
-        """Start tracking a new RAG operation."""
-        operation_id = f"{session_id}_{int(time.time() * 1000)}"
+    def start_operation(self, query: str, session_id: str, model: str, embedding_model: str,
+                        operation: str = "rag"):
+        """
+        Start tracking a new RAG operation.
+
+        API calls made in the calling context until complete_operation
+        (including asyncio tasks and to_thread calls started from it) count
+        towards the operation's token usage.
+        """
+        # Concurrent queries of one session can start in the same millisecond
+        operation_id = f"{session_id}_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+        usage = UsageMeter()
         self.current_operation[operation_id] = {
             "query": query,
             "session_id": session_id,
             "model_used": model,
             "embedding_model": embedding_model,
+            "operation": operation,
+            "usage": usage,
+            "usage_token": start_tracking(usage),
             "start_time": time.time(),
             "retrieval_start": None,
             "retrieval_end": None,
@@ -81,6 +105,8 @@ class RAGTracer:
             
         op = self.current_operation[operation_id]
         end_time = time.time()
+        stop_tracking(op["usage_token"])
+        usage = op["usage"]
         
         # Calculate timings with proper null checks
         retrieval_start = op.get("retrieval_start") or op["start_time"]
@@ -110,11 +136,26 @@ class RAGTracer:
             avg_chunk_score=avg_score,
             response_length=op["response_length"],
             model_used=op["model_used"],
-            embedding_model=op["embedding_model"]
+            embedding_model=op["embedding_model"],
+            operation=op["operation"],
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            embedding_tokens=usage.embedding_tokens,
+            cost=usage.cost
         )
         
         # Save metrics
         self.save_metrics(metrics)
+        self.usage_ledger.append(op["session_id"], op["operation"], op["model_used"], usage.to_dict(),
+                                 timestamp=metrics.timestamp)
+        if self.trace_log:
+            self.trace_log.record(
+                query=op["query"],
+                namespace=op["session_id"],
+                started_at=op["start_time"],
+                timings={"retrieval": retrieval_time, "generation": generation_time, "total": total_time},
+                chunks_retrieved=op["chunks_retrieved"]
+            )
         
         # Clean up
         del self.current_operation[operation_id]
@@ -175,6 +216,9 @@ class RAGTracer:
         generation_times = [m['generation_time'] for m in metrics]
         chunk_counts = [m['chunks_retrieved'] for m in metrics]
         top_scores = [m['top_chunk_score'] for m in metrics]
+        costs = [m.get('cost', 0.0) for m in metrics]
+        tokens = [m.get('prompt_tokens', 0) + m.get('completion_tokens', 0) + m.get('embedding_tokens', 0)
+                  for m in metrics]
         
         return {
             "total_queries": len(metrics),
@@ -186,7 +230,30 @@ class RAGTracer:
             "min_total_time": min(total_times),
             "max_total_time": max(total_times),
             "min_top_score": min(top_scores) if top_scores else 0,
-            "max_top_score": max(top_scores) if top_scores else 0
+            "max_top_score": max(top_scores) if top_scores else 0,
+            "total_tokens": sum(tokens),
+            "total_cost": sum(costs),
+            "avg_cost": sum(costs) / len(costs)
+        }
+
+    def record_ingestion(self, session_id: str, embedding_model: str, usage: UsageMeter):
+        """Record the token usage of one document ingestion."""
+        self.usage_ledger.append(session_id, "ingest", embedding_model, usage.to_dict())
+
+    def get_usage_rollups(self, session_id: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Token and cost totals by session, by operation (rag, agent, /summarize, ingest...) and by day
+
+        Args:
+            session_id (Optional[str]): Restrict the operation and day rollups to one session
+
+        Returns:
+            Dict: {"by_session": ..., "by_operation": ..., "by_day": ...}, most expensive first
+        """
+        return {
+            "by_session": self.usage_ledger.rollup("session"),
+            "by_operation": self.usage_ledger.rollup("operation", session_id),
+            "by_day": self.usage_ledger.rollup("day", session_id)
         }
     
     def clear_session_metrics(self, session_id: str):
@@ -0,0 +1,383 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: limits are enforced per process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BULK = 10
+
+# Directory under DATA_DIR holding the bucket state shared by every process on the host
+RATE_LIMIT_DIR = "rate_limits"
+
+# Threads that wait for bucket capacity on behalf of coroutines. Not the event loop's default
+# executor, which asyncio.run() joins on exit: a request that gave up waiting must not hold it open.
+_ASYNC_WAITERS = ThreadPoolExecutor(thread_name_prefix="rate-limit-wait")
+
+_current_priority: contextvars.ContextVar = contextvars.ContextVar("rate_limit_priority", default=PRIORITY_NORMAL)
+
+@contextmanager
+def request_priority(priority: int):
+    """
+    Run API calls in this block with the given scheduling priority
+
+    Args:
+        priority (int): PRIORITY_INTERACTIVE, PRIORITY_NORMAL or PRIORITY_BULK
+    """
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def current_priority() -> int:
+    """Get the scheduling priority of the calling context."""
+    return _current_priority.get()
+
+def estimate_tokens(text: Any) -> int:
+    """
+    Cheap token estimate (~4 characters per token) used for scheduling
+
+    Args:
+        text: A string or a list of strings
+
+    Returns:
+        int: Estimated token count
+    """
+    if isinstance(text, str):
+        return len(text) // 4 + 1
+    return sum(len(item) // 4 + 1 for item in text)
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Check whether an API error is an HTTP 429 / rate limit error."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """
+    Read the server-requested delay from an API error, if any
+
+    Args:
+        error (BaseException): Exception raised by the API client
+
+    Returns:
+        Optional[float]: Seconds to wait, from retry-after-ms or retry-after headers
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+class TokenBucket:
+    """Continuously refilled bucket holding at most one minute of allowance."""
+
+    def __init__(self, per_minute: float, now: Optional[float] = None):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic() if now is None else now
+
+    def refill(self, now: float, rate_factor: float = 1.0):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate * rate_factor)
+        self.updated = now
+
+    def time_until(self, amount: float, rate_factor: float = 1.0) -> float:
+        """Seconds until the bucket holds `amount` (after refill)."""
+        missing = amount - self.level
+        return 0.0 if missing <= 0 else missing / (self.rate * rate_factor)
+
+class RateLimitScheduler:
+    """
+    Shared, thread-safe scheduler enforcing requests- and tokens-per-minute.
+
+    Callers block in a priority queue until both buckets have room instead of
+    failing; interactive traffic is always served before queued bulk work.
+    On 429 responses the scheduler pauses every caller for the Retry-After
+    delay and halves its refill rate, then recovers gradually on success.
+
+    With a ``state_path``, the buckets, pause and rate factor live in that
+    file instead, under a file lock, so every process on the host (the app,
+    upload scripts, the pipeline) draws from the same limit. The priority
+    queue cannot span processes, so bulk callers leave ``bulk_reserve`` of
+    each bucket untouched for interactive callers elsewhere.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: Optional[float] = None,
+                 state_path: Optional[str] = None, bulk_reserve: float = 0.2):
+        """
+        Args:
+            name (str): API name, used in messages
+            requests_per_minute (float): Request limit
+            tokens_per_minute (Optional[float]): Token limit, None for none
+            state_path (Optional[str]): File sharing the buckets across processes
+            bulk_reserve (float): Share of each shared bucket bulk callers may not use
+        """
+        self.name = name
+        self.state_path = state_path if fcntl is not None else None
+        self.bulk_reserve = bulk_reserve if self.state_path else 0.0
+        # Wall-clock time in shared state, since other processes read it too
+        self._clock = time.time if self.state_path else time.monotonic
+        self.requests = TokenBucket(requests_per_minute, self._clock())
+        self.tokens = TokenBucket(tokens_per_minute, self._clock()) if tokens_per_minute else None
+        self.rate_factor = 1.0
+        self.paused_until = 0.0
+
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._stats = {"acquired": 0, "waited_seconds": 0.0, "rate_limited": 0}
+
+    def acquire(self, tokens: int = 0, priority: Optional[int] = None, timeout: Optional[float] = None) -> float:
+        """
+        Wait until a request costing `tokens` may be sent
+
+        Args:
+            tokens (int): Estimated tokens for the request
+            priority (Optional[int]): Scheduling priority, defaults to the context's
+            timeout (Optional[float]): Maximum seconds to wait
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        if priority is None:
+            priority = current_priority()
+        if self.tokens is not None:
+            # A single request can never need more than a full bucket
+            tokens = min(tokens, self.tokens.capacity)
+
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        entry = (priority, next(self._sequence))
+
+        with self._condition:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._take(tokens, priority) if self._waiters[0] == entry else None
+
+                    if wait == 0.0:
+                        heapq.heappop(self._waiters)
+                        waited = now - start
+                        self._stats["acquired"] += 1
+                        self._stats["waited_seconds"] += waited
+                        self._condition.notify_all()
+                        return waited
+
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            raise TimeoutError(f"Timed out waiting for {self.name} rate limit")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._condition.wait(wait)
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._condition.notify_all()
+                raise
+
+    def _take(self, tokens: int, priority: int) -> float:
+        """Take capacity for the head of the queue, or return the seconds until it can."""
+        with self._shared_state():
+            now = self._clock()
+            if now < self.paused_until:
+                return self.paused_until - now
+
+            reserve = self.bulk_reserve if priority >= PRIORITY_BULK else 0.0
+            self.requests.refill(now, self.rate_factor)
+            needed = min(1 + reserve * self.requests.capacity, max(self.requests.capacity, 1))
+            wait = self.requests.time_until(needed, self.rate_factor)
+            if self.tokens is not None:
+                self.tokens.refill(now, self.rate_factor)
+                needed = min(tokens + reserve * self.tokens.capacity, self.tokens.capacity)
+                wait = max(wait, self.tokens.time_until(needed, self.rate_factor))
+            if wait == 0.0:
+                self.requests.level -= 1
+                if self.tokens is not None:
+                    self.tokens.level -= tokens
+            return wait
+
+    @contextmanager
+    def _shared_state(self):
+        """Load the shared buckets for the block and store them afterwards (no-op without a state file)."""
+        if self.state_path is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with open(f"{self.state_path}.lock", 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.state_path, 'r', encoding='utf-8') as f:
+                        state = json.load(f)
+                    # Another process may have been configured with a higher limit
+                    level, self.requests.updated = state["requests"]
+                    self.requests.level = min(level, self.requests.capacity)
+                    if self.tokens is not None and state.get("tokens"):
+                        level, self.tokens.updated = state["tokens"]
+                        self.tokens.level = min(level, self.tokens.capacity)
+                    self.rate_factor = state["rate_factor"]
+                    self.paused_until = state["paused_until"]
+                except (FileNotFoundError, ValueError, KeyError):
+                    pass
+                yield
+                temp = f"{self.state_path}.tmp"
+                with open(temp, 'w', encoding='utf-8') as f:
+                    json.dump({
+                        "requests": [self.requests.level, self.requests.updated],
+                        "tokens": [self.tokens.level, self.tokens.updated] if self.tokens is not None else None,
+                        "rate_factor": self.rate_factor,
+                        "paused_until": self.paused_until
+                    }, f)
+                os.replace(temp, self.state_path)
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def report_rate_limited(self, retry_after: Optional[float] = None):
+        """Pause all callers after a 429 and slow down the refill rate."""
+        with self._condition, self._shared_state():
+            delay = retry_after if retry_after is not None else 60.0 / max(self.requests.capacity, 1.0)
+            self.paused_until = max(self.paused_until, self._clock() + delay)
+            self.rate_factor = max(0.1, self.rate_factor * 0.5)
+            self._stats["rate_limited"] += 1
+            self._condition.notify_all()
+        logger.warning(f"{self.name} rate limited; pausing {delay:.1f}s at {self.rate_factor:.0%} of configured rate")
+
+    def report_success(self):
+        """Recover the refill rate step by step after successful calls."""
+        if self.rate_factor < 1.0:
+            with self._condition, self._shared_state():
+                self.rate_factor = min(1.0, self.rate_factor + 0.05)
+
+    def call(self, func: Callable[[], Any], tokens: int = 0, priority: Optional[int] = None,
+             max_retries: int = 5) -> Any:
+        """
+        Run an API call under the rate limit, retrying on 429 responses
+
+        Args:
+            func (Callable): Zero-argument function performing the request
+            tokens (int): Estimated tokens for the request
+            priority (Optional[int]): Scheduling priority
+            max_retries (int): Maximum retries after rate limit errors
+
+        Returns:
+            Any: Result of func
+        """
+        for attempt in range(max_retries + 1):
+            self.acquire(tokens, priority)
+            try:
+                result = func()
+            except Exception as e:
+                if is_rate_limit_error(e) and attempt < max_retries:
+                    self.report_rate_limited(get_retry_after(e))
+                    continue
+                raise
+            self.report_success()
+            return result
+
+    async def acall(self, func: Callable[[], Awaitable[Any]], tokens: int = 0, priority: Optional[int] = None,
+                    max_retries: int = 5) -> Any:
+        """
+        Async variant of call() for coroutine-based API clients
+
+        Waiting for the buckets happens in a worker thread so the event loop
+        keeps serving other requests.
+
+        Args:
+            func (Callable): Zero-argument function returning an awaitable request
+            tokens (int): Estimated tokens for the request
+            priority (Optional[int]): Scheduling priority
+            max_retries (int): Maximum retries after rate limit errors
+
+        Returns:
+            Any: Result of the awaited request
+        """
+        if priority is None:
+            priority = current_priority()
+        loop = asyncio.get_running_loop()
+        for attempt in range(max_retries + 1):
+            await loop.run_in_executor(_ASYNC_WAITERS, self.acquire, tokens, priority)
+            try:
+                result = await func()
+            except Exception as e:
+                if is_rate_limit_error(e) and attempt < max_retries:
+                    self.report_rate_limited(get_retry_after(e))
+                    continue
+                raise
+            self.report_success()
+            return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get counters and the current rate adaptation state."""
+        with self._condition:
+            return {
+                **self._stats,
+                "queued": len(self._waiters),
+                "rate_factor": self.rate_factor,
+                "paused_for": max(0.0, self.paused_until - self._clock())
+            }
+
+# Schedulers shared by every caller of the same API, and through DATA_DIR by every process
+_SCHEDULER_DEFAULTS = {
+    "openai": (500, 200_000),
+    "embedding": (3000, 1_000_000),
+}
+_schedulers: Dict[str, RateLimitScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(name: str) -> RateLimitScheduler:
+    """
+    Get the shared scheduler for an API
+
+    Limits come from {NAME}_REQUESTS_PER_MINUTE and {NAME}_TOKENS_PER_MINUTE,
+    e.g. EMBEDDING_REQUESTS_PER_MINUTE. Unless RATE_LIMIT_SHARED=false, the
+    buckets are kept in $DATA_DIR/rate_limits/ so that every process on the
+    host shares them, and bulk callers leave RATE_LIMIT_BULK_RESERVE of
+    them to interactive ones.
+
+    Args:
+        name (str): "openai", "embedding" or any other API name
+
+    Returns:
+        RateLimitScheduler: Shared scheduler
+    """
+    scheduler = _schedulers.get(name)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.get(name)
+            if scheduler is None:
+                default_rpm, default_tpm = _SCHEDULER_DEFAULTS.get(name, (60, None))
+                prefix = name.upper()
+                rpm = float(os.getenv(f"{prefix}_REQUESTS_PER_MINUTE", default_rpm))
+                tpm = os.getenv(f"{prefix}_TOKENS_PER_MINUTE", default_tpm)
+                state_path = None
+                if os.getenv("RATE_LIMIT_SHARED", "true").lower() == "true":
+                    state_path = os.path.join(os.getenv("DATA_DIR", "data"), RATE_LIMIT_DIR, f"{name}.json")
+                scheduler = RateLimitScheduler(name, rpm, float(tpm) if tpm else None, state_path=state_path,
+                                               bulk_reserve=float(os.getenv("RATE_LIMIT_BULK_RESERVE", "0.2")))
+                _schedulers[name] = scheduler
+    return scheduler
@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class StartupTimeline:
+    """Records how long each startup phase (imports, config, client init) took."""
+
+    def __init__(self, origin: Optional[float] = None):
+        self.origin = origin if origin is not None else time.perf_counter()
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, name: str, start: float, end: float):
+        """Record a phase from perf_counter start/end timestamps."""
+        event = {
+            "name": name,
+            "start": start - self.origin,
+            "duration": end - start,
+            "thread": threading.current_thread().name
+        }
+        with self._lock:
+            self._events.append(event)
+        logger.info(f"Startup phase {name} took {event['duration']:.3f} seconds")
+
+    @contextmanager
+    def phase(self, name: str):
+        """Context manager timing a startup phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def get_events(self) -> List[Dict[str, Any]]:
+        """Get recorded phases ordered by start offset."""
+        with self._lock:
+            return sorted(self._events, key=lambda event: event["start"])
+
+    def summary(self) -> str:
+        """Format the timeline as one line per phase."""
+        return "\n".join(
+            f"{event['start']:8.3f}s +{event['duration']:.3f}s  {event['name']} [{event['thread']}]"
+            for event in self.get_events()
+        )
+
+class LazyService:
+    """A value built on first use, at most once, even when requested from several threads."""
+
+    def __init__(self, name: str, factory: Callable[[], Any], timeline: Optional[StartupTimeline] = None):
+        self.name = name
+        self.factory = factory
+        self.timeline = timeline
+        self.error: Optional[BaseException] = None
+        self._value = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def get(self) -> Any:
+        """Return the service, constructing it if needed."""
+        if self._ready:
+            return self._value
+
+        with self._lock:
+            if not self._ready:
+                start = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except BaseException as e:
+                    # Keep the error for status display but let the next caller retry
+                    self.error = e
+                    raise
+                finally:
+                    if self.timeline:
+                        self.timeline.record(f"init:{self.name}", start, time.perf_counter())
+                self.error = None
+                self._ready = True
+        return self._value
+
+    def warm_up(self) -> threading.Thread:
+        """Construct the service in a background daemon thread."""
+        def run():
+            try:
+                self.get()
+            except Exception as e:
+                logger.warning(f"Background warm-up of {self.name} failed: {e}")
+
+        thread = threading.Thread(target=run, name=f"warmup-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+class ServiceContainer:
+    """
+    Registry of lazily initialized clients.
+
+    Services are registered with a zero-argument factory and only built when
+    first requested (or when warmed up in the background), so the app can
+    render before slow network clients are connected. Coroutines using the
+    services run on the container's own long-lived event loop (see run).
+    """
+
+    def __init__(self, timeline: Optional[StartupTimeline] = None):
+        self.timeline = timeline or StartupTimeline()
+        self._services: Dict[str, LazyService] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Register a service factory under a name."""
+        self._services[name] = LazyService(name, factory, self.timeline)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._services
+
+    def get(self, name: str) -> Any:
+        """Get a service, building it on first use."""
+        if name not in self._services:
+            raise KeyError(f"Unknown service: {name}")
+        return self._services[name].get()
+
+    def is_ready(self, name: str) -> bool:
+        """Check whether a service has been built."""
+        return name in self._services and self._services[name].ready
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> List[threading.Thread]:
+        """Start building services in background threads."""
+        names = list(names) if names is not None else list(self._services)
+        return [self._services[name].warm_up() for name in names if not self.is_ready(name)]
+
+    def status(self) -> Dict[str, str]:
+        """Get 'ready', 'failed: ...' or 'pending' for every service."""
+        result = {}
+        for name, service in self._services.items():
+            if service.ready:
+                result[name] = "ready"
+            elif service.error is not None:
+                result[name] = f"failed: {service.error}"
+            else:
+                result[name] = "pending"
+        return result
+
+    def run(self, coroutine: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the container's event loop and wait for its result
+
+        Every call shares one loop running in a background thread, so async
+        clients cached by the services (e.g. ChatOpenAI's httpx pool) are
+        never reused across closed loops, as they would be with an
+        asyncio.run() per call. The caller's context variables (request
+        priority, usage tracking) are carried into the coroutine.
+
+        Args:
+            coroutine (Coroutine): Coroutine to run
+            timeout (Optional[float]): Maximum seconds to wait; the coroutine is cancelled after it
+
+        Returns:
+            Any: The coroutine's result
+        """
+        context = contextvars.copy_context()
+
+        async def in_caller_context():
+            for variable, value in context.items():
+                variable.set(value)
+            return await coroutine
+
+        future = asyncio.run_coroutine_threadsafe(in_caller_context(), self._event_loop())
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="service-loop", daemon=True).start()
+                self._loop = loop
+            return self._loop
@@ -0,0 +1,158 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query so trivially different spellings share one key
+
+    Args:
+        query (str): Raw user query or command
+
+    Returns:
+        str: Lower-cased query with collapsed whitespace
+    """
+    return " ".join(query.lower().split())
+
+def query_key(namespace: Optional[str], query: str) -> Tuple[str, str]:
+    """Build a coalescing key from a namespace and a query."""
+    return (namespace or "", normalize_query(query))
+
+class _Call:
+    """A call in progress that duplicate callers wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running block and receive the same result (or exception)
+    instead of repeating the work. Nothing is remembered once the call
+    finishes, so this deduplicates in-flight work only and never serves
+    stale results.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"executions": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """
+        Run func once for all concurrent callers with the same key
+
+        Args:
+            key (Hashable): Identity of the work
+            func (Callable): Zero-argument function doing the work
+
+        Returns:
+            Any: Result of func, shared by every concurrent caller
+        """
+        return self.do_shared(key, func)[0]
+
+    def do_shared(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Like do(), but also report whether the result came from another caller
+
+        Returns:
+            Tuple[Any, bool]: (result, shared)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._stats["executions"] += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+                leader = False
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = func()
+            return call.value, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    async def ado(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async variant of do() for coroutine functions
+
+        Callers may wait from different event loops (Streamlit runs one
+        asyncio.run() per request), so the result is handed over through a
+        thread-safe future. If the running call is cancelled, e.g. by its
+        caller's timeout, the callers waiting on it start over.
+
+        Args:
+            key (Hashable): Identity of the work
+            func (Callable): Zero-argument function returning an awaitable
+
+        Returns:
+            Any: Result of the awaited call, shared by every concurrent caller
+        """
+        while True:
+            with self._lock:
+                future = self._async_calls.get(key)
+                if future is None:
+                    future = self._async_calls[key] = concurrent.futures.Future()
+                    self._stats["executions"] += 1
+                    leader = True
+                else:
+                    self._stats["coalesced"] += 1
+                    leader = False
+
+            if leader:
+                break
+            try:
+                # Shielded: a waiter giving up must not cancel the call for the others
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+
+        try:
+            value = await func()
+        except BaseException as e:
+            self._finish_async(key)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+        self._finish_async(key)
+        future.set_result(value)
+        return value
+
+    def _finish_async(self, key: Hashable):
+        with self._lock:
+            self._async_calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        """Number of keys currently executing."""
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get execution and coalescing counters."""
+        with self._lock:
+            return {"name": self.name, **self._stats, "in_flight": len(self._calls) + len(self._async_calls)}
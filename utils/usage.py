@@ -0,0 +1,260 @@
+import contextvars
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+# USD per million tokens as (input, output); embeddings only have input.
+# List prices at the time of writing, override with MODEL_PRICES.
+DEFAULT_MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4": (30.00, 60.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "text-embedding-ada-002": (0.10, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0)
+}
+
+_model_prices: Optional[Dict[str, Tuple[float, float]]] = None
+
+def get_model_prices() -> Dict[str, Tuple[float, float]]:
+    """
+    Per-model token prices
+
+    MODEL_PRICES may hold a JSON object of model -> [input, output] USD per
+    million tokens, merged over the defaults.
+
+    Returns:
+        Dict[str, Tuple[float, float]]: model -> (input, output) price
+    """
+    global _model_prices
+    if _model_prices is None:
+        prices = dict(DEFAULT_MODEL_PRICES)
+        override = os.getenv("MODEL_PRICES")
+        if override:
+            try:
+                prices.update({model: tuple(price) for model, price in json.loads(override).items()})
+            except (ValueError, TypeError):
+                pass
+        _model_prices = prices
+    return _model_prices
+
+def token_cost(model: str, input_tokens: int, output_tokens: int = 0) -> float:
+    """
+    Cost in USD of a call, 0 for unknown models
+
+    Dated model names ("gpt-4o-mini-2024-07-18") are priced as their base model.
+    """
+    prices = get_model_prices()
+    name = model or ""
+    price = prices.get(name)
+    if price is None:
+        # Longest known prefix, so gpt-4o-mini is not priced as gpt-4
+        matches = [known for known in prices if name.startswith(known)]
+        price = prices[max(matches, key=len)] if matches else (0.0, 0.0)
+    return (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000
+
+class UsageMeter:
+    """Token and cost totals of one traced operation or ingestion run."""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.embedding_tokens = 0
+        self.cost = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, model: str, input_tokens: int, output_tokens: int = 0):
+        """
+        Count one API call
+
+        Args:
+            kind (str): "llm" or "embedding"
+            model (str): Model name, used for pricing
+            input_tokens (int): Prompt (or embedded text) tokens
+            output_tokens (int): Completion tokens
+        """
+        with self._lock:
+            if kind == "embedding":
+                self.embedding_tokens += input_tokens
+            else:
+                self.prompt_tokens += input_tokens
+                self.completion_tokens += output_tokens
+            self.cost += token_cost(model, input_tokens, output_tokens)
+            self.calls += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "embedding_tokens": self.embedding_tokens,
+            "cost": round(self.cost, 6),
+            "calls": self.calls
+        }
+
+# Meter of the operation running in this context; copied into asyncio tasks and to_thread calls
+_current_meter: contextvars.ContextVar[Optional[UsageMeter]] = contextvars.ContextVar("usage_meter", default=None)
+
+def start_tracking(meter: UsageMeter) -> contextvars.Token:
+    """
+    Attribute API calls made from now on in this context to ``meter``
+
+    Returns:
+        contextvars.Token: Pass to stop_tracking
+    """
+    return _current_meter.set(meter)
+
+def stop_tracking(token: contextvars.Token):
+    """Undo start_tracking."""
+    try:
+        _current_meter.reset(token)
+    except ValueError:
+        # Finished from another context (e.g. a generator closed elsewhere), which never saw the meter
+        pass
+
+@contextmanager
+def track_usage(meter: UsageMeter) -> Iterator[UsageMeter]:
+    """Attribute every API call made inside the block to ``meter``."""
+    token = start_tracking(meter)
+    try:
+        yield meter
+    finally:
+        stop_tracking(token)
+
+def record_usage(kind: str, model: str, input_tokens: int, output_tokens: int = 0):
+    """Count an API call against the current operation, if one is being tracked."""
+    meter = _current_meter.get()
+    if meter is not None:
+        meter.add(kind, model, input_tokens, output_tokens)
+
+def response_token_usage(response: Any) -> Optional[Tuple[int, int]]:
+    """
+    (input, output) tokens reported by an OpenAI or LangChain response
+
+    Returns:
+        Optional[Tuple[int, int]]: None when the response carries no usage
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if isinstance(usage, dict) and "input_tokens" in usage:
+        return usage["input_tokens"], usage.get("output_tokens", 0)
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage")
+    if isinstance(usage, dict) and "prompt_tokens" in usage:
+        return usage["prompt_tokens"], usage.get("completion_tokens", 0)
+    usage = getattr(response, "usage", None)
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        return usage.prompt_tokens, getattr(usage, "completion_tokens", 0) or 0
+    return None
+
+class UsageLedger:
+    """
+    Append-only JSON Lines record of usage per operation and ingestion run.
+
+    Rollups by session, operation (rag, agent, /summarize, ingest...) and
+    day are kept as running totals for the metrics panel: each rollup only
+    reads the lines appended since the last one (by any process), so a
+    rerun costs the same however long the ledger has grown.
+    """
+
+    GROUPINGS = ("session", "operation", "day")
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        # Bytes of the file already added to the totals, and which file they came from
+        self._offset = 0
+        self._file_id: Optional[Tuple[int, int]] = None
+        # (grouping, session id or None for all sessions) -> group -> totals
+        self._totals: Dict[Tuple[str, Optional[str]], Dict[str, Dict[str, Any]]] = {}
+
+    def append(self, session_id: str, operation: str, model: str, usage: Dict[str, Any],
+               timestamp: Optional[str] = None):
+        """
+        Record the usage of one operation
+
+        Args:
+            session_id (str): Session the operation ran in
+            operation (str): "rag", "agent", a command such as "/summarize", or "ingest"
+            model (str): Chat or embedding model mainly used
+            usage (Dict[str, Any]): UsageMeter.to_dict()
+            timestamp (Optional[str]): ISO time, defaults to now
+        """
+        entry = dict(usage, session_id=session_id, operation=operation, model=model,
+                     timestamp=timestamp or datetime.now().isoformat())
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def load(self) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        entries = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
+    def rollup(self, by: str, session_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Sum usage by "session", "operation" or "day"
+
+        Args:
+            by (str): Grouping key
+            session_id (Optional[str]): Only count this session
+
+        Returns:
+            Dict[str, Dict[str, Any]]: group -> token and cost totals, most expensive first
+        """
+        if by not in self.GROUPINGS:
+            raise ValueError(f"Unknown usage grouping: {by}")
+        with self._lock:
+            self._read_appended()
+            groups = {key: dict(total) for key, total in self._totals.get((by, session_id or None), {}).items()}
+        return dict(sorted(groups.items(), key=lambda item: item[1]["cost"], reverse=True))
+
+    def _read_appended(self):
+        """Add the complete lines written since the last call to the running totals (lock held)."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self._offset, self._file_id, self._totals = 0, None, {}
+            return
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self._offset:
+            # Replaced or truncated: start over
+            self._offset, self._file_id, self._totals = 0, file_id, {}
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(stat.st_size - self._offset)
+        # A line still being written by another process is picked up next time
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            try:
+                self._add(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+        self._offset += complete
+
+    def _add(self, entry: Dict[str, Any]):
+        keys = {"session": entry.get("session_id", ""), "operation": entry.get("operation", ""),
+                "day": entry.get("timestamp", "")[:10]}
+        scopes = [None, entry["session_id"]] if entry.get("session_id") else [None]
+        for by, key in keys.items():
+            for scope in scopes:
+                total = self._totals.setdefault((by, scope), {}).setdefault(
+                    key, {"count": 0, "prompt_tokens": 0, "completion_tokens": 0, "embedding_tokens": 0, "cost": 0.0}
+                )
+                total["count"] += 1
+                for field in ("prompt_tokens", "completion_tokens", "embedding_tokens", "cost"):
+                    total[field] += entry.get(field, 0)
@@ -0,0 +1,706 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils.vector_store import SCAN_BLOCK_SIZE, ScalarQuantizer, normalize_rows, top_k_indices
+
+try:
+    import fcntl
+except ImportError:  # Windows: single writer process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+SEGMENT_FILE = "segment.json"
+
+def _write_offsets_file(path: Path, items: Sequence[bytes]):
+    """Write items back to back into ``path`` plus an int64 offsets file."""
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    with open(path, 'wb') as f:
+        for i, item in enumerate(items):
+            f.write(item)
+            offsets[i + 1] = offsets[i] + len(item)
+    np.save(path.with_suffix(".idx.npy"), offsets)
+
+def _memmap(path: Path, dtype: str, shape: Tuple[int, ...]) -> np.ndarray:
+    # np.memmap cannot map an empty file
+    if not shape[0]:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+def write_segment(directory: Union[str, Path], generation: int, ids: Sequence[str], vectors: Any,
+                  metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+                  dtype: str = "float32", extras: Optional[Dict[str, Any]] = None,
+                  sources: Optional[Sequence[str]] = None, dropped: Optional[Sequence[str]] = None) -> Path:
+    """
+    Write one immutable segment
+
+    Layout of ``seg-<generation>/``:
+        segment.json          count, dimension, dtype, generation (and merge provenance)
+        vectors.bin           raw row-major float32 or int8 matrix (unit rows)
+        scale.npy             per-dimension scale for int8 segments
+        ids.bin + .idx.npy    UTF-8 ids and their offsets
+        metadata.bin + .idx   one JSON document per row and their offsets
+        extra-<name>.npy      optional per-row arrays kept for the caller
+
+    The segment is built in a temporary directory and renamed into place,
+    so readers never see a partial segment.
+
+    Args:
+        directory (Union[str, Path]): Store directory
+        generation (int): Segment generation, higher is newer
+        ids (Sequence[str]): Vector ids
+        vectors: Matrix of vectors
+        metadata (Optional[Sequence[Dict]]): Metadata per vector
+        dtype (str): "float32" or "int8"
+        extras (Optional[Dict[str, Any]]): Per-row arrays, e.g. an index's cluster assignment
+        sources (Optional[Sequence[str]]): For a merge, the segments it replaces
+        dropped (Optional[Sequence[str]]): For a merge, ids of the dead rows it left out
+
+    Returns:
+        Path: The segment directory
+    """
+    if dtype not in ("float32", "int8"):
+        raise ValueError(f"Unsupported segment dtype: {dtype}")
+    directory = Path(directory)
+    final = directory / f"seg-{generation:08d}"
+    temp = directory / f".seg-{generation:08d}.tmp"
+    shutil.rmtree(temp, ignore_errors=True)
+    temp.mkdir(parents=True)
+
+    matrix = normalize_rows(vectors) if len(ids) else np.empty((0, 0), dtype=np.float32)
+    if dtype == "int8" and len(ids):
+        quantizer = ScalarQuantizer().fit(matrix)
+        np.save(temp / "scale.npy", quantizer.scale)
+        matrix = quantizer.encode(matrix)
+    matrix.tofile(temp / "vectors.bin")
+
+    metadata = metadata if metadata is not None else [None] * len(ids)
+    _write_offsets_file(temp / "ids.bin", [vector_id.encode("utf-8") for vector_id in ids])
+    _write_offsets_file(temp / "metadata.bin", [json.dumps(item).encode("utf-8") for item in metadata])
+    for name, values in (extras or {}).items():
+        np.save(temp / f"extra-{name}.npy", np.asarray(values))
+
+    info = {
+        "generation": generation,
+        "count": len(ids),
+        "dimension": int(matrix.shape[1]) if len(ids) else 0,
+        "dtype": dtype,
+        "extras": sorted(extras or {}),
+        "created_at": time.time()
+    }
+    if sources is not None:
+        info["sources"] = list(sources)
+        info["dropped"] = list(dropped or [])
+    with open(temp / SEGMENT_FILE, 'w', encoding='utf-8') as f:
+        json.dump(info, f)
+    os.rename(temp, final)
+    return final
+
+class VectorSegment:
+    """
+    Read-only view of a segment on disk.
+
+    Opening only reads segment.json and maps the files, so it costs the
+    same for ten rows as for ten million; pages are read on first touch
+    and are shared through the OS page cache by every process mapping
+    the same segment.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / SEGMENT_FILE, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        self.generation: int = info["generation"]
+        self.count: int = info["count"]
+        self.dimension: int = info["dimension"]
+        self.dtype: str = info["dtype"]
+        self.extras: List[str] = info.get("extras", [])
+        # Set on merged segments only: what they replaced and which dead ids they left out
+        self.sources: Optional[List[str]] = info.get("sources")
+        self.dropped: List[str] = info.get("dropped", [])
+
+        self.vectors = _memmap(self.path / "vectors.bin", self.dtype, (self.count, self.dimension))
+        self.scale = np.load(self.path / "scale.npy") if self.dtype == "int8" and self.count else None
+        self._id_offsets = np.load(self.path / "ids.idx.npy", mmap_mode='r')
+        self._ids = _memmap(self.path / "ids.bin", "uint8", (int(self._id_offsets[-1]),))
+        self._metadata_offsets = np.load(self.path / "metadata.idx.npy", mmap_mode='r')
+        self._metadata = _memmap(self.path / "metadata.bin", "uint8", (int(self._metadata_offsets[-1]),))
+        self._rows: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def id_at(self, row: int) -> str:
+        start, end = self._id_offsets[row], self._id_offsets[row + 1]
+        return bytes(self._ids[start:end]).decode("utf-8")
+
+    def metadata_at(self, row: int) -> Optional[Dict[str, Any]]:
+        start, end = self._metadata_offsets[row], self._metadata_offsets[row + 1]
+        return json.loads(bytes(self._metadata[start:end]))
+
+    def row_of(self, vector_id: str) -> Optional[int]:
+        """Row of an id; the id map is built on first use (O(n) once)."""
+        if self._rows is None:
+            self._rows = {self.id_at(row): row for row in range(self.count)}
+        return self._rows.get(vector_id)
+
+    def extra(self, name: str) -> Optional[np.ndarray]:
+        """A per-row array stored with the segment, memory-mapped; None if it has none by that name."""
+        if name not in self.extras:
+            return None
+        return np.load(self.path / f"extra-{name}.npy", mmap_mode='r' if self.count else None)
+
+    def vector_at(self, row: int) -> np.ndarray:
+        vector = np.asarray(self.vectors[row], dtype=np.float32)
+        return vector * self.scale if self.scale is not None else vector
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine scores for every row, scanned block by block."""
+        prepared = query * self.scale if self.scale is not None else query
+        out = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, SCAN_BLOCK_SIZE):
+            block = self.vectors[start:start + SCAN_BLOCK_SIZE]
+            out[start:start + len(block)] = np.asarray(block, dtype=np.float32) @ prepared
+        return out
+
+class SegmentedVectorStore:
+    """
+    Persistent local vector store made of immutable memory-mapped segments.
+
+    Writes are buffered in memory and flushed as a new segment. Deletes and
+    overwrites never touch existing segments: they are recorded as
+    tombstones in the manifest (an id is dead in every segment older than
+    its tombstone generation). Compaction merges all segments into one,
+    drops dead rows and swaps the manifest atomically, either on demand or
+    from a background thread. Merges are size-tiered: a flush only merges
+    the newest segments that are no bigger than everything after them, so
+    every vector is rewritten O(log n) times however small the flushes.
+
+    Several processes can open the same directory: readers pick up new
+    manifests automatically and only ever map files, while manifest updates
+    are serialized with a file lock where the platform supports it. Callers
+    keeping a derived view (an index) hold locked() across their own reads
+    and writes and catch up with state() and changes_since().
+    """
+
+    def __init__(self, directory: Union[str, Path], dtype: str = "float32",
+                 flush_size: Optional[int] = None, max_segments: Optional[int] = None):
+        """
+        Open (or create) a store
+
+        Args:
+            directory (Union[str, Path]): Store directory
+            dtype (str): Storage type for new segments, "float32" or "int8"
+            flush_size (Optional[int]): Buffered vectors that trigger a flush
+            max_segments (Optional[int]): Segment count above which the newest segments are merged
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dtype = dtype
+        self.flush_size = flush_size or int(os.getenv("VECTOR_SEGMENT_FLUSH_SIZE", "10000"))
+        self.max_segments = max_segments or int(os.getenv("VECTOR_SEGMENT_MAX_SEGMENTS", "8"))
+
+        self.segments: List[VectorSegment] = []
+        self.tombstones: Dict[str, int] = {}
+        self.next_generation = 0
+        self.vector_count = 0
+        self._pending: Dict[str, Tuple[np.ndarray, Optional[Dict[str, Any]], Dict[str, Any]]] = {}
+        self._manifest_version = None
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._compactor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.refresh()
+
+    def __len__(self) -> int:
+        """Live vectors on disk plus buffered vectors not yet on disk."""
+        with self._lock:
+            self.refresh()
+            return self.vector_count + sum(1 for vector_id in self._pending if not self._exists(vector_id))
+
+    def manifest_version(self) -> Optional[Tuple[int, int]]:
+        """
+        Identity of the manifest on disk, without taking any lock
+
+        Every manifest write is a rename, so this changes with each
+        committed write from any process. None before the first write.
+        """
+        try:
+            stat = (self.directory / MANIFEST_FILE).stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def refresh(self):
+        """
+        Reload the manifest if another process changed it
+        """
+        path = self.directory / MANIFEST_FILE
+        version = self.manifest_version()
+        if version is None:
+            return
+        with self._lock:
+            if version == self._manifest_version:
+                return
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            # Segments are immutable, so already-open ones are reused as is
+            opened = {segment.path.name: segment for segment in self.segments}
+            self.segments = [opened.get(name) or VectorSegment(self.directory / name) for name in manifest["segments"]]
+            self.tombstones = manifest["tombstones"]
+            self.next_generation = manifest["next_generation"]
+            self.vector_count = manifest["vector_count"]
+            self._manifest_version = version
+
+    def add(self, ids: Sequence[str], vectors: Any, metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+            extras: Optional[Dict[str, Sequence[Any]]] = None):
+        """
+        Buffer vectors for the next segment, replacing existing ids
+
+        Args:
+            ids (Sequence[str]): Vector ids
+            vectors: Matrix of vectors
+            metadata (Optional[Sequence[Dict]]): Metadata per vector
+            extras (Optional[Dict[str, Sequence]]): Per-row values stored alongside (see write_segment)
+        """
+        matrix = normalize_rows(vectors)
+        metadata = metadata if metadata is not None else [None] * len(ids)
+        extras = extras or {}
+        with self._lock:
+            for row, (vector_id, vector, item) in enumerate(zip(ids, matrix, metadata)):
+                self._pending[vector_id] = (vector, item, {name: values[row] for name, values in extras.items()})
+            if len(self._pending) >= self.flush_size:
+                self.flush()
+
+    def delete(self, ids: Sequence[str]) -> int:
+        """
+        Delete vectors by id (tombstoned until the next compaction)
+
+        Returns:
+            int: Number of stored vectors deleted
+        """
+        deleted = 0
+        with self._locked_manifest():
+            for vector_id in ids:
+                buffered = self._pending.pop(vector_id, None) is not None
+                if self._exists(vector_id):
+                    self.tombstones[vector_id] = self.next_generation
+                    self.vector_count -= 1
+                    deleted += 1
+                elif buffered:
+                    deleted += 1
+            self._write_manifest()
+        return deleted
+
+    def flush(self):
+        """
+        Write buffered vectors as a new segment
+        """
+        with self._locked_manifest():
+            if not self._pending:
+                return
+            ids = list(self._pending)
+            vectors = np.stack([self._pending[vector_id][0] for vector_id in ids])
+            metadata = [self._pending[vector_id][1] for vector_id in ids]
+            # Only extras every buffered row has can be stored
+            names = set.intersection(*(set(self._pending[vector_id][2]) for vector_id in ids))
+            extras = {name: np.array([self._pending[vector_id][2][name] for vector_id in ids]) for name in names}
+            generation = self.next_generation
+            path = write_segment(self.directory, generation, ids, vectors, metadata, dtype=self.dtype, extras=extras)
+
+            # Only overwritten ids need a tombstone to hide their older copies
+            overwritten = [vector_id for vector_id in ids if self._exists(vector_id)]
+            for vector_id in overwritten:
+                self.tombstones[vector_id] = generation
+            self.vector_count += len(ids) - len(overwritten)
+            self.segments.append(VectorSegment(path))
+            self.next_generation = generation + 1
+            self._pending.clear()
+            self._write_manifest()
+
+    def get(self, vector_id: str) -> Optional[Tuple[np.ndarray, Optional[Dict[str, Any]]]]:
+        """Stored (normalized) vector and metadata for an id."""
+        with self._lock:
+            self.refresh()
+            if vector_id in self._pending:
+                return self._pending[vector_id][:2]
+            for segment in reversed(self.segments):
+                row = segment.row_of(vector_id)
+                if row is not None and self._alive(segment, vector_id):
+                    return segment.vector_at(row), segment.metadata_at(row)
+            return None
+
+    def search(self, query: Any, top_k: int = 5) -> List[Tuple[str, float, Optional[Dict[str, Any]]]]:
+        """
+        Exact top-k search by cosine similarity over every segment
+
+        Args:
+            query: Query vector
+            top_k (int): Number of results
+
+        Returns:
+            List[Tuple]: (id, score, metadata), best first
+        """
+        q = normalize_rows(query)[0]
+        with self._lock:
+            self.refresh()
+            segments = list(self.segments)
+            tombstones = dict(self.tombstones)
+            pending = dict(self._pending)
+
+        candidates = []
+        for segment in segments:
+            if not segment.count:
+                continue
+            scores = segment.scores(q)
+            # Over-fetch so dead or shadowed rows cannot push live ones out
+            for row in top_k_indices(scores, top_k + len(tombstones) + len(pending)):
+                vector_id = segment.id_at(int(row))
+                if vector_id in pending or segment.generation < tombstones.get(vector_id, -1):
+                    continue
+                candidates.append((vector_id, float(scores[row]), segment, int(row)))
+        for vector_id, (vector, item, _) in pending.items():
+            candidates.append((vector_id, float(vector @ q), None, item))
+
+        candidates.sort(key=lambda candidate: candidate[1], reverse=True)
+        return [
+            (vector_id, score, segment.metadata_at(extra) if segment is not None else extra)
+            for vector_id, score, segment, extra in candidates[:top_k]
+        ]
+
+    def live_rows(self, extras: Sequence[str] = ()) -> Tuple[List[str], np.ndarray, List[Optional[Dict[str, Any]]], Dict[str, np.ndarray]]:
+        """
+        Every live vector, e.g. to rebuild an in-memory index on startup
+
+        A store compacted into one float32 segment hands out its memory map
+        as is, so nothing is read until the rows are used.
+
+        Args:
+            extras (Sequence[str]): Per-row arrays to return; one is left out unless every live row has it
+
+        Returns:
+            Tuple: (ids, unit vectors, metadata, extras by name)
+        """
+        with self._lock:
+            self.refresh()
+            pending = dict(self._pending)
+            parts = []
+            for segment in self.segments:
+                rows = self._live_rows(segment, self.tombstones)
+                if pending:
+                    rows = rows[[segment.id_at(int(row)) not in pending for row in rows]]
+                if len(rows):
+                    parts.append((segment, rows))
+
+        ids, metadata, blocks = [], [], []
+        extra_blocks = {name: [] for name in extras}
+        for segment, rows in parts:
+            whole = len(rows) == segment.count
+            block = segment.vectors if whole else np.asarray(segment.vectors[rows], dtype=np.float32)
+            blocks.append(block * segment.scale if segment.scale is not None else block)
+            ids.extend(segment.id_at(int(row)) for row in rows)
+            metadata.extend(segment.metadata_at(int(row)) for row in rows)
+            for name in list(extra_blocks):
+                values = segment.extra(name)
+                if values is None:
+                    del extra_blocks[name]
+                else:
+                    extra_blocks[name].append(values if whole else np.asarray(values[rows]))
+        if pending:
+            ids.extend(pending)
+            blocks.append(np.stack([vector for vector, _, _ in pending.values()]))
+            metadata.extend(item for _, item, _ in pending.values())
+            for name in list(extra_blocks):
+                if all(name in row_extras for _, _, row_extras in pending.values()):
+                    extra_blocks[name].append(np.array([row_extras[name] for _, _, row_extras in pending.values()]))
+                else:
+                    del extra_blocks[name]
+
+        def join(arrays: List[np.ndarray]) -> np.ndarray:
+            return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+        vectors = join(blocks) if blocks else np.empty((0, 0), dtype=np.float32)
+        return ids, vectors, metadata, {name: join(arrays) for name, arrays in extra_blocks.items() if arrays}
+
+    def state(self) -> Tuple[Optional[Tuple[int, int]], frozenset, Dict[str, int]]:
+        """
+        What the store holds right now, for a later changes_since()
+
+        Returns:
+            Tuple: (manifest version, segment names, tombstones)
+        """
+        with self._lock:
+            self.refresh()
+            return self._manifest_version, frozenset(s.path.name for s in self.segments), dict(self.tombstones)
+
+    def changes_since(self, state: Tuple[Optional[Tuple[int, int]], frozenset, Dict[str, int]]
+                      ) -> Optional[Tuple[List[str], np.ndarray, List[Optional[Dict[str, Any]]], List[str]]]:
+        """
+        Rows written and ids deleted (by any process) since state() returned ``state``
+
+        New flushed segments contribute their live rows. Merged segments
+        only contribute the dead ids they dropped, as long as everything
+        they replaced was already known; a rewrite, or a merge of segments
+        never seen, cannot be derived and returns None, meaning "reload
+        everything with live_rows()". Call with locked() held so the
+        segments cannot be swapped underneath.
+
+        Args:
+            state: Value returned by state()
+
+        Returns:
+            Optional[Tuple]: (ids, unit vectors, metadata, deleted ids), or None
+        """
+        _, known, tombstones_then = state
+        with self._lock:
+            self.refresh()
+            current = {segment.path.name for segment in self.segments}
+            replaced, covered = known - current, set()
+            candidates = {vector_id for vector_id, g in self.tombstones.items() if tombstones_then.get(vector_id) != g}
+            ids, blocks, metadata = [], [], []
+            for segment in self.segments:
+                if segment.path.name in known:
+                    continue
+                if segment.sources is not None:
+                    if not set(segment.sources) <= known:
+                        return None
+                    covered.update(segment.sources)
+                    candidates.update(segment.dropped)
+                    continue
+                live = self._live_rows(segment, self.tombstones)
+                if not len(live):
+                    continue
+                block = np.asarray(segment.vectors[live], dtype=np.float32)
+                blocks.append(block * segment.scale if segment.scale is not None else block)
+                ids.extend(segment.id_at(int(row)) for row in live)
+                metadata.extend(segment.metadata_at(int(row)) for row in live)
+            if not replaced <= covered:
+                return None
+            deleted = [vector_id for vector_id in candidates if not self._exists(vector_id)]
+        vectors = np.concatenate(blocks) if blocks else np.empty((0, 0), dtype=np.float32)
+        return ids, vectors, metadata, deleted
+
+    def rewrite(self, ids: Sequence[str], vectors: Any, metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+                extras: Optional[Dict[str, Any]] = None):
+        """
+        Replace the whole store with one segment holding exactly these vectors
+
+        For snapshots of an index whose per-row extras all changed at once
+        (e.g. after retraining its quantizer).
+        """
+        with self._locked_manifest():
+            generation = self.next_generation
+            path = write_segment(self.directory, generation, ids, vectors, metadata, dtype=self.dtype, extras=extras)
+            replaced = [segment.path.name for segment in self.segments]
+            self.segments = [VectorSegment(path)]
+            self.tombstones = {}
+            self.vector_count = len(ids)
+            self.next_generation = generation + 1
+            self._pending.clear()
+            self._write_manifest()
+        for name in replaced:
+            shutil.rmtree(self.directory / name, ignore_errors=True)
+
+    def _merge_start(self) -> Optional[int]:
+        """
+        First segment of the newest run to merge, or None
+
+        Walking back from the newest segment, an older segment joins the
+        run while it is no bigger than the run so far, so segment sizes
+        stay roughly geometric. The run is extended to keep at most
+        max_segments, and everything is merged once a fifth of the rows
+        are tombstoned.
+        """
+        counts = [len(segment) for segment in self.segments]
+        if counts and len(self.tombstones) > 0.2 * max(self.vector_count, 1):
+            return 0
+        if len(counts) < 2:
+            return None
+        start, newer = len(counts) - 1, counts[-1]
+        while start > 0 and counts[start - 1] <= newer:
+            start -= 1
+            newer += counts[start]
+        if len(counts) > self.max_segments:
+            start = min(start, self.max_segments - 1)
+        return start if start < len(counts) - 1 else None
+
+    def needs_compaction(self) -> bool:
+        """True when some segments are due to be merged (see _merge_start)."""
+        with self._lock:
+            self.refresh()
+            return self._merge_start() is not None
+
+    def compact(self, full: bool = False):
+        """
+        Merge segments, dropping dead rows
+
+        Merges the newest run chosen by _merge_start, or every segment if
+        ``full``. Extras every merged segment has are carried over. The
+        merged segment is written without holding the lock, so searches and
+        writes continue meanwhile; only the manifest swap is locked.
+        Replaced segment files are deleted afterwards (processes that still
+        map them keep their view until they refresh).
+        """
+        with self._locked_manifest():
+            start = 0 if full else self._merge_start()
+            if start is None or (full and len(self.segments) <= 1 and not self.tombstones):
+                return
+            segments = self.segments[start:]
+            tombstones = dict(self.tombstones)
+            generation = self.next_generation
+            self.next_generation += 1
+            self._write_manifest()
+
+        ids, blocks, metadata, dropped = [], [], [], []
+        names = set.intersection(*(set(segment.extras) for segment in segments)) if segments else set()
+        extras = {name: [] for name in names}
+        for segment in segments:
+            live = self._live_rows(segment, tombstones)
+            if len(live) < segment.count:
+                dead = np.ones(segment.count, dtype=bool)
+                dead[live] = False
+                dropped.extend(segment.id_at(int(row)) for row in np.flatnonzero(dead))
+            if not len(live):
+                continue
+            block = np.asarray(segment.vectors[live], dtype=np.float32)
+            blocks.append(block * segment.scale if segment.scale is not None else block)
+            ids.extend(segment.id_at(int(row)) for row in live)
+            metadata.extend(segment.metadata_at(int(row)) for row in live)
+            for name in names:
+                extras[name].append(np.asarray(segment.extra(name)[live]))
+        vectors = np.concatenate(blocks) if blocks else np.empty((0, 0), dtype=np.float32)
+        extras = {name: np.concatenate(arrays) for name, arrays in extras.items() if arrays}
+        merged = {segment.path.name for segment in segments}
+        path = write_segment(self.directory, generation, ids, vectors, metadata, dtype=self.dtype, extras=extras,
+                             sources=sorted(merged), dropped=dropped)
+
+        with self._locked_manifest():
+            if not merged <= {segment.path.name for segment in self.segments}:
+                # Rewritten meanwhile; the merge is stale
+                shutil.rmtree(path, ignore_errors=True)
+                return
+            self.segments = sorted([VectorSegment(path)] + [s for s in self.segments if s.path.name not in merged],
+                                   key=lambda segment: segment.generation)
+            # A tombstone is still needed while an older, unmerged segment holds its id
+            older = [segment for segment in self.segments if segment.generation < generation]
+            self.tombstones = {
+                vector_id: g for vector_id, g in self.tombstones.items()
+                if g > generation or any(segment.row_of(vector_id) is not None for segment in older)
+            }
+            self._write_manifest()
+        for name in merged:
+            shutil.rmtree(self.directory / name, ignore_errors=True)
+
+    def start_compactor(self, interval: float = 30.0):
+        """
+        Compact in a background thread whenever needs_compaction() is true
+
+        Args:
+            interval (float): Seconds between checks
+        """
+        if self._compactor is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    if self.needs_compaction():
+                        self.compact()
+                except Exception as e:
+                    logger.warning(f"Vector segment compaction failed: {str(e)}")
+
+        self._compactor = threading.Thread(target=run, name="vector-compactor", daemon=True)
+        self._compactor.start()
+
+    def stop_compactor(self):
+        """
+        Stop the background compactor, waiting for a merge in progress
+        """
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def close(self):
+        """
+        Flush buffered vectors and stop the background compactor
+        """
+        self.stop_compactor()
+        self.flush()
+
+    @staticmethod
+    def _live_rows(segment: VectorSegment, tombstones: Dict[str, int]) -> np.ndarray:
+        """Rows of a segment no tombstone kills."""
+        dead = [
+            segment.row_of(vector_id) for vector_id, killed_at in tombstones.items()
+            if segment.generation < killed_at
+        ]
+        live = np.ones(segment.count, dtype=bool)
+        live[[row for row in dead if row is not None]] = False
+        return np.flatnonzero(live)
+
+    def _alive(self, segment: VectorSegment, vector_id: str) -> bool:
+        return segment.generation >= self.tombstones.get(vector_id, -1)
+
+    def _exists(self, vector_id: str) -> bool:
+        return any(
+            segment.row_of(vector_id) is not None and self._alive(segment, vector_id)
+            for segment in self.segments
+        )
+
+    def locked(self):
+        """
+        Hold the store's thread and cross-process lock across several calls
+
+        Re-entrant: the store's own writes inside the block reuse it.
+        """
+        return self._locked_manifest()
+
+    @contextmanager
+    def _locked_manifest(self):
+        with self._lock:
+            if self._lock_depth:
+                # flock is per open file, so a nested open would block on ourselves
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(self.directory / ".lock", 'a') as handle:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                self._lock_depth = 1
+                try:
+                    # Another process may have written since we last looked
+                    self.refresh()
+                    yield
+                finally:
+                    self._lock_depth = 0
+                    if fcntl is not None:
+                        fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _write_manifest(self):
+        path = self.directory / MANIFEST_FILE
+        temp = self.directory / f".{MANIFEST_FILE}.tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({
+                "segments": [segment.path.name for segment in self.segments],
+                "tombstones": self.tombstones,
+                "next_generation": self.next_generation,
+                "vector_count": self.vector_count
+            }, f)
+        os.replace(temp, path)
+        stat = path.stat()
+        self._manifest_version = (stat.st_ino, stat.st_mtime_ns)